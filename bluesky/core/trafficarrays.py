@@ -2,10 +2,27 @@
     delete, and reset functionality for all registered child arrays."""
 # -*- coding: utf-8 -*-
 from collections.abc import Collection
+from itertools import compress
 import numpy as np
 
 defaults = {"float": 0.0, "int": 0, "uint":0, "bool": False, "S": "", "str": ""}
 
+# Minimum number of elements allocated for the backing buffer of a traffic array
+mincapacity = 64
+
+# Cache of default values per numpy dtype
+_dtypedefaults = dict()
+
+
+def dtypedefault(dtype):
+    ''' Return the default value for new elements of an array of type dtype. '''
+    value = _dtypedefaults.get(dtype)
+    if value is None:
+        # Get type without byte length
+        vartype = ''.join(c for c in str(dtype) if c.isalpha())
+        value = _dtypedefaults[dtype] = defaults.get(vartype, 0)
+    return value
+
 
 class RegisterElementParameters:
     """ Class to use in 'with'-syntax. This class automatically
@@ -47,6 +64,10 @@ class TrafficArrays:
         self._children = []
         self._ArrVars  = []
         self._LstVars  = []
+        # Backing buffers of the numpy arrays. The public arrays are views of
+        # the first ntraf elements of these buffers. Buffer capacity grows
+        # geometrically, so that creating aircraft is amortized O(1).
+        self._ArrBufs  = dict()
 
     def reparent(self, newparent):
         ''' Give TrafficArrays object a new parent. '''
@@ -83,9 +104,27 @@ class TrafficArrays:
             lst.extend([defaults.get(vartype)] * n)
 
         for v in self._ArrVars:  # Numpy array
-            # Get type without byte length
-            vartype = ''.join(c for c in str(self.__dict__[v].dtype) if c.isalpha())
-            self.__dict__[v] = np.append(self.__dict__[v], [defaults.get(vartype, 0)] * n)
+            nold = len(self.__dict__[v])
+            buf = self._getbuffer(v, nold + n)
+            buf[nold:nold + n] = dtypedefault(buf.dtype)
+            self.__dict__[v] = buf[:nold + n]
+
+    def _getbuffer(self, v, size):
+        ''' Return the backing buffer of array v, making sure that it contains
+            the current data of v, and has room for at least size elements. '''
+        arr = self.__dict__[v]
+        buf = self._ArrBufs.get(v)
+        if buf is None or buf.dtype != arr.dtype or len(buf) < size:
+            # (Re)allocate the backing buffer with geometric growth
+            cap = max(size, mincapacity, 0 if buf is None else 2 * len(buf))
+            buf = np.empty(cap, dtype=arr.dtype)
+            buf[:len(arr)] = arr
+            self._ArrBufs[v] = buf
+        elif arr.base is not buf:
+            # The array was rebound (e.g., arr = np.where(...)) since the
+            # last create/delete: bring the buffer up-to-date
+            buf[:len(arr)] = arr
+        return buf
 
     def istrafarray(self, name):
         ''' Returns true if parameter 'name' is a traffic array. '''
@@ -99,15 +138,46 @@ class TrafficArrays:
 
     def delete(self, idx):
         ''' Aircraft delete. '''
+        if self is TrafficArrays.root:
+            # Arrays that were rebound since the last create/delete can alias
+            # other traffic arrays (e.g., gs = tas). Give these their own
+            # buffer again before any buffer is compacted in-place.
+            self._adoptrebound()
+
         # Remove element (aircraft) idx from all lists and arrays
         for child in self._children:
             child.delete(idx)
 
+        keep = None
         for v in self._ArrVars:
-            self.__dict__[v] = np.delete(self.__dict__[v], idx)
+            arr = self.__dict__[v]
+            buf = self._ArrBufs.get(v)
+            if buf is None or arr.base is not buf:
+                self.__dict__[v] = np.delete(arr, idx)
+            elif isinstance(idx, Collection):
+                # Shift remaining elements within the buffer instead of
+                # reallocating the array
+                if keep is None:
+                    keep = np.ones(len(arr), dtype=bool)
+                    keep[idx] = False
+                    nnew = np.count_nonzero(keep)
+                arr[:nnew] = arr[keep]
+                self.__dict__[v] = arr[:nnew]
+            else:
+                i = int(idx) % len(arr)
+                arr[i:-1] = arr[i + 1:]
+                self.__dict__[v] = arr[:-1]
 
         if self._LstVars:
-            if isinstance(idx, Collection):
+            if isinstance(idx, Collection) and len(idx) > 1:
+                # Batched delete: rebuild each list in one pass
+                if keep is None:
+                    keep = np.ones(len(self.__dict__[self._LstVars[0]]), dtype=bool)
+                    keep[idx] = False
+                for v in self._LstVars:
+                    lst = self.__dict__[v]
+                    lst[:] = compress(lst, keep)
+            elif isinstance(idx, Collection):
                 for i in reversed(idx):
                     for v in self._LstVars:
                         del self.__dict__[v][i]
@@ -115,6 +185,18 @@ class TrafficArrays:
                 for v in self._LstVars:
                     del self.__dict__[v][idx]
 
+    def _adoptrebound(self):
+        ''' Copy all arrays that are not a view of their own backing buffer
+            back into this buffer. '''
+        for child in self._children:
+            child._adoptrebound()
+
+        for v in self._ArrVars:
+            arr = self.__dict__[v]
+            buf = self._ArrBufs.get(v)
+            if buf is None or arr.base is not buf:
+                self.__dict__[v] = self._getbuffer(v, len(arr))[:len(arr)]
+
     def reset(self):
         ''' Delete all elements from arrays and start at 0 aircraft. '''
         for child in self._children:
@@ -122,6 +204,7 @@ class TrafficArrays:
 
         for v in self._ArrVars:
             self.__dict__[v] = np.array([], dtype=self.__dict__[v].dtype)
+        self._ArrBufs.clear()
 
         for v in self._LstVars:
             self.__dict__[v] = []
@@ -23,10 +23,10 @@ class TrafficProxy(Base):
     # data['inconf'] = bs.traf.cd.inconf
     # data['tcpamax'] = bs.traf.cd.tcpamax
     # data['rpz'] = bs.traf.cd.rpz
-    # data['nconf_cur'] = len(bs.traf.cd.confpairs_unique)
-    # data['nconf_tot'] = len(bs.traf.cd.confpairs_all)
-    # data['nlos_cur'] = len(bs.traf.cd.lospairs_unique)
-    # data['nlos_tot'] = len(bs.traf.cd.lospairs_all)
+    # data['nconf_cur'] = bs.traf.cd.nconf_cur
+    # data['nconf_tot'] = bs.traf.cd.nconf_tot
+    # data['nlos_cur'] = bs.traf.cd.nlos_cur
+    # data['nlos_tot'] = bs.traf.cd.nlos_tot
     
     # data['vmin']       = bs.traf.perf.vmin
     # data['vmax']       = bs.traf.perf.vmax
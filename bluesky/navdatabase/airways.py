@@ -0,0 +1,205 @@
+''' Airway network as an integer-indexed graph, for airway listing, airway
+    expansion and shortest-route generation. '''
+import heapq
+import numpy as np
+
+from bluesky.tools import geo
+from .spatialindex import SpatialIndex
+
+
+def build_airwaygraph(awydata):
+    ''' Graph columns from the airway legs in awydata.
+
+        Nodes are the airway fixes (unique name and position). Each unique
+        leg is stored once. The adjacency of each node is stored in CSR
+        form: adjnode[adjstart[i]:adjstart[i+1]] are the neighbours of node i.
+        Segments are the fixes of each chain of legs of an airway, in order. '''
+    nodes = dict()
+    legs = dict()
+    awids = dict()
+    for awid, fromid, fromlat, fromlon, toid, tolat, tolon, ndir in zip(
+            awydata['awid'], awydata['awfromwpid'], awydata['awfromlat'].tolist(),
+            awydata['awfromlon'].tolist(), awydata['awtowpid'], awydata['awtolat'].tolist(),
+            awydata['awtolon'].tolist(), np.asarray(awydata['awndir']).tolist()):
+        inode = nodes.setdefault((fromid, fromlat, fromlon), len(nodes))
+        jnode = nodes.setdefault((toid, tolat, tolon), len(nodes))
+        iawy = awids.setdefault(awid, len(awids))
+        if inode == jnode:
+            continue
+        if (iawy, jnode, inode) in legs:
+            # Same leg in the other direction: both directions are allowed
+            legs[(iawy, jnode, inode)] = 2
+        else:
+            legs.setdefault((iawy, inode, jnode), ndir)
+
+    wpid, lat, lon = zip(*nodes) if nodes else 3 * [()]
+    lat, lon = np.array(lat, dtype=float), np.array(lon, dtype=float)
+    legawy, legfrom, legto = (np.array(v, dtype=int).reshape(-1) for v in zip(*legs)) \
+        if legs else 3 * [np.zeros(0, dtype=int)]
+    legndir = np.array(list(legs.values()), dtype=int)
+
+    # Adjacency in both directions, legs with one direction are only
+    # traversed from their from-fix to their to-fix
+    src = np.concatenate((legfrom, legto))
+    order = np.argsort(src, kind='stable')
+    adjstart = np.searchsorted(src[order], np.arange(len(nodes) + 1))
+    adjnode = np.concatenate((legto, legfrom))[order]
+    adjleg = np.tile(np.arange(len(legawy)), 2)[order]
+    adjfwd = np.repeat([True, False], len(legawy))[order]
+
+    # Segments: walk the chains of legs of each airway, starting at fixes
+    # where a chain ends or branches, and then around the remaining loops
+    segawy, segnodes = [], []
+    awylegs = np.argsort(legawy, kind='stable')
+    awystart = np.searchsorted(legawy[awylegs], np.arange(len(awids) + 1))
+    for iawy in range(len(awids)):
+        neighbours = dict()
+        for ileg in awylegs[awystart[iawy]:awystart[iawy + 1]].tolist():
+            neighbours.setdefault(int(legfrom[ileg]), []).append(int(legto[ileg]))
+            neighbours.setdefault(int(legto[ileg]), []).append(int(legfrom[ileg]))
+        used = set()
+        starts = [n for n, nb in neighbours.items() if len(nb) != 2] + list(neighbours)
+        for start in starts:
+            for nxt in neighbours[start]:
+                if (start, nxt) in used:
+                    continue
+                segment = [start]
+                prev, cur = start, nxt
+                while True:
+                    used.update(((prev, cur), (cur, prev)))
+                    segment.append(cur)
+                    ahead = [n for n in neighbours[cur] if (cur, n) not in used]
+                    if len(neighbours[cur]) != 2 or not ahead:
+                        break
+                    prev, cur = cur, ahead[0]
+                segawy.append(iawy)
+                segnodes.append(segment)
+
+    return dict(wpid=list(wpid), lat=lat, lon=lon, awid=list(awids),
+                legawy=legawy, legfrom=legfrom, legto=legto, legndir=legndir,
+                adjstart=adjstart, adjnode=adjnode, adjleg=adjleg, adjfwd=adjfwd,
+                segawy=np.array(segawy, dtype=int),
+                segstart=np.cumsum([0] + [len(s) for s in segnodes]),
+                segnode=np.array([n for s in segnodes for n in s], dtype=int))
+
+
+class AirwayGraph:
+    ''' Airway network graph, from the columns made by build_airwaygraph. '''
+    def __init__(self, columns):
+        self.wpid = columns['wpid']
+        self.lat = columns['lat']
+        self.lon = columns['lon']
+        self.awid = columns['awid']
+        self.legawy = columns['legawy']
+        self.legndir = columns['legndir']
+        self.adjstart = columns['adjstart']
+        self.adjnode = columns['adjnode']
+        self.adjleg = columns['adjleg']
+        self.adjfwd = columns['adjfwd']
+        self.segawy = columns['segawy']
+        self.segstart = columns['segstart']
+        self.segnode = columns['segnode']
+
+        # Leg lengths [nm], lookup of fixes and airways by name
+        self.legdist = geo.kwikdist(self.lat[columns['legfrom']], self.lon[columns['legfrom']],
+                                    self.lat[columns['legto']], self.lon[columns['legto']])
+        self.nodeindex = dict()
+        for i, name in enumerate(self.wpid):
+            self.nodeindex.setdefault(name, []).append(i)
+        self.awyindex = {name: i for i, name in enumerate(self.awid)}
+        self.awysegments = dict()
+        for iseg, iawy in enumerate(self.segawy.tolist()):
+            self.awysegments.setdefault(iawy, []).append(iseg)
+        self.spatial = SpatialIndex(self.lat, self.lon)
+
+        # Length of each adjacency, and whether it can be flown in that direction
+        self.adjdist = self.legdist[self.adjleg]
+        self.adjok = self.adjfwd | (self.legndir[self.adjleg] == 2)
+
+    def nodes(self, wpid, lat=None, lon=None, maxdist=10.0):
+        ''' Fixes with this name, within maxdist [nm] from lat, lon when given. '''
+        idx = self.nodeindex.get(wpid, [])
+        if lat is None or not idx:
+            return idx
+        dist = geo.kwikdist(lat, lon, self.lat[idx], self.lon[idx])
+        return [i for i, d in zip(idx, dist) if d < maxdist]
+
+    def segment(self, iseg):
+        ''' Fixes of a segment. '''
+        return self.segnode[self.segstart[iseg]:self.segstart[iseg + 1]]
+
+    def connections(self, node):
+        ''' Airway legs from a fix, as [airway, fix name] lists. '''
+        start, end = self.adjstart[node], self.adjstart[node + 1]
+        return [[self.awid[self.legawy[leg]], self.wpid[nb]]
+                for nb, leg in zip(self.adjnode[start:end].tolist(), self.adjleg[start:end].tolist())]
+
+    def segments(self, awid):
+        ''' The segments of an airway as lists of fix names. '''
+        return [[self.wpid[n] for n in self.segment(iseg).tolist()]
+                for iseg in self.awysegments.get(self.awyindex.get(awid), [])]
+
+    def expand(self, awid, fromnodes, toid):
+        ''' Fixes along airway awid from one of fromnodes up to and including
+            the fix with name toid, excluding the from-fix itself. Empty when
+            the airway does not connect them. '''
+        fromnodes = np.asarray(fromnodes)
+        for iseg in self.awysegments.get(self.awyindex.get(awid), []):
+            seg = self.segment(iseg)
+            ifrom = np.flatnonzero(np.isin(seg, fromnodes))
+            ito = np.flatnonzero(np.array([self.wpid[n] == toid for n in seg.tolist()]))
+            if len(ifrom) and len(ito):
+                i, j = ifrom[0], ito[np.argmin(np.abs(ito - ifrom[0]))]
+                return seg[i + 1:j + 1].tolist() if j > i else seg[j:i][::-1].tolist()
+        return []
+
+    def shortest(self, origlat, origlon, destlat, destlon, nentry=5):
+        ''' Shortest airway route between two positions with A*. The route
+            joins the network at one of the nentry fixes closest to the origin,
+            and leaves it at one of the nentry fixes closest to the destination.
+
+            Returns the list of fixes, empty when there is no route. '''
+        if not self.wpid:
+            return []
+        entries = self.spatial.nearest(origlat, origlon, nentry)
+        exits = self.spatial.nearest(destlat, destlon, nentry)
+        exitdist = dict(zip(exits.tolist(), geo.kwikdist(self.lat[exits], self.lon[exits],
+                                                          destlat, destlon).tolist()))
+        # Heuristic: straight distance to the destination
+        hdist = geo.kwikdist(self.lat, self.lon, destlat, destlon)
+        cost = dict()
+        prev = dict()
+        heap = []
+        for node, dist in zip(entries.tolist(), geo.kwikdist(origlat, origlon, self.lat[entries],
+                                                             self.lon[entries]).tolist()):
+            cost[node] = dist
+            prev[node] = -1
+            heapq.heappush(heap, (dist + hdist[node], dist, node))
+
+        # The destination is node -2, reached from the exit fixes
+        while heap:
+            _, dist, node = heapq.heappop(heap)
+            if node == -2:
+                break
+            if dist > cost[node]:
+                continue
+            start, end = self.adjstart[node], self.adjstart[node + 1]
+            neighbours = [(nb, dist + legdist) for nb, legdist, ok in zip(
+                self.adjnode[start:end].tolist(), self.adjdist[start:end].tolist(),
+                self.adjok[start:end].tolist()) if ok]
+            if node in exitdist:
+                neighbours.append((-2, dist + exitdist[node]))
+            for nb, nbdist in neighbours:
+                if nbdist < cost.get(nb, np.inf):
+                    cost[nb] = nbdist
+                    prev[nb] = node
+                    heapq.heappush(heap, (nbdist + (hdist[nb] if nb >= 0 else 0.0), nbdist, nb))
+        if -2 not in prev:
+            return []
+
+        route = []
+        node = prev[-2]
+        while node >= 0:
+            route.append(node)
+            node = prev[node]
+        return route[::-1]
@@ -1,9 +1,12 @@
 ''' Loader functions for navigation data. '''
 import pickle
+from collections.abc import Mapping
+import numpy as np
 
 from bluesky import settings
 from bluesky.tools import cachefile
 from .loadnavdata_txt import loadnavdata_txt, loadthresholds_txt
+from .airways import build_airwaygraph
 
 
 # Cache versions: increment these to the current date if the source data is updated
@@ -14,8 +17,57 @@ navdb_version = 'v20170101'
 settings.set_variable_defaults(navdata_path='navdata')
 
 
-def load_navdata():
-    ''' Load navigation database. '''
+# Layers of navigation data. Each layer is cached in its own directory, so
+# that loading one layer never reads the files of the others.
+navdata_layers = ('wpt', 'apt', 'awy', 'awygraph', 'fir', 'co', 'rwy')
+
+
+def load_navdata(layer):
+    ''' Load one layer of the navigation database. '''
+    with cachefile.opencolumns(f'navdata_{layer}', navdb_version) as cache:
+        try:
+            columns = cache.load(layer)
+        except cachefile.CacheError as e:
+            print(e.args[0])
+            columns = None
+
+    if columns is None:
+        columns = build_navdata()[layer]
+
+    if layer == 'fir':
+        return unpack_fir(columns)
+    if layer == 'rwy':
+        return RunwayThresholds(columns)
+    return columns
+
+
+def build_navdata():
+    ''' Convert the navigation data to columns, and write the cache of
+        every layer. Returns a dict with the columns of each layer. '''
+    wptdata, aptdata, awydata, firdata, codata, rwythresholds = load_navdata_pickle()
+
+    # Numeric data as arrays, which are memory-mapped from the cache
+    for data, names in ((wptdata, ('wpelev', 'wpvar')),
+                        (awydata, ('awndir', 'awlowfl', 'awupfl')),
+                        (codata, ('conr',))):
+        data.update({name: np.array(data[name]) for name in names})
+
+    layers = dict(wpt=wptdata, apt=aptdata, awy=awydata, awygraph=build_airwaygraph(awydata),
+                  fir=pack_fir(firdata), co=codata, rwy=pack_thresholds(rwythresholds))
+    for layer, columns in layers.items():
+        dump_navdata(layer, columns)
+    return layers
+
+
+def dump_navdata(layer, columns):
+    ''' Write the cache of one layer of the navigation database. '''
+    with cachefile.opencolumns(f'navdata_{layer}', navdb_version) as cache:
+        cache.dump(layer, columns)
+
+
+def load_navdata_pickle():
+    ''' Load navigation data from a pickle cache of an older BlueSky version,
+        or parse the navigation data files when there is none. '''
     with cachefile.openfile('navdata.p', navdb_version) as cache:
         try:
             wptdata       = cache.load()
@@ -24,17 +76,67 @@ def load_navdata():
             firdata       = cache.load()
             codata        = cache.load()
             rwythresholds = cache.load()
+            return wptdata, aptdata, awydata, firdata, codata, rwythresholds
         except (pickle.PickleError, cachefile.CacheError) as e:
             print(e.args[0])
 
-            wptdata, aptdata, awydata, firdata, codata = loadnavdata_txt()
-            rwythresholds = loadthresholds_txt()
+    wptdata, aptdata, awydata, firdata, codata = loadnavdata_txt()
+    return wptdata, aptdata, awydata, firdata, codata, loadthresholds_txt()
+
+
+def pack_fir(firdata):
+    ''' FIR data with the [name, lats, lons] list per FIR as columns, with
+        the FIR border points concatenated. '''
+    fir = firdata['fir']
+    columns = {name: value for name, value in firdata.items() if name != 'fir'}
+    columns['firname'] = [f[0] for f in fir]
+    columns['firnpoints'] = [len(f[1]) for f in fir]
+    columns['firlat'] = np.array([lat for f in fir for lat in f[1]], dtype=float)
+    columns['firlon'] = np.array([lon for f in fir for lon in f[2]], dtype=float)
+    return columns
+
+
+def unpack_fir(columns):
+    ''' FIR data from the columns made by pack_fir. '''
+    firdata = {name: value for name, value in columns.items()
+               if name not in ('firname', 'firnpoints', 'firlat', 'firlon')}
+    ends = np.cumsum(columns['firnpoints'], dtype=int)
+    lats = np.split(columns['firlat'], ends[:-1]) if len(ends) else []
+    lons = np.split(columns['firlon'], ends[:-1]) if len(ends) else []
+    firdata['fir'] = [[name, lat.tolist(), lon.tolist()]
+                      for name, lat, lon in zip(columns['firname'], lats, lons)]
+    return firdata
+
+
+def pack_thresholds(rwythresholds):
+    ''' Runway thresholds {apt: {rwy: (lat, lon, hdg)}} as columns with one
+        row per runway, and the number of runways per airport. '''
+    thr = [thr for rwys in rwythresholds.values() for thr in rwys.values()]
+    return dict(apt=list(rwythresholds), nrwy=[len(rwys) for rwys in rwythresholds.values()],
+                rwy=[rwy for rwys in rwythresholds.values() for rwy in rwys],
+                thr=np.array(thr, dtype=float).reshape(-1, 3))
+
+
+class RunwayThresholds(Mapping):
+    ''' Runway thresholds {apt: {rwy: (lat, lon, hdg)}} from the columns made
+        by pack_thresholds. The runways of an airport are only unpacked when
+        they are used for the first time. '''
+    def __init__(self, columns):
+        self.columns = columns
+        ends = np.cumsum(columns['nrwy'], dtype=int)
+        self.index = dict(zip(columns['apt'], zip((ends - columns['nrwy']).tolist(), ends.tolist())))
+        self.rwys = dict()
+
+    def __getitem__(self, apt):
+        rwys = self.rwys.get(apt)
+        if rwys is None:
+            start, end = self.index[apt]
+            rwys = self.rwys[apt] = dict(zip(self.columns['rwy'][start:end],
+                                             map(tuple, self.columns['thr'][start:end].tolist())))
+        return rwys
 
-            cache.dump(wptdata)
-            cache.dump(awydata)
-            cache.dump(aptdata)
-            cache.dump(firdata)
-            cache.dump(codata)
-            cache.dump(rwythresholds)
+    def __iter__(self):
+        return iter(self.index)
 
-    return wptdata, aptdata, awydata, firdata, codata, rwythresholds
+    def __len__(self):
+        return len(self.index)
@@ -2,11 +2,33 @@ from math import *
 import numpy as np
 
 from .loadnavdata import load_navdata
+from .spatialindex import SpatialIndex, inbox
+from .airways import AirwayGraph
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
-from bluesky.tools.misc import findall
 import bluesky as bs
 
+
+def nameindex(ids):
+    """ Dictionary with per identifier the list of its indices in ids. """
+    index = dict()
+    for i, name in enumerate(ids):
+        index.setdefault(name, []).append(i)
+    return index
+
+
+# Attributes of the optional layers of navigation data, which are loaded on
+# first use: headless simulations often only use the waypoints and airports
+lazylayers = dict(
+    awy=('awfromwpid', 'awfromlat', 'awfromlon', 'awtowpid', 'awtolat', 'awtolon',
+         'awid', 'awndir', 'awlowfl', 'awupfl'),
+    awygraph=('airways',),
+    fir=('fir', 'firlat0', 'firlon0', 'firlat1', 'firlon1'),
+    co=('coname', 'cocode2', 'cocode3', 'conr'),
+    rwy=('rwythresholds',))
+lazyattrs = {name: layer for layer, names in lazylayers.items() for name in names}
+
+
 class Navdatabase:
     """
     Navdatabase class definition : command stack & processing class
@@ -24,6 +46,8 @@ class Navdatabase:
         wplat                     : latitude
         wplon                     : longitude
         wpco                      : country code
+        wpindex                   : dict with per identifier the list of waypoint indices
+        wpspatial                 : spatial index of the waypoint positions
 
         apid                      : list of identifier/short names
         apname                    : long name
@@ -33,6 +57,15 @@ class Navdatabase:
         apmaxrwy                  : max rwy length in meters
         apco                      : country code
         apelev                    : country code
+        aptindex                  : dict with per identifier the list of airport indices
+        aptspatial                : spatial index of the airport positions
+
+        awfromwpid, awtowpid      : identifiers of the start and end fix of each airway leg
+        awid                      : airway identifier of each leg
+        airways                   : airway network graph (fixes, legs, segments)
+
+        Airway, FIR, country code and runway threshold data are only loaded
+        on first use (see lazylayers).
 
 
     Created by  : Jacco M. Hoekstra (TU Delft)
@@ -46,7 +79,8 @@ class Navdatabase:
 
     def reset(self):
         print("Loading global navigation database...")
-        wptdata, aptdata, awydata, firdata, codata, rwythresholds = load_navdata()
+        wptdata = load_navdata('wpt')
+        aptdata = load_navdata('apt')
 
         # Get waypoint data
         self.wpid     = wptdata['wpid']       # identifier (string)
@@ -57,18 +91,8 @@ class Navdatabase:
         self.wpvar    = wptdata['wpvar']      # magn variation [deg]
         self.wpfreq   = wptdata['wpfreq']       # frequency [kHz/MHz]
         self.wpdesc   = wptdata['wpdesc']     # description
-
-        # Get airway legs data
-        self.awfromwpid = awydata['awfromwpid']  # identifier (string)
-        self.awfromlat  = awydata['awfromlat']   # latitude [deg]
-        self.awfromlon  = awydata['awfromlon']   # longitude [deg]
-        self.awtowpid   = awydata['awtowpid']    # identifier (string)
-        self.awtolat    = awydata['awtolat']     # latitude [deg]
-        self.awtolon    = awydata['awtolon']     # longitude [deg]
-        self.awid       = awydata['awid']        # airway identifier (string)
-        self.awndir     = awydata['awndir']      # number of directions (1 or 2)
-        self.awlowfl    = awydata['awlowfl']     # lower flight level (int)
-        self.awupfl     = awydata['awupfl']      # upper flight level (int)
+        self.wpindex  = nameindex(self.wpid)  # indices per identifier
+        self.wpspatial = SpatialIndex(self.wplat, self.wplon)  # nearest/inside queries
 
         # Get airpoint data
         self.aptid     = aptdata['apid']      # 4 char identifier (string)
@@ -79,21 +103,58 @@ class Navdatabase:
         self.aptype    = aptdata['aptype']    # type (int, 1=large, 2=medium, 3=small)
         self.aptco     = aptdata['apco']      # two char country code (string)
         self.aptelev   = aptdata['apelev']    # field elevation in meters [m] above mean sea level
-
-        # Get FIR data
-        self.fir      = firdata['fir']        # fir name
-        self.firlat0  = firdata['firlat0']    # start lat of a line of border
-        self.firlon0  = firdata['firlon0']    # start lon of a line of border
-        self.firlat1  = firdata['firlat1']    # end lat of a line of border
-        self.firlon1  = firdata['firlon1']    # end lon of a line of border
-
-        # Get country code data
-        self.coname   = codata['coname']      # country full name
-        self.cocode2  = codata['cocode2']     # country code A2 (asscii2) 2 chars
-        self.cocode3  = codata['cocode3']     # country code A3 (asscii2) 3 chars
-        self.conr     = codata['conr']        # country icao number
-
-        self.rwythresholds = rwythresholds
+        self.aptindex  = nameindex(self.aptid)  # indices per identifier
+        self.aptspatial = SpatialIndex(self.aptlat, self.aptlon)  # nearest/inside queries
+
+        # Optional layers are (re)loaded on first use
+        for name in lazyattrs:
+            self.__dict__.pop(name, None)
+
+    def __getattr__(self, name):
+        """Load an optional layer of navigation data on first use of one
+           of its attributes"""
+        layer = lazyattrs.get(name)
+        if layer is None:
+            raise AttributeError(f"'Navdatabase' object has no attribute '{name}'")
+        self.loadlayer(layer)
+        return self.__dict__[name]
+
+    def loadlayer(self, layer):
+        """Load an optional layer of navigation data"""
+        data = load_navdata(layer)
+        if layer == 'awy':
+            # Get airway legs data
+            self.awfromwpid = data['awfromwpid']  # identifier (string)
+            self.awfromlat  = data['awfromlat']   # latitude [deg]
+            self.awfromlon  = data['awfromlon']   # longitude [deg]
+            self.awtowpid   = data['awtowpid']    # identifier (string)
+            self.awtolat    = data['awtolat']     # latitude [deg]
+            self.awtolon    = data['awtolon']     # longitude [deg]
+            self.awid       = data['awid']        # airway identifier (string)
+            self.awndir     = data['awndir']      # number of directions (1 or 2)
+            self.awlowfl    = data['awlowfl']     # lower flight level (int)
+            self.awupfl     = data['awupfl']      # upper flight level (int)
+
+        elif layer == 'awygraph':
+            self.airways = AirwayGraph(data)  # airway network graph
+
+        elif layer == 'fir':
+            # Get FIR data
+            self.fir      = data['fir']        # fir name
+            self.firlat0  = data['firlat0']    # start lat of a line of border
+            self.firlon0  = data['firlon0']    # start lon of a line of border
+            self.firlat1  = data['firlat1']    # end lat of a line of border
+            self.firlon1  = data['firlon1']    # end lon of a line of border
+
+        elif layer == 'co':
+            # Get country code data
+            self.coname   = data['coname']      # country full name
+            self.cocode2  = data['cocode2']     # country code A2 (asscii2) 2 chars
+            self.cocode3  = data['cocode3']     # country code A3 (asscii2) 3 chars
+            self.conr     = data['conr']        # country icao number
+
+        elif layer == 'rwy':
+            self.rwythresholds = data  # {apt: {rwy: (lat, lon, hdg)}}
 
     def defwpt(self,name=None,lat=None,lon=None,wptype=None):
         # Prevent polluting the database: check arguments
@@ -110,7 +171,7 @@ class Navdatabase:
 
         # No data: give info on waypoint
         elif lat==None or lon==None:
-            if self.wpid.count(name.upper()) > 0:
+            if name.upper() in self.wpindex:
                 i = self.getwpidx(name.upper(), bs.ref.lat, bs.ref.lon)
                 txt = f"{self.wpid[i]} : {self.wplat[i]}, {self.wplon[i]}"
                 if len(self.wptype[i]) > 0:
@@ -122,17 +183,19 @@ class Navdatabase:
                 return True, f"Waypoint {name.upper()} does not yet exist."
 
         # Still here? So there is data, then we add this waypoint
+        self.wpindex.setdefault(name.upper(), []).append(len(self.wpid))
         self.wpid.append(name.upper())
         self.wplat = np.append(self.wplat,lat)
         self.wplon = np.append(self.wplon,lon)
+        self.wpspatial.insert(lat, lon)
 
         if wptype == None:
             self.wptype.append("")
         else:
             self.wptype.append(wptype)
 
-        self.wpelev.append(0.0)               # elevation [m]
-        self.wpvar.append(0.0)                # magn variation [deg]
+        self.wpelev = np.append(self.wpelev, 0.0)  # elevation [m]
+        self.wpvar = np.append(self.wpvar, 0.0)    # magn variation [deg]
         self.wpfreq.append(0.0)               # frequency [kHz/MHz]
         self.wpdesc.append("Custom waypoint") # description
 
@@ -143,22 +206,31 @@ class Navdatabase:
 
     def delwpt(self,name=''):
         """ Delete a waypoint"""
-        if self.wpid.count(name.upper()) <= 0:
+        if name.upper() not in self.wpindex:
             return False,"Waypoint " + name.upper() + " does not exist."
 
-        idx = len(self.wpid) - self.wpid[::-1].index(name) - 1 # Search from back of list
+        idx = self.wpindex[name.upper()][-1] # Last waypoint with this name
 
         del self.wpid[idx]   # wp name
 
-        np.delete(self.wplat,idx)  # wp lat
-        np.delete (self.wplon,idx) # wp lon
+        self.wplat = np.delete(self.wplat,idx)  # wp lat
+        self.wplon = np.delete(self.wplon,idx) # wp lon
+        self.wpspatial.delete(idx)
 
         del self.wptype[idx]        # Waypoint type
-        del self.wpelev[idx]        # elevation [m]
-        del self.wpvar[idx]         # magn variation [deg]
+        self.wpelev = np.delete(self.wpelev, idx)  # elevation [m]
+        self.wpvar = np.delete(self.wpvar, idx)    # magn variation [deg]
         del self.wpfreq[idx]        # frequency [kHz/MHz]
         del self.wpdesc[idx]        # description
 
+        # Update the name index: indices after the deleted waypoint shift down
+        if idx == len(self.wpid):
+            self.wpindex[name.upper()].pop()
+            if not self.wpindex[name.upper()]:
+                del self.wpindex[name.upper()]
+        else:
+            self.wpindex = nameindex(self.wpid)
+
          # Update screen info (delete necessary there?)
         bs.scr.removenavwpt(name.upper())
 
@@ -166,238 +238,113 @@ class Navdatabase:
 
     def getwpidx(self, txt, reflat: float|None = None, reflon: float|None = None):
         """Get waypoint index to access data"""
-        name = txt.upper()
-        try:
-            i = self.wpid.index(name)
-        except:
+        idx = self.wpindex.get(txt.upper())
+        if idx is None:
             return -1
 
-        # if no pos is specified, get first occurence
-        if reflat is None:
-            return i
+        # if no pos is specified, or there is only one, get first occurence
+        if reflat is None or len(idx) == 1:
+            return idx[0]
+
+        # If pos is specified return closest
+        return idx[self.closest(idx, reflat, reflon)]
 
-        # If pos is specified check for more and return closest
+    def closest(self, idx, reflat, reflon):
+        """Position in the list of waypoint indices idx of the waypoint closest to reflat, reflon"""
+        idx = np.asarray(idx)
+        return int(np.argmin(geo.kwikdist(reflat, reflon, self.wplat[idx], self.wplon[idx])))
+
+    def getwpidx_many(self, names, reflats=None, reflons=None):
+        """Get the waypoint indices of a list of names (-1 when not found). With
+           reference positions, the closest of duplicate waypoints is selected,
+           otherwise the first occurrence."""
+        candidates = [self.wpindex.get(name.upper(), ()) for name in names]
+
+        # All (name, candidate waypoint) combinations
+        counts = np.array([len(idx) for idx in candidates], dtype=int)
+        iname = np.repeat(np.arange(len(names)), counts)
+        icand = np.array([i for idx in candidates for i in idx], dtype=int)
+
+        # Select the first, or the closest candidate of each name
+        if reflats is None or len(icand) == 0:
+            order = np.arange(len(icand))
         else:
-            idx = []
-            idx.append(i)
-            found = True
-            while i < len(self.wpid) - 1 and found:
-                try:
-                    i = self.wpid.index(name, i + 1)
-                    idx.append(i)
-                except:
-                    found = False
-            if len(idx) == 1:
-                return idx[0]
-            else:
-                imin = idx[0]
-                dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
-                for i in idx[1:]:
-                    d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
-                    if d < dmin:
-                        imin = i
-                        dmin = d
-                return imin
+            dist = geo.kwikdist(np.asarray(reflats)[iname], np.asarray(reflons)[iname],
+                                self.wplat[icand], self.wplon[icand])
+            order = np.lexsort((dist, iname))
+        found, first = np.unique(iname[order], return_index=True)
+        idx = np.full(len(names), -1, dtype=int)
+        idx[found] = icand[order[first]]
+        return idx
 
     def getwpindices(self, txt, reflat: float|None = None, reflon: float|None = None, crit=1852.0):
         """Get waypoint index to access data"""
-        name = txt.upper()
-        try:
-            i = self.wpid.index(name)
-        except:
+        idx = self.wpindex.get(txt.upper())
+        if idx is None:
             return [-1]
 
-        # if no pos is specified, get first occurence
-        if reflat is None:
-            return [i]
-
-        # If pos is specified check for more and return closest
-        else:
-            idx = findall(self.wpid,name) # find indices of al occurences
+        # if no pos is specified, or there is only one, get first occurence
+        if reflat is None or len(idx) == 1:
+            return [idx[0]]
 
-            if len(idx) == 1:
-                return [idx[0]]
-            else:
-                imin = idx[0]
-                dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
-                for i in idx[1:]:
-                    d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
-                    if d < dmin:
-                        imin = i
-                        dmin = d
-                # Find co-located
-                indices = [imin]
-                for i in idx:
-                    if i!=imin:
-                        dist = nm*geo.kwikdist(self.wplat[i], self.wplon[i], \
-                                            self.wplat[imin], self.wplon[imin])
-                        if dist<=crit:
-                            indices.append(i)
-
-                return indices
+        # If pos is specified return closest, and the ones co-located with it
+        imin = idx[self.closest(idx, reflat, reflon)]
+        others = np.array([i for i in idx if i != imin])
+        dist = nm * geo.kwikdist(self.wplat[others], self.wplon[others],
+                                 self.wplat[imin], self.wplon[imin])
+        return [imin] + others[dist <= crit].tolist()
 
     def getaptidx(self, txt):
         """Get waypoint index to access data"""
-        try:
-            return self.aptid.index(txt.upper())
-        except:
-            return -1
-
-    def getinear(self, wlat, wlon, lat, lon):  # lat,lon in degrees
-        # t0 = time.clock()
-        f = cos(radians(lat))
-        dlat = (wlat - lat + 180.) % 360. - 180.
-        dlon = f * ((wlon - lon + 180.) % 360. - 180.)
-        d2 = dlat * dlat + dlon * dlon
-        idx = np.argmin(d2)
-        # dt = time.clock()-t0
-        # print dt
-        return idx
+        idx = self.aptindex.get(txt.upper())
+        return -1 if idx is None else idx[0]
 
     def getwpinear(self, lat, lon):  # lat,lon in degrees
-        """Get closest waypoint index"""
-        return self.getinear(self.wplat, self.wplon, lat, lon)
+        """Get closest waypoint index, or -1 when there are no waypoints"""
+        idx = self.wpspatial.nearest(lat, lon)
+        return int(idx[0]) if len(idx) else -1
 
     def getapinear(self, lat, lon):  # lat,lon in degrees
-        """Get closest airport index"""
-        return self.getinear(self.aptlat, self.aptlon, lat, lon)
+        """Get closest airport index, or -1 when there are no airports"""
+        idx = self.aptspatial.nearest(lat, lon)
+        return int(idx[0]) if len(idx) else -1
 
-    def getinside(self, wlat, wlon, lat0, lat1, lon0, lon1):
-        """Get indices inside given box"""
-        # t0 = time.clock()
-        if lat0 < lat1:
-            arr = np.where((wlat > lat0) * (wlat < lat1) * (wlon > lon0) * (wlon < lon1))
-        else:
-            arr = np.where((wlat > lat1) + (wlat < lat0) * (wlon > lon0) * (wlon < lon1))
+    def getwpknear(self, lat, lon, k):  # lat,lon in degrees
+        """Get indices of the k closest waypoints, closest first"""
+        return self.wpspatial.nearest(lat, lon, k).tolist()
+
+    def getapknear(self, lat, lon, k):  # lat,lon in degrees
+        """Get indices of the k closest airports, closest first"""
+        return self.aptspatial.nearest(lat, lon, k).tolist()
 
-        # dt = time.clock()-t0
-        # print dt
-        return list(arr[0])  # Get indices
+    def getinside(self, wlat, wlon, lat0, lat1, lon0, lon1):
+        """Get indices inside given box (lon0 > lon1: box crosses the antimeridian)"""
+        return list(np.where(inbox(wlat, wlon, lat0, lat1, lon0, lon1))[0])  # Get indices
 
     def getwpinside(self, lat0, lat1, lon0, lon1):
         """Get waypoint indices inside box"""
-        return self.getinside(self.wplat, self.wplon, lat0, lat1, lon0, lon1)
+        return self.wpspatial.inside(lat0, lat1, lon0, lon1)
 
     def getapinside(self, lat0, lat1, lon0, lon1):
         """Get airport indicex inside box"""
-        return self.getinside(self.aptlat, self.aptlon, lat0, lat1, lon0, lon1)
+        return self.aptspatial.inside(lat0, lat1, lon0, lon1)
 
-    # returns all runways of given airport
+    # returns all segments of given airway
     def listairway(self, airwayid):
-        awkey = airwayid.upper()
-
-        airway = []     # identifier of waypoint   0 .. N-1
-
-        # Does this airway exist?
-        if self.awid.count(awkey)>0:
-            # Collect leg indices
-            i = 0
-            found = True
-            legs  = []  # Alle leg incl. duplicate legs
-            left  = []  # wps in left column in file
-            right = []  # wps in right coumn in file
-
-            idx = findall(self.awid,awkey)
-            for i in idx:
-                newleg = self.awfromwpid[i]+"-"+self.awtowpid[i]
-                if newleg not in legs:
-                    legs.append(newleg)
-                    left.append(self.awfromwpid[i])
-                    right.append(self.awtowpid[i])
-
-            # Not found: return
-            if len(legs)==0:
-                return []
-
-            # Count wps to see when we have all segments
-            unused =  len(left)+len(right)
-
-            while unused>0 and not left==len(left)*[""]:
-
-                # Find start of a segment
-                wps  = left+right
-                iwps = 0
-                while iwps<len(wps) and wps.count(wps[iwps])>1:
-                    iwps = iwps + 1
-
-                i = iwps%len(left)
-                j = int(iwps/len(left))
-
-                # Catch single lost wps
-                if j>1 or iwps>len(wps):
-                    break
-
-                # Sort
-                wps = [left,right]
-                segment = []
-
-                segready = False
-                while not segready:
-
-                    # Get leg
-                    curwp  = wps[j][i]
-                    nextwp = wps[1-j][i]
-
-                    # Update admin of to do wplist
-                    unused      = unused - 2
-                    wps[j][i]   = ""
-                    wps[1-j][i] = ""
+        """List of segments (lists of waypoint ids) of an airway"""
+        return self.airways.segments(airwayid.upper())
 
-                    # Add first wp to segment
-                    segment.append(curwp)
-
-                    # Find next lef with nextwp
-                    if wps[0].count(nextwp)>0:
-                        j  = 0
-                        i  = wps[0].index(nextwp)
-                        found = True
-
-                    elif wps[1].count(nextwp)>0:
-                        i  = wps[1].index(nextwp)
-                        j  = 1
-                        found = True
-                    else:
-                        found = False
-
-                    # This segemnt done?
-                    segready = (not found) or curwp=="" or nextwp==""
-
-                # Also add final nextwp of this segment
-                segment.append(nextwp)
-
-                # Airway cab have multiple separate segments
-                airway.append(segment)
-
-                # Ready for next segment
-                left  = wps[0]
-                right = wps[1]
-
-
-        return airway #,connect
-
-    def listconnections(self, wpid,wplat,wplon):
-
-        # Return list of connecting airway legs
+    def listconnections(self, wpid, wplat, wplon):
+        """List of [airway, waypoint id] of the airway legs connected to a waypoint"""
         connect = []
-
-        # Check from-list first
-        if wpid in self.awfromwpid:
-            idx = findall(self.awfromwpid,wpid)
-            for i in idx:
-                newitem = [self.awid[i],self.awtowpid[i]]
-                if (newitem not in connect) and \
-                         geo.kwikdist(self.awfromlat[i],self.awfromlon[i],
-                                  wplat,wplon) < 10.:
-                    connect.append(newitem)
-
-        # Check to-list nextt
-        if wpid in self.awtowpid:
-            idx = findall(self.awtowpid,wpid)
-            for i in idx:
-                newitem = [self.awid[i],self.awfromwpid[i]]
-                if (newitem not in connect) and \
-                         geo.kwikdist(self.awtolat[i],self.awtolon[i],
-                                  wplat,wplon) < 10.:
+        for node in self.airways.nodes(wpid, wplat, wplon):
+            for newitem in self.airways.connections(node):
+                if newitem not in connect:
                     connect.append(newitem)
 
         return connect # return list of [awid,wpid]
+
+    def routegen(self, origlat, origlon, destlat, destlon):
+        """Waypoint ids of the shortest airway route between two positions"""
+        return [self.airways.wpid[node] for node in
+                self.airways.shortest(origlat, origlon, destlat, destlon)]
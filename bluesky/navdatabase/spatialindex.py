@@ -0,0 +1,121 @@
+''' Spatial index for nearest and inside-box queries on navigation data points. '''
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def lat2xyz(lat, lon):
+    ''' Unit-sphere x,y,z coordinates of lat,lon [deg] positions. '''
+    lat, lon = np.radians(lat), np.radians(lon)
+    coslat = np.cos(lat)
+    return np.stack((coslat * np.cos(lon), coslat * np.sin(lon), np.sin(lat)), axis=-1)
+
+
+def inbox(lat, lon, lat0, lat1, lon0, lon1):
+    ''' Mask of the positions inside the box between lat0,lat1 and from lon0
+        eastward to lon1. When lon0 > lon1 the box crosses the antimeridian. '''
+    lat = np.asarray(lat)
+    lon = (np.asarray(lon) + 180.0) % 360.0 - 180.0
+    lon0, lon1 = (lon0 + 180.0) % 360.0 - 180.0, (lon1 + 180.0) % 360.0 - 180.0
+    inlat = (lat > min(lat0, lat1)) & (lat < max(lat0, lat1))
+    if lon0 <= lon1:
+        return inlat & (lon > lon0) & (lon < lon1)
+    return inlat & ((lon > lon0) | (lon < lon1))
+
+
+class SpatialIndex:
+    ''' KD-tree on unit-sphere x,y,z coordinates of a set of lat,lon points,
+        which are identified by their index in the (navdb) point arrays.
+
+        Points are inserted at the end and deleted by index, in the same way
+        as in the navdb point arrays. Inserted points are kept in a small list
+        and deleted points are only marked in the tree, until there are more
+        than maxpending of them: then the tree is rebuilt at the next query.
+        The tree is also only built at the first query. '''
+    maxpending = 256
+
+    def __init__(self, lat, lon):
+        self.lat = np.array(lat, dtype=float)  # [deg] point positions in tree
+        self.lon = np.array(lon, dtype=float)  # [deg]
+        self.idx = np.arange(len(self.lat))    # point index of tree points, -1: deleted
+        self.ndeleted = 0
+        self.tree = None
+
+        # Points inserted after the tree was built
+        self.newlat = []
+        self.newlon = []
+        self.newidx = []
+
+    def __len__(self):
+        return len(self.idx) - self.ndeleted + len(self.newidx)
+
+    def insert(self, lat, lon):
+        ''' Add a point after the last one. '''
+        self.newidx.append(len(self))
+        self.newlat.append(lat)
+        self.newlon.append(lon)
+
+    def delete(self, idx):
+        ''' Delete point idx. The index of the points after it decreases by one. '''
+        if idx in self.newidx:
+            i = self.newidx.index(idx)
+            del self.newidx[i], self.newlat[i], self.newlon[i]
+        else:
+            self.idx[self.idx == idx] = -1
+            self.ndeleted += 1
+        self.idx[self.idx > idx] -= 1
+        self.newidx = [i - 1 if i > idx else i for i in self.newidx]
+
+    def build(self):
+        ''' (Re)build the tree from all points. '''
+        if self.ndeleted or self.newidx:
+            n = len(self)
+            lat, lon = np.empty(n), np.empty(n)
+            alive = self.idx >= 0
+            lat[self.idx[alive]] = self.lat[alive]
+            lon[self.idx[alive]] = self.lon[alive]
+            lat[self.newidx] = self.newlat
+            lon[self.newidx] = self.newlon
+            self.__init__(lat, lon)
+        self.tree = cKDTree(lat2xyz(self.lat, self.lon))
+
+    def gettree(self):
+        ''' The up-to-date tree. '''
+        if self.tree is None or self.ndeleted + len(self.newidx) > self.maxpending:
+            self.build()
+        return self.tree
+
+    def nearest(self, lat, lon, k=1):
+        ''' Indices of the k points closest to lat,lon, closest first. '''
+        tree = self.gettree()
+        xyz = lat2xyz(lat, lon)
+        ntree = min(len(self.idx), k + self.ndeleted)
+        dist, i = tree.query(xyz, ntree) if ntree else (np.zeros(0), np.zeros(0, dtype=int))
+        dist, idx = np.atleast_1d(dist), self.idx[np.atleast_1d(i)]
+        dist, idx = dist[idx >= 0], idx[idx >= 0]
+        if self.newidx:
+            newdist = np.linalg.norm(lat2xyz(self.newlat, self.newlon) - xyz, axis=1)
+            dist = np.concatenate((dist, newdist))
+            idx = np.concatenate((idx, self.newidx))
+        return idx[np.lexsort((idx, dist))[:k]]
+
+    def inside(self, lat0, lat1, lon0, lon1):
+        ''' Indices of the points inside the box between lat0,lat1 and from lon0
+            eastward to lon1 (lon0 > lon1: box crosses the antimeridian). '''
+        tree = self.gettree()
+        width = (lon1 - lon0) % 360.0
+        if width <= 180.0:
+            # Search the tree in the smallest sphere around the box centre that
+            # contains the box. For boxes up to 180 deg wide this sphere
+            # goes through the box corner furthest from the centre.
+            centre = lat2xyz(0.5 * (lat0 + lat1), lon0 + 0.5 * width)
+            corners = lat2xyz([lat0, lat0, lat1, lat1], [lon0, lon1, lon0, lon1])
+            radius = np.max(np.linalg.norm(corners - centre, axis=1))
+            i = np.array(tree.query_ball_point(centre, radius * (1.0 + 1e-9) + 1e-12), dtype=int)
+        else:
+            i = np.arange(len(self.idx))
+        i = i[(self.idx[i] >= 0) & inbox(self.lat[i], self.lon[i], lat0, lat1, lon0, lon1)]
+        idx = self.idx[i].tolist()
+        if self.newidx:
+            isnew = inbox(self.newlat, self.newlon, lat0, lat1, lon0, lon1)
+            idx += [i for i, isin in zip(self.newidx, isnew) if isin]
+        return sorted(idx)
@@ -2,6 +2,7 @@
 import numpy as np
 from bluesky.tools.aero import vtas2eas
 from bluesky.traffic.asas import ConflictResolution
+from bluesky.traffic.derivedstate import derivedstate
 
 
 def init_plugin():
@@ -38,9 +39,9 @@ class Eby(ConflictResolution):
         # now we have the change in speed vector for each aircraft.
         dv=np.transpose(dv)
         # the old speed vector, cartesian coordinates
-        trkrad = np.radians(ownship.trk)
-        v = np.array([np.sin(trkrad) * ownship.tas,\
-                      np.cos(trkrad)*ownship.tas,\
+        derived = derivedstate(ownship)
+        v = np.array([derived.sintrk * ownship.tas,\
+                      derived.costrk * ownship.tas,\
                       ownship.vs])
         # the new speed vector
         newv = dv + v
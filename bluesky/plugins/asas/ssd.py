@@ -1,4 +1,9 @@
 ''' Conflict resolution based on the SSD algorithm. '''
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import bluesky as bs
+from bluesky import stack
 from bluesky.traffic.asas import ConflictResolution
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
@@ -13,6 +18,10 @@ except ImportError:
 # TODO: not completely migrated yet to class-based implementation
 
 
+# Number of worker processes for the SSD construction (0: all available cores)
+bs.settings.set_variable_defaults(asas_ssd_nworkers=0)
+
+
 def init_plugin():
 
     # Addtional initilisation code
@@ -30,6 +39,44 @@ def init_plugin():
 
 
 class SSD(ConflictResolution):
+    ''' Conflict resolution using the Solution Space Diagram.
+
+        The SSDs and resolutions of the aircraft in conflict are constructed
+        in batches of aircraft, which are distributed over a pool of worker
+        processes.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.pool = None
+        self.nworkers = 1
+        self.setnworkers(bs.settings.asas_ssd_nworkers)
+
+    @stack.command(name='SSDWORKERS')
+    def setnworkers(self, nworkers: int = None):
+        ''' Set the number of worker processes for the construction of the SSDs.
+            A value of zero uses all available cores. '''
+        if nworkers is None:
+            return True, f'SSDWORKERS [n]\nSSD currently uses {self.nworkers} worker processes'
+        if nworkers < 0:
+            return False, 'SSDWORKERS: number of workers should be positive'
+        self.stoppool()
+        self.nworkers = nworkers or os.cpu_count() or 1
+        return True
+
+    def stoppool(self):
+        ''' Shut down the worker pool. '''
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def deactivate(self):
+        super().deactivate()
+        self.stoppool()
+
+    def reset(self):
+        super().reset()
+        self.stoppool()
+
     def setprio(self, flag=None, priocode=''):
         '''Set the prio switch and the type of prio '''
         if flag is None:
@@ -134,32 +181,36 @@ class SSD(ConflictResolution):
         # asas is an object of the ASAS class defined in asas.py
 
 
+    def map(self, func, shared, rows, *items):
+        ''' Call func(*shared, rows, *items) for batches of rows with the
+            corresponding per-row items, in the worker pool when more than one
+            worker is used. Returns the list of per-row results in row order. '''
+        if self.nworkers == 1 or len(rows) < 2:
+            return func(*shared, rows, *items)
+        if self.pool is None:
+            # Don't fork the simulation process: it runs other threads,
+            # such as the CD worker threads and the wind loader
+            self.pool = ProcessPoolExecutor(self.nworkers, mp_context=mp.get_context('spawn'))
+        # Use a few batches per worker to balance the load
+        nbatches = min(len(rows), 4 * self.nworkers)
+        bounds = np.linspace(0, len(rows), nbatches + 1).astype(int)
+        futures = [self.pool.submit(func, *shared, rows[start:end],
+                                    *(item[start:end] for item in items))
+                   for start, end in zip(bounds[:-1], bounds[1:])]
+        return [result for future in futures for result in future.result()]
+
     def constructSSD(self, conf, ownship, priocode="RS1"):
         """ Calculates the FRV and ARV of the SSD """
-        N = 0
-        # Parameters
-        N_angle = 180  # [-] Number of points on circle (discretization)
-        hsep = conf.rpz  # [m] Horizontal separation (5 NM)
-        margin = self.resofach  # [-] Safety margin for evasion
-        hsepm = hsep * margin  # [m] Horizontal separation with safety margin
-        alpham = 0.4999 * np.pi  # [rad] Maximum half-angle for VO
-        betalos = np.pi / 4  # [rad] Minimum divertion angle for LOS (45 deg seems optimal)
-        adsbmax = 65. * nm  # [m] Maximum ADS-B range
-        beta = np.pi / 4 + betalos / 2
-        if priocode == "RS7" or priocode == "RS8":
-            adsbmax /= 2
-
-        # Relevant info from traf
-        gsnorth = ownship.gsnorth
-        gseast = ownship.gseast
-        lat = ownship.lat
-        lon = ownship.lon
-        ntraf = ownship.ntraf
-        hdg = ownship.hdg
+        # Relevant info from traf, batched for the workers
         gs_ap = ownship.ap.tas
         hdg_ap = ownship.ap.trk
-        apnorth = np.cos(hdg_ap / 180 * np.pi) * gs_ap
-        apeast = np.sin(hdg_ap / 180 * np.pi) * gs_ap
+        acdata = dict(lat=ownship.lat, lon=ownship.lon, gseast=ownship.gseast,
+                      gsnorth=ownship.gsnorth, hdg=ownship.hdg, gs_ap=gs_ap,
+                      apnorth=np.cos(hdg_ap / 180 * np.pi) * gs_ap,
+                      apeast=np.sin(hdg_ap / 180 * np.pi) * gs_ap,
+                      vmin=ownship.perf.vmin, vmax=ownship.perf.vmax,
+                      # [m] Horizontal separation with safety margin
+                      hsepm=conf.rpz * self.resofach)
 
         # Local variables, will be put into asas later
         FRV_loc = [None] * ownship.ntraf
@@ -169,299 +220,28 @@ class SSD(ConflictResolution):
         FRV_area_loc = np.zeros(ownship.ntraf, dtype=np.float32)
         ARV_area_loc = np.zeros(ownship.ntraf, dtype=np.float32)
 
-        # # Use velocity limits for the ring-shaped part of the SSD
-        # Discretize the circles using points on circle
-        angles = np.arange(0, 2 * np.pi, 2 * np.pi / N_angle)
-        # Put points of unit-circle in a (180x2)-array (CW)
-        xyc = np.transpose(np.reshape(np.concatenate((np.sin(angles), np.cos(angles))), (2, N_angle)))
-
-        # If no traffic
-        if ntraf == 0:
-            return
-
-        # # If only one aircraft
-        # elif ntraf == 1:
-        #     # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-        #     ARV_loc[0] = circle_lst
-        #     FRV_loc[0] = []
-        #     ARV_calc_loc[0] = ARV_loc[0]
-        #     # Calculate areas and store in asas
-        #     FRV_area_loc[0] = 0
-        #     ARV_area_loc[0] = np.pi * (vmax ** 2 - vmin ** 2)
-        #     return
-
-        # Function qdrdist_matrix needs 4 vectors as input (lat1,lon1,lat2,lon2)
-        # To be efficient, calculate all qdr and dist in one function call
-        # Example with ntraf = 5:   ind1 = [0,0,0,0,1,1,1,2,2,3]
-        #                           ind2 = [1,2,3,4,2,3,4,3,4,4]
-        # This way the qdrdist is only calculated once between every aircraft
-        # To get all combinations, use this function to get the indices
-        ind1, ind2 = self.qdrdist_matrix_indices(ntraf)
-        # Get absolute bearing [deg] and distance [nm]
-        # Not sure abs/rel, but qdr is defined from [-180,180] deg, w.r.t. North
-        [qdr, dist] = geo.qdrdist_matrix(lat[ind1], lon[ind1], lat[ind2], lon[ind2])
-        # Put result of function from matrix to ndarray
-        qdr = np.reshape(np.array(qdr), np.shape(ind1))
-        dist = np.reshape(np.array(dist), np.shape(ind1))
-        # SI-units from [deg] to [rad]
-        qdr = np.deg2rad(qdr)
-        # Get distance from [nm] to [m]
-        dist = dist * nm
-
-        # In LoS the VO can't be defined, act as if dist is on edge
-        dist[dist < hsepm] = hsepm
-
-        # Calculate vertices of Velocity Obstacle (CCW)
-        # These are still in relative velocity space, see derivation in appendix
-        # Half-angle of the Velocity obstacle [rad]
-        # Include safety margin
-        alpha = np.arcsin(hsepm / dist)
-        # Limit half-angle alpha to 89.982 deg. Ensures that VO can be constructed
-        alpha[alpha > alpham] = alpham
-        # Relevant sin/cos/tan
-        sinqdr = np.sin(qdr)
-        cosqdr = np.cos(qdr)
-        tanalpha = np.tan(alpha)
-        cosqdrtanalpha = cosqdr * tanalpha
-        sinqdrtanalpha = sinqdr * tanalpha
-
-        # Consider every aircraft
-        for i in range(ntraf):
-            # Calculate SSD only for aircraft in conflict (See formulas appendix)
-            if conf.inconf[i]:
-
-                vmin = ownship.perf.vmin[i]
-                vmax = ownship.perf.vmax[i]
-
-                # in the first time step, ASAS runs before perf, which means that his value will be zero
-                # and the SSD cannot be constructed
-                if vmin == vmax == 0:
-                    continue
-
-                # Map them into the format pyclipper wants. Outercircle CCW, innercircle CW
-                circle_tup = (tuple(map(tuple, np.flipud(xyc * vmax))), tuple(map(tuple, xyc * vmin)))
-                circle_lst = [list(map(list, np.flipud(xyc * vmax))), list(map(list, xyc * vmin))]
-
-                # Relevant x1,y1,x2,y2 (x0 and y0 are zero in relative velocity space)
-                x1 = (sinqdr + cosqdrtanalpha) * 2 * vmax
-                x2 = (sinqdr - cosqdrtanalpha) * 2 * vmax
-                y1 = (cosqdr - sinqdrtanalpha) * 2 * vmax
-                y2 = (cosqdr + sinqdrtanalpha) * 2 * vmax
-
-                # SSD for aircraft i
-                # Get indices that belong to aircraft i
-                ind = np.where(np.logical_or(ind1 == i, ind2 == i))[0]
-                # Check whether there are any aircraft in the vicinity
-                if len(ind) == 0:
-                    # No aircraft in the vicinity
-                    # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                    ARV_loc[i] = circle_lst
-                    FRV_loc[i] = []
-                    ARV_calc_loc[i] = ARV_loc[i]
-                    # Calculate areas and store in asas
-                    FRV_area_loc[i] = 0
-                    ARV_area_loc[i] = np.pi * (vmax ** 2 - vmin ** 2)
-                else:
-                    # The i's of the other aircraft
-                    i_other = np.delete(np.arange(0, ntraf), i)
-                    # Aircraft that are within ADS-B range
-                    ac_adsb = np.where(dist[ind] < adsbmax)[0]
-                    # Now account for ADS-B range in indices of other aircraft (i_other)
-                    ind = ind[ac_adsb]
-                    i_other = i_other[ac_adsb]
-                    if not priocode == "RS7" and not priocode == "RS8":
-                        # Put it in class-object (not for RS7 and RS8)
-                        conf.inrange[i] = i_other
-                    else:
-                        conf.inrange2[i] = i_other
-                    # VO from 2 to 1 is mirror of 1 to 2. Only 1 to 2 can be constructed in
-                    # this manner, so need a correction vector that will mirror the VO
-                    fix = np.ones(np.shape(i_other))
-                    fix[i_other < i] = -1
-                    # Relative bearing [deg] from [-180,180]
-                    # (less required conversions than rad in RotA)
-                    fix_ang = np.zeros(np.shape(i_other))
-                    fix_ang[i_other < i] = 180.
-
-                    # Get vertices in an x- and y-array of size (ntraf-1)*3x1
-                    x = np.concatenate((gseast[i_other],
-                                        x1[ind] * fix + gseast[i_other],
-                                        x2[ind] * fix + gseast[i_other]))
-                    y = np.concatenate((gsnorth[i_other],
-                                        y1[ind] * fix + gsnorth[i_other],
-                                        y2[ind] * fix + gsnorth[i_other]))
-                    # Reshape [(ntraf-1)x3] and put arrays in one array [(ntraf-1)x3x2]
-                    x = np.transpose(x.reshape(3, np.shape(i_other)[0]))
-                    y = np.transpose(y.reshape(3, np.shape(i_other)[0]))
-                    xy = np.dstack((x, y))
-
-                    # Make a clipper object
-                    pc = pyclipper.Pyclipper()
-                    # Add circles (ring-shape) to clipper as subject
-                    pc.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
-
-                    # Extra stuff needed for RotA
-                    if priocode == "RS6":
-                        # Make another clipper object for RotA
-                        pc_rota = pyclipper.Pyclipper()
-                        pc_rota.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
-                        # Bearing calculations from own view and other view
-                        brg_own = np.mod((np.rad2deg(qdr[ind]) + fix_ang - hdg[i]) + 540., 360.) - 180.
-                        brg_other = np.mod((np.rad2deg(qdr[ind]) + 180. - fix_ang - hdg[i_other]) + 540., 360.) - 180.
-
-                    # Add each other other aircraft to clipper as clip
-                    for j in range(np.shape(i_other)[0]):
-                        ## Debug prints
-                        ## print(traf.id[i] + " - " + traf.id[i_other[j]])
-                        ## print(dist[ind[j]])
-                        # Scale VO when not in LOS
-                        if dist[ind[j]] > hsepm:
-                            # Normally VO shall be added of this other a/c
-                            VO = pyclipper.scale_to_clipper(tuple(map(tuple, xy[j, :, :])))
-                        else:
-                            # Pair is in LOS, instead of triangular VO, use darttip
-                            # Check if bearing should be mirrored
-                            if i_other[j] < i:
-                                qdr_los = qdr[ind[j]] + np.pi
-                            else:
-                                qdr_los = qdr[ind[j]]
-                            # Length of inner-leg of darttip
-                            leg = 1.1 * vmax / np.cos(beta) * np.array([1, 1, 1, 0])
-                            # Angles of darttip
-                            angles_los = np.array([qdr_los + 2 * beta, qdr_los, qdr_los - 2 * beta, 0.])
-                            # Calculate coordinates (CCW)
-                            x_los = leg * np.sin(angles_los)
-                            y_los = leg * np.cos(angles_los)
-                            # Put in array of correct format
-                            xy_los = np.vstack((x_los, y_los)).T
-                            # Scale darttip
-                            VO = pyclipper.scale_to_clipper(tuple(map(tuple, xy_los)))
-                        # Add scaled VO to clipper
-                        pc.AddPath(VO, pyclipper.PT_CLIP, True)
-                        # For RotA it is possible to ignore
-                        if priocode == "RS6":
-                            if brg_own[j] >= -20. and brg_own[j] <= 110.:
-                                # Head-on or converging from right
-                                pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
-                            elif brg_other[j] <= -110. or brg_other[j] >= 110.:
-                                # In overtaking position
-                                pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
-                        # Detect conflicts for smaller layer in RS7 and RS8
-                        if priocode == "RS7" or priocode == "RS8":
-                            if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((gseast[i], gsnorth[i])), VO):
-                                conf.inconf2[i] = True
-                        if priocode == "RS5":
-                            if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((apeast[i], apnorth[i])), VO):
-                                conf.ap_free[i] = False
-
-                    # Execute clipper command
-                    FRV = pyclipper.scale_from_clipper(
-                        pc.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
-
-                    ARV = pc.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO)
-
-                    if not priocode == "RS1" and not priocode == "RS5" and not priocode == "RS7" and not priocode == "RS8":
-                        # Make another clipper object for extra intersections
-                        pc2 = pyclipper.Pyclipper()
-                        # When using RotA clip with pc_rota
-                        if priocode == "RS6":
-                            # Calculate ARV for RotA
-                            ARV_rota = pc_rota.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO,
-                                                       pyclipper.PFT_NONZERO)
-                            if len(ARV_rota) > 0:
-                                pc2.AddPaths(ARV_rota, pyclipper.PT_CLIP, True)
-                        else:
-                            # Put the ARV in there, make sure it's not empty
-                            if len(ARV) > 0:
-                                pc2.AddPaths(ARV, pyclipper.PT_CLIP, True)
-
-                    # Scale back
-                    ARV = pyclipper.scale_from_clipper(ARV)
-
-                    # Check if ARV or FRV is empty
-                    if len(ARV) == 0:
-                        # No aircraft in the vicinity
-                        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                        ARV_loc[i] = []
-                        FRV_loc[i] = circle_lst
-                        ARV_calc_loc[i] = []
-                        # Calculate areas and store in asas
-                        FRV_area_loc[i] = np.pi * (vmax ** 2 - vmin ** 2)
-                        ARV_area_loc[i] = 0
-                    elif len(FRV) == 0:
-                        # Should not happen with one a/c or no other a/c in the vicinity.
-                        # These are handled earlier. Happens when RotA has removed all
-                        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                        ARV_loc[i] = circle_lst
-                        FRV_loc[i] = []
-                        ARV_calc_loc[i] = circle_lst
-                        # Calculate areas and store in asas
-                        FRV_area_loc[i] = 0
-                        ARV_area_loc[i] = np.pi * (vmax ** 2 - vmin ** 2)
-                    else:
-                        # Check multi exteriors, if this layer is not a list, it means it has no exteriors
-                        # In that case, make it a list, such that its format is consistent with further code
-                        if not type(FRV[0][0]) == list:
-                            FRV = [FRV]
-                        if not type(ARV[0][0]) == list:
-                            ARV = [ARV]
-                        # Store in asas
-                        FRV_loc[i] = FRV
-                        ARV_loc[i] = ARV
-                        # Calculate areas and store in asas
-                        FRV_area_loc[i] = self.area(FRV)
-                        ARV_area_loc[i] = self.area(ARV)
-
-                        # For resolution purposes sometimes extra intersections are wanted
-                        if priocode == "RS2" or priocode == "RS9" or priocode == "RS6" or priocode == "RS3" or priocode == "RS4":
-                            # Make a box that covers right or left of SSD
-                            own_hdg = hdg[i] * np.pi / 180
-                            # Efficient calculation of box, see notes
-                            if priocode == "RS2" or priocode == "RS6":
-                                # CW or right-turning
-                                sin_table = np.array([[1, 0], [-1, 0], [-1, -1], [1, -1]], dtype=np.float64)
-                                cos_table = np.array([[0, 1], [0, -1], [1, -1], [1, 1]], dtype=np.float64)
-                            elif priocode == "RS9":
-                                # CCW or left-turning
-                                sin_table = np.array([[1, 0], [1, 1], [-1, 1], [-1, 0]], dtype=np.float64)
-                                cos_table = np.array([[0, 1], [-1, 1], [-1, -1], [0, -1]], dtype=np.float64)
-                            # Overlay a part of the full SSD
-                            if priocode == "RS2" or priocode == "RS9" or priocode == "RS6":
-                                # Normalized coordinates of box
-                                xyp = np.sin(own_hdg) * sin_table + np.cos(own_hdg) * cos_table
-                                # Scale with vmax (and some factor) and put in tuple
-                                part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
-                                pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
-                            elif priocode == "RS3":
-                                # Small ring
-                                xyp = (tuple(map(tuple, np.flipud(xyc * min(vmax, gs_ap[i] + 0.1)))),
-                                       tuple(map(tuple, xyc * max(vmin, gs_ap[i] - 0.1))))
-                                part = pyclipper.scale_to_clipper(xyp)
-                                pc2.AddPaths(part, pyclipper.PT_SUBJECT, True)
-                            elif priocode == "RS4":
-                                hdg_sel = hdg[i] * np.pi / 180
-                                xyp = np.array([[np.sin(hdg_sel - 0.0087), np.cos(hdg_sel - 0.0087)],
-                                                [0, 0],
-                                                [np.sin(hdg_sel + 0.0087), np.cos(hdg_sel + 0.0087)]],
-                                               dtype=np.float64)
-                                part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
-                                pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
-                            # Execute clipper command
-                            ARV_calc = pyclipper.scale_from_clipper(
-                                pc2.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
-                            N += 1
-                            # If no smaller ARV is found, take the full ARV
-                            if len(ARV_calc) == 0:
-                                ARV_calc = ARV
-                            # Check multi exteriors, if this layer is not a list, it means it has no exteriors
-                            # In that case, make it a list, such that its format is consistent with further code
-                            if not type(ARV_calc[0][0]) == list:
-                                ARV_calc = [ARV_calc]
-                        # Shortest way out prio, so use full SSD (ARV_calc = ARV)
-                        else:
-                            ARV_calc = ARV
-                        # Update calculatable ARV for resolutions
-                        ARV_calc_loc[i] = ARV_calc
+        # Calculate SSD only for aircraft in conflict.
+        # In the first time step, ASAS runs before perf, which means that vmin
+        # and vmax will be zero and the SSD cannot be constructed
+        vmin, vmax = ownship.perf.vmin, ownship.perf.vmax
+        rows = np.flatnonzero(np.logical_and(conf.inconf,
+                                             np.logical_or(vmin != 0, vmax != 0)))
+        results = self.map(construct, (acdata, priocode), rows)
+
+        for i, (FRV, ARV, ARV_calc, FRV_area, ARV_area, inrange, inconf2, ap_free) \
+                in zip(rows, results):
+            FRV_loc[i] = FRV
+            ARV_loc[i] = ARV
+            ARV_calc_loc[i] = ARV_calc
+            FRV_area_loc[i] = FRV_area
+            ARV_area_loc[i] = ARV_area
+            if not priocode == "RS7" and not priocode == "RS8":
+                # Put it in class-object (not for RS7 and RS8)
+                conf.inrange[i] = inrange
+            else:
+                conf.inrange2[i] = inrange
+            conf.inconf2[i] = conf.inconf2[i] or inconf2
+            conf.ap_free[i] = conf.ap_free[i] and ap_free
 
         # If sequential approach, the local should go elsewhere
         if not priocode == "RS7" and not priocode == "RS8":
@@ -477,11 +257,12 @@ class SSD(ConflictResolution):
 
     def calculate_resolution(self, conf, ownship):
         """ Calculates closest conflict-free point according to ruleset """
-        # It's just linalg, however credits to: http://stackoverflow.com/a/1501725
         # Variables
         ARV = conf.ARV_calc
         if self.priocode == "RS7" or self.priocode == "RS8":
             ARV2 = conf.ARV_calc2
+        else:
+            ARV2 = [None] * ownship.ntraf
         # Select AP-setting as reference point for closest to target rulesets
         if self.priocode == "RS5" or self.priocode == "RS8":
             gsnorth = np.cos(ownship.ap.trk / 180 * np.pi) * ownship.ap.tas
@@ -489,185 +270,432 @@ class SSD(ConflictResolution):
         else:
             gsnorth = ownship.gsnorth
             gseast = ownship.gseast
-        ntraf = ownship.ntraf
-
-        # Loop through SSDs of all aircraft
-        for i in range(ntraf):
-            # Only those that are in conflict need to resolve
-            if conf.inconf[i] and ARV[i] is not None and len(ARV[i]) > 0:
-                # First check if AP-setting is free
-                if conf.ap_free[i] and self.priocode == "RS5":
-                    conf.asase[i] = gseast[i]
-                    conf.asasn[i] = gsnorth[i]
+        acdata = dict(lat=ownship.lat, lon=ownship.lon, gseast=ownship.gseast,
+                      gsnorth=ownship.gsnorth, rpz=conf.rpz, refeast=gseast,
+                      refnorth=gsnorth)
+
+        # Those that are not in conflict will be assigned zeros
+        # Or those that have no solutions (full ARV)
+        conf.asase[:] = 0.
+        conf.asasn[:] = 0.
+
+        # Only those that are in conflict need to resolve
+        rows = np.array([i for i in range(ownship.ntraf) if conf.inconf[i] and
+                         ARV[i] is not None and len(ARV[i]) > 0], dtype=int)
+        results = self.map(resolution, (acdata, self.priocode), rows,
+                           [ARV[i] for i in rows], [ARV2[i] for i in rows],
+                           conf.inconf2[rows], conf.ap_free[rows],
+                           [conf.inrange[i] for i in rows])
+        if len(rows):
+            conf.asase[rows], conf.asasn[rows] = np.transpose(results)
+
+
+def construct(acdata, priocode, rows):
+    """ Calculates the FRV and ARV of the SSDs of aircraft rows.
+        Returns a list with for each aircraft a tuple with
+        (FRV, ARV, ARV_calc, FRV_area, ARV_area, inrange, inconf2, ap_free) """
+    # Parameters
+    N_angle = 180  # [-] Number of points on circle (discretization)
+    alpham = 0.4999 * np.pi  # [rad] Maximum half-angle for VO
+    betalos = np.pi / 4  # [rad] Minimum divertion angle for LOS (45 deg seems optimal)
+    adsbmax = 65. * nm  # [m] Maximum ADS-B range
+    beta = np.pi / 4 + betalos / 2
+    if priocode == "RS7" or priocode == "RS8":
+        adsbmax /= 2
+
+    # Relevant info from traf
+    gsnorth = acdata['gsnorth']
+    gseast = acdata['gseast']
+    lat = acdata['lat']
+    lon = acdata['lon']
+    hdg = acdata['hdg']
+    gs_ap = acdata['gs_ap']
+    ntraf = len(lat)
+
+    # # Use velocity limits for the ring-shaped part of the SSD
+    # Discretize the circles using points on circle
+    angles = np.arange(0, 2 * np.pi, 2 * np.pi / N_angle)
+    # Put points of unit-circle in a (180x2)-array (CW)
+    xyc = np.transpose(np.reshape(np.concatenate((np.sin(angles), np.cos(angles))), (2, N_angle)))
+
+    # The i's of the other aircraft, for each of the rows
+    others = np.tile(np.arange(ntraf - 1), (len(rows), 1))
+    others += others >= rows[:, np.newaxis]
+    # qdr and dist are calculated from the lowest to the highest index of
+    # each pair, so they are the same for both aircraft of a pair
+    ind1 = np.minimum(rows[:, np.newaxis], others).ravel()
+    ind2 = np.maximum(rows[:, np.newaxis], others).ravel()
+    # Get absolute bearing [deg] and distance [nm]
+    # Not sure abs/rel, but qdr is defined from [-180,180] deg, w.r.t. North
+    qdr, dist = geo.qdrdist(lat[ind1], lon[ind1], lat[ind2], lon[ind2])
+    # SI-units from [deg] to [rad]
+    qdr = np.deg2rad(qdr).reshape(others.shape)
+    # Get distance from [nm] to [m]
+    dist = (dist * nm).reshape(others.shape)
+
+    # Largest horizontal separation with safety margin of each pair
+    hsepm = np.maximum(acdata['hsepm'][ind1], acdata['hsepm'][ind2]).reshape(others.shape)
+
+    # In LoS the VO can't be defined, act as if dist is on edge
+    dist = np.maximum(dist, hsepm)
+
+    # Calculate vertices of Velocity Obstacle (CCW)
+    # These are still in relative velocity space, see derivation in appendix
+    # Half-angle of the Velocity obstacle [rad]
+    # Include safety margin
+    alpha = np.arcsin(hsepm / dist)
+    # Limit half-angle alpha to 89.982 deg. Ensures that VO can be constructed
+    alpha[alpha > alpham] = alpham
+    # Relevant sin/cos/tan
+    sinqdr = np.sin(qdr)
+    cosqdr = np.cos(qdr)
+    tanalpha = np.tan(alpha)
+    cosqdrtanalpha = cosqdr * tanalpha
+    sinqdrtanalpha = sinqdr * tanalpha
+
+    # Consider every aircraft
+    results = []
+    for k, i in enumerate(rows):
+        vmin = acdata['vmin'][i]
+        vmax = acdata['vmax'][i]
+        inrange = None
+        inconf2 = False
+        ap_free = True
+
+        # Map them into the format pyclipper wants. Outercircle CCW, innercircle CW
+        circle_tup = (tuple(map(tuple, np.flipud(xyc * vmax))), tuple(map(tuple, xyc * vmin)))
+        circle_lst = [list(map(list, np.flipud(xyc * vmax))), list(map(list, xyc * vmin))]
+
+        # Check whether there are any aircraft in the vicinity
+        if ntraf == 1:
+            # No aircraft in the vicinity
+            # Map them into the format ARV wants. Outercircle CCW, innercircle CW
+            results.append(([], circle_lst, circle_lst, 0, np.pi * (vmax ** 2 - vmin ** 2),
+                            inrange, inconf2, ap_free))
+            continue
+
+        # Aircraft that are within ADS-B range
+        ac_adsb = np.where(dist[k] < adsbmax)[0]
+        # Now account for ADS-B range in indices of other aircraft (i_other)
+        i_other = others[k, ac_adsb]
+        inrange = i_other
+        qdr_i = qdr[k, ac_adsb]
+        dist_i = dist[k, ac_adsb]
+        hsepm_i = hsepm[k, ac_adsb]
+        # Relevant x1,y1,x2,y2 (x0 and y0 are zero in relative velocity space)
+        x1 = (sinqdr[k, ac_adsb] + cosqdrtanalpha[k, ac_adsb]) * 2 * vmax
+        x2 = (sinqdr[k, ac_adsb] - cosqdrtanalpha[k, ac_adsb]) * 2 * vmax
+        y1 = (cosqdr[k, ac_adsb] - sinqdrtanalpha[k, ac_adsb]) * 2 * vmax
+        y2 = (cosqdr[k, ac_adsb] + sinqdrtanalpha[k, ac_adsb]) * 2 * vmax
+
+        # VO from 2 to 1 is mirror of 1 to 2. Only 1 to 2 can be constructed in
+        # this manner, so need a correction vector that will mirror the VO
+        fix = np.ones(np.shape(i_other))
+        fix[i_other < i] = -1
+        # Relative bearing [deg] from [-180,180]
+        # (less required conversions than rad in RotA)
+        fix_ang = np.zeros(np.shape(i_other))
+        fix_ang[i_other < i] = 180.
+
+        # Get vertices in an x- and y-array of size (ntraf-1)*3x1
+        x = np.concatenate((gseast[i_other],
+                            x1 * fix + gseast[i_other],
+                            x2 * fix + gseast[i_other]))
+        y = np.concatenate((gsnorth[i_other],
+                            y1 * fix + gsnorth[i_other],
+                            y2 * fix + gsnorth[i_other]))
+        # Reshape [(ntraf-1)x3] and put arrays in one array [(ntraf-1)x3x2]
+        x = np.transpose(x.reshape(3, np.shape(i_other)[0]))
+        y = np.transpose(y.reshape(3, np.shape(i_other)[0]))
+        xy = np.dstack((x, y))
+
+        # Make a clipper object
+        pc = pyclipper.Pyclipper()
+        # Add circles (ring-shape) to clipper as subject
+        pc.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
+
+        # Extra stuff needed for RotA
+        if priocode == "RS6":
+            # Make another clipper object for RotA
+            pc_rota = pyclipper.Pyclipper()
+            pc_rota.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
+            # Bearing calculations from own view and other view
+            brg_own = np.mod((np.rad2deg(qdr_i) + fix_ang - hdg[i]) + 540., 360.) - 180.
+            brg_other = np.mod((np.rad2deg(qdr_i) + 180. - fix_ang - hdg[i_other]) + 540., 360.) - 180.
+
+        # Add each other other aircraft to clipper as clip
+        for j in range(np.shape(i_other)[0]):
+            # Scale VO when not in LOS
+            if dist_i[j] > hsepm_i[j]:
+                # Normally VO shall be added of this other a/c
+                VO = pyclipper.scale_to_clipper(tuple(map(tuple, xy[j, :, :])))
+            else:
+                # Pair is in LOS, instead of triangular VO, use darttip
+                # Check if bearing should be mirrored
+                if i_other[j] < i:
+                    qdr_los = qdr_i[j] + np.pi
                 else:
-                    # Loop through all exteriors and append. Afterwards concatenate
-                    p = []
-                    q = []
-                    for j in range(len(ARV[i])):
-                        p.append(np.array(ARV[i][j]))
-                        q.append(np.diff(np.row_stack((p[j], p[j][0])), axis=0))
-                    p = np.concatenate(p)
-                    q = np.concatenate(q)
-                    # Calculate squared distance between edges
-                    l2 = np.sum(q ** 2, axis=1)
-                    # Catch l2 == 0 (exception)
-                    same = l2 < 1e-8
-                    l2[same] = 1.
-                    # Calc t
-                    t = np.sum((np.array([gseast[i], gsnorth[i]]) - p) * q, axis=1) / l2
-                    # Speed of boolean indices only slightly faster (negligible)
-                    # t must be limited between 0 and 1
-                    t = np.clip(t, 0., 1.)
-                    t[same] = 0.
-                    # Calculate closest point to each edge
-                    x1 = p[:, 0] + t * q[:, 0]
-                    y1 = p[:, 1] + t * q[:, 1]
-                    # Get distance squared
-                    d2 = (x1 - gseast[i]) ** 2 + (y1 - gsnorth[i]) ** 2
-                    # Sort distance
-                    ind = np.argsort(d2)
-                    x1 = x1[ind]
-                    y1 = y1[ind]
-
-                    if self.priocode == "RS7" or self.priocode == "RS8" and conf.inconf2[i]:
-                        # Loop through all exteriors and append. Afterwards concatenate
-                        p = []
-                        q = []
-                        for j in range(len(ARV2[i])):
-                            p.append(np.array(ARV2[i][j]))
-                            q.append(np.diff(np.row_stack((p[j], p[j][0])), axis=0))
-                        p = np.concatenate(p)
-                        q = np.concatenate(q)
-                        # Calculate squared distance between edges
-                        l2 = np.sum(q ** 2, axis=1)
-                        # Catch l2 == 0 (exception)
-                        same = l2 < 1e-8
-                        l2[same] = 1.
-                        # Calc t
-                        t = np.sum((np.array([gseast[i], gsnorth[i]]) - p) * q, axis=1) / l2
-                        # Speed of boolean indices only slightly faster (negligible)
-                        # t must be limited between 0 and 1
-                        t = np.clip(t, 0., 1.)
-                        t[same] = 0.
-                        # Calculate closest point to each edge
-                        x2 = p[:, 0] + t * q[:, 0]
-                        y2 = p[:, 1] + t * q[:, 1]
-                        # Get distance squared
-                        d2 = (x2 - gseast[i]) ** 2 + (y2 - gsnorth[i]) ** 2
-                        # Sort distance
-                        ind = np.argsort(d2)
-                        x2 = x2[ind]
-                        y2 = y2[ind]
-                        d2 = d2[ind]
-
-                    # Store result in conf
-                    if not conf.inconf2[i] or not self.priocode == "RS7" and not self.priocode == "RS8":
-                        conf.asase[i] = x1[0]
-                        conf.asasn[i] = y1[0]
-                    else:
-                        # Sequential method, check if both result in very similar resolutions
-                        if (x1[0] - x2[0]) * (x1[0] - x2[0]) + (x1[0] - x2[0]) * (x1[0] - x2[0]) < 1:
-                            # In that case take the full layer
-                            conf.asase[i] = x1[0]
-                            conf.asasn[i] = y1[0]
-                        else:
-                            # In that case take the partial layer solution and see which
-                            # results in lower TLOS
-                            conf.asase[i] = x1[0]
-                            conf.asasn[i] = y1[0]
-                            # dv2 for the RS1-solution
-                            dist12 = (x1[0] - gseast[i]) ** 2 + (y1[0] - gsnorth[i]) ** 2
-                            # distances for the partial layer solution stored in d2
-                            ind = d2 < dist12
-                            if sum(ind) == 1:
-                                conf.asase[i] = x2[0]
-                                conf.asasn[i] = y2[0]
-                            elif sum(ind) > 1:
-                                x2 = x2[ind]
-                                y2 = y2[ind]
-                                # Get solution with minimum TLOS
-                                i_other = conf.inrange[i]
-                                idx = self.minTLOS(conf, ownship, i, i_other, x1, y1, x2, y2)
-                                # Get solution with maximum TLOS
-                                conf.asase[i] = x2[idx]
-                                conf.asasn[i] = y2[idx]
-                            else:
-                                # This case should not happen...
-                                conf.asase[i] = x1[0]
-                                conf.asasn[i] = y1[0]
-
-            # Those that are not in conflict will be assigned zeros
-            # Or those that have no solutions (full ARV)
+                    qdr_los = qdr_i[j]
+                # Length of inner-leg of darttip
+                leg = 1.1 * vmax / np.cos(beta) * np.array([1, 1, 1, 0])
+                # Angles of darttip
+                angles_los = np.array([qdr_los + 2 * beta, qdr_los, qdr_los - 2 * beta, 0.])
+                # Calculate coordinates (CCW)
+                x_los = leg * np.sin(angles_los)
+                y_los = leg * np.cos(angles_los)
+                # Put in array of correct format
+                xy_los = np.vstack((x_los, y_los)).T
+                # Scale darttip
+                VO = pyclipper.scale_to_clipper(tuple(map(tuple, xy_los)))
+            # Add scaled VO to clipper
+            pc.AddPath(VO, pyclipper.PT_CLIP, True)
+            # For RotA it is possible to ignore
+            if priocode == "RS6":
+                if brg_own[j] >= -20. and brg_own[j] <= 110.:
+                    # Head-on or converging from right
+                    pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
+                elif brg_other[j] <= -110. or brg_other[j] >= 110.:
+                    # In overtaking position
+                    pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
+            # Detect conflicts for smaller layer in RS7 and RS8
+            if priocode == "RS7" or priocode == "RS8":
+                if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((gseast[i], gsnorth[i])), VO):
+                    inconf2 = True
+            if priocode == "RS5":
+                if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((acdata['apeast'][i], acdata['apnorth'][i])), VO):
+                    ap_free = False
+
+        # Execute clipper command
+        FRV = pyclipper.scale_from_clipper(
+            pc.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
+
+        ARV = pc.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO)
+
+        if not priocode == "RS1" and not priocode == "RS5" and not priocode == "RS7" and not priocode == "RS8":
+            # Make another clipper object for extra intersections
+            pc2 = pyclipper.Pyclipper()
+            # When using RotA clip with pc_rota
+            if priocode == "RS6":
+                # Calculate ARV for RotA
+                ARV_rota = pc_rota.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO,
+                                           pyclipper.PFT_NONZERO)
+                if len(ARV_rota) > 0:
+                    pc2.AddPaths(ARV_rota, pyclipper.PT_CLIP, True)
             else:
-                conf.asase[i] = 0.
-                conf.asasn[i] = 0.
-
-
-    def area(self, vset):
-        """ This function calculates the area of the set of FRV or ARV """
-        # Initialize A as it could be calculated iteratively
-        A = 0
-        # Check multiple exteriors
-        if type(vset[0][0]) == list:
-            # Calc every exterior separately
-            for i in range(len(vset)):
-                A += pyclipper.scale_from_clipper(
-                    pyclipper.scale_from_clipper(pyclipper.Area(pyclipper.scale_to_clipper(vset[i]))))
+                # Put the ARV in there, make sure it's not empty
+                if len(ARV) > 0:
+                    pc2.AddPaths(ARV, pyclipper.PT_CLIP, True)
+
+        # Scale back
+        ARV = pyclipper.scale_from_clipper(ARV)
+
+        # Check if ARV or FRV is empty
+        if len(ARV) == 0:
+            # No aircraft in the vicinity
+            # Map them into the format ARV wants. Outercircle CCW, innercircle CW
+            results.append((circle_lst, [], [], np.pi * (vmax ** 2 - vmin ** 2), 0,
+                            inrange, inconf2, ap_free))
+            continue
+        if len(FRV) == 0:
+            # Should not happen with one a/c or no other a/c in the vicinity.
+            # These are handled earlier. Happens when RotA has removed all
+            # Map them into the format ARV wants. Outercircle CCW, innercircle CW
+            results.append(([], circle_lst, circle_lst, 0, np.pi * (vmax ** 2 - vmin ** 2),
+                            inrange, inconf2, ap_free))
+            continue
+
+        # Check multi exteriors, if this layer is not a list, it means it has no exteriors
+        # In that case, make it a list, such that its format is consistent with further code
+        if not type(FRV[0][0]) == list:
+            FRV = [FRV]
+        if not type(ARV[0][0]) == list:
+            ARV = [ARV]
+
+        # For resolution purposes sometimes extra intersections are wanted
+        if priocode == "RS2" or priocode == "RS9" or priocode == "RS6" or priocode == "RS3" or priocode == "RS4":
+            # Make a box that covers right or left of SSD
+            own_hdg = hdg[i] * np.pi / 180
+            # Efficient calculation of box, see notes
+            if priocode == "RS2" or priocode == "RS6":
+                # CW or right-turning
+                sin_table = np.array([[1, 0], [-1, 0], [-1, -1], [1, -1]], dtype=np.float64)
+                cos_table = np.array([[0, 1], [0, -1], [1, -1], [1, 1]], dtype=np.float64)
+            elif priocode == "RS9":
+                # CCW or left-turning
+                sin_table = np.array([[1, 0], [1, 1], [-1, 1], [-1, 0]], dtype=np.float64)
+                cos_table = np.array([[0, 1], [-1, 1], [-1, -1], [0, -1]], dtype=np.float64)
+            # Overlay a part of the full SSD
+            if priocode == "RS2" or priocode == "RS9" or priocode == "RS6":
+                # Normalized coordinates of box
+                xyp = np.sin(own_hdg) * sin_table + np.cos(own_hdg) * cos_table
+                # Scale with vmax (and some factor) and put in tuple
+                part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
+                pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
+            elif priocode == "RS3":
+                # Small ring
+                xyp = (tuple(map(tuple, np.flipud(xyc * min(vmax, gs_ap[i] + 0.1)))),
+                       tuple(map(tuple, xyc * max(vmin, gs_ap[i] - 0.1))))
+                part = pyclipper.scale_to_clipper(xyp)
+                pc2.AddPaths(part, pyclipper.PT_SUBJECT, True)
+            elif priocode == "RS4":
+                hdg_sel = hdg[i] * np.pi / 180
+                xyp = np.array([[np.sin(hdg_sel - 0.0087), np.cos(hdg_sel - 0.0087)],
+                                [0, 0],
+                                [np.sin(hdg_sel + 0.0087), np.cos(hdg_sel + 0.0087)]],
+                               dtype=np.float64)
+                part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
+                pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
+            # Execute clipper command
+            ARV_calc = pyclipper.scale_from_clipper(
+                pc2.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
+            # If no smaller ARV is found, take the full ARV
+            if len(ARV_calc) == 0:
+                ARV_calc = ARV
+            # Check multi exteriors, if this layer is not a list, it means it has no exteriors
+            # In that case, make it a list, such that its format is consistent with further code
+            if not type(ARV_calc[0][0]) == list:
+                ARV_calc = [ARV_calc]
+        # Shortest way out prio, so use full SSD (ARV_calc = ARV)
+        else:
+            ARV_calc = ARV
+
+        # Calculate areas and store in asas
+        results.append((FRV, ARV, ARV_calc, area(FRV), area(ARV), inrange, inconf2, ap_free))
+
+    return results
+
+
+def resolution(acdata, priocode, rows, ARV, ARV2, inconf2, ap_free, inrange):
+    """ Calculates closest conflict-free point of aircraft rows according to
+        ruleset. Returns a list with for each aircraft a tuple (asase, asasn) """
+    gseast = acdata['refeast']
+    gsnorth = acdata['refnorth']
+    results = []
+    for k, i in enumerate(rows):
+        # First check if AP-setting is free
+        if ap_free[k] and priocode == "RS5":
+            results.append((gseast[i], gsnorth[i]))
+            continue
+
+        x1, y1, _ = closest_points(ARV[k], gseast[i], gsnorth[i])
+        if priocode == "RS7" or priocode == "RS8" and inconf2[k]:
+            x2, y2, d2 = closest_points(ARV2[k], gseast[i], gsnorth[i])
+
+        # Store result
+        if not inconf2[k] or not priocode == "RS7" and not priocode == "RS8":
+            results.append((x1[0], y1[0]))
+        # Sequential method, check if both result in very similar resolutions
+        elif (x1[0] - x2[0]) * (x1[0] - x2[0]) + (x1[0] - x2[0]) * (x1[0] - x2[0]) < 1:
+            # In that case take the full layer
+            results.append((x1[0], y1[0]))
         else:
-            # Single exterior
-            A = pyclipper.scale_from_clipper(
-                pyclipper.scale_from_clipper(pyclipper.Area(pyclipper.scale_to_clipper(vset))))
-        return A
-
-
-    def qdrdist_matrix_indices(self, ntraf):
-        """ This function gives the indices that can be used in the lon/lat-vectors """
-        # The indices will be n*(n-1)/2 long
-        # Only works for n >= 2, which is logical...
-        # This is faster than np.triu_indices :)
-        tmp_range = np.arange(ntraf - 1, dtype=np.int32)
-        ind1 = np.repeat(tmp_range, (tmp_range + 1)[::-1])
-        ind2 = np.ones(ind1.shape[0], dtype=np.int32)
-        inds = np.cumsum(tmp_range[1:][::-1] + 1)
-        np.put(ind2, inds, np.arange(ntraf * -1 + 3, 1))
-        ind2 = np.cumsum(ind2, out=ind2)
-        return ind1, ind2
-
-
-    def minTLOS(self, conf, ownship, i, i_other, x1, y1, x, y):
-        """ This function calculates the aggregated TLOS for all resolution points """
-        # Get speeds of other AC in range
-        x_other = ownship.gseast[i_other]
-        y_other = ownship.gsnorth[i_other]
-        # Get relative bearing [deg] and distance [nm]
-        qdr, dist = geo.qdrdist(ownship.lat[i], ownship.lon[i], ownship.lat[i_other], ownship.lon[i_other])
-        # Convert to SI
-        qdr = np.deg2rad(qdr)
-        dist *= nm
-        # For vectorization, store lengths as W and L
-        W = np.shape(x)[0]
-        L = np.shape(x_other)[0]
-        # Relative speed-components
-        du = np.dot(x_other.reshape((L, 1)), np.ones((1, W))) - np.dot(np.ones((L, 1)), x.reshape((1, W)))
-        dv = np.dot(y_other.reshape((L, 1)), np.ones((1, W))) - np.dot(np.ones((L, 1)), y.reshape((1, W)))
-        # Relative speed + zero check
-        vrel2 = du * du + dv * dv
-        vrel2 = np.where(np.abs(vrel2) < 1e-6, 1e-6, vrel2)  # limit lower absolute value
-        # X and Y distance
-        dx = np.dot(np.reshape(dist * np.sin(qdr), (L, 1)), np.ones((1, W)))
-        dy = np.dot(np.reshape(dist * np.cos(qdr), (L, 1)), np.ones((1, W)))
-        # Time to CPA
-        tcpa = -(du * dx + dv * dy) / vrel2
-        # CPA distance
-        dcpa2 = np.square(np.dot(dist.reshape((L, 1)), np.ones((1, W)))) - np.square(tcpa) * vrel2
-        # Calculate time to LOS
-        R2 = conf.rpz * conf.rpz
-        swhorconf = dcpa2 < R2
-        dxinhor = np.sqrt(np.maximum(0, R2 - dcpa2))
-        dtinhor = dxinhor / np.sqrt(vrel2)
-        tinhor = np.where(swhorconf, tcpa - dtinhor, 0.)
-        tinhor = np.where(tinhor > 0, tinhor, 1e6)
-        # Get index of best solution
-        idx = np.argmax(np.sum(tinhor, 0))
-
-        return idx
\ No newline at end of file
+            # In that case take the partial layer solution and see which
+            # results in lower TLOS
+            # dv2 for the RS1-solution
+            dist12 = (x1[0] - gseast[i]) ** 2 + (y1[0] - gsnorth[i]) ** 2
+            # distances for the partial layer solution stored in d2
+            ind = d2 < dist12
+            if sum(ind) == 1:
+                results.append((x2[0], y2[0]))
+            elif sum(ind) > 1:
+                x2 = x2[ind]
+                y2 = y2[ind]
+                # Get solution with minimum TLOS
+                idx = minTLOS(acdata, i, inrange[k], x1, y1, x2, y2)
+                # Get solution with maximum TLOS
+                results.append((x2[idx], y2[idx]))
+            else:
+                # This case should not happen...
+                results.append((x1[0], y1[0]))
+
+    return results
+
+
+def closest_points(vset, x0, y0):
+    """ Closest point to (x0, y0) on each edge of the set of ARV polygons,
+        sorted on squared distance. Returns x, y, and the squared distance. """
+    # It's just linalg, however credits to: http://stackoverflow.com/a/1501725
+    # Loop through all exteriors and append. Afterwards concatenate
+    p = []
+    q = []
+    for j in range(len(vset)):
+        p.append(np.array(vset[j]))
+        q.append(np.diff(np.vstack((p[j], p[j][0])), axis=0))
+    p = np.concatenate(p)
+    q = np.concatenate(q)
+    # Calculate squared distance between edges
+    l2 = np.sum(q ** 2, axis=1)
+    # Catch l2 == 0 (exception)
+    same = l2 < 1e-8
+    l2[same] = 1.
+    # Calc t
+    t = np.sum((np.array([x0, y0]) - p) * q, axis=1) / l2
+    # Speed of boolean indices only slightly faster (negligible)
+    # t must be limited between 0 and 1
+    t = np.clip(t, 0., 1.)
+    t[same] = 0.
+    # Calculate closest point to each edge
+    x = p[:, 0] + t * q[:, 0]
+    y = p[:, 1] + t * q[:, 1]
+    # Get distance squared
+    d2 = (x - x0) ** 2 + (y - y0) ** 2
+    # Sort distance
+    ind = np.argsort(d2)
+    return x[ind], y[ind], d2[ind]
+
+
+def area(vset):
+    """ This function calculates the area of the set of FRV or ARV """
+    # Initialize A as it could be calculated iteratively
+    A = 0
+    # Check multiple exteriors
+    if type(vset[0][0]) == list:
+        # Calc every exterior separately
+        for i in range(len(vset)):
+            A += pyclipper.scale_from_clipper(
+                pyclipper.scale_from_clipper(pyclipper.Area(pyclipper.scale_to_clipper(vset[i]))))
+    else:
+        # Single exterior
+        A = pyclipper.scale_from_clipper(
+            pyclipper.scale_from_clipper(pyclipper.Area(pyclipper.scale_to_clipper(vset))))
+    return A
+
+
+def minTLOS(acdata, i, i_other, x1, y1, x, y):
+    """ This function calculates the aggregated TLOS for all resolution points """
+    # Get speeds of other AC in range
+    x_other = acdata['gseast'][i_other]
+    y_other = acdata['gsnorth'][i_other]
+    # Get relative bearing [deg] and distance [nm]
+    qdr, dist = geo.qdrdist(acdata['lat'][i], acdata['lon'][i],
+                            acdata['lat'][i_other], acdata['lon'][i_other])
+    # Convert to SI
+    qdr = np.deg2rad(qdr)
+    dist *= nm
+    # For vectorization, store lengths as W and L
+    W = np.shape(x)[0]
+    L = np.shape(x_other)[0]
+    # Relative speed-components
+    du = np.dot(x_other.reshape((L, 1)), np.ones((1, W))) - np.dot(np.ones((L, 1)), x.reshape((1, W)))
+    dv = np.dot(y_other.reshape((L, 1)), np.ones((1, W))) - np.dot(np.ones((L, 1)), y.reshape((1, W)))
+    # Relative speed + zero check
+    vrel2 = du * du + dv * dv
+    vrel2 = np.where(np.abs(vrel2) < 1e-6, 1e-6, vrel2)  # limit lower absolute value
+    # X and Y distance
+    dx = np.dot(np.reshape(dist * np.sin(qdr), (L, 1)), np.ones((1, W)))
+    dy = np.dot(np.reshape(dist * np.cos(qdr), (L, 1)), np.ones((1, W)))
+    # Time to CPA
+    tcpa = -(du * dx + dv * dy) / vrel2
+    # CPA distance
+    dcpa2 = np.square(np.dot(dist.reshape((L, 1)), np.ones((1, W)))) - np.square(tcpa) * vrel2
+    # Calculate time to LOS
+    R2 = acdata['rpz'][i] * acdata['rpz'][i]
+    swhorconf = dcpa2 < R2
+    dxinhor = np.sqrt(np.maximum(0, R2 - dcpa2))
+    dtinhor = dxinhor / np.sqrt(vrel2)
+    tinhor = np.where(swhorconf, tcpa - dtinhor, 0.)
+    tinhor = np.where(tinhor > 0, tinhor, 1e6)
+    # Get index of best solution
+    idx = np.argmax(np.sum(tinhor, 0))
+
+    return idx
@@ -85,14 +85,13 @@ class Metrics(Entity):
             return
 
         # Check convergence using CD with large RPZ and tlook
-        confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS = \
+        confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS, confidx, losidx = \
             traf.cd.detect(traf, traf, np.ones(traf.ntraf) * 20 * nm, traf.cd.hpz, np.ones(traf.ntraf) * 3600)
 
         if confpairs:
-            own, intr = zip(*confpairs)
-            ownidx = traf.id2idx(own)
+            ownidx = confidx[0]
             mask = traf.alt[ownidx] > 70 * ft
-            ownidx = np.array(ownidx)[mask]
+            ownidx = ownidx[mask]
             dcpa = np.array(dcpa)[mask]
             tcpa = np.array(tcpa)[mask]
         else:
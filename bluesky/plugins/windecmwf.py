@@ -7,6 +7,7 @@ import netCDF4 as nc
 from bluesky import stack
 from bluesky.core import timed_function
 from bluesky.traffic.windsim import WindSim
+from bluesky.traffic.windforecast import WindForecast
 
 
 datadir = Path('')
@@ -43,15 +44,52 @@ class WindECMWF(WindSim):
 
         # Switch for periodic loading of new GFS data
         self.autoload = True
-        
+
+        # Wind data at 3-hour intervals, interpolated in time. The data time
+        # runs with the simulation time, with an offset when a different
+        # date and time is loaded.
+        self.forecast = WindForecast('windecmwf', self.decode, self.islocal)
+        self.offset = datetime.timedelta(0)
+        self.validtime = None
+
+    @staticmethod
+    def ncfile(year, month, day):
+        ''' Local file name of the ERA5 data of a day. '''
+        return f'p_levels_{year:04d}{month:02d}{day:02d}.nc'
+
+    def islocal(self, validtime):
+        ''' Whether the ERA5 data of a valid time is downloaded. '''
+        return (datadir / self.ncfile(validtime.year, validtime.month, validtime.day)).is_file()
+
+    def decode(self, validtime):
+        ''' Wind on the pressure levels of the ERA5 data of a valid time, on a
+            grid with ascending latitudes and altitudes. '''
+        netcdf = self.fetch_nc(validtime.year, validtime.month, validtime.day)
+        if netcdf is None:
+            return None
+
+        level = netcdf['level'][:].data
+        lats  = netcdf['latitude'][:].data
+        lons  = netcdf['longitude'][:].data
+        vxs   = netcdf['u'][validtime.hour // 3].data
+        vys   = netcdf['v'][validtime.hour // 3].data
+        netcdf.close()
+
+        # Transform pressure levels to altitude
+        p = level * 100
+        h = (1 - (p / 101325.0)**0.190264) * 44330.76923    # in meters
+
+        ialt = np.argsort(h)
+        ilat = np.argsort(lats)
+        return dict(lat=lats[ilat], lon=lons, alt=h[ialt],
+                    vnorth=vys[ialt][:, ilat], veast=vxs[ialt][:, ilat])
+
     def fetch_nc(self, year, month, day):
         """
         Retrieve weather data via the CDS API for multiple pressure levels
         """
         
-        ymd = "%04d%02d%02d" % (year, month, day)
-        
-        fname = f'p_levels_{ymd}.nc'
+        fname = self.ncfile(year, month, day)
         fpath = datadir / fname
         
         if not fpath.is_file():
@@ -88,8 +126,8 @@ class WindECMWF(WindSim):
                     ],
                 },
                 fpath)
-    
-        stack.echo("Download completed.")
+
+            stack.echo("Download completed.")
         netcdf = nc.Dataset(fpath, mode='r')
     
         return netcdf
@@ -148,58 +186,63 @@ class WindECMWF(WindSim):
         '''
         self.lat0, self.lon0, self.lat1, self.lon1 =  min(lat0, lat1), \
                               min(lon0, lon1), max(lat0, lat1), max(lon0, lon1)
-        self.year = year or bs.sim.utc.year
-        self.month = month or bs.sim.utc.month
-        self.day = day or bs.sim.utc.day
-        self.hour = hour or bs.sim.utc.hour
-
-        # round hour to 3 hours
-        self.hour  = round(self.hour/3) * 3
-        if self.hour == 24:
-            ymd0 = "%04d%02d%02d" % (self.year, self.month, self.day)
-            ymd1 = (datetime.datetime.strptime(ymd0, '%Y%m%d') + 
-                    datetime.timedelta(days=1))
-            self.year  = ymd1.year
-            self.month = ymd1.month
-            self.day   = ymd1.day
-            self.hour  = 0
+        utc = bs.sim.utc
+        if year or month or day or hour is not None:
+            time = datetime.datetime(year or utc.year, month or utc.month, day or utc.day,
+                                     utc.hour if hour is None else hour)
+        else:
+            time = utc
+        self.offset = time - utc
+
+        return self.loadtime(time)
+
+    def loadtime(self, time):
+        ''' Load the wind field of a date and time, interpolated between the
+            ERA5 data before and after it. '''
+        self.validtime = self.forecast.validtime(time)
+        self.year, self.month, self.day, self.hour = self.validtime.year, \
+            self.validtime.month, self.validtime.day, self.validtime.hour
 
         txt = "Loading wind field for %s-%s-%s..." % (self.year, self.month, self.day)
         stack.echo("%s" % txt)
 
-        netcdf = self.fetch_nc(self.year, self.month, self.day)
+        grid = None
+        if self.lat0 != self.lat1 and self.lon0 != self.lon1:
+            self.forecast.setarea(self.lat0, self.lon0, self.lat1, self.lon1)
+            grid = self.forecast.settime(time)
 
-        if netcdf is None or self.lat0 == self.lat1 or self.lon0 == self.lon1:
+        if grid is None:
             return False, "Wind data non-existend in area [%d, %d], [%d, %d]. " \
                 % (self.lat0, self.lat1, self.lon0, self.lon1) \
                 + "time: %04d-%02d-%02d" \
                 % (self.year, self.month, self.day)
 
-        # first clear exisiting wind field
-        self.clear()
-
-        # add new wind field
-        data = self.extract_wind(netcdf, self.lat0, self.lon0, self.lat1, self.lon1, self.hour).T
-
-        data = data[np.lexsort((data[:, 2], data[:, 1], data[:, 0]))] # Sort by lat, lon, alt
-        reshapefactor = int((1 + (max(self.lat0, self.lat1) - min(self.lat0, self.lat1))*4) * \
-                            (1 + (max(self.lon0, self.lon1) - min(self.lon0, self.lon1))*4))
-
-        lat     = np.reshape(data[:,0], (reshapefactor, -1)).T[0,:]
-        lon     = np.reshape(data[:,1], (reshapefactor, -1)).T[0,:]
-        veast   = np.reshape(data[:,3], (reshapefactor, -1)).T
-        vnorth  = np.reshape(data[:,4], (reshapefactor, -1)).T
-        windalt = np.reshape(data[:,2], (reshapefactor, -1)).T[:,0]
-
-        self.addpointvne(lat, lon, vnorth, veast, windalt)        
+        # Replace the existing wind field
+        self.loadgrid(grid)
 
         return True, "Wind field updated in area [%d, %d], [%d, %d]. " \
             % (self.lat0, self.lat1, self.lon0, self.lon1) \
             + "time: %04d-%02d-%02d" \
             % (self.year, self.month, self.day)
 
-    @timed_function(name='WINDECMWF', dt=3600)
+    @timed_function(name='WINDECMWF.reset', hook='reset')
+    def reset(self):
+        ''' Stop loading ERA5 data in the background, and clear the loaded
+            data on simulation reset. '''
+        super().reset()
+        self.forecast.reset()
+        self.offset = datetime.timedelta(0)
+        self.validtime = None
+
+    @timed_function(name='WINDECMWF', dt=60)
     def update(self):
-        if self.autoload:
-            _, txt = self.loadwind(self.lat0, self.lon0, self.lat1, self.lon1)
-            stack.echo("%s" % txt)
\ No newline at end of file
+        ''' Interpolate the wind in time, and load the wind field when the
+            simulation time passes the next ERA5 data. '''
+        if not self.autoload:
+            return
+        time = bs.sim.utc + self.offset
+        if self.forecast.validtime(time) != self.validtime:
+            _, txt = self.loadtime(time)
+            stack.echo("%s" % txt)
+        elif self.grid is self.forecast.series:
+            self.forecast.settime(time, self)
@@ -8,6 +8,7 @@ import bluesky as bs
 from bluesky import stack
 from bluesky.core import timed_function
 from bluesky.traffic.windsim import WindSim
+from bluesky.traffic.windforecast import WindForecast
 
 bs.settings.set_variable_defaults(
     windgfs_url="https://www.ncei.noaa.gov/data/global-forecast-system/access/historical/analysis/")
@@ -48,15 +49,47 @@ class WindGFS(WindSim):
         # Switch for periodic loading of new GFS data
         self.autoload = True
 
-    def fetch_grb(self, year, month, day, hour, pred=0):
+        # Wind data at 3-hour intervals, interpolated in time. The data time
+        # runs with the simulation time, with an offset when a different
+        # date and time is loaded.
+        self.forecast = WindForecast('windgfs', self.decode, self.islocal)
+        self.offset = datetime.timedelta(0)
+        self.validtime = None
+
+    @staticmethod
+    def gfsrun(validtime):
+        ''' Date, hour and forecast hour of the GFS data of a valid time. '''
+        pred = validtime.hour % 6
+        return validtime.year, validtime.month, validtime.day, validtime.hour - pred, pred
+
+    @staticmethod
+    def grbfile(year, month, day, hour, pred=0):
+        ''' Remote location and local file name of GFS data. '''
         ym = "%04d%02d" % (year, month)
         ymd = "%04d%02d%02d" % (year, month, day)
         hm = "%02d00" % hour
         pred = "%03d" % pred
 
         remote_loc = "/%s/%s/gfsanl_3_%s_%s_%s.grb2" % (ym, ymd, ymd, hm, pred)
-
         fname = "gfsanl_3_%s_%s_%s.grb2" % (ymd, hm, pred)
+        return remote_loc, fname
+
+    def islocal(self, validtime):
+        ''' Whether the GFS data of a valid time is downloaded. '''
+        return (datadir / self.grbfile(*self.gfsrun(validtime))[1]).is_file()
+
+    def decode(self, validtime):
+        ''' Wind on the pressure levels of the GFS data of a valid time. '''
+        grb = self.fetch_grb(*self.gfsrun(validtime))
+        if grb is None:
+            return None
+        try:
+            return self.decode_wind(grb)
+        finally:
+            grb.close()
+
+    def fetch_grb(self, year, month, day, hour, pred=0):
+        remote_loc, fname = self.grbfile(year, month, day, hour, pred)
         fpath = datadir / fname
 
         remote_url = bs.settings.windgfs_url + remote_loc
@@ -86,11 +119,37 @@ class WindGFS(WindSim):
                         sys.stdout.write("\r[%s%s]" % ('=' * done, ' ' * (50-done)) )
                         sys.stdout.flush()
 
-        stack.echo("Download completed.")
+            stack.echo("Download completed.")
         grb = pygrib.open(fpath)
 
         return grb
 
+    def decode_wind(self, grb):
+        ''' Wind on the pressure levels of GFS data, on a grid with ascending
+            latitudes and altitudes. '''
+        grb_wind_v = grb.select(shortName="v", typeOfLevel=['isobaricInhPa'])
+        grb_wind_u = grb.select(shortName="u", typeOfLevel=['isobaricInhPa'])
+
+        alts, vnorth, veast = [], [], []
+        for grbu, grbv in zip(grb_wind_u, grb_wind_v):
+            level = grbu.level
+            if level < 100:  # lesss than 100 hPa, above about 54 k ft
+                continue
+
+            p = level * 100
+            h = (1 - (p / 101325.0)**0.190264) * 44330.76923    # in meters
+            alts.append(round(h))
+            veast.append(grbu.values)
+            vnorth.append(grbv.values)
+
+        if not alts:
+            return None
+        lats, lons = grbu.latlons()
+        ialt = np.argsort(alts)
+        ilat = np.argsort(lats[:, 0])
+        return dict(lat=lats[ilat, 0], lon=lons[0, :], alt=np.array(alts, dtype=float)[ialt],
+                    vnorth=np.array(vnorth)[ialt][:, ilat], veast=np.array(veast)[ialt][:, ilat])
+
     def extract_wind(self, grb, lat0, lon0, lat1, lon1):
 
         grb_wind_v = grb.select(shortName="v", typeOfLevel=['isobaricInhPa'])
@@ -149,65 +208,63 @@ class WindGFS(WindSim):
         '''
         self.lat0, self.lon0, self.lat1, self.lon1 =  min(lat0, lat1), \
                               min(lon0, lon1), max(lat0, lat1), max(lon0, lon1)
-        self.year = year or bs.sim.utc.year
-        self.month = month or bs.sim.utc.month
-        self.day = day or bs.sim.utc.day
-        self.hour = hour or bs.sim.utc.hour
-
-        # round hour to 3 hours, check if it is a +3h prediction
-        self.hour = round(self.hour/3) * 3
-        if self.hour in [3, 9, 15, 21]:
-            self.hour = self.hour - 3
-            pred = 3
-        elif self.hour == 24:
-            ymd0 = "%04d%02d%02d" % (self.year, self.month, self.day)
-            print(ymd0)
-            ymd1 = (datetime.datetime.strptime(ymd0, '%Y%m%d') + 
-                    datetime.timedelta(days=1))
-            self.year  = ymd1.year
-            self.month = ymd1.month
-            self.day   = ymd1.day    
-            self.hour  = 0
-            pred = 0
+        utc = bs.sim.utc
+        if year or month or day or hour is not None:
+            time = datetime.datetime(year or utc.year, month or utc.month, day or utc.day,
+                                     utc.hour if hour is None else hour)
         else:
-            pred = 0
+            time = utc
+        self.offset = time - utc
+
+        return self.loadtime(time)
+
+    def loadtime(self, time):
+        ''' Load the wind field of a date and time, interpolated between the
+            GFS data before and after it. '''
+        self.validtime = self.forecast.validtime(time)
+        self.year, self.month, self.day, self.hour = self.validtime.year, \
+            self.validtime.month, self.validtime.day, self.validtime.hour
 
         txt = "Loading wind field for %s-%s-%s %s:00..." % (self.year, self.month, self.day, self.hour)
         stack.echo("%s" % txt)
 
-        grb = self.fetch_grb(self.year, self.month, self.day, self.hour, pred)
+        grid = None
+        if self.lat0 != self.lat1 and self.lon0 != self.lon1:
+            self.forecast.setarea(self.lat0, self.lon0, self.lat1, self.lon1)
+            grid = self.forecast.settime(time)
 
-        if grb is None or self.lat0 == self.lat1 or self.lon0 == self.lon1:
+        if grid is None:
             return False, "Wind data non-existend in area [%d, %d], [%d, %d]. " \
                 % (self.lat0, self.lat1, self.lon0, self.lon1) \
                 + "time: %04d-%02d-%02d %02d:00" \
                 % (self.year, self.month, self.day, self.hour)
 
-        # first clear exisiting wind field
-        self.clear()
-
-        # add new wind field
-        data = self.extract_wind(grb, self.lat0, self.lon0, self.lat1, self.lon1).T
-
-        data = data[np.lexsort((data[:, 2], data[:, 1], data[:, 0]))] # Sort by lat, lon, alt
-        reshapefactor = int((1 + max(self.lat0, self.lat1) - min(self.lat0, self.lat1)) * \
-                            (1 + max(self.lon0, self.lon1) - min(self.lon0, self.lon1)))
-
-        lat     = np.reshape(data[:,0], (reshapefactor, -1)).T[0,:]
-        lon     = np.reshape(data[:,1], (reshapefactor, -1)).T[0,:]
-        veast   = np.reshape(data[:,3], (reshapefactor, -1)).T
-        vnorth  = np.reshape(data[:,4], (reshapefactor, -1)).T
-        windalt = np.reshape(data[:,2], (reshapefactor, -1)).T[:,0]
-
-        self.addpointvne(lat, lon, vnorth, veast, windalt)        
+        # Replace the existing wind field
+        self.loadgrid(grid)
 
         return True, "Wind field updated in area [%d, %d], [%d, %d]. " \
             % (self.lat0, self.lat1, self.lon0, self.lon1) \
             + "time: %04d-%02d-%02d %02d:00" \
             % (self.year, self.month, self.day, self.hour)
 
-    @timed_function(name='WINDGFS', dt=3600)
+    @timed_function(name='WINDGFS.reset', hook='reset')
+    def reset(self):
+        ''' Stop loading GFS data in the background, and clear the loaded
+            data on simulation reset. '''
+        super().reset()
+        self.forecast.reset()
+        self.offset = datetime.timedelta(0)
+        self.validtime = None
+
+    @timed_function(name='WINDGFS', dt=60)
     def update(self):
-        if self.autoload:
-            _, txt = self.loadwind(self.lat0, self.lon0, self.lat1, self.lon1)
-            stack.echo("%s" % txt)
\ No newline at end of file
+        ''' Interpolate the wind in time, and load the wind field when the
+            simulation time passes the next GFS data. '''
+        if not self.autoload:
+            return
+        time = bs.sim.utc + self.offset
+        if self.forecast.validtime(time) != self.validtime:
+            _, txt = self.loadtime(time)
+            stack.echo("%s" % txt)
+        elif self.grid is self.forecast.series:
+            self.forecast.settime(time, self)
@@ -144,10 +144,10 @@ class ScreenIO(Entity):
         data['inconf'] = bs.traf.cd.inconf
         data['tcpamax'] = bs.traf.cd.tcpamax
         data['rpz'] = bs.traf.cd.rpz
-        data['nconf_cur'] = len(bs.traf.cd.confpairs_unique)
-        data['nconf_tot'] = len(bs.traf.cd.confpairs_all)
-        data['nlos_cur'] = len(bs.traf.cd.lospairs_unique)
-        data['nlos_tot'] = len(bs.traf.cd.lospairs_all)
+        data['nconf_cur'] = bs.traf.cd.nconf_cur
+        data['nconf_tot'] = bs.traf.cd.nconf_tot
+        data['nlos_cur'] = bs.traf.cd.nlos_cur
+        data['nlos_tot'] = bs.traf.cd.nlos_tot
         data['trk']        = bs.traf.trk
         data['vs']         = bs.traf.vs
         data['vmin']       = bs.traf.perf.vmin
@@ -200,12 +200,12 @@ class ScreenIO(Entity):
             data['aclat']  = bs.traf.lat[idx]
             data['aclon']  = bs.traf.lon[idx]
 
-            data['wplat']  = route.wplat
-            data['wplon']  = route.wplon
+            data['wplat']  = route.wplat.tolist()
+            data['wplon']  = route.wplon.tolist()
 
-            data['wpalt']  = route.wpalt
-            data['wpspd']  = route.wpspd
+            data['wpalt']  = route.wpalt.tolist()
+            data['wpspd']  = route.wpspd.tolist()
 
-            data['wpname'] = route.wpname
+            data['wpname'] = route.wpname.tolist()
 
         self.pub_route.send_replace((sender or b'C'), **data)
\ No newline at end of file
@@ -108,6 +108,10 @@ class Simulation(Base):
         simstack.process()
 
         if self.state == bs.OP:
+            # Quantities derived from the traffic state of the previous step
+            # are outdated
+            bs.traf.derived.newstep()
+
             # Plot/log the current timestep, and call preupdate functions
             plotter.update()
             datalog.update()
@@ -123,6 +127,9 @@ class Simulation(Base):
             bs.traf.update()
             hooks.update.trigger()
 
+            # Remove aircraft that were deleted with deferred deletion
+            bs.traf.compact()
+
         else:
             hooks.hold.trigger()
 
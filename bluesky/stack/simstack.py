@@ -16,8 +16,8 @@ settings.set_variable_defaults(start_location="EHAM", scenario_path="scenario")
 
 # List of TMX commands not yet implemented in BlueSky
 tmxlist = ("BGPASAS", "DFFLEVEL", "FFLEVEL", "FILTCONF", "FILTTRED", "FILTTAMB",
-           "GRAB", "HDGREF", "MOVIE", "NAVDB", "PREDASAS", "RENAME", "RETYPE",
-           "SWNLRPASAS", "TRAFRECDT", "TRAFLOGDT", "TREACT", "WINDGRID")
+           "GRAB", "HDGREF", "MOVIE", "NAVDB", "PREDASAS", "RETYPE",
+           "SWNLRPASAS", "TRAFRECDT", "TRAFLOGDT", "TREACT")
 
 
 def init():
@@ -0,0 +1,134 @@
+"""
+Tests the airway graph: airway segments, expansion along airways and
+shortest airway routes against a brute-force search.
+"""
+import itertools
+import numpy as np
+
+from bluesky.navdatabase.airways import AirwayGraph, build_airwaygraph
+from bluesky.tools import geo
+
+
+# Fixes on a 4x4 grid of 1 degree, named by row and column
+FIXES = {f'P{i}{j}': (50.0 + i, 4.0 + j) for i in range(4) for j in range(4)}
+
+
+def awydata(legs):
+    """ Airway data in navdb form from (awid, from, to, ndir) legs. """
+    data = dict(awid=[], awfromwpid=[], awfromlat=[], awfromlon=[],
+                awtowpid=[], awtolat=[], awtolon=[], awndir=[])
+    for awid, fromid, toid, ndir in legs:
+        data['awid'].append(awid)
+        data['awfromwpid'].append(fromid)
+        data['awfromlat'].append(FIXES[fromid][0])
+        data['awfromlon'].append(FIXES[fromid][1])
+        data['awtowpid'].append(toid)
+        data['awtolat'].append(FIXES[toid][0])
+        data['awtolon'].append(FIXES[toid][1])
+        data['awndir'].append(ndir)
+    return {name: np.array(value) if name.startswith(('awfroml', 'awtol')) else value
+            for name, value in data.items()}
+
+
+def grid_legs():
+    """ Two-way airways along the rows, one-way airways along the columns
+        (northbound), and a duplicate leg in the opposite direction. """
+    legs = []
+    for i in range(4):
+        legs += [(f'R{i}', f'P{i}{j}', f'P{i}{j + 1}', 2) for j in range(3)]
+        legs += [(f'C{i}', f'P{j}{i}', f'P{j + 1}{i}', 1) for j in range(3)]
+    legs.append(('R0', 'P01', 'P00', 2))
+    return legs
+
+
+def test_segments():
+    """ Airways are listed as one segment per chain of legs, and duplicate
+        legs are stored once. """
+    graph = AirwayGraph(build_airwaygraph(awydata(grid_legs())))
+    assert len(graph.wpid) == 16
+    assert len(graph.legawy) == 24
+    assert graph.segments('R1') in ([['P10', 'P11', 'P12', 'P13']],
+                                    [['P13', 'P12', 'P11', 'P10']])
+    assert graph.segments('XX') == []
+
+    # A branching airway is split at the branch
+    legs = [('B1', 'P00', 'P01', 2), ('B1', 'P01', 'P02', 2), ('B1', 'P01', 'P11', 2)]
+    graph = AirwayGraph(build_airwaygraph(awydata(legs)))
+    segments = graph.segments('B1')
+    assert len(segments) == 3
+    assert all(seg[0] == 'P01' or seg[-1] == 'P01' for seg in segments)
+
+
+def test_expand():
+    """ Fixes along an airway in both directions, excluding the from-fix. """
+    graph = AirwayGraph(build_airwaygraph(awydata(grid_legs())))
+    assert [graph.wpid[n] for n in graph.expand('R2', graph.nodes('P20'), 'P23')] == \
+        ['P21', 'P22', 'P23']
+    assert [graph.wpid[n] for n in graph.expand('R2', graph.nodes('P23'), 'P21')] == \
+        ['P22', 'P21']
+    assert graph.expand('R2', graph.nodes('P10'), 'P23') == []
+    assert graph.expand('XX', graph.nodes('P20'), 'P23') == []
+
+
+def test_connections():
+    """ Legs from a fix in both directions. """
+    graph = AirwayGraph(build_airwaygraph(awydata(grid_legs())))
+    lat, lon = FIXES['P11']
+    node, = graph.nodes('P11', lat, lon)
+    assert sorted(graph.connections(node)) == \
+        [['C1', 'P01'], ['C1', 'P21'], ['R1', 'P10'], ['R1', 'P12']]
+    assert graph.nodes('P11', lat + 5.0, lon) == []
+
+
+def brute_shortest(graph, origlat, origlon, destlat, destlon, nentry):
+    """ Shortest route length over all entry and exit fixes with Dijkstra
+        from each entry fix. """
+    entries = graph.spatial.nearest(origlat, origlon, nentry).tolist()
+    exits = graph.spatial.nearest(destlat, destlon, nentry).tolist()
+    best = np.inf
+    for entry in entries:
+        dist = {entry: 0.0}
+        todo = {entry}
+        while todo:
+            node = min(todo, key=dist.get)
+            todo.remove(node)
+            for k in range(graph.adjstart[node], graph.adjstart[node + 1]):
+                nb = int(graph.adjnode[k])
+                if graph.adjok[k] and dist[node] + graph.adjdist[k] < dist.get(nb, np.inf):
+                    dist[nb] = dist[node] + graph.adjdist[k]
+                    todo.add(nb)
+        for exitnode in exits:
+            if exitnode in dist:
+                best = min(best, geo.kwikdist(origlat, origlon, graph.lat[entry], graph.lon[entry])
+                           + dist[exitnode]
+                           + geo.kwikdist(graph.lat[exitnode], graph.lon[exitnode], destlat, destlon))
+    return best
+
+
+def route_length(graph, route, origlat, origlon, destlat, destlon):
+    lat = np.concatenate(([origlat], graph.lat[route], [destlat]))
+    lon = np.concatenate(([origlon], graph.lon[route], [destlon]))
+    return np.sum(geo.kwikdist(lat[:-1], lon[:-1], lat[1:], lon[1:]))
+
+
+def test_shortest():
+    """ Shortest routes are as short as the brute-force routes, and only use
+        one-way airways in their direction. """
+    graph = AirwayGraph(build_airwaygraph(awydata(grid_legs())))
+    for (orig, dest), nentry in itertools.product(
+            itertools.permutations(['P00', 'P03', 'P30', 'P33', 'P12'], 2), (1, 3)):
+        origlat, origlon = FIXES[orig]
+        destlat, destlon = FIXES[dest]
+        route = graph.shortest(origlat, origlon, destlat, destlon, nentry)
+        expected = brute_shortest(graph, origlat, origlon, destlat, destlon, nentry)
+        if np.isinf(expected):
+            assert route == []
+            continue
+        assert np.isclose(route_length(graph, route, origlat, origlon, destlat, destlon), expected)
+        for a, b in zip(route[:-1], route[1:]):
+            k = graph.adjstart[a] + np.flatnonzero(
+                graph.adjnode[graph.adjstart[a]:graph.adjstart[a + 1]] == b)
+            assert np.any(graph.adjok[k])
+
+    # All column airways are northbound: no way south from a single entry fix
+    assert graph.shortest(*FIXES['P30'], *FIXES['P00'], nentry=1) == []
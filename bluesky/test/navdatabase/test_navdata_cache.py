@@ -0,0 +1,93 @@
+"""
+Tests the column cache of the navigation data.
+"""
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky.navdatabase import loadnavdata, navdatabase
+from bluesky.navdatabase.airways import build_airwaygraph
+from bluesky.tools import cachefile
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(bs.settings, 'cache_path', str(tmp_path))
+    return tmp_path
+
+
+def test_columns(cache_path):
+    """ Columns are loaded with the same values and types as they were dumped. """
+    table = dict(lat=np.linspace(-90.0, 90.0, 7), id=['EHAM', '', 'ÅRE', 'SPY'],
+                 empty=[], emptystr=[''], freq=[350, 114.3, 0.0], nr=[1, 2, 3])
+    with cachefile.opencolumns('test', 'v1') as cache:
+        with pytest.raises(cachefile.CacheError):
+            cache.load('tbl')
+        cache.dump('tbl', table)
+
+    with cachefile.opencolumns('test', 'v1') as cache:
+        loaded = cache.load('tbl')
+    assert isinstance(loaded['lat'], np.ndarray) and not loaded['lat'].flags.writeable
+    assert np.array_equal(loaded.pop('lat'), table.pop('lat'))
+    assert loaded == table
+    assert [type(v) for v in loaded['freq']] == [int, float, float]
+
+    # Other versions are not read
+    with cachefile.opencolumns('test', 'v2') as cache:
+        with pytest.raises(cachefile.CacheError):
+            cache.load('tbl')
+
+
+def test_fir_thresholds():
+    """ FIR borders and runway thresholds survive packing into columns. """
+    firdata = dict(fir=[['EHAA', [50.0, 51.0, 52.0], [3.0, 4.0, 5.0]], ['EBBU', [49.0], [2.0]]],
+                   firlat0=np.zeros(2))
+    assert loadnavdata.unpack_fir(loadnavdata.pack_fir(firdata))['fir'] == firdata['fir']
+
+    rwythresholds = {'EHAM': {'06': (52.3, 4.7, 58.0), '24': (52.3, 4.8, 238.0)},
+                     'XXXX': {}, 'EHRD': {'24': (51.9, 4.4, 237.0)}}
+    unpacked = loadnavdata.RunwayThresholds(loadnavdata.pack_thresholds(rwythresholds))
+    assert dict(unpacked) == rwythresholds
+    assert unpacked.get('EHGG') is None and unpacked['EHAM']['24'][2] == 238.0
+
+
+def test_lazy_layers(cache_path, monkeypatch):
+    """ Optional layers are only read from their cache on first use. """
+    awydata = dict(awid=['A1'], awfromwpid=['SPY'], awfromlat=np.array([52.5]),
+                   awfromlon=np.array([4.9]), awtowpid=['PAM'], awtolat=np.array([52.3]),
+                   awtolon=np.array([4.7]), awndir=np.array([2]), awlowfl=np.array([0]),
+                   awupfl=np.array([660]))
+    layers = dict(
+        wpt=dict(wpid=['SPY', 'PAM'], wplat=np.array([52.5, 52.3]), wplon=np.array([4.9, 4.7]),
+                 wptype=['VOR', 'VOR'], wpelev=np.zeros(2), wpvar=np.zeros(2),
+                 wpfreq=[113.3, 117.8], wpdesc=['', '']),
+        apt=dict(apid=['EHAM'], apname=['SCHIPHOL'], aplat=np.array([52.3]),
+                 aplon=np.array([4.76]), apmaxrwy=[3800], aptype=[1], apco=['NL'],
+                 apelev=[-3.0]),
+        awy=awydata, awygraph=build_airwaygraph(awydata),
+        fir=loadnavdata.pack_fir(dict(fir=[['EHAA', [50.0, 51.0], [3.0, 4.0]]],
+                                      firlat0=np.zeros(1), firlon0=np.zeros(1),
+                                      firlat1=np.zeros(1), firlon1=np.zeros(1))),
+        co=dict(coname=['Netherlands'], cocode2=['NL'], cocode3=['NLD'], conr=np.array([528])),
+        rwy=loadnavdata.pack_thresholds({'EHAM': {'06': (52.3, 4.7, 58.0)}}))
+    for layer, columns in layers.items():
+        loadnavdata.dump_navdata(layer, columns)
+
+    loaded = []
+    load_navdata = navdatabase.load_navdata
+    monkeypatch.setattr(navdatabase, 'load_navdata',
+                        lambda layer: loaded.append(layer) or load_navdata(layer))
+    db = navdatabase.Navdatabase()
+    assert loaded == ['wpt', 'apt'] and db.wpid == ['SPY', 'PAM']
+
+    assert db.cocode3 == ['NLD'] and db.coname == ['Netherlands']
+    assert db.rwythresholds['EHAM']['06'] == (52.3, 4.7, 58.0)
+    assert db.listairway('A1') in ([['SPY', 'PAM']], [['PAM', 'SPY']])
+    assert loaded == ['wpt', 'apt', 'co', 'rwy', 'awygraph']
+    with pytest.raises(AttributeError):
+        db.nonexisting
+
+    # A reset unloads the optional layers again
+    db.reset()
+    assert 'coname' not in vars(db) and db.fir[0][0] == 'EHAA'
+    assert loaded[-3:] == ['wpt', 'apt', 'fir']
@@ -0,0 +1,96 @@
+"""
+Tests the waypoint name index of the navigation database against lookups
+that scan the list of waypoint identifiers.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky.navdatabase.navdatabase import Navdatabase, nameindex
+from bluesky.navdatabase.spatialindex import SpatialIndex
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+
+
+@pytest.fixture
+def navdb(monkeypatch):
+    """ A small navigation database with many duplicate waypoint names. """
+    monkeypatch.setattr(bs, 'scr', SimpleNamespace(addnavwpt=lambda *args: None,
+                                                    removenavwpt=lambda *args: None))
+    rng = np.random.default_rng(1)
+    db = Navdatabase.__new__(Navdatabase)
+    db.wpid = [f'WP{i}' for i in rng.integers(0, 50, 500)]
+    db.wplat = rng.uniform(-80.0, 80.0, 500)
+    db.wplon = rng.uniform(-180.0, 180.0, 500)
+    # Co-located duplicates
+    db.wplat[400:410] = db.wplat[0] + rng.uniform(-0.01, 0.01, 10)
+    db.wplon[400:410] = db.wplon[0]
+    db.wpid[400:410] = 10 * [db.wpid[0]]
+    for name in ('wptype', 'wpfreq', 'wpdesc'):
+        setattr(db, name, 500 * [''])
+    db.wpelev = np.zeros(500)
+    db.wpvar = np.zeros(500)
+    db.wpindex = nameindex(db.wpid)
+    db.wpspatial = SpatialIndex(db.wplat, db.wplon)
+    db.aptid = ['EHAM', 'EHRD', 'EHAM']
+    db.aptindex = nameindex(db.aptid)
+    return db
+
+
+def scan_closest(db, name, reflat, reflon):
+    """ Closest waypoint with this name, found by scanning all waypoints. """
+    idx = [i for i, wpid in enumerate(db.wpid) if wpid == name]
+    if not idx:
+        return -1
+    return min(idx, key=lambda i: (geo.kwikdist(reflat, reflon, db.wplat[i], db.wplon[i]), i))
+
+
+def test_getwpidx(navdb):
+    """ Single and bulk lookups give the closest waypoint with that name. """
+    rng = np.random.default_rng(2)
+    names = [f'wp{i}' for i in rng.integers(0, 55, 200)]
+    reflat, reflon = rng.uniform(-80.0, 80.0, (2, 200))
+    reference = [scan_closest(navdb, name.upper(), lat, lon)
+                 for name, lat, lon in zip(names, reflat, reflon)]
+    assert [navdb.getwpidx(*args) for args in zip(names, reflat, reflon)] == reference
+    assert navdb.getwpidx_many(names, reflat, reflon).tolist() == reference
+    assert navdb.getwpidx('WP3') == navdb.wpid.index('WP3')
+    assert navdb.getwpidx('NONE', 0.0, 0.0) == -1
+    assert navdb.getaptidx('eham') == 0 and navdb.getaptidx('EHGG') == -1
+
+
+def test_getwpindices(navdb):
+    """ The closest waypoint comes first, followed by the co-located ones. """
+    name = navdb.wpid[0]
+    indices = navdb.getwpindices(name, navdb.wplat[0], navdb.wplon[0])
+    assert indices[0] == 0
+    others = [i for i, wpid in enumerate(navdb.wpid) if wpid == name and i > 0 and
+              nm * geo.kwikdist(navdb.wplat[i], navdb.wplon[i], navdb.wplat[0], navdb.wplon[0]) <= 1852.0]
+    assert indices[1:] == others and len(others) >= 10
+
+
+def test_defwpt_delwpt(navdb):
+    """ Defining and deleting waypoints keeps the name index up to date. """
+    navdb.defwpt('new', 10.0, 20.0)
+    navdb.defwpt('WP1', 11.0, 21.0)
+    assert navdb.getwpidx('WP1', 11.0, 21.0) == len(navdb.wpid) - 1
+    assert navdb.getwpinear(11.0, 21.0) == len(navdb.wpid) - 1
+    assert navdb.getwpinear(10.0, 20.0) == len(navdb.wpid) - 2
+    assert navdb.wpindex == nameindex(navdb.wpid)
+    navdb.delwpt('NEW')
+    navdb.delwpt('WP3')
+    assert 'NEW' not in navdb.wpindex
+    assert navdb.wpindex == nameindex(navdb.wpid)
+    assert len(navdb.wplat) == len(navdb.wpid)
+    assert navdb.getwpidx('WP1', 11.0, 21.0) == len(navdb.wpid) - 1
+    assert navdb.getwpinear(11.0, 21.0) == len(navdb.wpid) - 1
+
+
+def test_nearest_empty(navdb):
+    """ Nearest lookups without waypoints or airports give -1. """
+    navdb.wpspatial = SpatialIndex(np.zeros(0), np.zeros(0))
+    navdb.aptspatial = SpatialIndex(np.zeros(0), np.zeros(0))
+    assert navdb.getwpinear(52.0, 4.0) == -1
+    assert navdb.getapinear(52.0, 4.0) == -1
+    assert navdb.getwpknear(52.0, 4.0, 3) == []
@@ -0,0 +1,64 @@
+"""
+Tests the spatial index of navigation data points against brute-force
+nearest and inside-box searches.
+"""
+import numpy as np
+
+from bluesky.navdatabase.spatialindex import SpatialIndex, inbox, lat2xyz
+
+
+def brute_nearest(lat, lon, qlat, qlon, k):
+    dist = np.linalg.norm(lat2xyz(lat, lon) - lat2xyz(qlat, qlon), axis=1)
+    return np.lexsort((np.arange(len(lat)), dist))[:k].tolist()
+
+
+def check_queries(index, lat, lon, rng):
+    """ Random nearest and box queries, also across the antimeridian. """
+    for _ in range(50):
+        qlat, qlon = rng.uniform(-90.0, 90.0), rng.uniform(-180.0, 180.0)
+        assert index.nearest(qlat, qlon).tolist() == brute_nearest(lat, lon, qlat, qlon, 1)
+        assert index.nearest(qlat, qlon, 7).tolist() == brute_nearest(lat, lon, qlat, qlon, 7)
+
+        lat0, lat1 = np.sort(rng.uniform(-90.0, 90.0, 2))
+        lon0 = rng.uniform(-180.0, 180.0)
+        lon1 = (lon0 + rng.choice([5.0, 60.0, 200.0]) + 180.0) % 360.0 - 180.0
+        assert index.inside(lat0, lat1, lon0, lon1) == \
+            np.flatnonzero(inbox(lat, lon, lat0, lat1, lon0, lon1)).tolist()
+
+
+def test_queries():
+    """ Nearest, k-nearest and box queries equal the brute-force results. """
+    rng = np.random.default_rng(1)
+    lat = np.degrees(np.arcsin(rng.uniform(-1.0, 1.0, 5000)))
+    lon = rng.uniform(-180.0, 180.0, 5000)
+    check_queries(SpatialIndex(lat, lon), lat, lon, rng)
+
+
+def test_antimeridian():
+    """ Points on both sides of the antimeridian are close to each other. """
+    index = SpatialIndex([10.0, 10.0, 10.0], [179.9, -179.9, 170.0])
+    assert index.nearest(10.0, -179.95, 2).tolist() == [1, 0]
+    assert index.inside(9.0, 11.0, 179.0, -179.0) == [0, 1]
+    assert index.inside(9.0, 11.0, -179.0, 179.0) == [2]
+
+
+def test_insert_delete():
+    """ Inserted and deleted points give the same results as a rebuilt index. """
+    rng = np.random.default_rng(2)
+    lat = list(rng.uniform(-80.0, 80.0, 1000))
+    lon = list(rng.uniform(-180.0, 180.0, 1000))
+    index = SpatialIndex(lat, lon)
+    index.maxpending = 20
+    for _ in range(100):
+        if rng.random() < 0.6:
+            lat.append(rng.uniform(-80.0, 80.0))
+            lon.append(rng.uniform(-180.0, 180.0))
+            index.insert(lat[-1], lon[-1])
+        else:
+            i = int(rng.integers(len(lat)))
+            del lat[i], lon[i]
+            index.delete(i)
+        if rng.random() < 0.1:
+            check_queries(index, np.array(lat), np.array(lon), rng)
+    assert len(index) == len(lat)
+    check_queries(index, np.array(lat), np.array(lon), rng)
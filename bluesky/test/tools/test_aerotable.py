@@ -0,0 +1,106 @@
+"""
+Tests the tabulated atmosphere and speed conversions against the analytic
+functions of bluesky.tools.aero.
+"""
+import numpy as np
+import pytest
+
+from bluesky.tools import aero, aerotable
+from bluesky.tools.aero import R, gamma, p0, rho0
+
+
+N = 1000
+
+
+@pytest.fixture
+def h():
+    return np.random.default_rng(1).uniform(-500.0, 20000.0, N)
+
+
+@pytest.fixture
+def spd():
+    return np.random.default_rng(2).uniform(-20.0, 330.0, N)
+
+
+def nonisa(h, dtemp):
+    """ Analytic pressure, density, temperature and speed of sound at
+        pressure altitude h with a temperature offset from ISA. """
+    p, _, T = aero.vatmos(h)
+    T = T + dtemp
+    return p, p / (R * T), T, np.sqrt(gamma * R * T)
+
+
+def test_isa(h, spd):
+    """ Tabulated values are close to the analytic ones. """
+    for tab, ref in zip(aerotable.vatmos_vsound(h), (*aero.vatmos(h), aero.vvsound(h))):
+        assert np.allclose(tab, ref, rtol=1e-6, atol=0.0)
+    assert np.allclose(aerotable.vcas2tas(spd, h), aero.vcas2tas(spd, h), rtol=1e-5, atol=1e-3)
+    assert np.allclose(aerotable.vtas2cas(spd, h), aero.vtas2cas(spd, h), rtol=1e-5, atol=1e-3)
+    assert np.all(np.sign(aerotable.vcas2tas(spd, h)) == np.sign(spd))
+
+    casmach = np.where(spd < 150.0, 0.3 + spd / 1000.0, spd)
+    for tab, ref in zip(aerotable.vcasormach(casmach, h), aero.vcasormach(casmach, h)):
+        assert np.allclose(tab, ref, rtol=1e-5, atol=1e-3)
+    assert np.allclose(aerotable.vcasormach2tas(casmach, h),
+                       aero.vcasormach2tas(casmach, h), rtol=1e-5, atol=1e-3)
+
+
+def test_dtemp(h, spd):
+    """ Temperature offsets change density, speed of sound and TAS, but not
+        pressure. """
+    dtemp = np.random.default_rng(3).uniform(-30.0, 30.0, N)
+    p, rho, T, a = nonisa(h, dtemp)
+    tab = aerotable.vatmos_vsound(h, dtemp)
+    for tabvalue, ref in zip(tab, (p, rho, T, a)):
+        assert np.allclose(tabvalue, ref, rtol=1e-6, atol=0.0)
+    assert np.allclose(aerotable.vdensity(h, dtemp), rho, rtol=1e-6, atol=0.0)
+    assert np.allclose(aerotable.vvsound(h, dtemp), a, rtol=1e-6, atol=0.0)
+
+    # CAS to TAS with the actual pressure and density
+    qdyn = p0 * ((1.0 + rho0 * spd * spd / (7.0 * p0)) ** 3.5 - 1.0)
+    tas = np.copysign(np.sqrt(7.0 * p / rho * ((1.0 + qdyn / p) ** (2.0 / 7.0) - 1.0)), spd)
+    assert np.allclose(aerotable.vcas2tas(spd, h, dtemp), tas, rtol=1e-5, atol=1e-3)
+    # TAS beyond the table speeds at ISA temperature is extrapolated, and
+    # not compared
+    inside = np.abs(tas) < 0.8 * aerotable.table().vmax
+    assert np.allclose(aerotable.vtas2cas(tas, h, dtemp)[inside], spd[inside],
+                       rtol=1e-5, atol=1e-3)
+    assert np.allclose(aerotable.vtas2mach(tas, h, dtemp), tas / a)
+
+
+def test_reuse(h, spd):
+    """ Lookups with precomputed altitudes and out buffers give the same
+        results. """
+    alts = aerotable.altitudes(h)
+    out = np.empty(N)
+    assert aerotable.vcas2tas(spd, alts, out=out) is out
+    assert np.array_equal(out, aerotable.vcas2tas(spd, h))
+    atmos = tuple(np.empty(N) for _ in range(4))
+    result = aerotable.vatmos_vsound(alts, out=atmos)
+    assert all(r is o for r, o in zip(result, atmos))
+    for tab, ref in zip(atmos, aerotable.vatmos_vsound(h)):
+        assert np.array_equal(tab, ref)
+
+
+def test_bounds():
+    """ Altitudes outside the table use the analytic functions. """
+    tab = aerotable.table()
+    h = np.array([tab.hmin - 1000.0, 5000.0, tab.hmax + 1000.0, 30000.0, 70000.0])
+    spd = np.full(len(h), 150.0)
+    dtemp = np.full(len(h), 15.0)
+    for tabvalue, ref in zip(aerotable.vatmos_vsound(h), (*aero.vatmos(h), aero.vvsound(h))):
+        assert np.allclose(tabvalue, ref, rtol=1e-6, atol=0.0)
+    for tabvalue, ref in zip(aerotable.vatmos_vsound(h, dtemp), nonisa(h, dtemp)):
+        assert np.allclose(tabvalue, ref, rtol=1e-6, atol=0.0)
+    assert np.allclose(aerotable.vcas2tas(spd, h), aero.vcas2tas(spd, h), rtol=1e-6)
+    assert np.allclose(aerotable.vtas2cas(4.0 * spd, h), aero.vtas2cas(4.0 * spd, h), rtol=1e-6)
+    assert np.allclose(aerotable.vcas2tas(-spd, h), -aero.vcas2tas(spd, h), rtol=1e-6)
+    casmach = np.array([150.0, 0.8, 150.0, 0.8, 150.0])
+    for tabvalue, ref in zip(aerotable.vcasormach(casmach, h), aero.vcasormach(casmach, h)):
+        assert np.allclose(tabvalue, ref, rtol=1e-5)
+
+    # The same with precomputed altitudes and out buffers
+    alts = aerotable.altitudes(h)
+    out = np.empty(len(h))
+    assert aerotable.vcas2tas(spd, alts, out=out) is out
+    assert np.allclose(out, aero.vcas2tas(spd, h), rtol=1e-6)
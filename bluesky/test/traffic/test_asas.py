@@ -0,0 +1,588 @@
+"""
+Tests conflict detection implementations against the reference
+full-matrix StateBased detection, and MVP conflict resolution.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import bluesky
+from bluesky.core.trafficarrays import TrafficArrays
+from bluesky.tools import datalog
+from bluesky.tools.aero import nm, ft
+from bluesky.traffic.asas import StateBased, StateBasedGrid, StateBasedTiled, \
+    StateBasedParallel, StateBasedIncremental, MVP
+from bluesky.traffic.asas.conflictdb import PairLog
+from bluesky.traffic.asas.statebasedtiled import TileWorkspace
+
+
+def random_traffic(ntraf, lat0=52.0, lon0=4.0, span=2.0, seed=1):
+    """
+    Random traffic around (lat0, lon0), with aircraft on a limited set
+    of flight levels to get a decent number of conflicts.
+    """
+    rng = np.random.default_rng(seed)
+    return SimpleNamespace(
+        ntraf=ntraf,
+        id=[f'AC{i}' for i in range(ntraf)],
+        lat=lat0 + rng.uniform(-span, span, ntraf),
+        lon=(lon0 + rng.uniform(-span, span, ntraf) + 180.0) % 360.0 - 180.0,
+        alt=rng.choice([3000.0, 6000.0, 9000.0, 9100.0], ntraf),
+        trk=rng.uniform(0.0, 360.0, ntraf),
+        gs=rng.uniform(100.0, 250.0, ntraf),
+        vs=rng.choice([-5.0, 0.0, 0.0, 5.0], ntraf))
+
+
+def detect_args(traf):
+    """ Non-uniform protected zones and lookahead times for traf. """
+    rpz = np.full(traf.ntraf, 5.0 * nm)
+    rpz[::7] = 6.5 * nm
+    hpz = np.full(traf.ntraf, 1000.0 * ft)
+    dtlookahead = np.full(traf.ntraf, 300.0)
+    dtlookahead[::5] = 200.0
+    return rpz, hpz, dtlookahead
+
+
+def detect(cls, traf):
+    """ Run detection of cls on traf. """
+    return detect_with(cls.__new__(cls), traf)
+
+
+def detect_with(detector, traf):
+    """ Run detection of detector instance on traf. """
+    return detector.detect(traf, traf, *detect_args(traf))
+
+
+def assert_same_detection(reference, result):
+    """ Conflict and LoS pairs and all conflict data should be identical. """
+    assert result[0] == reference[0]
+    assert result[1] == reference[1]
+    for ref, res in zip(reference[2:], result[2:]):
+        np.testing.assert_array_equal(res, ref)
+
+
+@pytest.mark.parametrize('ntraf, lat0, lon0', [
+    (2, 52.0, 4.0),
+    (400, 52.0, 4.0),
+    (400, 0.0, 179.5),
+    (400, 88.5, 0.0)])
+def test_statebasedgrid(ntraf, lat0, lon0):
+    """
+    Grid-based detection should be identical to StateBased, also across
+    the antimeridian and close to the poles.
+    """
+    traf = random_traffic(ntraf, lat0, lon0)
+    reference = detect(StateBased, traf)
+    assert ntraf < 10 or reference[0]
+    assert_same_detection(reference, detect(StateBasedGrid, traf))
+
+
+@pytest.mark.parametrize('tilesize', [1, 7, 128, 1000])
+def test_statebasedtiled(tilesize):
+    """
+    Tiled detection should be bit-for-bit identical to StateBased,
+    for tiles that do and do not divide the number of aircraft.
+    """
+    traf = random_traffic(400)
+    reference = detect(StateBased, traf)
+    tiled = StateBasedTiled.__new__(StateBasedTiled)
+    tiled.tilesize = tilesize
+    tiled.workspace = TileWorkspace()
+    for _ in range(2):
+        result = tiled.detect(traf, traf, *detect_args(traf))
+        assert_same_detection(reference, result)
+        for ref, res in zip(reference[2:], result[2:]):
+            assert ref.tobytes() == res.tobytes()
+
+
+@pytest.mark.parametrize('nthreads, tilesize', [(1, 64), (3, 16), (4, 1000), (16, 7)])
+def test_statebasedparallel(nthreads, tilesize):
+    """
+    Parallel detection should be bit-for-bit identical to StateBased,
+    also with more threads than tiles.
+    """
+    traf = random_traffic(400)
+    reference = detect(StateBased, traf)
+    parallel = StateBasedParallel.__new__(StateBasedParallel)
+    parallel.tilesize = tilesize
+    parallel.pool = None
+    parallel.setnthreads(nthreads)
+    for _ in range(2):
+        result = parallel.detect(traf, traf, *detect_args(traf))
+        for ref, res in zip(reference[2:], result[2:]):
+            assert ref.tobytes() == res.tobytes()
+        assert_same_detection(reference, result)
+    parallel.pool.shutdown()
+
+
+def test_statebasedparallel_pool(traffic_):
+    """
+    The worker pool of parallel detection is started on the first
+    detection, and shut down when another CD method is selected and on
+    simulation reset.
+    """
+    bluesky.sim.reset()
+    for cmd in ('CRE KL001 B738 52.0 4.0 90 FL100 250',
+                'CRE KL002 B738 52.0 4.5 270 FL100 250',
+                'CDMETHOD STATEBASEDPARALLEL'):
+        bluesky.stack.stack(cmd)
+    bluesky.stack.process()
+    parallel = StateBasedParallel.implinstance()
+    bluesky.sim.op()
+    for _ in range(40):
+        bluesky.sim.step()
+    assert parallel.pool is not None and bluesky.traf.cd.inconf.all()
+
+    bluesky.stack.stack('CDMETHOD STATEBASED')
+    bluesky.stack.process()
+    assert parallel.pool is None
+
+    bluesky.stack.stack('CDMETHOD STATEBASEDPARALLEL')
+    bluesky.stack.process()
+    for _ in range(40):
+        bluesky.sim.step()
+    assert parallel.pool is not None
+    bluesky.sim.reset()
+    assert parallel.pool is None
+
+
+def test_statebasedincremental(monkeypatch):
+    """
+    Incremental detection should be identical to StateBased over time,
+    while only checking a subset of all pairs, also after aircraft are
+    moved, created and deleted.
+    """
+    monkeypatch.setattr(bluesky, 'sim', SimpleNamespace(simt=0.0), raising=False)
+    traf = random_traffic(300, span=4.0)
+    incremental = StateBasedIncremental.__new__(StateBasedIncremental)
+    # Keep the detector out of the traffic tree of an initialized simulation
+    monkeypatch.setattr(TrafficArrays, 'root', None)
+    TrafficArrays.__init__(incremental)
+    incremental.clearqueue()
+    incremental.horizon = 30.0
+    incremental.maxgs = 300.0
+    incremental.maxvs = 10.0
+    rng = np.random.default_rng(2)
+    npairs = []
+
+    for step in range(40):
+        if step == 15:
+            # Move an aircraft on top of another one
+            traf.lat[0], traf.lon[0], traf.alt[0] = traf.lat[1], traf.lon[1], traf.alt[1]
+            incremental.invalidate([0])
+        elif step == 25:
+            # Delete two aircraft, and create one
+            keep = np.ones(traf.ntraf, dtype=bool)
+            keep[[3, 50]] = False
+            incremental.delete(np.array([3, 50]))
+            for name in ('lat', 'lon', 'alt', 'trk', 'gs', 'vs'):
+                values = getattr(traf, name)[keep]
+                setattr(traf, name, np.append(values, values[5]))
+            traf.ntraf -= 1
+            traf.id = [acid for acid, k in zip(traf.id, keep) if k] + ['NEW']
+            incremental.invalidate(np.array([traf.ntraf - 1]))
+
+        reference = detect(StateBased, traf)
+        assert_same_detection(reference, detect_with(incremental, traf))
+        npairs.append(len(incremental.due))
+
+        # Move aircraft for 5 seconds, with random changes in track and speed
+        bluesky.sim.simt += 5.0
+        traf.trk = (traf.trk + rng.uniform(-10.0, 10.0, traf.ntraf)) % 360.0
+        traf.gs = np.clip(traf.gs + rng.uniform(-5.0, 5.0, traf.ntraf), 100.0, 250.0)
+        traf.lat = traf.lat + traf.gs * np.cos(np.radians(traf.trk)) * 5.0 / 111319.0
+        traf.lon = traf.lon + traf.gs * np.sin(np.radians(traf.trk)) * 5.0 / \
+            (111319.0 * np.cos(np.radians(traf.lat)))
+        traf.alt = traf.alt + traf.vs * 5.0
+
+    # Only a small part of all pairs should be queued for re-checks
+    assert max(npairs) < 0.3 * 300 * 299 / 2
+
+
+def test_pairlog(monkeypatch, tmp_path):
+    """
+    The pair log should detect start and end of events regardless of
+    pair order, keep minimum dcpa/tcpa, and spill its history to disk.
+    """
+    monkeypatch.setattr(datalog, 'makeLogfileName', lambda name: tmp_path / f'{name}.log')
+    log = PairLog('conflicts')
+    log.update(0.0, np.array([1, 2]), np.array([2, 1]), np.array([500.0, 400.0]),
+               np.array([60.0, 60.0]))
+    assert (log.ncurrent, log.ntotal) == (1, 1)
+    log.update(1.0, np.array([2, 3, 5]), np.array([1, 5, 3]), np.array([300.0, 100.0, 100.0]),
+               np.array([50.0, 20.0, 20.0]))
+    assert (log.ncurrent, log.ntotal) == (2, 2)
+    # Pair (1, 2) ends, pair (3, 5) continues
+    log.update(2.0, np.array([3]), np.array([5]), np.array([200.0]), np.array([10.0]))
+    assert (log.ncurrent, log.ntotal, log.nhist) == (1, 2, 1)
+
+    # Force the history to disk
+    log.memcap = 0.0
+    log.update(3.0, np.array([], dtype=int), np.array([], dtype=int),
+               np.array([]), np.array([]))
+    assert (log.ncurrent, log.nhist, log.nchunks) == (0, 0, 1)
+    history = log.history()
+    np.testing.assert_array_equal(history['idx_a'], [1, 3])
+    np.testing.assert_array_equal(history['idx_b'], [2, 5])
+    np.testing.assert_array_equal(history['start_t'], [0.0, 1.0])
+    np.testing.assert_array_equal(history['end_t'], [2.0, 3.0])
+    np.testing.assert_array_equal(history['min_dcpa'], [300.0, 100.0])
+    np.testing.assert_array_equal(history['min_tcpa'], [50.0, 10.0])
+
+
+def test_conflog_deferred_delete(traffic_, monkeypatch):
+    """
+    A conflict of an aircraft that is deleted with deferred deletion should
+    be logged against that aircraft until it is removed, and then end.
+    """
+    bluesky.sim.reset()
+    monkeypatch.setattr(bluesky.traf, 'deferdelete', True)
+    for cmd in ('CRE KL001 B738 52.0 4.0 90 FL100 250',
+                'CRE KL002 B738 52.0 4.5 270 FL100 250',
+                'CRE KL003 B738 53.0 4.0 90 FL100 250',
+                'CDMETHOD STATEBASED'):
+        bluesky.stack.stack(cmd)
+    bluesky.stack.process()
+    uid = bluesky.traf.uid.copy()
+    cd = bluesky.traf.cd
+    bluesky.sim.op()
+    for _ in range(40):
+        bluesky.sim.step()
+    assert (cd.nconf_cur, cd.nconf_tot) == (1, 1)
+
+    # KL002 stays in the traffic arrays until the end of the timestep
+    bluesky.stack.stack('DEL KL002')
+    bluesky.stack.process()
+    assert bluesky.traf.ntraf == 3
+    cd.update(bluesky.traf, bluesky.traf)
+    assert (cd.nconf_cur, cd.nconf_tot) == (1, 1)
+    current = cd.conflog.current
+    assert (current['idx_a'][0], current['idx_b'][0]) == (uid[0], uid[1])
+
+    bluesky.traf.compact()
+    assert bluesky.traf.id == ['KL001', 'KL003']
+    cd.update(bluesky.traf, bluesky.traf)
+    assert (cd.nconf_cur, cd.nconf_tot, cd.conflog.nhist) == (0, 1, 1)
+    bluesky.sim.reset()
+
+
+def resolve_headon(priocode=''):
+    """ MVP resolution of two aircraft flying head-on at the same altitude,
+        of which the second one is climbing. """
+    traf = SimpleNamespace(
+        ntraf=2, id=['AC0', 'AC1'], lat=np.array([52.0, 52.1]), lon=np.array([4.0, 4.0]),
+        alt=np.array([3000.0, 3000.0]), trk=np.array([0.0, 180.0]),
+        gs=np.array([150.0, 150.0]), vs=np.array([0.0, 5.0]))
+    traf.gseast = np.zeros(2)
+    traf.gsnorth = np.array([150.0, -150.0])
+    traf.id2idx = lambda acids: np.array([traf.id.index(acid) for acid in acids])
+    traf.perf = SimpleNamespace(vmin=50.0, vmax=300.0, vsmin=-20.0, vsmax=20.0)
+    traf.ap = SimpleNamespace(vs=traf.vs)
+    traf.selalt = traf.alt
+    rpz, hpz, dtlookahead = detect_args(traf)
+    result = detect(StateBased, traf)
+    conf = SimpleNamespace(confpairs=result[0], qdr=result[4], dist=result[5],
+                           tcpa=result[7], tLOS=result[8], rpz=rpz, hpz=hpz,
+                           dtlookahead=dtlookahead)
+    mvp = MVP.__new__(MVP)
+    mvp.swprio, mvp.priocode = bool(priocode), priocode
+    mvp.resofach = mvp.resofacv = 1.0
+    mvp.noresoac = mvp.resooffac = np.zeros(2, dtype=bool)
+    mvp.swresohoriz, mvp.swresospd, mvp.swresohdg, mvp.swresovert = True, False, False, False
+    assert len(conf.confpairs) == 2
+    return mvp.resolve(conf, traf, traf)
+
+
+@pytest.mark.filterwarnings('error::RuntimeWarning')
+def test_mvp_headon():
+    """
+    MVP should give finite, opposite heading changes for a head-on
+    conflict, and only the climbing aircraft resolves with LAY1 priority.
+    """
+    trk, gs, _, _ = resolve_headon()
+    assert np.all(np.isfinite(trk)) and np.all(np.isfinite(gs))
+    dtrk = (trk - np.array([0.0, 180.0]) + 180.0) % 360.0 - 180.0
+    assert dtrk[0] != 0.0
+    np.testing.assert_allclose(dtrk[0], dtrk[1])
+
+    trk, gs, _, _ = resolve_headon('LAY1')
+    assert trk[0] == 0.0 and gs[0] == 150.0
+    assert trk[1] != 180.0
+
+
+def ref_mvp(mvp, ownship, intruder, conf, qdr, dist, tcpa, tLOS, idx1, idx2):
+    """ Per-pair MVP, as implemented before vectorization. """
+    rpz_m = np.max(conf.rpz[[idx1, idx2]] * mvp.resofach)
+    hpz_m = np.max(conf.hpz[[idx1, idx2]] * mvp.resofacv)
+    dtlook = conf.dtlookahead[idx1]
+    qdr = np.radians(qdr)
+    drel = np.array([np.sin(qdr) * dist, np.cos(qdr) * dist,
+                     intruder.alt[idx2] - ownship.alt[idx1]])
+    v1 = np.array([ownship.gseast[idx1], ownship.gsnorth[idx1], ownship.vs[idx1]])
+    v2 = np.array([intruder.gseast[idx2], intruder.gsnorth[idx2], intruder.vs[idx2]])
+    vrel = v2 - v1
+
+    dcpa = drel + vrel * tcpa
+    dabsH = np.sqrt(dcpa[0] * dcpa[0] + dcpa[1] * dcpa[1])
+    iH = rpz_m - dabsH
+    if dabsH <= 10.:
+        dabsH = 10.
+        dcpa[0] = drel[1] / dist * dabsH
+        dcpa[1] = -drel[0] / dist * dabsH
+    if rpz_m < dist and dabsH < dist:
+        erratum = np.cos(np.arcsin(rpz_m / dist) - np.arcsin(dabsH / dist))
+        dv1 = ((rpz_m / erratum - dabsH) * dcpa[0]) / (abs(tcpa) * dabsH)
+        dv2 = ((rpz_m / erratum - dabsH) * dcpa[1]) / (abs(tcpa) * dabsH)
+    else:
+        dv1 = (iH * dcpa[0]) / (abs(tcpa) * dabsH)
+        dv2 = (iH * dcpa[1]) / (abs(tcpa) * dabsH)
+
+    iV = hpz_m if abs(vrel[2]) > 0.0 else hpz_m - abs(drel[2])
+    tsolV = abs(drel[2] / vrel[2]) if abs(vrel[2]) > 0.0 else tLOS
+    if tsolV > dtlook:
+        tsolV = tLOS
+        iV = hpz_m
+    dv3 = (iV / tsolV) * (-vrel[2] / abs(vrel[2])) if abs(vrel[2]) > 0.0 else iV / tsolV
+    return np.array([dv1, dv2, dv3]), tsolV
+
+
+def ref_applyprio(priocode, dv_mvp, dv1, vs1, vs2):
+    """ Per-pair priority rules, as implemented before vectorization, for
+        the resolution dv1 of the ownship. """
+    cruise1 = abs(vs1) < 0.1 and abs(vs2) > 0.1
+    cruise2 = abs(vs2) < 0.1 and abs(vs1) > 0.1
+    if priocode == 'FF1':
+        dv_mvp[2] = dv_mvp[2] / 2.0
+        return dv1 - dv_mvp
+    if priocode == 'FF2':
+        dv_mvp[2] = dv_mvp[2] / 2.0
+        return dv1 if cruise1 else dv1 - dv_mvp
+    if priocode == 'FF3':
+        if cruise1:
+            dv_mvp[2] = 0.0
+            return dv1 - dv_mvp
+        if cruise2:
+            dv_mvp[2] = 0.0
+            return dv1
+        dv_mvp[2] = dv_mvp[2] / 2.0
+        return dv1 - dv_mvp
+    if priocode in ('LAY1', 'LAY2'):
+        dv_mvp[2] = 0.0
+        yields = cruise1 if priocode == 'LAY1' else cruise2
+        return dv1 if yields else dv1 - dv_mvp
+    return dv1
+
+
+def ref_resolve(mvp, conf, ownship, intruder):
+    """ The resolution vectors and vertical solve times of the per-pair MVP
+        resolution, which resolve() turns into new track, speeds and
+        altitude. """
+    dv = np.zeros((ownship.ntraf, 3))
+    timesolveV = np.ones(ownship.ntraf) * 1e9
+    for (ac1, ac2), qdr, dist, tcpa, tLOS in zip(conf.confpairs, conf.qdr, conf.dist,
+                                                  conf.tcpa, conf.tLOS):
+        idx1 = ownship.id.index(ac1)
+        idx2 = intruder.id.index(ac2)
+        dv_mvp, tsolV = ref_mvp(mvp, ownship, intruder, conf, qdr, dist, tcpa, tLOS, idx1, idx2)
+        timesolveV[idx1] = min(timesolveV[idx1], tsolV)
+        if mvp.swprio:
+            dv[idx1] = ref_applyprio(mvp.priocode, dv_mvp, dv[idx1], ownship.vs[idx1],
+                                     intruder.vs[idx2])
+        else:
+            dv_mvp[2] = 0.5 * dv_mvp[2]
+            dv[idx1] = dv[idx1] - dv_mvp
+        if mvp.noresoac[idx2]:
+            dv[idx1] = dv[idx1] + dv_mvp
+        if mvp.resooffac[idx1]:
+            dv[idx1] = 0.0
+    return dv, timesolveV
+
+
+def conflict_mix(npairs, seed):
+    """
+    Random pairs of crossing, overtaking, vertical and same-altitude
+    climbing conflicts.
+    """
+    rng = np.random.default_rng(seed)
+    lat, lon, alt, trk, gs, vs = ([] for _ in range(6))
+    for i in range(npairs):
+        kind = i % 4
+        lat0, lon0 = 52.0 + 0.5 * (i // 20), 4.0 + 0.5 * (i % 20)
+        alt0 = rng.uniform(3000.0, 9000.0)
+        trk0 = rng.uniform(0.0, 360.0)
+        gs0 = rng.uniform(100.0, 250.0)
+        if kind == 0:
+            # Crossing: the intruder flies towards the ownship position
+            # at the time the ownship gets there
+            angle = rng.uniform(30.0, 150.0) * rng.choice([-1.0, 1.0])
+            t = rng.uniform(60.0, 200.0)
+            trk1 = trk0 + angle
+            gs1 = rng.uniform(100.0, 250.0)
+            dn = gs0 * t * np.cos(np.radians(trk0)) - gs1 * t * np.cos(np.radians(trk1))
+            de = gs0 * t * np.sin(np.radians(trk0)) - gs1 * t * np.sin(np.radians(trk1))
+            dalt, vs1, vs2 = rng.uniform(-50.0, 50.0), 0.0, rng.choice([0.0, 2.0])
+        elif kind == 1:
+            # Overtaking: a faster intruder behind the ownship
+            trk1, gs1 = trk0 + rng.uniform(-5.0, 5.0), gs0 + rng.uniform(30.0, 60.0)
+            d = -rng.uniform(5000.0, 15000.0)
+            dn, de = d * np.cos(np.radians(trk0)), d * np.sin(np.radians(trk0))
+            dalt, vs1, vs2 = rng.uniform(-50.0, 50.0), rng.choice([0.0, -3.0]), 0.0
+        elif kind == 2:
+            # Vertical: nearly the same horizontal velocity, closing vertically
+            trk1, gs1 = trk0, gs0 + rng.uniform(1.0, 5.0)
+            dn, de = rng.uniform(-500.0, 500.0, 2)
+            dalt = rng.choice([-1.0, 1.0]) * rng.uniform(400.0, 800.0)
+            vs1, vs2 = np.sign(dalt) * rng.uniform(2.0, 8.0), rng.choice([0.0, -np.sign(dalt) * 3.0])
+        else:
+            # Same altitude, head-on or crossing, with a climbing ownship
+            trk1, gs1 = trk0 + rng.uniform(150.0, 210.0), rng.uniform(100.0, 250.0)
+            d = rng.uniform(10000.0, 30000.0)
+            dn, de = d * np.cos(np.radians(trk0)), d * np.sin(np.radians(trk0))
+            dalt, vs1, vs2 = 0.0, rng.uniform(2.0, 8.0), 0.0
+        lat += [lat0, lat0 + np.degrees(dn / 6371000.0)]
+        lon += [lon0, lon0 + np.degrees(de / 6371000.0 / np.cos(np.radians(lat0)))]
+        alt += [alt0, alt0 + dalt]
+        trk += [trk0 % 360.0, trk1 % 360.0]
+        gs += [gs0, gs1]
+        vs += [vs1, vs2]
+
+    ntraf = 2 * npairs
+    traf = SimpleNamespace(ntraf=ntraf, id=[f'AC{i}' for i in range(ntraf)], lat=np.array(lat),
+                           lon=np.array(lon), alt=np.array(alt), trk=np.array(trk),
+                           gs=np.array(gs), vs=np.array(vs))
+    traf.gseast = traf.gs * np.sin(np.radians(traf.trk))
+    traf.gsnorth = traf.gs * np.cos(np.radians(traf.trk))
+    traf.id2idx = lambda acids: np.array([traf.id.index(acid) for acid in acids])
+    traf.perf = SimpleNamespace(vmin=np.full(ntraf, 50.0), vmax=np.full(ntraf, 300.0),
+                                vsmin=np.full(ntraf, -20.0), vsmax=np.full(ntraf, 20.0))
+    traf.ap = SimpleNamespace(vs=traf.vs)
+    traf.selalt = traf.alt + rng.choice([-1000.0, 0.0, 1000.0], ntraf)
+    return traf
+
+
+@pytest.mark.filterwarnings('error::RuntimeWarning')
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('priocode', ['', 'FF1', 'FF2', 'FF3', 'LAY1', 'LAY2'])
+def test_mvp_random(seed, priocode):
+    """
+    Vectorized MVP should be identical to the per-pair implementation,
+    for crossing, overtaking and vertical conflicts, and in all resolution
+    modes, without floating point warnings.
+    """
+    traf = conflict_mix(200, seed)
+    rpz, hpz, dtlookahead = detect_args(traf)
+    result = detect(StateBased, traf)
+    conf = SimpleNamespace(confpairs=result[0], qdr=result[4], dist=result[5],
+                           tcpa=result[7], tLOS=result[8], rpz=rpz, hpz=hpz,
+                           dtlookahead=dtlookahead)
+    assert len(conf.confpairs) > 200
+
+    rng = np.random.default_rng(seed)
+    mvp = MVP.__new__(MVP)
+    mvp.swprio, mvp.priocode = bool(priocode), priocode
+    mvp.resofach, mvp.resofacv = 1.05, 1.1
+    mvp.noresoac = rng.random(traf.ntraf) < 0.1
+    # Same-altitude climbing pairs have an infinite vertical resolution,
+    # which gives NaN when it is added back for a noreso intruder
+    mvp.noresoac[6::8] = mvp.noresoac[7::8] = False
+    mvp.resooffac = rng.random(traf.ntraf) < 0.1
+    with np.errstate(all='ignore'):
+        dv, timesolveV = ref_resolve(mvp, conf, traf, traf)
+    newv = np.array([traf.gseast, traf.gsnorth, traf.vs]) + dv.T
+    for horiz, spd, hdg, vert in ((True, False, False, False), (True, True, False, False),
+                                  (True, False, True, False), (False, False, False, True),
+                                  (False, False, False, False)):
+        mvp.swresohoriz, mvp.swresospd, mvp.swresohdg, mvp.swresovert = horiz, spd, hdg, vert
+        trk, gs, vs, alt = mvp.resolve(conf, traf, traf)
+
+        # Horizontal and vertical resolutions follow from the reference
+        # resolution vectors as in resolve()
+        reftrk = (np.arctan2(newv[0], newv[1]) * 180 / np.pi) % 360
+        refgs = np.sqrt(newv[0]**2 + newv[1]**2)
+        refvs = newv[2]
+        if horiz and spd and not hdg:
+            reftrk, refvs = traf.trk, traf.vs
+        elif horiz and hdg and not spd:
+            refgs, refvs = traf.gs, traf.vs
+        elif horiz:
+            refvs = traf.vs
+        elif vert:
+            reftrk, refgs = traf.trk, traf.gs
+        np.testing.assert_array_equal(trk, reftrk)
+        np.testing.assert_array_equal(gs, np.maximum(traf.perf.vmin, np.minimum(traf.perf.vmax, refgs)))
+        refvs = np.maximum(traf.perf.vsmin, np.minimum(traf.perf.vsmax, refvs))
+        np.testing.assert_array_equal(vs, refvs)
+        if not horiz:
+            # The altitude follows from the vertical solve times
+            asasalt = refvs * timesolveV + traf.alt
+            changed = np.logical_and(timesolveV < dtlookahead, np.abs(dv[:, 2]) > 0.0)
+            np.testing.assert_array_equal(alt[changed], asasalt[changed])
+
+
+def test_ssd_workers():
+    """
+    SSD resolutions should not depend on the number of worker processes.
+    The worker pool is shut down when another CR method is selected.
+    """
+    pytest.importorskip('pyclipper')
+    from bluesky.plugins.asas.ssd import SSD
+    traf = random_traffic(80, span=0.5)
+    traf.hdg = traf.trk
+    traf.gseast = traf.gs * np.sin(np.radians(traf.trk))
+    traf.gsnorth = traf.gs * np.cos(np.radians(traf.trk))
+    traf.ap = SimpleNamespace(tas=traf.gs, trk=(traf.trk + 10.0) % 360.0)
+    traf.perf = SimpleNamespace(vmin=np.full(80, 70.0), vmax=np.full(80, 260.0))
+    traf.selalt = traf.alt
+    rpz, _, _ = detect_args(traf)
+    inconf = detect(StateBased, traf)[2]
+    assert np.any(inconf)
+
+    resolver = SSD.__new__(SSD)
+    resolver.pool = None
+    resolver.swprio, resolver.resofach = True, 1.05
+    for priocode in ('RS1', 'RS6', 'RS7'):
+        resolver.priocode = priocode
+        results = []
+        for nworkers in (1, 2):
+            resolver.setnworkers(nworkers)
+            conf = SimpleNamespace(inconf=inconf, rpz=rpz)
+            results.append(resolver.resolve(conf, traf, traf))
+        for single, multi in zip(*results):
+            np.testing.assert_array_equal(multi, single)
+    assert resolver.pool is not None
+    resolver.deactivate()
+    assert resolver.pool is None
+
+
+def ssd_acdata(lat, lon, trk):
+    """ SSD input data of aircraft at lat, lon flying trk at 200 m/s. """
+    ntraf = len(lat)
+    gs = np.full(ntraf, 200.0)
+    return dict(lat=np.asarray(lat), lon=np.asarray(lon), hdg=np.asarray(trk),
+                gseast=gs * np.sin(np.radians(trk)), gsnorth=gs * np.cos(np.radians(trk)),
+                gs_ap=gs, apeast=gs * np.sin(np.radians(trk)), apnorth=gs * np.cos(np.radians(trk)),
+                vmin=np.full(ntraf, 70.0), vmax=np.full(ntraf, 260.0),
+                hsepm=np.full(ntraf, 5.0 * nm * 1.05))
+
+
+@pytest.mark.parametrize('lat, lon, trk', [
+    ([52.0], [4.0], [90.0]),
+    # The other aircraft is beyond ADS-B range
+    ([52.0, 54.0], [4.0, 4.0], [0.0, 180.0])])
+def test_ssd_free(lat, lon, trk):
+    """
+    Without other aircraft in range, the whole velocity ring is allowed.
+    """
+    pytest.importorskip('pyclipper')
+    from bluesky.plugins.asas.ssd import construct
+    for priocode in ('RS1', 'RS2', 'RS6'):
+        for FRV, ARV, ARV_calc, FRV_area, ARV_area, *_ in \
+                construct(ssd_acdata(lat, lon, trk), priocode, np.arange(len(lat))):
+            assert FRV == [] and FRV_area == 0
+            assert len(ARV) == 2 and ARV_calc == ARV
+            np.testing.assert_allclose(ARV_area, np.pi * (260.0**2 - 70.0**2))
+    # An aircraft in conflict does have forbidden velocities
+    FRV, ARV, _, FRV_area, _, *_ = construct(ssd_acdata([52.0, 52.5], [4.0, 4.0], [0.0, 180.0]),
+                                             'RS1', np.array([0]))[0]
+    assert len(FRV) > 0 and FRV_area > 0
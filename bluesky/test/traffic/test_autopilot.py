@@ -0,0 +1,422 @@
+"""
+Tests the vectorized waypoint switching of the autopilot (wppassingcheck,
+ComputeVNAV, setspeedforRTA and ActiveWaypoint.calcturn) against the
+scalar, per aircraft implementation it replaced, on a random traffic mix.
+"""
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky import stack
+from bluesky.stack.stackbase import Stack
+from bluesky.tools import geo
+from bluesky.tools.aero import ft, nm, g0, vcas2tas, vtas2cas
+from bluesky.tools.misc import degto180
+from bluesky.traffic.autopilot import calcvrta
+from bluesky.traffic.route import Route
+
+
+# Scalar reference implementation: the per aircraft autopilot functions as
+# they were before vectorization. The speed conversions use the vectorized
+# atmosphere, as the scalar one in aero differs from it by up to 1e-4.
+def ref_calcturn(actwp, acidx, tas, wpqdr, next_wpqdr, turnbank, turnrad, turnspd, turnhdgr,
+                 flyturn, flyby):
+    ''' ActiveWaypoint.calcturn for scalars. '''
+    num_defined_values = sum([turnbank > 0, turnrad > 0, turnspd > 0, turnhdgr > 0])
+    if num_defined_values == 0 or not flyturn:
+        turnbank = np.rad2deg(bs.traf.ap.bankdef[acidx])
+        turnspd = tas
+        turnrad = turnspd**2/(g0*np.tan(np.deg2rad(turnbank)))
+        if not flyby:
+            return 0, turnrad, turnspd, turnbank, turnhdgr
+    elif num_defined_values == 1:
+        if turnspd > 0:
+            turnbank = 25
+            turnrad = turnspd**2/(g0*np.tan(np.deg2rad(turnbank)))
+        elif turnrad > 0:
+            turnspd = tas
+            turnbank = np.arctan(turnspd**2/(turnrad * g0))
+        elif turnbank > 0:
+            turnspd = tas
+            turnrad = turnspd**2 / (g0 * np.tan(np.deg2rad(turnbank)))
+        elif turnhdgr > 0:
+            turnspd = tas
+            turnbank = np.arctan(turnhdgr*turnspd/g0)
+            turnrad = turnspd / turnhdgr
+    elif num_defined_values == 2:
+        if turnrad > 0 and turnbank > 0:
+            turnspd = np.sqrt(g0*turnrad*np.tan(np.deg2rad(turnbank)))
+        elif turnrad > 0 and turnspd > 0:
+            turnbank = np.arctan(turnspd**2/(turnrad*g0))
+        elif turnspd > 0 and turnbank > 0:
+            turnrad = turnspd**2/(g0*np.tan(np.deg2rad(turnbank)))
+        elif turnhdgr > 0 and turnspd > 0:
+            turnbank = np.arctan(turnhdgr*turnspd/g0)
+            turnrad = turnspd / turnhdgr
+        elif turnhdgr > 0 and turnbank > 0:
+            turnspd = g0*np.tan(np.deg2rad(turnbank))/turnhdgr
+            turnrad = turnspd / turnhdgr
+        elif turnhdgr > 0 and turnrad > 0:
+            turnspd = turnhdgr * turnrad
+            turnbank = np.arctan(turnhdgr*turnspd/g0)
+
+    turndist = np.abs(turnrad * np.tan(np.radians(0.5 * np.abs(degto180(wpqdr % 360. - next_wpqdr % 360.)))))
+    return turndist, turnrad, turnspd, turnbank, turnhdgr
+
+
+def ref_setspeedforRTA(ap, idx, torta, xtorta):
+    ''' Autopilot.setspeedforRTA for one aircraft. '''
+    if torta < -90.:
+        return False
+    deltime = torta - bs.sim.simt
+    if deltime > 0:
+        gsrta = calcvrta(bs.traf.gs[idx], xtorta, deltime, bs.traf.perf.axmax[idx])
+        tailwind = (bs.traf.windnorth[idx]*bs.traf.gsnorth[idx] +
+                    bs.traf.windeast[idx]*bs.traf.gseast[idx]) / bs.traf.gs[idx]
+        rtacas = vtas2cas(gsrta - tailwind, bs.traf.alt[idx])
+        if bs.traf.actwp.spdcon[idx] < 0. and bs.traf.swvnavspd[idx]:
+            bs.traf.actwp.spd[idx] = rtacas
+        return rtacas
+    return False
+
+
+def ref_ComputeVNAV(ap, idx, toalt, xtoalt, torta, xtorta):
+    ''' Autopilot.ComputeVNAV for one aircraft. '''
+    ref_setspeedforRTA(ap, idx, torta, xtorta + ap.dist2wp[idx])
+
+    if toalt < 0 or not bs.traf.swvnav[idx]:
+        ap.dist2vs[idx] = -999999.
+        return
+
+    epsalt = 2.*ft
+    if bs.traf.alt[idx] > toalt + epsalt:
+        if bs.traf.vs[idx] > 0.0001:
+            ap.vnavvs[idx] = 0.0
+            ap.alt[idx] = bs.traf.alt[idx]
+            if bs.traf.swvnav[idx]:
+                bs.traf.selalt[idx] = bs.traf.alt[idx]
+
+        bs.traf.actwp.nextaltco[idx] = toalt
+        bs.traf.actwp.xtoalt[idx] = xtoalt
+
+        if ap.swtod[idx]:
+            ap.dist2wp[idx] = nm*geo.kwikdist(bs.traf.lat[idx], bs.traf.lon[idx],
+                                              bs.traf.actwp.lat[idx], bs.traf.actwp.lon[idx])
+            descdist = abs(bs.traf.alt[idx] - toalt) / ap.steepness
+            ap.dist2vs[idx] = descdist - xtoalt
+
+            if ap.dist2wp[idx] - 1.02*bs.traf.actwp.turndist[idx] < ap.dist2vs[idx]:
+                ap.alt[idx] = bs.traf.actwp.nextaltco[idx]
+                t2go = ap.dist2wp[idx]/max(0.01, bs.traf.gs[idx])
+                bs.traf.actwp.vs[idx] = (bs.traf.alt[idx]-toalt)/max(0.01, t2go)
+            elif xtoalt < descdist:
+                bs.traf.actwp.vs[idx] = -abs(ap.steepness) * (bs.traf.gs[idx] +
+                                                              (bs.traf.gs[idx] < 0.2 * bs.traf.tas[idx]) *
+                                                              bs.traf.tas[idx])
+            else:
+                bs.traf.actwp.vs[idx] = 0.0
+        else:
+            steepness_ = (bs.traf.alt[idx]-bs.traf.actwp.nextaltco[idx])/(max(0.01, ap.dist2wp[idx]+xtoalt))
+            bs.traf.actwp.vs[idx] = -abs(steepness_) * (bs.traf.gs[idx] +
+                                                        (bs.traf.gs[idx] < 0.2 * bs.traf.tas[idx]) *
+                                                        bs.traf.tas[idx])
+            ap.dist2vs[idx] = 99999.
+
+    elif bs.traf.alt[idx] < toalt - 9.9 * ft:
+        if bs.traf.vs[idx] < -0.0001:
+            ap.vnavvs[idx] = 0.0
+            ap.alt[idx] = bs.traf.alt[idx]
+            if bs.traf.swvnav[idx]:
+                bs.traf.selalt[idx] = bs.traf.alt[idx]
+
+        bs.traf.actwp.nextaltco[idx] = toalt
+        bs.traf.actwp.xtoalt[idx] = xtoalt
+        ap.alt[idx] = bs.traf.actwp.nextaltco[idx]
+        ap.dist2vs[idx] = 99999.
+
+        t2go = max(0.1, ap.dist2wp[idx]+xtoalt) / max(0.01, bs.traf.gs[idx])
+        if ap.swtoc[idx]:
+            steepness_ = ap.steepness
+        else:
+            steepness_ = (bs.traf.alt[idx] - bs.traf.actwp.nextaltco[idx]) / (max(0.01, ap.dist2wp[idx] + xtoalt))
+
+        bs.traf.actwp.vs[idx] = np.maximum(steepness_*bs.traf.gs[idx],
+                                           (bs.traf.actwp.nextaltco[idx] - bs.traf.alt[idx]) / t2go)
+    else:
+        ap.dist2vs[idx] = -999.
+
+
+def ref_switchwp(ap, idxreached, qdr):
+    ''' The waypoint switching loop of Autopilot.wppassingcheck, per aircraft
+        that reached its active waypoint. '''
+    actwp = bs.traf.actwp
+    for i in idxreached:
+        actwp.spd[i] = actwp.nextspd[i]
+        actwp.spdcon[i] = actwp.nextspd[i]
+        ap.route[i].runactwpstack()
+
+        if not actwp.swlastwp[i]:
+            lat, lon, alt, actwp.nextspd[i], actwp.xtoalt[i], toalt, \
+                actwp.xtorta[i], actwp.torta[i], lnavon, flyby, flyturn, turnrad, turnspd, \
+                turnhdgr, turnbank, actwp.next_qdr[i], actwp.swlastwp[i] = ap.route[i].getnextwp()
+
+            actwp.nextturnlat[i], actwp.nextturnlon[i], actwp.nextturnspd[i], \
+                actwp.nextturnrad[i], actwp.nextturnhdgr[i], actwp.nextturnidx[i] = \
+                ap.route[i].getnextturnwp()
+        else:
+            bs.traf.swlnav[i] = False
+            bs.traf.swvnav[i] = False
+            bs.traf.swvnavspd[i] = False
+            continue
+
+        if not lnavon and bs.traf.swlnav[i]:
+            bs.traf.swlnav[i] = False
+            if bs.traf.swvnavspd[i] and actwp.nextspd[i] >= 0.0:
+                bs.traf.selspd[i] = actwp.nextspd[i]
+
+        bs.traf.swvnav[i] = bs.traf.swvnav[i] and bs.traf.swlnav[i]
+
+        actwp.lat[i] = lat
+        actwp.lon[i] = lon
+        actwp.flyby[i] = int(flyby)
+
+        qdr[i], distnmi = geo.qdrdist(bs.traf.lat[i], bs.traf.lon[i], actwp.lat[i], actwp.lon[i])
+        ap.dist2wp[i] = distnmi*nm
+        actwp.curlegdir[i] = qdr[i]
+        actwp.curleglen[i] = ap.dist2wp[i]
+
+        if alt >= -0.01:
+            actwp.nextaltco[i] = alt
+            actwp.xtoalt[i] = 0.0
+        else:
+            actwp.nextaltco[i] = toalt
+
+        if bs.traf.swvnavspd[i] and actwp.spd[i] >= 0.0:
+            bs.traf.selspd[i] = actwp.spd[i]
+
+        local_next_qdr = qdr[i] if actwp.next_qdr[i] < -900. else actwp.next_qdr[i]
+
+        actwp.turndist[i], turnrad, turnspd, turnbank, turnhdgr = \
+            ref_calcturn(actwp, i, bs.traf.tas[i], qdr[i], local_next_qdr, turnbank,
+                         turnrad, turnspd, turnhdgr, flyturn, flyby)
+
+        actwp.oldturnspd[i] = actwp.turnspd[i]
+        actwp.flyturn[i] = flyturn
+        actwp.turnrad[i] = turnrad
+        actwp.turnspd[i] = turnspd
+        actwp.turnhdgr[i] = turnhdgr
+        ap.turnphi[i] = np.deg2rad(turnbank)
+
+        actwp.turnfromlastwp[i] = actwp.turntonextwp[i]
+        actwp.turntonextwp[i] = False
+
+        if actwp.flyturn[i]:
+            actwp.turnspd[i] = turnspd
+        else:
+            actwp.turnspd[i] = -990.
+
+        if actwp.flyturn[i] and actwp.turnrad[i] < 0.0 and actwp.turnspd[i] >= 0.:
+            turntas = vcas2tas(actwp.turnspd[i], bs.traf.alt[i])
+            actwp.turndist[i] = actwp.turndist[i]*turntas*turntas/(bs.traf.tas[i]*bs.traf.tas[i])
+
+        ref_ComputeVNAV(ap, i, toalt, actwp.xtoalt[i], actwp.torta[i], actwp.xtorta[i])
+
+
+# Saving and comparing the simulation state
+def getstate():
+    ''' Copies of all traffic arrays and of the route store. '''
+    state = dict()
+
+    def addarrays(obj, prefix):
+        for name in obj._ArrVars:
+            state[prefix + name] = getattr(obj, name).copy()
+        for name in obj._LstVars:
+            state[prefix + name] = list(getattr(obj, name))
+        for child in obj._children:
+            addarrays(child, prefix + type(child).__name__ + '.')
+
+    addarrays(bs.traf, '')
+    store = Route.store
+    for name, column in store.data.items():
+        state['store.' + name] = column[:store.nrows].copy()
+    for name in ('start', 'count', 'iactwp', 'landed', 'stale', 'redirect'):
+        state['store.' + name] = getattr(store, name).copy()
+    state['stack'] = [line for line, _ in Stack.cmdstack]
+    return state
+
+
+def setstate(state):
+    ''' Restore the traffic arrays and route store from getstate(). '''
+    def setarrays(obj, prefix):
+        for name in obj._ArrVars:
+            setattr(obj, name, state[prefix + name].copy())
+        for name in obj._LstVars:
+            setattr(obj, name, list(state[prefix + name]))
+        for child in obj._children:
+            setarrays(child, prefix + type(child).__name__ + '.')
+
+    setarrays(bs.traf, '')
+    store = Route.store
+    for name, column in store.data.items():
+        column[:store.nrows] = state['store.' + name]
+    for name in ('start', 'count', 'iactwp', 'landed', 'stale', 'redirect'):
+        getattr(store, name)[:] = state['store.' + name]
+    Stack.cmdstack.clear()
+    Stack.cmdstack.extend((line, None) for line in state['stack'])
+
+
+def assert_same_state(state, ref):
+    ''' Compare two states from getstate(). '''
+    assert state.keys() == ref.keys()
+    for name, values in state.items():
+        refvalues = ref[name]
+        if isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+            np.testing.assert_allclose(values, refvalues, rtol=1e-9, atol=1e-9, err_msg=name)
+        elif isinstance(values, np.ndarray):
+            np.testing.assert_array_equal(values, refvalues, err_msg=name)
+        else:
+            assert values == refvalues, name
+
+
+# Random traffic mix
+def command(*lines):
+    ''' Execute stack commands. '''
+    for line in lines:
+        stack.stack(line)
+    stack.process()
+
+
+def create_traffic(rng, n=60):
+    ''' Aircraft with random routes: with and without altitude and speed
+        constraints, RTA waypoints, flyturn waypoints with turn data, and
+        aircraft flying to their last waypoint. '''
+    bs.sim.reset()
+    for k in range(n):
+        acid = f'AC{k:03d}'
+        lat, lon = rng.uniform(51.5, 53.0), rng.uniform(3.5, 6.5)
+        command(f'CRE {acid} B738 {lat:.4f} {lon:.4f} {rng.uniform(0, 360):.1f} '
+                f'FL{rng.integers(50, 350)} {rng.integers(200, 300)}')
+        for _ in range(rng.integers(1, 7)):
+            lines = []
+            mode = rng.random()
+            if mode < 0.15:
+                lines.append(f'ADDWPT {acid} FLYTURN')
+                for turnvar, value in ((' TURNSPD', '180'), (' TURNRAD', '2'),
+                                       (' TURNBANK', '30'), (' TURNHDG', '3')):
+                    if rng.random() < 0.4:
+                        lines.append(f'ADDWPT {acid}{turnvar} {value}')
+            elif mode < 0.25:
+                lines.append(f'ADDWPT {acid} FLYOVER')
+            elif mode < 0.5:
+                lines.append(f'ADDWPT {acid} FLYBY')
+            alt = f'FL{rng.integers(30, 350)}' if rng.random() < 0.5 else ''
+            spd = f'{rng.integers(180, 300)}' if rng.random() < 0.4 else ''
+            lat += rng.uniform(-0.3, 0.3)
+            lon += rng.uniform(-0.3, 0.3)
+            lines.append(f'ADDWPT {acid},{lat:.4f},{lon:.4f},{alt},{spd}')
+            command(*lines)
+
+        acrte = bs.traf.ap.route[k]
+        if rng.random() < 0.3:
+            wpname = acrte.wpname[rng.integers(acrte.nwp)]
+            command(f'RTA {acid} {wpname} {rng.uniform(-100., 2000.):.1f}')
+        if rng.random() < 0.3:
+            command(f'VNAV {acid} ON')
+        if rng.random() < 0.2:
+            command(f'SWTOD {acid} OFF')
+        if rng.random() < 0.2:
+            command(f'DIRECT {acid} {acrte.wpname[-1]}')
+
+    # Fly a while, so the aircraft are spread over their legs
+    bs.sim.op()
+    for _ in range(rng.integers(0, 1200)):
+        bs.sim.step()
+
+
+@pytest.fixture
+def traffic_mix(traffic_):
+    ''' Random traffic mixes, which are removed after the test. '''
+    yield create_traffic
+    bs.sim.reset()
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_wppassingcheck(traffic_mix, monkeypatch, seed):
+    ''' Switch to the next waypoint for random aircraft at once, and one by
+        one with the scalar implementation. '''
+    rng = np.random.default_rng(seed)
+    traffic_mix(rng)
+    ap, actwp = bs.traf.ap, bs.traf.actwp
+    idxreached = np.flatnonzero(rng.random(bs.traf.ntraf) < 0.6)
+    qdr, dist = geo.qdrdist(bs.traf.lat, bs.traf.lon, actwp.lat, actwp.lon)
+
+    state = getstate()
+    monkeypatch.setitem(vars(actwp), 'reached', lambda qdr, dist: idxreached)
+    ap.wppassingcheck(qdr.copy(), dist * nm)
+    result = getstate()
+
+    # Scalar implementation, followed by the unchanged rest of wppassingcheck
+    setstate(state)
+    refqdr = qdr.copy()
+    ref_switchwp(ap, idxreached, refqdr)
+    monkeypatch.setitem(vars(actwp), 'reached', lambda qdr, dist: np.array([], dtype=int))
+    ap.wppassingcheck(refqdr, dist * nm)
+    assert_same_state(result, getstate())
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_computevnav(traffic_mix, seed):
+    ''' VNAV and RTA speed for random aircraft and constraints at once, and
+        one by one with the scalar implementation. '''
+    rng = np.random.default_rng(seed)
+    traffic_mix(rng)
+    n = bs.traf.ntraf
+    idx = np.flatnonzero(rng.random(n) < 0.7)
+    toalt = np.where(rng.random(len(idx)) < 0.8, rng.uniform(0., 12000., len(idx)), -999.)
+    xtoalt = rng.uniform(0., 50., len(idx)) * nm * (rng.random(len(idx)) < 0.7)
+    torta = np.where(rng.random(len(idx)) < 0.5, rng.uniform(-100., 2000., len(idx)), -999.)
+    xtorta = rng.uniform(0., 50., len(idx)) * nm
+
+    state = getstate()
+    bs.traf.ap.ComputeVNAV(idx, toalt, xtoalt, torta, xtorta)
+    result = getstate()
+
+    setstate(state)
+    for args in zip(idx, toalt, xtoalt, torta, xtorta):
+        ref_ComputeVNAV(bs.traf.ap, *args)
+    assert_same_state(result, getstate())
+
+    # A single aircraft
+    setstate(state)
+    bs.traf.ap.ComputeVNAV(idx[0], toalt[0], xtoalt[0], torta[0], xtorta[0])
+    result = getstate()
+    setstate(state)
+    ref_ComputeVNAV(bs.traf.ap, idx[0], toalt[0], xtoalt[0], torta[0], xtorta[0])
+    assert_same_state(result, getstate())
+
+
+def test_calcturn(traffic_mix):
+    ''' Turn data for all combinations of given turn data at once, and one
+        by one with the scalar implementation. '''
+    rng = np.random.default_rng(1)
+    traffic_mix(rng, 20)
+    n = 500
+    idx = rng.integers(bs.traf.ntraf, size=n)
+    tas = rng.uniform(50., 250., n)
+    wpqdr, next_wpqdr = rng.uniform(-180., 360., (2, n))
+    turnbank, turnrad, turnspd, turnhdgr = (
+        np.where(rng.random(n) < 0.4, rng.uniform(low, high, n), -999.)
+        for low, high in ((10., 35.), (500., 5000.), (60., 150.), (1., 5.)))
+    flyturn, flyby = rng.random((2, n)) < 0.5
+
+    result = bs.traf.actwp.calcturn(idx, tas, wpqdr, next_wpqdr, turnbank, turnrad,
+                                    turnspd, turnhdgr, flyturn, flyby)
+    for k in range(n):
+        ref = ref_calcturn(bs.traf.actwp, idx[k], tas[k], wpqdr[k], next_wpqdr[k], turnbank[k],
+                           turnrad[k], turnspd[k], turnhdgr[k], flyturn[k], flyby[k])
+        assert np.allclose([values[k] for values in result], ref, rtol=1e-12), k
+
+        # Scalar arguments give scalar results
+        assert np.allclose(bs.traf.actwp.calcturn(idx[k], tas[k], wpqdr[k], next_wpqdr[k],
+                                                  turnbank[k], turnrad[k], turnspd[k],
+                                                  turnhdgr[k], flyturn[k], flyby[k]), ref, rtol=1e-12)
@@ -0,0 +1,68 @@
+"""
+Tests the per-step cache of quantities derived from the traffic state.
+"""
+from types import SimpleNamespace
+import numpy as np
+
+from bluesky.tools.aerotable import vatmos, vvsound
+from bluesky.traffic.derivedstate import DerivedState, derivedstate
+
+
+def traffic(n=50, seed=1):
+    rng = np.random.default_rng(seed)
+    return SimpleNamespace(lat=rng.uniform(-80.0, 80.0, n), trk=rng.uniform(0.0, 360.0, n),
+                           hdg=rng.uniform(0.0, 360.0, n), alt=rng.uniform(0.0, 15000.0, n),
+                           tas=rng.uniform(50.0, 250.0, n), gs=rng.uniform(50.0, 250.0, n),
+                           vs=rng.uniform(-10.0, 10.0, n))
+
+
+def test_values():
+    """ Cached quantities equal the directly computed ones. """
+    traf = traffic()
+    derived = DerivedState(traf)
+    assert np.array_equal(derived.coslat, np.cos(np.radians(traf.lat)))
+    assert np.array_equal(derived.sinhdg, np.sin(np.radians(traf.hdg)))
+    veast, vnorth, vup = derived.enu
+    assert np.array_equal(veast, traf.gs * np.sin(np.radians(traf.trk)))
+    assert np.array_equal(vnorth, traf.gs * np.cos(np.radians(traf.trk)))
+    assert vup is traf.vs
+    p, rho, temp = vatmos(traf.alt)
+    assert np.array_equal(derived.p, p) and np.array_equal(derived.rho, rho)
+    assert np.array_equal(derived.temp, temp)
+    assert np.array_equal(derived.vsound, vvsound(traf.alt))
+
+
+def test_reuse():
+    """ Quantities are computed once per step, unless their source array
+        is replaced, and shared between sources that are the same array. """
+    traf = traffic()
+    derived = DerivedState(traf)
+    sintrk = derived.sintrk
+    assert derived.sintrk is sintrk and derived.costrk is derived.costrk
+
+    traf.trk = traf.trk + 1.0
+    assert derived.sintrk is not sintrk
+    assert np.array_equal(derived.sintrk, np.sin(np.radians(traf.trk)))
+
+    traf.trk = traf.hdg
+    assert derived.sintrk is derived.sinhdg
+    assert derived.gsvel is not derived.tasvel
+    traf.gs = traf.tas
+    assert derived.gsvel is derived.tasvel
+
+    # Changes in place are only seen after a new step
+    rho = derived.rho
+    traf.alt[:] = 0.0
+    assert derived.rho is rho
+    derived.newstep()
+    assert derived.step == 1 and np.all(derived.rho == 1.225)
+
+
+def test_derivedstate():
+    """ Traffic uses its own cache, other aircraft data an uncached one. """
+    traf = traffic()
+    traf.derived = DerivedState(traf)
+    assert derivedstate(traf) is traf.derived
+    adsb = traffic(seed=2)
+    assert derivedstate(adsb) is not derivedstate(adsb)
+    assert np.array_equal(derivedstate(adsb).sintrk, np.sin(np.radians(adsb.trk)))
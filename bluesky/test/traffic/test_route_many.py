@@ -0,0 +1,141 @@
+"""
+Tests the loading of many waypoints at once: Route.load_many, the
+FLIGHTPLAN command, txt2pos_many and Navdatabase.getwpidx_many.
+"""
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky import stack
+from bluesky.tools.aero import ft, kts
+from bluesky.tools.position import txt2pos, txt2pos_many
+from bluesky.traffic.route import Route
+from bluesky.traffic.routestore import RouteStore
+
+
+WPTS = ['SPY', 'SUGOL', '52.5,4.2', 'PAM', 'EHRD', '52.0,3.5']
+
+
+def command(*lines):
+    ''' Execute stack commands. '''
+    for line in lines:
+        stack.stack(line)
+    stack.process()
+
+
+def route(acid):
+    ''' The route of aircraft acid. '''
+    return bs.traf.ap.route[bs.traf.id2idx(acid)]
+
+
+def assert_same_route(acid1, acid2):
+    ''' Compare all waypoint columns of the routes of two aircraft, with the
+        call sign in the names of lat/lon waypoints replaced. '''
+    rte1, rte2 = route(acid1), route(acid2)
+    rte1.calcfp()
+    rte2.calcfp()
+    assert rte1.nwp == len(rte1.wpname)
+    assert rte2.nwp == len(rte2.wpname)
+    assert rte2.iactwp == rte1.iactwp
+    for name, (dtype, _) in RouteStore.columns.items():
+        values1, values2 = getattr(rte1, name).tolist(), getattr(rte2, name).tolist()
+        if name == 'wpname':
+            values1 = [v.replace(acid1, 'AC') for v in values1]
+            values2 = [v.replace(acid2, 'AC') for v in values2]
+        if dtype is float:
+            np.testing.assert_allclose(values2, values1, err_msg=name)
+        else:
+            assert values2 == values1, name
+
+
+@pytest.fixture
+def aircraft(traffic_):
+    ''' Two aircraft with the same position, type and orig/dest. '''
+    bs.sim.reset()
+    command('CRE KL001 B738 52.3 4.7 270 FL100 250',
+            'CRE KL002 B738 52.3 4.7 270 FL100 250',
+            'ORIG KL001 EHAM', 'ORIG KL002 EHAM',
+            'DEST KL001 EHGG', 'DEST KL002 EHGG')
+    yield 'KL001', 'KL002'
+    bs.sim.reset()
+
+
+def test_load_many(aircraft):
+    ''' A route loaded at once equals the same route from ADDWPT. '''
+    ac1, ac2 = aircraft
+    command(*(f'ADDWPT {ac1} {wpt}' for wpt in WPTS))
+    Route.load_many([bs.traf.id2idx(ac2)], [WPTS])
+    assert route(ac1).nwp == len(WPTS) + 2
+    assert_same_route(ac1, ac2)
+
+
+def test_load_many_constraints(aircraft):
+    ''' Altitude and speed constraints, appended to an existing route. '''
+    ac1, ac2 = aircraft
+    wpts = ['SUGOL', '52.5,4.2', 'PAM']
+    alts = ['3000', '', 'FL50']
+    spds = ['220', '200', '']
+    command(f'ADDWPT {ac1} SPY', f'ADDWPT {ac2} SPY')
+    command(*(f'ADDWPT {ac1},{wpt},{alt},{spd}' for wpt, alt, spd in zip(wpts, alts, spds)))
+    Route.load_many([bs.traf.id2idx(ac2)], [wpts], [[3000. * ft, -999., 5000. * ft]],
+                    [[220. * kts, 200. * kts, -999.]])
+    assert_same_route(ac1, ac2)
+
+
+def test_load_many_stale_nwp(aircraft):
+    ''' Waypoints are appended after all waypoints in the route store, also
+        when nwp was not updated for a waypoint that was inserted directly. '''
+    ac1, ac2 = aircraft
+    command(f'ADDWPT {ac1} SPY', f'ADDWPT {ac2} SPY')
+    for acid in aircraft:
+        acrte = route(acid)
+        acrte.store.insert(acrte.slot, acrte.nwp - 1, wpname='T/D', wplat=52.2, wplon=4.5,
+                           wptype=Route.calcwp)
+    command(f'ADDWPT {ac1} SUGOL', f'ADDWPT {ac1} PAM')
+    Route.load_many([bs.traf.id2idx(ac2)], [['SUGOL', 'PAM']])
+    assert route(ac2).wpname.tolist() == ['EHAM', 'SPY', 'T/D', 'SUGOL', 'PAM', 'EHGG']
+    assert_same_route(ac1, ac2)
+
+
+def test_flightplan(aircraft):
+    ''' FLIGHTPLAN adds the same waypoints as ADDWPT. '''
+    ac1, ac2 = aircraft
+    command(*(f'ADDWPT {ac1} {wpt}' for wpt in WPTS))
+    command(f'FLIGHTPLAN {ac2} ' + ' '.join(WPTS))
+    assert_same_route(ac1, ac2)
+
+    # Unknown waypoints are skipped
+    bs.sim.reset()
+    command(f'CRE {ac1} B738 52.3 4.7 270 FL100 250')
+    command(f'FLIGHTPLAN {ac1} SPY NOSUCHWPT PAM')
+    assert route(ac1).wpname.tolist() == ['SPY', 'PAM']
+
+
+def test_txt2pos_many(traffic_):
+    ''' Looking up positions at once gives the same as one by one. '''
+    bs.sim.reset()
+    command('CRE KL001 B738 52.3 4.7 270 FL100 250')
+    names = ['SPY', 'sugol', 'EHAM', 'EHAM/RW06', 'EHAM/RWY18R', '52.5,4.2',
+             'N52\'30\'0.0",E004\'12\'0.0"', 'KL001', 'NOSUCHWPT']
+    reflats = np.linspace(51., 53., len(names))
+    reflons = np.linspace(3., 6., len(names))
+    lat, lon, types = txt2pos_many(names, reflats, reflons)
+    assert types[-1] == ''
+    assert types[:4] == ['nav', 'nav', 'apt', 'rwy']
+    for name, reflat, reflon, lat_, lon_, type_ in zip(names, reflats, reflons, lat, lon, types):
+        success, pos = txt2pos(name, reflat, reflon)
+        assert success == (type_ != ''), name
+        if success:
+            assert (lat_, lon_) == pytest.approx((pos.lat, pos.lon)), name
+
+
+def test_getwpidx_many(traffic_):
+    ''' Looking up waypoints at once gives the closest waypoint, as with
+        getwpidx. '''
+    names = ['SPY', 'SUGOL', 'PAM', 'SPY', 'NOSUCHWPT']
+    reflats = [52., 52.5, 51., 10., 52.]
+    reflons = [4., 4., 5., 10., 4.]
+    idx = bs.navdb.getwpidx_many(names, reflats, reflons)
+    assert idx[-1] == -1
+    for name, reflat, reflon, i in zip(names, reflats, reflons, idx):
+        assert i == bs.navdb.getwpidx(name, reflat, reflon), name
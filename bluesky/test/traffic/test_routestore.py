@@ -0,0 +1,159 @@
+"""
+Tests the columnar route store, and its vectorized route lookups against
+routes stored as Python lists.
+"""
+import numpy as np
+
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+from bluesky.traffic.routestore import RouteStore, WaypointColumn
+
+
+def random_edits(store, nroutes=20, nedits=600, seed=1):
+    """
+    Apply random waypoint inserts, deletes and resizes to the routes in store,
+    and to the same routes as lists of (name, lat, flyturn) waypoints.
+    """
+    rng = np.random.default_rng(seed)
+    slots = [store.alloc() for _ in range(nroutes)]
+    routes = [[] for _ in range(nroutes)]
+    for edit in range(nedits):
+        i = rng.integers(nroutes)
+        slot, route = slots[i], routes[i]
+        action = rng.random()
+        if action < 0.7 or not route:
+            idx = int(rng.integers(-len(route) - 1, len(route) + 1))
+            wpt = (f'WP{edit}', rng.uniform(-80.0, 80.0), bool(rng.random() < 0.3))
+            store.insert(slot, idx, wpname=wpt[0], wplat=wpt[1], wpflyturn=wpt[2])
+            route.insert(idx, wpt)
+        elif action < 0.95:
+            idx = int(rng.integers(-len(route), len(route)))
+            store.delete(slot, idx)
+            del route[idx]
+        else:
+            n = int(rng.integers(0, len(route) + 3))
+            store.resize(slot, n)
+            route[n:] = []
+            route.extend(('', 0.0, False) for _ in range(n - len(route)))
+    return slots, routes
+
+
+def check_routes(store, slots, routes):
+    """ Check that the routes in store equal the list routes. """
+    for slot, route in zip(slots, routes):
+        assert WaypointColumn(store, slot, 'wpname') == [wpt[0] for wpt in route]
+        assert WaypointColumn(store, slot, 'wplat') == [wpt[1] for wpt in route]
+        assert WaypointColumn(store, slot, 'wpflyturn') == [wpt[2] for wpt in route]
+        # New waypoints get their own (empty) stack
+        stacks = WaypointColumn(store, slot, 'wpstack').tolist()
+        assert all(stack == [] for stack in stacks)
+        assert len({id(stack) for stack in stacks}) == len(stacks)
+
+    # Rows that do not hold a waypoint keep their default values
+    used = np.zeros(store.nrows, dtype=bool)
+    for slot in slots:
+        start, end = store.segment(slot)
+        used[start:end] = True
+    assert not np.any(store.data['wpflyturn'][:store.nrows][~used])
+    assert all(stack is None for stack in store.data['wpstack'][:store.nrows][~used])
+
+
+def test_store_edits():
+    """ Random edits give the same routes as the list implementation. """
+    store = RouteStore()
+    slots, routes = random_edits(store)
+    check_routes(store, slots, routes)
+    assert store.nunused > 0
+    store.compact()
+    assert store.nunused == 0
+    check_routes(store, slots, routes)
+
+    # Freeing routes makes their slots available again
+    for slot in slots[::2]:
+        store.free(slot)
+    assert store.alloc() in slots[::2]
+
+
+def test_store_lookups():
+    """ Vectorized active waypoint, distance to go and next turn lookups. """
+    store = RouteStore()
+    slots, routes = random_edits(store)
+    slots = np.array(slots)
+    rng = np.random.default_rng(2)
+    lat, lon = rng.uniform(-60.0, 60.0, (2, len(slots)))
+    for slot, route in zip(slots, routes):
+        n = len(route)
+        store.setcolumn(slot, 'wplon', rng.uniform(-180.0, 180.0, n))
+        store.setcolumn(slot, 'wpdistto', rng.uniform(0.0, 100.0, n))
+        store.iactwp[slot] = rng.integers(-1, n + 1)
+
+    rows = store.active(slots)
+    dist2go = store.distance_to_go(slots, lat, lon)
+    turnrows = store.nextturn(slots)
+    for i, slot in enumerate(slots):
+        start, end = store.segment(slot)
+        iactwp = store.iactwp[slot]
+        wplat = WaypointColumn(store, slot, 'wplat')
+        wplon = WaypointColumn(store, slot, 'wplon')
+        wpdistto = WaypointColumn(store, slot, 'wpdistto')
+        flyturn = WaypointColumn(store, slot, 'wpflyturn').tolist()
+        if not 0 <= iactwp < end - start:
+            assert rows[i] == -1 and dist2go[i] == 0.0 and turnrows[i] == -1
+            continue
+        assert rows[i] == start + iactwp
+        _, dist = geo.qdrdist(lat[i], lon[i], wplat[iactwp], wplon[iactwp])
+        assert np.isclose(dist2go[i], (dist + sum(wpdistto[iactwp + 1:])) * nm)
+        turnidx = [j for j in range(iactwp, end - start) if flyturn[j]]
+        assert turnrows[i] == (start + turnidx[0] if turnidx else -1)
+
+
+def test_store_stale():
+    """ Edits mark the first changed waypoint of a route for the flight plan calculation. """
+    store = RouteStore()
+    slot = store.alloc()
+    assert store.stale[slot] == -1
+    store.resize(slot, 5)
+    assert store.stale[slot] == 0
+    store.stale[slot] = -1
+    store.insert(slot, 3, wpname='A')
+    store.setrow(slot, 4, wpalt=1000.)
+    assert store.stale[slot] == 3
+    store.delete(slot, 1)
+    assert store.stale[slot] == 1
+    store.stale[slot] = -1
+    store.resize(slot, 2)
+    assert store.stale[slot] == 2
+
+    # Setting waypoint values through a route column
+    store.resize(slot, 6)
+    store.stale[slot] = -1
+    wpalt = WaypointColumn(store, slot, 'wpalt')
+    wpalt[4] = 1000.
+    assert store.stale[slot] == 4
+    wpalt[-3] = 2000.
+    assert store.stale[slot] == 3
+    store.stale[slot] = -1
+    wpalt[5:1:-2] = [3000., 4000.]
+    assert store.stale[slot] == 3
+    WaypointColumn(store, slot, 'wpstack')[2:4] = [['ECHO A'], ['ECHO B']]
+    assert store.stale[slot] == 2
+    wpalt[6:] = []
+    assert store.stale[slot] == 2
+
+
+def test_store_insertmany():
+    """ Inserting a block of waypoints equals inserting them one by one. """
+    store = RouteStore()
+    slots = [store.alloc() for _ in range(2)]
+    for slot in slots:
+        store.insert(slot, 0, wpname='ORIG', wplat=1.)
+        store.insert(slot, 1, wpname='DEST', wplat=2.)
+    names = [f'WP{i}' for i in range(100)]
+    lats = np.linspace(10., 20., 100)
+    for i, (name, lat) in enumerate(zip(names, lats)):
+        store.insert(slots[0], 1 + i, wpname=name, wplat=lat, wpflyturn=True)
+    store.stale[slots[1]] = -1
+    assert store.insertmany(slots[1], 1, 100, wpname=names, wplat=lats, wpflyturn=True) == 1
+    assert store.stale[slots[1]] == 1
+    check_routes(store, slots, 2 * [[('ORIG', 1., False)] + list(zip(names, lats, 100 * [True]))
+                                    + [('DEST', 2., False)]])
@@ -142,3 +142,53 @@ def test_trafficarrays_reset(t_a):
 
     assert not root.fl_list
     assert not root.children[0].np_array_bool
+
+
+def test_trafficarrays_buffered_create_delete():
+    """
+    Tests that traffic arrays are views of a geometrically growing
+    backing buffer, and that delete also handles arrays that were
+    rebound to other data (or to another traffic array).
+    """
+
+    class BufRoot(TrafficArrays):
+        def __init__(self):
+            super().__init__()
+            TrafficArrays.setroot(self)
+            with self.settrafarrays():
+                self.ids = []
+                self.x = np.array([])
+                self.y = np.array([])
+                self.flag = np.array([], dtype=bool)
+
+    root = BufRoot()
+    for i in range(100):
+        root.create()
+        root.ntraf += 1
+        root.ids[-1] = str(i)
+        root.x[-1] = i
+
+    assert len(root.x) == 100
+    assert root.x.base is root._ArrBufs['x']
+    assert len(root._ArrBufs['x']) >= 100
+    assert root.flag.dtype == bool and not root.flag.any()
+
+    # Rebind y to an alias of x, and flag to a new array
+    root.y = root.x
+    root.flag = root.x > 50.0
+    root.delete(3)
+    assert len(root.x) == len(root.y) == len(root.flag) == 99
+    assert list(root.x[2:5]) == [2.0, 4.0, 5.0]
+    assert list(root.y[2:5]) == [2.0, 4.0, 5.0]
+    assert root.ids[3] == '4'
+
+    root.delete(np.array([0, 1, 98]))
+    assert len(root.x) == len(root.ids) == 96
+    assert root.x[0] == 2.0 and root.x[-1] == 98.0
+    assert root.ids[0] == '2' and root.ids[-1] == '98'
+    assert root.flag.sum() == 48
+
+    # Rebound arrays are copied back into their own buffer on create
+    root.create(2)
+    assert root.y.base is root._ArrBufs['y']
+    assert list(root.y[-3:]) == [98.0, 0.0, 0.0]
@@ -0,0 +1,102 @@
+"""
+Tests time-varying wind from forecast data: decoded slices are cached,
+the next slice is loaded in the background, and wind is interpolated in
+time between the valid times.
+"""
+import datetime
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky.traffic.windforecast import WindForecast
+
+
+T0 = datetime.datetime(2022, 3, 1, 6)
+HOUR = datetime.timedelta(hours=1)
+
+
+class Source:
+    """ Global 1 degree wind data, with a north wind equal to the hours
+        since T0, and an east wind equal to the longitude. """
+    def __init__(self, local=True):
+        self.decoded = []
+        self.local = local
+
+    def decode(self, validtime):
+        self.decoded.append(validtime)
+        lat = np.arange(90.0, -90.5, -1.0)[::-1]
+        lon = np.arange(0.0, 360.0, 1.0)
+        alt = np.array([0.0, 5000.0, 10000.0])
+        shape = (len(alt), len(lat), len(lon))
+        hours = (validtime - T0) / HOUR
+        return dict(lat=lat, lon=lon, alt=alt, vnorth=np.full(shape, hours),
+                    veast=np.broadcast_to(lon, shape).copy())
+
+    def islocal(self, validtime):
+        return self.local
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(bs.settings, 'cache_path', str(tmp_path))
+    return tmp_path
+
+
+def test_forecast(cache_path):
+    source = Source()
+    forecast = WindForecast('test', source.decode, source.islocal)
+    forecast.setarea(50.0, -10.0, 55.0, 10.0)
+    series = forecast.settime(T0 + 1.5 * HOUR)
+    assert series.times == [T0, T0 + 3 * HOUR]
+    assert (series.nlat, series.nlon, series.nalt) == (6, 21, 3)
+
+    vn, ve = series.getdata([52.0, 52.0], [-5.5, 5.5], [1000.0, 1000.0])
+    assert np.allclose(vn, 1.5) and np.allclose(ve, [354.5, 5.5])
+
+    # The slice after the next one is loaded in the background
+    forecast.pending[T0 + 6 * HOUR].result()
+    assert source.decoded == [T0, T0 + 3 * HOUR, T0 + 6 * HOUR]
+    forecast.settime(T0 + 4 * HOUR)
+    assert series.times == [T0, T0 + 3 * HOUR, T0 + 6 * HOUR]
+    assert np.allclose(series.getdata(52.0, 0.0, 1000.0)[0], 4.0)
+    forecast.pending[T0 + 9 * HOUR].result()
+
+    # Decoded slices are cached
+    source = Source(local=False)
+    forecast = WindForecast('test', source.decode, source.islocal)
+    forecast.setarea(50.0, -10.0, 55.0, 10.0)
+    series = forecast.settime(T0 + 7 * HOUR)
+    assert np.allclose(series.getdata(52.0, 0.0, 1000.0)[0], 7.0)
+    assert source.decoded == []
+    # Slices that are not cached or local are not loaded in the background
+    assert T0 + 12 * HOUR not in forecast.pending
+
+
+def test_missing(cache_path):
+    forecast = WindForecast('test', lambda validtime: None, lambda validtime: False)
+    forecast.setarea(50.0, -10.0, 55.0, 10.0)
+    assert forecast.settime(T0) is None
+    assert forecast.missing == {T0}
+
+    source = Source()
+    forecast = WindForecast('test', source.decode, source.islocal)
+    forecast.setarea(-95.0, 0.0, -91.0, 10.0)
+    assert forecast.settime(T0) is None
+
+
+def test_reset(cache_path):
+    source = Source()
+    forecast = WindForecast('test', source.decode, source.islocal)
+    forecast.setarea(50.0, -10.0, 55.0, 10.0)
+    forecast.settime(T0 + 1.5 * HOUR)
+    executor = forecast.executor
+    forecast.reset()
+    assert executor._shutdown
+    assert forecast.area is None and forecast.series is None and not forecast.pending
+
+    # The forecast can be used again after reset
+    forecast.setarea(50.0, -10.0, 55.0, 10.0)
+    series = forecast.settime(T0 + 1.5 * HOUR)
+    assert np.allclose(series.getdata(52.0, 0.0, 1000.0)[0], 1.5)
+    forecast.close()
+    assert forecast.executor._shutdown and not forecast.pending
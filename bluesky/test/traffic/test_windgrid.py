@@ -0,0 +1,114 @@
+"""
+Tests the regular-grid wind field against scipy's grid interpolation and
+the interpolation between wind definitions of the wind field.
+"""
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+from bluesky.tools.aero import ft
+from bluesky.traffic.windfield import Windfield
+from bluesky.traffic.windgrid import WindGrid, WindSeries, memory_estimate
+
+
+LATS = np.arange(40.0, 60.01, 0.5)
+LONS = np.arange(-10.0, 20.01, 0.5)
+ALTS = np.array([0.0, 500.0, 1500.0, 3000.0, 5500.0, 9000.0, 12000.0])
+
+
+def griddata(seed=1):
+    rng = np.random.default_rng(seed)
+    shape = (len(ALTS), len(LATS), len(LONS))
+    return rng.normal(0.0, 20.0, shape), rng.normal(0.0, 20.0, shape)
+
+
+def test_rgi():
+    """ Inside the grid the wind equals scipy's trilinear interpolation. """
+    vnorth, veast = griddata()
+    grid = WindGrid(LATS, LONS, ALTS, vnorth, veast, dtype=np.float64)
+    rng = np.random.default_rng(2)
+    lat = rng.uniform(40.0, 60.0, 1000)
+    lon = rng.uniform(-10.0, 20.0, 1000)
+    alt = rng.uniform(0.0, 12000.0, 1000)
+    # Include the grid points and levels themselves
+    lat[:7], lon[:7], alt[:7] = LATS[:7], LONS[:7], ALTS
+    vn, ve = grid.getdata(lat, lon, alt)
+    points = np.column_stack((alt, lat, lon))
+    assert np.allclose(vn, RegularGridInterpolator((ALTS, LATS, LONS), vnorth)(points))
+    assert np.allclose(ve, RegularGridInterpolator((ALTS, LATS, LONS), veast)(points))
+
+
+def test_outside():
+    """ Fill value outside the lat/lon grid, or the nearest edge without one,
+        and the nearest level above and below the levels. """
+    vnorth, veast = griddata()
+    grid = WindGrid(LATS, LONS, ALTS, vnorth, veast, fill_value=0.0, dtype=np.float64)
+    vn, ve = grid.getdata([30.0, 50.0, 50.0], [0.0, 25.0, -15.0], 1000.0)
+    assert np.all(vn == 0.0) and np.all(ve == 0.0)
+
+    grid.fill_value = None
+    vn, _ = grid.getdata([30.0, 50.0, 50.0, 40.0], [0.0, 25.0, -15.0, 0.0],
+                         [1000.0, 1000.0, 1000.0, 20000.0])
+    expected = grid.getdata([40.0, 50.0, 50.0, 40.0], [0.0, 20.0, -10.0, 0.0],
+                            [1000.0, 1000.0, 1000.0, 12000.0])[0]
+    assert np.allclose(vn, expected)
+    assert np.isclose(grid.getdata(40.0, 0.0, -100.0)[0], vnorth[0, 0, 20])
+
+
+def test_wrap():
+    """ A grid around the world wraps around in longitude. """
+    lons = np.arange(0.0, 360.0, 30.0)
+    vnorth = np.tile(np.arange(12.0), (1, 2, 1))
+    grid = WindGrid([0.0, 10.0], lons, [0.0], vnorth, vnorth)
+    assert grid.wraplon
+    vn, _ = grid.getdata([5.0, 5.0, 5.0], [345.0, -15.0, 15.0], [0.0, 0.0, 0.0])
+    assert np.allclose(vn, [5.5, 5.5, 0.5])
+
+
+def test_resample():
+    """ A grid resampled from wind definitions has their interpolated wind at
+        the grid points, and is dropped when the wind definitions change. """
+    field = Windfield()
+    rng = np.random.default_rng(3)
+    for lat, lon in zip(rng.uniform(50.0, 54.0, 10), rng.uniform(2.0, 8.0, 10)):
+        field.addpoint(lat, lon, rng.uniform(0.0, 360.0, 3), rng.uniform(5.0, 40.0, 3),
+                       [0.0, 10000.0 * ft, 30000.0 * ft])
+    lat = np.repeat(np.arange(50.0, 54.01, 0.5), 2)
+    lon = np.tile([2.0, 7.5], len(lat) // 2)
+    alt = np.full(len(lat), 10000.0 * ft)
+    expected = field.getdata(lat, lon, alt)
+
+    grid = field.resample(50.0, 54.0, 2.0, 8.0, 0.5, 1000.0 * ft)
+    assert field.grid is grid and grid.nlat == 9 and grid.nlon == 13
+    assert np.allclose(field.getdata(lat, lon, alt), expected, atol=1e-4)
+
+    field.addpoint(52.0, 5.0, 90.0, 10.0)
+    assert field.grid is None
+
+
+def test_memory():
+    vnorth, veast = griddata()
+    grid = WindGrid(LATS, LONS, ALTS, vnorth, veast)
+    assert grid.nbytes == memory_estimate(len(LATS), len(LONS), len(ALTS))
+    assert memory_estimate(721, 1440, 30) == 2 * 721 * 1440 * 30 * 4
+
+
+def test_series():
+    """ Wind interpolated in time between epochs, of which at most three
+        are kept. """
+    series = WindSeries(LATS, LONS, ALTS)
+    shape = (len(ALTS), len(LATS), len(LONS))
+    for hour in (6.0, 0.0, 3.0):
+        series.add(hour, np.full(shape, hour), np.full(shape, -hour))
+    assert series.times == [0.0, 3.0, 6.0]
+
+    for hour, expected in ((-1.0, 0.0), (1.5, 1.5), (3.0, 3.0), (4.0, 4.0), (7.0, 6.0)):
+        series.settime(hour)
+        vn, ve = series.getdata([50.0, 45.0], [5.0, 0.0], [1000.0, 8000.0])
+        assert np.allclose(vn, expected) and np.allclose(ve, -expected)
+
+    series.add(9.0, np.full(shape, 9.0), np.full(shape, -9.0))
+    assert series.times == [3.0, 6.0, 9.0]
+    series.settime(7.5)
+    assert np.allclose(series.getdata(50.0, 5.0, 1000.0)[0], 7.5)
+    series.add(0.0, np.zeros(shape), np.zeros(shape))
+    assert series.times == [0.0, 3.0, 6.0]
@@ -0,0 +1,152 @@
+"""
+Tests the per-aircraft wind sampling cache: only aircraft that moved, or
+with outdated samples, are sampled again from the wind field.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+import bluesky
+from bluesky.core.trafficarrays import TrafficArrays
+from bluesky.tools.aero import ft
+from bluesky.traffic.windfield import Windfield
+from bluesky.traffic.windgrid import WindSeries
+from bluesky.traffic.windsampler import WindSampler
+
+
+NAC = 20
+
+
+class CountingField(Windfield):
+    """ Wind field that records the number of positions of each lookup. """
+    def __init__(self):
+        super().__init__()
+        self.lookups = []
+
+    def getdata(self, userlat, userlon, useralt=0.0):
+        self.lookups.append(len(userlat))
+        return super().getdata(userlat, userlon, useralt)
+
+
+@pytest.fixture
+def sampler(monkeypatch):
+    monkeypatch.setattr(bluesky, 'sim', SimpleNamespace(simt=0.0), raising=False)
+    monkeypatch.setattr(TrafficArrays, 'root', None)
+    TrafficArrays.setroot(TrafficArrays())
+    monkeypatch.setattr(WindSampler, '_instance', None)
+    sampler = WindSampler()
+    sampler.setlimits(1000.0, 30.0, 60.0)
+    sampler.create(NAC)
+    return sampler
+
+
+def windfield():
+    field = CountingField()
+    field.addpoint(52.0, 4.0, [270.0, 300.0], [15.0, 30.0], [0.0, 30000.0 * ft])
+    field.addpoint(53.0, 6.0, [200.0, 250.0], [10.0, 25.0], [0.0, 30000.0 * ft])
+    return field
+
+
+def aircraft(seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(51.5, 53.5, NAC), rng.uniform(3.5, 6.5, NAC), \
+        rng.uniform(1000.0, 10000.0, NAC)
+
+
+def getdata(sampler, field, lat, lon, alt):
+    return sampler.getdata(field, lat, lon, alt, np.cos(np.radians(lat)))
+
+
+def test_moved(sampler):
+    """ Only aircraft that moved too far are sampled again. """
+    field = windfield()
+    lat, lon, alt = aircraft()
+    vn, ve = getdata(sampler, field, lat, lon, alt)
+    assert field.lookups == [NAC]
+    assert np.allclose(vn, field.getdata(lat, lon, alt)[0])
+
+    # Small moves: cached wind
+    vn0 = vn.copy()
+    lat, lon, alt = lat + 0.001, lon - 0.001, alt + 10.0
+    field.lookups.clear()
+    vn, ve = getdata(sampler, field, lat, lon, alt)
+    assert field.lookups == [] and np.array_equal(vn, vn0)
+
+    # Move two aircraft horizontally and climb one
+    lat[3] += 0.05
+    lon[7] = lon[7] + 0.05
+    alt[11] += 100.0
+    vn, ve = getdata(sampler, field, lat, lon, alt)
+    assert field.lookups == [3] and sampler.nsampled == 3
+    expected = field.getdata(lat, lon, alt)
+    for i in (3, 7, 11):
+        assert np.isclose(vn[i], expected[0][i]) and np.isclose(ve[i], expected[1][i])
+    assert np.array_equal(np.delete(vn, [3, 7, 11]), np.delete(vn0, [3, 7, 11]))
+
+
+def test_outdated(sampler):
+    """ All aircraft are sampled again after the maximum age, when the
+        wind field changes, and with zero limits. """
+    field = windfield()
+    lat, lon, alt = aircraft()
+    getdata(sampler, field, lat, lon, alt)
+    bluesky.sim.simt = 30.0
+    getdata(sampler, field, lat, lon, alt)
+    bluesky.sim.simt = 60.0
+    getdata(sampler, field, lat, lon, alt)
+    assert field.lookups == [NAC, NAC]
+
+    field.addpoint(52.5, 5.0, 90.0, 20.0)
+    vn, ve = getdata(sampler, field, lat, lon, alt)
+    assert field.lookups == [NAC, NAC, NAC]
+    assert np.allclose(vn, field.getdata(lat, lon, alt)[0])
+
+    sampler.setlimits(0.0, 0.0, 0.0)
+    getdata(sampler, field, lat, lon, alt)
+    assert sampler.nsampled == NAC
+
+
+def test_create_delete(sampler):
+    """ New aircraft are sampled on their first lookup. """
+    field = windfield()
+    lat, lon, alt = aircraft()
+    getdata(sampler, field, lat, lon, alt)
+    sampler.delete(np.array([0, 5]))
+    sampler.create(3)
+    lat, lon, alt = (np.append(np.delete(x, [0, 5]), y[:3])
+                     for x, y in zip((lat, lon, alt), aircraft(2)))
+    vn, _ = getdata(sampler, field, lat, lon, alt)
+    assert sampler.nsampled == 3
+    assert np.allclose(vn, field.getdata(lat, lon, alt)[0])
+
+
+def test_series(sampler):
+    """ All aircraft are sampled again when the wind of a wind series is
+        interpolated to a new time, and by default every step. """
+    shape = (1, 3, 4)
+    series = WindSeries(np.array([51.0, 52.5, 54.0]), np.array([3.0, 4.5, 6.0, 7.5]),
+                        np.array([0.0]))
+    series.add(0.0, np.zeros(shape), np.zeros(shape))
+    series.add(3600.0, np.full(shape, 10.0), np.zeros(shape))
+    field = CountingField()
+    field.loadgrid(series)
+    series.settime(0.0, field)
+    lat, lon, alt = aircraft()
+    vn, _ = getdata(sampler, field, lat, lon, alt)
+    assert np.allclose(vn, 0.0)
+
+    series.settime(1800.0, field)
+    vn, _ = getdata(sampler, field, lat, lon, alt)
+    assert sampler.nsampled == NAC and np.allclose(vn, 5.0)
+
+    # Unchanged wind: cached
+    series.settime(1800.0, field)
+    getdata(sampler, field, lat, lon, alt)
+    assert sampler.nsampled == 0
+
+    sampler.reset()
+    sampler.create(NAC)
+    assert (sampler.dist, sampler.dalt, sampler.dt) == (0.0, 0.0, 0.0)
+    for _ in range(2):
+        getdata(sampler, field, lat, lon, alt)
+        assert sampler.nsampled == NAC
@@ -0,0 +1,26 @@
+"""
+Tests the work arrays for intermediate results of the traffic update.
+"""
+import numpy as np
+
+from bluesky.traffic.workarrays import WorkArrays
+
+
+def test_reuse():
+    """ Work arrays are reused until the number of aircraft changes. """
+    work = WorkArrays()
+    tmp1, tmp2 = work(10, 'tmp1', 'tmp2')
+    assert tmp1.shape == tmp2.shape == (10,) and tmp1 is not tmp2
+    assert work(10, 'tmp1') is tmp1
+    assert work(10, 'tmp2', 'tmp1') == (tmp2, tmp1)
+
+    # Arrays of another dtype are separate
+    flags = work(10, 'tmp1', dtype=bool)
+    assert flags.dtype == bool and flags is not tmp1
+    assert work(10, 'tmp1') is tmp1
+
+    # New arrays when the number of aircraft changes
+    tmp1b = work(12, 'tmp1')
+    assert tmp1b.shape == (12,) and tmp1b is not tmp1
+    assert work(12, 'tmp1', dtype=bool).shape == (12,)
+    assert isinstance(tmp1b, np.ndarray)
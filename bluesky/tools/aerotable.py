@@ -0,0 +1,332 @@
+""" Tabulated International Standard Atmosphere and speed conversions.
+
+    Vectorized versions of the atmosphere and speed conversion functions of
+    bluesky.tools.aero, which interpolate linearly in tables that are
+    computed once with the analytic functions, instead of evaluating
+    exponentials and fractional powers on every call.
+
+    Altitudes can be given as an array of altitudes [m], or as Altitudes
+    from AeroTable.altitudes(), which hold the table indices and weights of
+    a set of altitudes. Several lookups at the same altitudes, such as the
+    atmosphere and the speed conversions of all aircraft in a simulation
+    step, then share one index computation.
+
+    All functions accept:
+    - dtemp: temperature offset from ISA [K]. The altitude is taken as
+      pressure altitude, so the pressure is that of ISA, and the density,
+      speed of sound and true airspeed follow from the offset temperature.
+    - out: array (or tuple of arrays for multiple results) to store the
+      results in, to avoid allocating new arrays every simulation step.
+
+    Altitudes outside the tables are computed with the analytic functions.
+"""
+import numpy as np
+
+from bluesky.tools import aero
+from bluesky.tools.aero import R, gamma
+
+
+def interp(values, slopes, i, w, out=None):
+    """ Linear interpolation in a table with values and slopes (differences
+        to the next value) at indices i, with weights w of the next value. """
+    out = np.multiply(slopes.take(i), w, out=out)
+    out += values.take(i)
+    return out
+
+
+def tabulate(values, axis=0):
+    """ Values and slopes along axis of a table, flattened for interpolation
+        with interp(). The slopes at the end of the axis are zero. """
+    slopes = np.diff(values, axis=axis, append=values.take([-1], axis=axis))
+    return values.ravel(), slopes.ravel()
+
+
+class Altitudes:
+    """ Table indices and interpolation weights of a set of altitudes, and
+        the indices of the altitudes outside the tables (None if there are
+        none). """
+    __slots__ = ('h', 'i', 'w', 'ispd', 'wspd', 'iout')
+
+    def __init__(self, h, i, w, ispd, wspd, iout=None):
+        self.h = h
+        # Altitude axis of the atmosphere table
+        self.i, self.w = i, w
+        # Altitude axis of the speed conversion tables
+        self.ispd, self.wspd = ispd, wspd
+        self.iout = iout
+
+
+class AeroTable:
+    """ Tables of the ISA atmosphere and of the CAS/TAS conversions.
+
+        The atmosphere tables hold pressure, density, temperature and speed
+        of sound per altitude. The CAS/TAS tables hold the converted speed
+        on an altitude x speed grid, and are interpolated bilinearly. Speeds
+        beyond the speed axis are extrapolated linearly.
+
+        Arguments:
+        - hmin, hmax, hstep: altitude axis [m] of the atmosphere tables
+        - vmax, vstep, hstepspd: speed axis [m/s] and altitude step [m] of
+          the CAS/TAS conversion tables
+    """
+    def __init__(self, hmin=-1000., hmax=25000., hstep=10.,
+                 vmax=600., vstep=1., hstepspd=50.):
+        self.hmin, self.hmax = hmin, hmax
+
+        # Atmosphere
+        self.hstep = hstep
+        h = np.arange(hmin, hmax + 0.5 * hstep, hstep)
+        self.nh = len(h)
+        p, rho, T = aero.vatmos(h)
+        self.p, self.rho, self.T, self.a = \
+            (tabulate(values) for values in (p, rho, T, aero.vvsound(h)))
+
+        # Speed conversions at ISA temperature, with the slopes along the
+        # speed axis
+        self.hstepspd, self.vmax, self.vstep = hstepspd, vmax, vstep
+        hspd = np.arange(hmin, hmax + 0.5 * hstepspd, hstepspd)
+        v = np.arange(0.0, vmax + 0.5 * vstep, vstep)
+        self.nhspd, self.nv = len(hspd), len(v)
+        hgrid, vgrid = np.meshgrid(hspd, v, indexing='ij')
+        self.tcas2tas = tabulate(aero.vcas2tas(vgrid, hgrid), axis=1)
+        self.ttas2cas = tabulate(aero.vtas2cas(vgrid, hgrid), axis=1)
+
+    @staticmethod
+    def index(x, x0, dx, n):
+        """ Lower index and weight of the upper index of x on an axis from
+            x0 with n steps dx, clipped to the axis. """
+        f = np.subtract(x, x0, dtype=float)
+        f *= 1.0 / dx
+        np.clip(f, 0.0, n - 1.0, out=f)
+        i = f.astype(np.intp)
+        np.minimum(i, n - 2, out=i)
+        f -= i
+        return i, f
+
+    def altitudes(self, h):
+        """ Table indices and weights of altitudes h [m]. Returns h when it
+            already is Altitudes. """
+        if isinstance(h, Altitudes):
+            return h
+        iout = np.flatnonzero(np.logical_or(np.less(h, self.hmin), np.greater(h, self.hmax)))
+        return Altitudes(h, *self.index(h, self.hmin, self.hstep, self.nh),
+                         *self.index(h, self.hmin, self.hstepspd, self.nhspd),
+                         iout if iout.size else None)
+
+    @staticmethod
+    def outside(result, h, func, *args):
+        """ Replace the results at altitudes h outside the tables with those
+            of the analytic function func(*args, h). """
+        if h.iout is not None:
+            shape = np.shape(result)
+            args = (np.broadcast_to(arg, shape).ravel()[h.iout] for arg in args)
+            np.put(result, h.iout, func(*args, np.ravel(h.h)[h.iout]))
+        return result
+
+    def pressure(self, h, out=None):
+        """ Pressure [Pa] at altitudes h [m]. """
+        h = self.altitudes(h)
+        return self.outside(interp(*self.p, h.i, h.w, out), h, aero.vpressure)
+
+    def temp(self, h, dtemp=None, out=None):
+        """ Temperature [K] at altitudes h [m]. """
+        h = self.altitudes(h)
+        T = self.outside(interp(*self.T, h.i, h.w, out), h, aero.vtemp)
+        if dtemp is not None:
+            T += dtemp
+        return T
+
+    def density(self, h, dtemp=None, out=None):
+        """ Density [kg/m3] at altitudes h [m]. """
+        h = self.altitudes(h)
+        if dtemp is None:
+            return self.outside(interp(*self.rho, h.i, h.w, out), h, aero.vdensity)
+        rho = self.temp(h, dtemp, out)
+        rho *= R
+        return np.divide(self.pressure(h), rho, out=rho)
+
+    def vsound(self, h, dtemp=None, out=None):
+        """ Speed of sound [m/s] at altitudes h [m]. """
+        h = self.altitudes(h)
+        if dtemp is None:
+            return self.outside(interp(*self.a, h.i, h.w, out), h, aero.vvsound)
+        T = self.temp(h, dtemp, out)
+        T *= gamma * R
+        return np.sqrt(T, out=T)
+
+    def atmos(self, h, dtemp=None, out=None, vsound=False):
+        """ Pressure [Pa], density [kg/m3] and temperature [K] at altitudes
+            h [m], and the speed of sound [m/s] when vsound is True. """
+        h = self.altitudes(h)
+        out = out or (None,) * (4 if vsound else 3)
+        p = self.pressure(h, out[0])
+        T = self.temp(h, dtemp, out[2])
+        if dtemp is None:
+            rho = self.outside(interp(*self.rho, h.i, h.w, out[1]), h, aero.vdensity)
+        else:
+            rho = np.divide(p, R * T, out=out[1])
+        if not vsound:
+            return p, rho, T
+        if dtemp is None:
+            return p, rho, T, self.outside(interp(*self.a, h.i, h.w, out[3]), h, aero.vvsound)
+        return p, rho, T, np.sqrt(gamma * R * T, out=out[3])
+
+    def tempratio(self, h, dtemp):
+        """ Ratio of actual to ISA temperature at altitudes h [m]. """
+        Tisa = self.temp(h)
+        return np.divide(Tisa + dtemp, Tisa, out=Tisa)
+
+    def convert(self, table, func, spd, h, out=None):
+        """ Speed conversion with a CAS/TAS table, for speeds spd [m/s] at
+            altitudes h [m], and with the analytic conversion func outside
+            the tables. Negative speeds give negative results. """
+        h = self.altitudes(h)
+        spd = np.asarray(spd, dtype=float)
+        fv = np.abs(spd)
+        fv *= 1.0 / self.vstep
+        iv = fv.astype(np.intp)
+        np.minimum(iv, self.nv - 2, out=iv)
+        fv -= iv
+
+        # Interpolate along the speed axis at both table altitudes, and
+        # then between the altitudes
+        base = h.ispd * self.nv
+        base += iv
+        lower = interp(*table, base, fv)
+        base += self.nv
+        result = interp(*table, base, fv, out)
+        result -= lower
+        result *= h.wspd
+        result += lower
+        np.copysign(result, spd, out=result)
+        return self.outside(result, h, func, spd)
+
+    def cas2tas(self, cas, h, dtemp=None, out=None):
+        """ Calibrated [m/s] to true airspeed [m/s] at altitudes h [m]. """
+        tas = self.convert(self.tcas2tas, aero.vcas2tas, cas, h, out)
+        if dtemp is not None:
+            tas *= np.sqrt(self.tempratio(h, dtemp))
+        return tas
+
+    def tas2cas(self, tas, h, dtemp=None, out=None):
+        """ True [m/s] to calibrated airspeed [m/s] at altitudes h [m]. """
+        if dtemp is not None:
+            tas = tas / np.sqrt(self.tempratio(h, dtemp))
+        return self.convert(self.ttas2cas, aero.vtas2cas, tas, h, out)
+
+    def mach2tas(self, mach, h, dtemp=None, out=None):
+        """ Mach number [-] to true airspeed [m/s] at altitudes h [m]. """
+        tas = self.vsound(h, dtemp, out)
+        tas *= mach
+        return tas
+
+    def tas2mach(self, tas, h, dtemp=None, out=None):
+        """ True airspeed [m/s] to Mach number [-] at altitudes h [m]. """
+        return np.divide(tas, self.vsound(h, dtemp), out=out)
+
+    def casormach(self, spd, h, dtemp=None, out=None):
+        """ True airspeed [m/s], CAS [m/s] and Mach number [-] for speeds spd
+            that are Mach numbers below the CAS/Mach threshold, and CAS
+            otherwise. """
+        h = self.altitudes(h)
+        spd = np.asarray(spd, dtype=float)
+        ismach = np.logical_and(spd > 0.1, spd < aero.casmach_thr)
+        a = self.vsound(h, dtemp)
+        tas = np.where(ismach, spd * a, self.cas2tas(spd, h, dtemp))
+        cas = np.where(ismach, self.tas2cas(tas, h, dtemp), spd)
+        mach = np.where(ismach, spd, tas / a)
+        if out is None:
+            return tas, cas, mach
+        for o, r in zip(out, (tas, cas, mach)):
+            np.copyto(o, r)
+        return out
+
+    def casormach2tas(self, spd, h, dtemp=None, out=None):
+        """ True airspeed [m/s] for speeds spd that are Mach numbers below
+            the CAS/Mach threshold, and CAS otherwise. """
+        h = self.altitudes(h)
+        spd = np.asarray(spd, dtype=float)
+        ismach = np.logical_and(spd > 0.1, spd < aero.casmach_thr)
+        tas = self.cas2tas(spd, h, dtemp, out)
+        if ismach.any():
+            np.copyto(tas, self.mach2tas(spd, h, dtemp), where=ismach)
+        return tas
+
+
+# The tables are computed on first use
+_table = None
+
+
+def table():
+    """ The default atmosphere and speed conversion tables. """
+    global _table
+    if _table is None:
+        _table = AeroTable()
+    return _table
+
+
+def altitudes(h):
+    """ Table indices and weights of altitudes h [m], for repeated lookups
+        at the same altitudes. """
+    return table().altitudes(h)
+
+
+def vatmos(h, dtemp=None, out=None):
+    """ Pressure [Pa], density [kg/m3] and temperature [K] at altitude h [m]. """
+    return table().atmos(h, dtemp, out)
+
+
+def vatmos_vsound(h, dtemp=None, out=None):
+    """ Pressure [Pa], density [kg/m3], temperature [K] and speed of sound
+        [m/s] at altitude h [m]. """
+    return table().atmos(h, dtemp, out, vsound=True)
+
+
+def vtemp(h, dtemp=None, out=None):
+    """ Temperature [K] at altitude h [m]. """
+    return table().temp(h, dtemp, out)
+
+
+def vpressure(h, out=None):
+    """ Pressure [Pa] at altitude h [m]. """
+    return table().pressure(h, out)
+
+
+def vdensity(h, dtemp=None, out=None):
+    """ Density [kg/m3] at altitude h [m]. """
+    return table().density(h, dtemp, out)
+
+
+def vvsound(h, dtemp=None, out=None):
+    """ Speed of sound [m/s] at altitude h [m]. """
+    return table().vsound(h, dtemp, out)
+
+
+def vtas2mach(tas, h, dtemp=None, out=None):
+    """ True airspeed [m/s] to Mach number [-]. """
+    return table().tas2mach(tas, h, dtemp, out)
+
+
+def vmach2tas(mach, h, dtemp=None, out=None):
+    """ Mach number [-] to true airspeed [m/s]. """
+    return table().mach2tas(mach, h, dtemp, out)
+
+
+def vcas2tas(cas, h, dtemp=None, out=None):
+    """ Calibrated airspeed [m/s] to true airspeed [m/s]. """
+    return table().cas2tas(cas, h, dtemp, out)
+
+
+def vtas2cas(tas, h, dtemp=None, out=None):
+    """ True airspeed [m/s] to calibrated airspeed [m/s]. """
+    return table().tas2cas(tas, h, dtemp, out)
+
+
+def vcasormach(spd, h, dtemp=None, out=None):
+    """ True airspeed [m/s], CAS [m/s] and Mach [-] from CAS or Mach speeds. """
+    return table().casormach(spd, h, dtemp, out)
+
+
+def vcasormach2tas(spd, h, dtemp=None, out=None):
+    """ True airspeed [m/s] from CAS or Mach speeds. """
+    return table().casormach2tas(spd, h, dtemp, out)
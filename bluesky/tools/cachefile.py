@@ -1,4 +1,9 @@
+import json
+import os
 import pickle
+import shutil
+import tempfile
+import numpy as np
 import bluesky as bs
 
 ## Default settings
@@ -9,6 +14,10 @@ def openfile(*args):
     return CacheFile(*args)
 
 
+def opencolumns(*args):
+    return ColumnCache(*args)
+
+
 class CacheError(Exception):
     ''' Exception class for CacheFile errors. '''
     pass
@@ -57,3 +66,111 @@ class CacheFile():
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.file:
             self.file.close()
+
+
+class ColumnCache():
+    ''' Cache of tables of data columns, stored as .npy files in a cache
+        directory. Numeric array columns are memory-mapped when loaded, so
+        that processes that load the same cache share its pages.
+
+        Supported columns are numpy arrays, and lists of strings, ints or
+        floats, which are returned as lists again. '''
+    # Increment when the way columns are stored changes
+    format_version = 1
+
+    def __init__(self, dname, version_ref='1'):
+        self.dname = bs.resource(bs.settings.cache_path).joinpath(dname)
+        self.version_ref = version_ref
+        self.index = None
+        self.tmpdir = None
+
+    def check_cache(self):
+        ''' Check whether the cache exists, and is of the correct version. '''
+        try:
+            with open(self.dname / 'index.json') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            raise CacheError('Cache not found: ' + str(self.dname))
+
+        if index.get('version') != [self.format_version, self.version_ref]:
+            raise CacheError('Cache out of date: ' + str(self.dname))
+        self.index = index['tables']
+        print('Reading cache:', self.dname)
+
+    def load(self, table):
+        ''' Load a table (dict of columns) from the cache. '''
+        if self.index is None:
+            self.check_cache()
+        if table not in self.index:
+            raise CacheError(f'Table {table} not in cache: ' + str(self.dname))
+
+        columns = dict()
+        for name, kind in self.index[table].items():
+            data = np.load(self.dname / f'{table}.{name}.npy', mmap_mode='r')
+            if kind == 'array':
+                columns[name] = np.asarray(data)
+            elif kind == 'str':
+                # The first value is the number of strings, to tell [] from ['']
+                values = data.tobytes().decode().split('\0')
+                columns[name] = values[1:] if int(values[0]) else []
+            else:
+                columns[name] = data.tolist()
+                if kind == 'mixed':
+                    isint = np.load(self.dname / f'{table}.{name}.int.npy')
+                    for i in np.flatnonzero(isint):
+                        columns[name][i] = int(columns[name][i])
+        return columns
+
+    def dump(self, table, columns):
+        ''' Write a table (dict of columns) to the cache. The cache is written
+            to a temporary directory, which replaces the cache on exit. '''
+        if self.tmpdir is None:
+            self.dname.parent.mkdir(parents=True, exist_ok=True)
+            self.tmpdir = tempfile.mkdtemp(prefix=self.dname.name, dir=self.dname.parent)
+            self.index = dict()
+            print("Writing cache:", self.dname)
+
+        self.index[table] = dict()
+        for name, data in columns.items():
+            fname = os.path.join(self.tmpdir, f'{table}.{name}.npy')
+            if isinstance(data, np.ndarray):
+                kind = 'array'
+            elif all(isinstance(v, str) for v in data):
+                if any('\0' in v for v in data):
+                    raise ValueError(f'Column {table}.{name} contains a NUL character')
+                # One NUL-separated byte string, starting with the number of strings
+                kind, data = 'str', np.frombuffer(
+                    ('\0'.join([str(len(data))] + data)).encode(), dtype=np.uint8)
+            else:
+                isint = np.array([isinstance(v, int) for v in data], dtype=bool)
+                if np.all(isint):
+                    kind, data = 'int', np.array(data, dtype=np.int64)
+                else:
+                    kind, data = ('mixed' if np.any(isint) else 'float'), np.array(data, dtype=float)
+                    if kind == 'mixed':
+                        np.save(os.path.join(self.tmpdir, f'{table}.{name}.int.npy'), isint)
+            np.save(fname, data)
+            self.index[table][name] = kind
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.tmpdir is None:
+            return
+        if exc_type is not None:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+            return
+
+        # The index is written last: a cache without index is never read
+        with open(os.path.join(self.tmpdir, 'index.json'), 'w') as f:
+            json.dump(dict(version=[self.format_version, self.version_ref],
+                           tables=self.index), f)
+
+        # Swap in the new cache. Processes that have the old cache files
+        # memory-mapped keep using them until they are done.
+        if self.dname.exists():
+            olddir = tempfile.mkdtemp(prefix=self.dname.name, dir=self.dname.parent)
+            os.replace(self.dname, os.path.join(olddir, 'old'))
+            shutil.rmtree(olddir, ignore_errors=True)
+        os.replace(self.tmpdir, self.dname)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
 import bluesky as bs
 from .misc import txt2lat, txt2lon
 
@@ -9,6 +10,61 @@ def txt2pos(name, reflat, reflon):
         return True, pos
     return False, name+" not found in database"
 
+def txt2pos_many(names, reflats, reflons):
+    """ Look up a list of position texts at once, like Position does for one.
+        Fixes and navaids are looked up in one navdb query, closest to the
+        reference positions.
+
+        Returns arrays with the latitudes and longitudes, and a list with the
+        position types ("latlon","nav","apt","rwy", or "" when not found). """
+    names = [name.upper().strip() for name in names]
+    lat = np.zeros(len(names))
+    lon = np.zeros(len(names))
+    types = len(names) * [""]
+
+    inav = []
+    for i, name in enumerate(names):
+        # lat,lon type ?
+        if name.count(",") > 0:
+            txt1, txt2 = name.split(",")
+            if islat(txt1):
+                lat[i], lon[i] = txt2lat(txt1), txt2lon(txt2)
+                types[i] = "latlon"
+
+        # runway type ? "EHAM/RW06","EHGG/RWY27"
+        elif name.count("/RW") > 0:
+            aptname, rwytxt = name.split("/RW")
+            rwy = bs.navdb.rwythresholds.get(aptname, {}).get(rwytxt.lstrip("Y"))
+            if rwy is not None:
+                lat[i], lon[i] = rwy[:2]
+                types[i] = "rwy"
+
+        # airport?
+        elif name in bs.navdb.aptindex:
+            idx = bs.navdb.getaptidx(name)
+            lat[i] = bs.navdb.aptlat[idx]
+            lon[i] = bs.navdb.aptlon[idx]
+            types[i] = "apt"
+
+        else:
+            inav.append(i)
+
+    # fix or navaid?
+    wpidx = bs.navdb.getwpidx_many([names[i] for i in inav],
+                                   np.asarray(reflats)[inav], np.asarray(reflons)[inav])
+    for i, idx in zip(inav, wpidx):
+        if idx >= 0:
+            lat[i], lon[i] = bs.navdb.wplat[idx], bs.navdb.wplon[idx]
+            types[i] = "nav"
+
+        # aircraft id?
+        elif names[i] in bs.traf.idindex:
+            idx = bs.traf.id2idx(names[i])
+            lat[i], lon[i] = bs.traf.lat[idx], bs.traf.lon[idx]
+            types[i] = "latlon"
+
+    return lat, lon, types
+
 def islat(txt):
     # Is it a latitude-like format or not?
 
@@ -60,15 +116,15 @@ class Position():
             self.type = "rwy"
 
         # airport?
-        elif bs.navdb.aptid.count(name)>0:
-            idx = bs.navdb.aptid.index(name.upper())
+        elif name in bs.navdb.aptindex:
+            idx = bs.navdb.getaptidx(name)
 
             self.lat = bs.navdb.aptlat[idx]
             self.lon = bs.navdb.aptlon[idx]
             self.type ="apt"
 
         # fix or navaid?
-        elif bs.navdb.wpid.count(name) > 0:
+        elif name in bs.navdb.wpindex:
             idx = bs.navdb.getwpidx(name, reflat, reflon)
             self.lat = bs.navdb.wplat[idx]
             self.lon = bs.navdb.wplon[idx]
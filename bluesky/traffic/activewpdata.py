@@ -115,61 +115,62 @@ class ActiveWaypoint(Entity, replaceable=True):
         # Return indices for which condition is True/1.0 for a/c where we have reached waypoint
         return swreached
 
-    # Calculate turn distance for scalars
     def calcturn(self, acidx, tas , wpqdr, next_wpqdr, turnbank, turnrad, turnspd, turnhdgr, flyturn, flyby):
-        """Calculate the properties of a turn in function of the input. Inputs are SCALARS."""
-        # If this is not a flyturn waypoint, just return standard values
+        """Calculate the properties of a turn in function of the input.
+        Inputs are scalars, or arrays for the aircraft with indices acidx."""
+        scalar = np.ndim(acidx) == 0
+        tas, wpqdr, next_wpqdr, turnbank, turnrad, turnspd, turnhdgr, flyturn, flyby = \
+            np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in
+                                  (tas, wpqdr, next_wpqdr, turnbank, turnrad, turnspd,
+                                   turnhdgr, flyturn, flyby)))
+        hasbank, hasrad, hasspd, hashdgr = turnbank > 0, turnrad > 0, turnspd > 0, turnhdgr > 0
         # Calculate the sum of bools to figure out things more easily
-        num_defined_values = sum([turnbank>0, turnrad>0, turnspd>0, turnhdgr>0])
-        # Case 1: No value is given or not a flyturn, use defaults
-        if num_defined_values == 0 or not flyturn:
-            turnbank = np.rad2deg(bs.traf.ap.bankdef[acidx])
-            turnspd = tas
-            # Calculate the radius
-            turnrad = turnspd**2/(g0*np.tan(np.deg2rad(turnbank)))
-            if not flyby:
-                # This is a flyover waypoint, so we have to fly OVER it, so turndist is 0
-                return 0, turnrad, turnspd, turnbank, turnhdgr
-        # Case 2: only one value is given. We then want to keep the speed as TAS unless the speed is the one that isn't specified
-        elif num_defined_values == 1:
-            # If the velocity is the given one, take default bank and calculate remaining values
-            if turnspd>0:
-                turnbank = 25
-                turnrad = turnspd**2/(g0*np.tan(np.deg2rad(turnbank)))
-            #Otherwise, keep velocity constant and calculate the remaining values
-            elif turnrad>0:
-                turnspd = tas
-                turnbank = np.arctan(turnspd**2/(turnrad * g0))
-                
-            elif turnbank>0:
-                turnspd = tas
-                turnrad = turnspd**2 / (g0 * np.tan(np.deg2rad(turnbank)))
-                
-            elif turnhdgr>0:
-                turnspd = tas
-                #Calculate the other two
-                turnbank = np.arctan(turnhdgr*turnspd/g0)
-                turnrad = turnspd / turnhdgr
-        # Case 3: We have two defined values and need to calculate the other
-        elif num_defined_values == 2:
-            # Need to figure out which ones and calculate the remaining
-            if turnrad>0 and turnbank>0:
-                turnspd = np.sqrt(g0*turnrad*np.tan(np.deg2rad(turnbank)))
-            elif turnrad>0 and turnspd>0:
-                turnbank = np.arctan(turnspd**2/(turnrad*g0))
-            elif turnspd>0 and turnbank>0:
-                turnrad = turnspd**2/(g0*np.tan(np.deg2rad(turnbank)))
+        num_defined_values = hasbank.astype(int) + hasrad + hasspd + hashdgr
+
+        # All cases are evaluated for all aircraft, and selected afterwards
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Case 1: No value is given or not a flyturn, use defaults
+            default = (num_defined_values == 0) | (flyturn == 0)
+            defbank = np.rad2deg(np.broadcast_to(bs.traf.ap.bankdef[acidx], tas.shape))
+            defrad = tas**2/(g0*np.tan(np.deg2rad(defbank)))
+
+            # Case 2: only one value is given. We then want to keep the speed as TAS unless
+            # the speed is the one that isn't specified.
+            # If the velocity is the given one, take default bank and calculate remaining values,
+            # otherwise, keep velocity constant and calculate the remaining values
+            one = ~default & (num_defined_values == 1)
+            onespd = one & hasspd
+            onerad = one & ~hasspd & hasrad
+            onebank = one & ~hasspd & ~hasrad & hasbank
+            onehdgr = one & ~hasspd & ~hasrad & ~hasbank & hashdgr
+
+            # Case 3: We have two defined values and need to calculate the other
+            two = ~default & (num_defined_values == 2)
+            radbank = two & hasrad & hasbank
+            radspd = two & hasrad & hasspd
+            spdbank = two & hasspd & hasbank
             # Now the cases where one of the known vars is heading rate
-            elif turnhdgr>0 and turnspd>0:
-                turnbank = np.arctan(turnhdgr*turnspd/g0)
-                turnrad = turnspd / turnhdgr
-            elif turnhdgr>0 and turnbank>0:
-                turnspd = g0*np.tan(np.deg2rad(turnbank))/turnhdgr
-                turnrad = turnspd / turnhdgr
-            elif turnhdgr>0 and turnrad>0:
-                turnspd = turnhdgr * turnrad
-                turnbank = np.arctan(turnhdgr*turnspd/g0)
-        
+            hdgrspd = two & hashdgr & hasspd
+            hdgrbank = two & hashdgr & hasbank
+            hdgrrad = two & hashdgr & hasrad
+
+            newspd = np.select([default | onerad | onebank | onehdgr, radbank, hdgrbank, hdgrrad],
+                               [tas, np.sqrt(g0*turnrad*np.tan(np.deg2rad(turnbank))),
+                                g0*np.tan(np.deg2rad(turnbank))/turnhdgr, turnhdgr * turnrad],
+                               turnspd)
+            newbank = np.select([default, onespd, onerad | radspd, onehdgr | hdgrspd | hdgrrad],
+                                [defbank, 25., np.arctan(newspd**2/(turnrad * g0)),
+                                 np.arctan(turnhdgr*newspd/g0)],
+                                turnbank)
+            newrad = np.select([default, onespd | onebank | spdbank, onehdgr | hdgrspd | hdgrbank],
+                               [defrad, newspd**2/(g0*np.tan(np.deg2rad(newbank))), newspd / turnhdgr],
+                               turnrad)
+
         # turndist is in meters
-        turndist = np.abs(turnrad * np.tan(np.radians(0.5 * np.abs(degto180(wpqdr%360. - next_wpqdr%360.)))))
-        return turndist, turnrad, turnspd, turnbank, turnhdgr
+        turndist = np.abs(newrad * np.tan(np.radians(0.5 * np.abs(degto180(wpqdr%360. - next_wpqdr%360.)))))
+        # A flyover waypoint without turn data has to be flown OVER, so turndist is 0
+        turndist = np.where(default & (flyby == 0), 0.0, turndist)
+
+        if scalar:
+            return turndist[0], newrad[0], newspd[0], newbank[0], turnhdgr[0]
+        return turndist, newrad, newspd, newbank, turnhdgr
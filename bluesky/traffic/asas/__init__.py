@@ -1,4 +1,8 @@
 from .detection import ConflictDetection
 from .resolution import ConflictResolution
 from .statebased import StateBased
+from .statebasedgrid import StateBasedGrid
+from .statebasedtiled import StateBasedTiled
+from .statebasedparallel import StateBasedParallel
+from .statebasedincremental import StateBasedIncremental
 from .mvp import MVP
\ No newline at end of file
@@ -0,0 +1,140 @@
+''' Conflict and loss of separation database. '''
+from pathlib import Path
+import numpy as np
+
+import bluesky as bs
+from bluesky.tools import datalog
+
+
+bs.settings.set_variable_defaults(asas_confdb_memcap=100.0)
+
+
+class PairLog:
+    ''' Log of aircraft pair events (conflicts or losses of separation).
+
+        Each event has a record with the stable ids of both aircraft
+        (idx_a < idx_b), the start and end time of the event, and the minimum
+        distance and time to CPA during the event. Events that are still
+        ongoing are kept in sorted arrays, ordered on their pair key. Start
+        and end events are found by sorted set difference of the keys of the
+        previous and current update.
+
+        Records of ended events are kept in memory until they exceed
+        asas_confdb_memcap megabytes, after which they are written to disk in
+        columnar (npz) chunks in the output directory.
+    '''
+    columns = ('idx_a', 'idx_b', 'start_t', 'end_t', 'min_dcpa', 'min_tcpa')
+    dtypes = (np.int64, np.int64, float, float, float, float)
+    # Size of one record [bytes]
+    recordsize = sum(np.dtype(dt).itemsize for dt in dtypes)
+
+    def __init__(self, name):
+        self.name = name
+        self.path = None
+        self.nchunks = 0
+        self.memcap = bs.settings.asas_confdb_memcap
+        self.clear()
+
+    def clear(self):
+        ''' Clear the ongoing events and the history. '''
+        self.reset_current()
+        # Total number of events since the start of the log
+        self.ntotal = 0
+        # In-memory history of ended events
+        self.nhist = 0
+        self.hist = {col: np.empty(256, dtype=dt) for col, dt in zip(self.columns, self.dtypes)}
+        # Start a new on-disk log for the next spill
+        self.path = None
+        self.nchunks = 0
+
+    def reset_current(self):
+        ''' Forget the ongoing events, without ending them. '''
+        self.keys = np.array([], dtype=np.int64)
+        self.current = {col: np.array([], dtype=dt) for col, dt in zip(self.columns, self.dtypes)}
+
+    @property
+    def ncurrent(self):
+        ''' Number of ongoing events. '''
+        return len(self.keys)
+
+    def update(self, simt, uida, uidb, dcpa=None, tcpa=None):
+        ''' Update the log with the pairs (uida, uidb) that have an event in
+            the current timestep. Pairs can occur in both orders. When no
+            dcpa and tcpa are given, their minimum values are stored as NaN. '''
+        a = np.minimum(uida, uidb).astype(np.int64)
+        b = np.maximum(uida, uidb).astype(np.int64)
+        keys, first, inverse = np.unique((a << 32) | b, return_index=True, return_inverse=True)
+        if dcpa is None:
+            mindcpa = np.full(len(keys), np.nan)
+            mintcpa = np.full(len(keys), np.nan)
+        else:
+            mindcpa = np.full(len(keys), np.inf)
+            mintcpa = np.full(len(keys), np.inf)
+            np.minimum.at(mindcpa, inverse, dcpa)
+            np.minimum.at(mintcpa, inverse, tcpa)
+
+        # Match the current with the ongoing events
+        pos = np.searchsorted(self.keys, keys)
+        found = np.zeros(len(keys), dtype=bool)
+        inrange = pos < len(self.keys)
+        found[inrange] = self.keys[pos[inrange]] == keys[inrange]
+        ongoing = np.zeros(len(self.keys), dtype=bool)
+        ongoing[pos[found]] = True
+
+        # Events that are no longer present have ended
+        if not np.all(ongoing):
+            ended = {col: values[~ongoing] for col, values in self.current.items()}
+            ended['end_t'][:] = simt
+            self.store(ended)
+
+        # New events start now
+        start = np.full(len(keys), simt)
+        start[found] = self.current['start_t'][pos[found]]
+        mindcpa[found] = np.minimum(mindcpa[found], self.current['min_dcpa'][pos[found]])
+        mintcpa[found] = np.minimum(mintcpa[found], self.current['min_tcpa'][pos[found]])
+        self.ntotal += len(keys) - np.count_nonzero(found)
+
+        self.keys = keys
+        self.current = dict(idx_a=a[first], idx_b=b[first], start_t=start,
+                            end_t=np.full(len(keys), np.nan),
+                            min_dcpa=mindcpa, min_tcpa=mintcpa)
+
+    def store(self, records):
+        ''' Add records of ended events to the history. '''
+        n = len(records['idx_a'])
+        nnew = self.nhist + n
+        if nnew > len(self.hist['idx_a']):
+            capacity = max(nnew, 2 * len(self.hist['idx_a']))
+            for col, values in self.hist.items():
+                self.hist[col] = np.empty(capacity, dtype=values.dtype)
+                self.hist[col][:self.nhist] = values[:self.nhist]
+        for col, values in self.hist.items():
+            values[self.nhist:nnew] = records[col]
+        self.nhist = nnew
+
+        if self.nhist * self.recordsize > self.memcap * 1e6:
+            self.spill()
+
+    def spill(self):
+        ''' Write the in-memory history to a new chunk on disk. '''
+        if not self.nhist:
+            return
+        if self.path is None:
+            self.path = datalog.makeLogfileName('CONFDB').with_suffix('')
+        self.path.mkdir(parents=True, exist_ok=True)
+        np.savez(self.path / f'{self.name}_{self.nchunks:04d}.npz',
+                 **{col: values[:self.nhist] for col, values in self.hist.items()})
+        self.nchunks += 1
+        self.nhist = 0
+
+    def history(self, ongoing=True):
+        ''' Return all records as a dict of column arrays, including those
+            that were written to disk, and optionally the ongoing events. '''
+        parts = []
+        for chunk in range(self.nchunks):
+            with np.load(Path(self.path) / f'{self.name}_{chunk:04d}.npz') as data:
+                parts.append({col: data[col] for col in self.columns})
+        parts.append({col: values[:self.nhist] for col, values in self.hist.items()})
+        if ongoing:
+            parts.append(self.current)
+        return {col: np.concatenate([part[col] for part in parts]) for col in self.columns}
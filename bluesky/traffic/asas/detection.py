@@ -4,7 +4,9 @@ import numpy as np
 import bluesky as bs
 from bluesky.tools.aero import ft, nm
 from bluesky.core import Entity
+from bluesky.core.entity import getproxied
 from bluesky.stack import command
+from bluesky.traffic.asas.conflictdb import PairLog
 
 
 bs.settings.set_variable_defaults(asas_pzr=5.0, asas_pzh=1000.0,
@@ -36,13 +38,9 @@ class ConflictDetection(Entity, replaceable=True):
         self.dcpa = np.array([])
         self.tcpa = np.array([])
         self.tLOS = np.array([])
-        # Unique conflicts and LoS in the current timestep (a, b) = (b, a)
-        self.confpairs_unique = set()
-        self.lospairs_unique = set()
-
-        # All conflicts and LoS since simt=0
-        self.confpairs_all = list()
-        self.lospairs_all = list()
+        # Database of all conflicts and LoS since simt=0, by stable aircraft id
+        self.conflog = PairLog('conflicts')
+        self.loslog = PairLog('los')
 
         # Per-aircraft conflict data
         with self.settrafarrays():
@@ -58,8 +56,8 @@ class ConflictDetection(Entity, replaceable=True):
 
     def clearconfdb(self):
         ''' Clear conflict database. '''
-        self.confpairs_unique.clear()
-        self.lospairs_unique.clear()
+        self.conflog.reset_current()
+        self.loslog.reset_current()
         self.confpairs.clear()
         self.lospairs.clear()
         self.qdr = np.array([])
@@ -70,6 +68,28 @@ class ConflictDetection(Entity, replaceable=True):
         self.inconf = np.zeros(bs.traf.ntraf)
         self.tcpamax = np.zeros(bs.traf.ntraf)
 
+    @classmethod
+    def select(cls, instance=None):
+        ''' Select a CD method, and deactivate the previously selected
+            instance when it is replaced. '''
+        previous = getproxied(cls._proxy)
+        super().select(instance)
+        if previous is not None and getproxied(cls._proxy) is not previous:
+            previous.deactivate()
+
+    def deactivate(self):
+        ''' Called when another CD method is selected. CD methods that
+            hold resources, such as worker threads, should release them. '''
+        pass
+
+    def invalidate(self, idx=None):
+        ''' Notify the CD implementation that the state of aircraft idx (or
+            of all aircraft when idx is None) changed discontinuously, e.g.,
+            by a MOVE command, or a change of protected zone or lookahead.
+            CD methods that reuse results of previous updates should
+            recompute these for the given aircraft. '''
+        pass
+
     def create(self, n):
         super().create(n)
         # Initialise values of own states
@@ -81,8 +101,8 @@ class ConflictDetection(Entity, replaceable=True):
     def reset(self):
         super().reset()
         self.clearconfdb()
-        self.confpairs_all.clear()
-        self.lospairs_all.clear()
+        self.conflog.clear()
+        self.loslog.clear()
         self.rpz_def = bs.settings.asas_pzr * nm
         self.hpz_def = bs.settings.asas_pzh * ft
         self.dtlookahead_def = bs.settings.asas_dtlookahead
@@ -137,11 +157,13 @@ class ConflictDetection(Entity, replaceable=True):
                 acidx = acidx[0]
             self.rpz[acidx] = radius * nm
             self.global_rpz = False
+            self.invalidate(acidx)
             return True, f'Setting PZ radius to {radius} NM for {len(acidx)} aircraft'
         oldradius = self.rpz_def
         self.rpz_def = radius * nm
         if self.global_rpz:
             self.rpz[:] = self.rpz_def
+            self.invalidate()
         # Adjust factors for reso zone if those were set with an absolute value
         if not bs.traf.cr.resorrelative:
             bs.stack.stack(f"RSZONER {bs.traf.cr.resofach*oldradius/nm}")
@@ -163,11 +185,13 @@ class ConflictDetection(Entity, replaceable=True):
                 acidx = acidx[0]
             self.hpz[acidx] = height * ft
             self.global_hpz = False
+            self.invalidate(acidx)
             return True, f'Setting PZ height to {height} ft for {len(acidx)} aircraft'
         oldhpz = self.hpz_def
         self.hpz_def = height * ft
         if self.global_hpz:
             self.hpz[:] = self.hpz_def
+            self.invalidate()
         # Adjust factors for reso zone if those were set with an absolute value
         if not bs.traf.cr.resodhrelative:
             bs.stack.stack(f"RSZONEDH {bs.traf.cr.resofacv*oldhpz/ft}")
@@ -183,10 +207,12 @@ class ConflictDetection(Entity, replaceable=True):
                 acidx = acidx[0]
             self.dtlookahead[acidx] = time
             self.global_dtlook = False
+            self.invalidate(acidx)
             return True, f'Setting CD lookahead to {time} sec for {len(acidx)} aircraft'
         self.dtlookahead_def = time
         if self.global_dtlook:
             self.dtlookahead[:] = time
+            self.invalidate()
         return True, f'Setting default CD lookahead to {time} sec'
 
     @command(name='DTNOLOOK')
@@ -209,26 +235,47 @@ class ConflictDetection(Entity, replaceable=True):
     def update(self, ownship, intruder):
         ''' Perform an update step of the Conflict Detection implementation. '''
         self.confpairs, self.lospairs, self.inconf, self.tcpamax, self.qdr, \
-            self.dist, self.dcpa, self.tcpa, self.tLOS = \
+            self.dist, self.dcpa, self.tcpa, self.tLOS, confidx, losidx = \
                 self.detect(ownship, intruder, self.rpz, self.hpz, self.dtlookahead)
 
-        # confpairs has conflicts observed from both sides (a, b) and (b, a)
-        # confpairs_unique keeps only one of these
-        confpairs_unique = {frozenset(pair) for pair in self.confpairs}
-        lospairs_unique = {frozenset(pair) for pair in self.lospairs}
+        # Log conflicts and LoS by stable aircraft id. confpairs has
+        # conflicts observed from both sides (a, b) and (b, a), the logs
+        # keep only one of these
+        if self.confpairs or self.conflog.ncurrent:
+            self.conflog.update(bs.sim.simt, ownship.uid[confidx[0]],
+                                ownship.uid[confidx[1]], self.dcpa, self.tcpa)
+        if self.lospairs or self.loslog.ncurrent:
+            self.loslog.update(bs.sim.simt, ownship.uid[losidx[0]], ownship.uid[losidx[1]])
 
-        self.confpairs_all.extend(confpairs_unique - self.confpairs_unique)
-        self.lospairs_all.extend(lospairs_unique - self.lospairs_unique)
+    @property
+    def nconf_cur(self):
+        ''' Number of unique conflicts in the current timestep. '''
+        return self.conflog.ncurrent
 
-        # Update confpairs_unique and lospairs_unique
-        self.confpairs_unique = confpairs_unique
-        self.lospairs_unique = lospairs_unique
+    @property
+    def nconf_tot(self):
+        ''' Total number of unique conflicts since simt=0. '''
+        return self.conflog.ntotal
+
+    @property
+    def nlos_cur(self):
+        ''' Number of unique LoS in the current timestep. '''
+        return self.loslog.ncurrent
+
+    @property
+    def nlos_tot(self):
+        ''' Total number of unique LoS since simt=0. '''
+        return self.loslog.ntotal
 
     def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
         ''' Detect any conflicts between ownship and intruder.
             This function should be reimplemented in a subclass for actual
             detection of conflicts. See for instance
             bluesky.traffic.asas.statebased.
+
+            Next to the conflict data, the ownship and intruder indices of
+            the conflict and LoS pairs are returned as (2, n) arrays
+            confidx and losidx, in the same order as confpairs and lospairs.
         '''
         confpairs = []
         lospairs = []
@@ -239,4 +286,7 @@ class ConflictDetection(Entity, replaceable=True):
         dcpa = np.array([])
         tcpa = np.array([])
         tLOS = np.array([])
-        return confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS
+        confidx = np.empty((2, 0), dtype=int)
+        losidx = np.empty((2, 0), dtype=int)
+        return confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS, \
+            confidx, losidx
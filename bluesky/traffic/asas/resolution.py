@@ -3,6 +3,7 @@ import numpy as np
 
 import bluesky as bs
 from bluesky.core import Entity
+from bluesky.core.entity import getproxied
 from bluesky.stack import command
 from bluesky.tools.aero import nm,ft
 
@@ -49,6 +50,20 @@ class ConflictResolution(Entity, replaceable=True):
         self.resodhrelative = True
         self.resorrelative  = True
 
+    @classmethod
+    def select(cls, instance=None):
+        ''' Select a CR method, and deactivate the previously selected
+            instance when it is replaced. '''
+        previous = getproxied(cls._proxy)
+        super().select(instance)
+        if previous is not None and getproxied(cls._proxy) is not previous:
+            previous.deactivate()
+
+    def deactivate(self):
+        ''' Called when another CR method is selected. CR methods that
+            hold resources, such as worker processes, should release them. '''
+        pass
+
     # By default all channels are controlled by self.active,
     # but they can be overloaded with separate variables or functions in a
     # derived ASAS Conflict Resolution class (@property decorator takes away
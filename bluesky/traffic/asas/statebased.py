@@ -4,6 +4,7 @@ from bluesky import stack
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
 from bluesky.traffic.asas import ConflictDetection
+from bluesky.traffic.derivedstate import derivedstate
 
 
 class StateBased(ConflictDetection):
@@ -28,15 +29,9 @@ class StateBased(ConflictDetection):
         dx = dist * np.sin(qdrrad)  # is pos j rel to i
         dy = dist * np.cos(qdrrad)  # is pos j rel to i
 
-        # Ownship track angle and speed
-        owntrkrad = np.radians(ownship.trk)
-        ownu = ownship.gs * np.sin(owntrkrad).reshape((1, ownship.ntraf))  # m/s
-        ownv = ownship.gs * np.cos(owntrkrad).reshape((1, ownship.ntraf))  # m/s
-
-        # Intruder track angle and speed
-        inttrkrad = np.radians(intruder.trk)
-        intu = intruder.gs * np.sin(inttrkrad).reshape((1, ownship.ntraf))  # m/s
-        intv = intruder.gs * np.cos(inttrkrad).reshape((1, ownship.ntraf))  # m/s
+        # Ownship and intruder eastern and northern ground speed [m/s]
+        ownu, ownv, intu, intv = (v.reshape((1, ownship.ntraf)) for v in
+                                  velocity_components(ownship, intruder))
 
         du = ownu - intu.T  # Speed du[i,j] is perceived eastern speed of i to j
         dv = ownv - intv.T  # Speed dv[i,j] is perceived northern speed of i to j
@@ -96,13 +91,97 @@ class StateBased(ConflictDetection):
         tcpamax = np.max(tcpa * swconfl, 1)
 
         # Select conflicting pairs: each a/c gets their own record
-        confpairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(*np.where(swconfl))]
+        confidx = np.array(np.where(swconfl))
+        confpairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(*confidx)]
         swlos = (dist < rpz) * (np.abs(dalt) < hpz)
-        lospairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(*np.where(swlos))]
+        losidx = np.array(np.where(swlos))
+        lospairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(*losidx)]
 
         return confpairs, lospairs, inconf, tcpamax, \
             qdr[swconfl], dist[swconfl], np.sqrt(dcpa2[swconfl]), \
-                tcpa[swconfl], tinconf[swconfl]
+                tcpa[swconfl], tinconf[swconfl], confidx, losidx
+
+
+def detect_pairs(ownship, intruder, irow, icol, rpz, hpz, dtlookahead, velocity=None):
+    ''' State-based conflict detection for a selection of aircraft pairs.
+
+        For each pair k, evaluates element [irow[k], icol[k]] of the matrices
+        computed in StateBased.detect, using exactly the same expressions.
+        This allows CD implementations that only consider a subset of all
+        pairs (e.g., after a broadphase) to produce identical results.
+
+        Arguments:
+        - ownship, intruder, rpz, hpz, dtlookahead: as in StateBased.detect
+        - irow, icol: Integer index arrays of the pairs to evaluate
+        - velocity: Optional precomputed tuple (ownu, ownv, intu, intv),
+          as returned by velocity_components()
+
+        Returns:
+        - swconfl, swlos: Conflict and LoS flags per pair
+        - qdr, dist, dcpa2, tcpa, tinconf: Conflict geometry per pair
+    '''
+    ownu, ownv, intu, intv = velocity or velocity_components(ownship, intruder)
+    notself = irow != icol
+
+    # Horizontal conflict, with the same operation order as kwikqdrdist_matrix
+    lata, lona = ownship.lat[irow], ownship.lon[irow]
+    latb, lonb = intruder.lat[icol], intruder.lon[icol]
+    dlat = np.radians(latb - lata)
+    dlon = np.radians(((lonb - lona) + 180) % 360 - 180)
+    cavelat = np.cos(np.radians(latb + lata) * 0.5)
+    dangle = np.sqrt(np.multiply(dlat, dlat) +
+                     np.multiply(np.multiply(dlon, dlon),
+                                 np.multiply(cavelat, cavelat)))
+    dist = 6371000. * dangle / nm * nm + np.where(notself, 0.0, 1e9)
+    qdr = np.mod(np.degrees(np.arctan2(np.multiply(dlon, cavelat), dlat)), 360.0)
+
+    qdrrad = np.radians(qdr)
+    dx = dist * np.sin(qdrrad)
+    dy = dist * np.cos(qdrrad)
+    du = ownu[icol] - intu[irow]
+    dv = ownv[icol] - intv[irow]
+
+    dv2 = du * du + dv * dv
+    dv2 = np.where(np.abs(dv2) < 1e-6, 1e-6, dv2)
+    vrel = np.sqrt(dv2)
+
+    tcpa = -(du * dx + dv * dy) / dv2 + np.where(notself, 0.0, 1e9)
+    dcpa2 = np.abs(dist * dist - tcpa * tcpa * dv2)
+
+    rpz = np.maximum(rpz[icol], rpz[irow])
+    R2 = rpz * rpz
+    swhorconf = dcpa2 < R2
+
+    dxinhor = np.sqrt(np.maximum(0., R2 - dcpa2))
+    dtinhor = dxinhor / vrel
+    tinhor = np.where(swhorconf, tcpa - dtinhor, 1e8)
+    touthor = np.where(swhorconf, tcpa + dtinhor, -1e8)
+
+    # Vertical conflict
+    dalt = ownship.alt[icol] - intruder.alt[irow] + np.where(notself, 0.0, 1e9)
+    dvs = ownship.vs[icol] - intruder.vs[irow]
+    dvs = np.where(np.abs(dvs) < 1e-6, 1e-6, dvs)
+
+    hpz = np.maximum(hpz[icol], hpz[irow])
+    tcrosshi = (dalt + hpz) / -dvs
+    tcrosslo = (dalt - hpz) / -dvs
+    tinver = np.minimum(tcrosshi, tcrosslo)
+    toutver = np.maximum(tcrosshi, tcrosslo)
+
+    # Combine vertical and horizontal conflict
+    tinconf = np.maximum(tinver, tinhor)
+    toutconf = np.minimum(toutver, touthor)
+
+    swconfl = swhorconf & (tinconf <= toutconf) & (toutconf > 0.0) & \
+        (tinconf < dtlookahead[irow]) & notself
+    swlos = (dist < rpz) & (np.abs(dalt) < hpz)
+
+    return swconfl, swlos, qdr, dist, dcpa2, tcpa, tinconf
+
+
+def velocity_components(ownship, intruder):
+    ''' Eastern and northern ground speed components of ownship and intruder. '''
+    return (*derivedstate(ownship).gsvel, *derivedstate(intruder).gsvel)
 
 
 try:
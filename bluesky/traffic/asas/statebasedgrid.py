@@ -0,0 +1,146 @@
+''' State-based conflict detection with a spatial hashing broadphase. '''
+import numpy as np
+from itertools import product
+
+from bluesky.traffic.asas.statebased import StateBased, detect_pairs, velocity_components
+
+
+# Earth radius used to scale the horizontal grid [m]
+Rearth = 6371000.
+
+# Relative margin on the cell size, to make sure that the broadphase is
+# conservative with respect to the flat-earth distance approximation used
+# in the CPA calculation
+cellmargin = 1.1
+
+
+class StateBasedGrid(StateBased):
+    ''' State-based conflict detection, where the exact CPA test is only
+        performed for aircraft pairs that share or neighbour a grid cell.
+
+        Aircraft positions are binned in a grid over earth-centered
+        coordinates on the unit sphere (which avoids special cases at the
+        antimeridian and the poles), and altitude. Cell sizes are chosen such
+        that any pair that is in conflict or LoS within the lookahead time is
+        always found in neighbouring cells:
+        - horizontal: lookahead time x max closing speed + horizontal PZ radius
+        - vertical: lookahead time x max closing vertical speed + vertical PZ size
+
+        Results are identical to those of StateBased, but the amount of work
+        scales with the number of nearby aircraft pairs instead of ntraf^2.
+    '''
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        velocity = velocity_components(ownship, intruder)
+
+        conf, los = [], []
+        qdr, dist, dcpa2, tcpa, tinconf = [], [], [], [], []
+        for irow, icol in self.candidates(ownship, intruder, rpz, hpz, dtlookahead):
+            sw_c, sw_l, qdr_p, dist_p, dcpa2_p, tcpa_p, tinconf_p = \
+                detect_pairs(ownship, intruder, irow, icol, rpz, hpz,
+                             dtlookahead, velocity)
+            conf.append((irow[sw_c], icol[sw_c]))
+            los.append((irow[sw_l], icol[sw_l]))
+            qdr.append(qdr_p[sw_c])
+            dist.append(dist_p[sw_c])
+            dcpa2.append(dcpa2_p[sw_c])
+            tcpa.append(tcpa_p[sw_c])
+            tinconf.append(tinconf_p[sw_c])
+
+        # Sort pairs in row-major order, as np.where would for a full matrix
+        iconf, jconf = (np.concatenate(v) for v in zip(*conf)) if conf else \
+            (np.array([], dtype=int), np.array([], dtype=int))
+        order = np.lexsort((jconf, iconf))
+        iconf, jconf = iconf[order], jconf[order]
+        qdr, dist, dcpa2, tcpa, tinconf = (
+            np.concatenate(v)[order] if v else np.array([])
+            for v in (qdr, dist, dcpa2, tcpa, tinconf))
+
+        ilos, jlos = (np.concatenate(v) for v in zip(*los)) if los else \
+            (np.array([], dtype=int), np.array([], dtype=int))
+        order = np.lexsort((jlos, ilos))
+        ilos, jlos = ilos[order], jlos[order]
+
+        # Ownship conflict flag and max tCPA
+        inconf = np.zeros(ownship.ntraf, dtype=bool)
+        inconf[iconf] = True
+        tcpamax = np.zeros(ownship.ntraf)
+        np.maximum.at(tcpamax, iconf, tcpa)
+
+        confpairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(iconf, jconf)]
+        lospairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(ilos, jlos)]
+
+        return confpairs, lospairs, inconf, tcpamax, \
+            qdr, dist, np.sqrt(dcpa2), tcpa, tinconf, \
+                np.array((iconf, jconf)), np.array((ilos, jlos))
+
+    @staticmethod
+    def candidates(ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Generator of candidate pairs (irow, icol) for the narrowphase.
+
+            Yields one batch of pairs per neighbour cell offset, so that the
+            narrowphase never needs to hold all candidate pairs at once.
+            Pairs are unique over all batches.
+        '''
+        ntraf = ownship.ntraf
+        if ntraf < 2:
+            return
+
+        tlook = max(0.0, np.max(dtlookahead))
+        hcell = cellmargin * (tlook * (np.max(ownship.gs) + np.max(intruder.gs)) +
+                              np.max(rpz)) / Rearth
+        vcell = cellmargin * (tlook * (np.max(np.abs(ownship.vs)) +
+                                       np.max(np.abs(intruder.vs))) + np.max(hpz))
+
+        # Limit the number of cells per dimension to keep cell keys within int64
+        altspan = max(np.ptp(ownship.alt), np.ptp(intruder.alt))
+        hcell = max(hcell, 1e-5)
+        vcell = max(vcell, altspan / 256, 1.0)
+
+        # Integer cell coordinates of ownship (rows) and intruders (columns)
+        cellsrow = gridcells(ownship.lat, ownship.lon, ownship.alt, hcell, vcell)
+        cellscol = gridcells(intruder.lat, intruder.lon, intruder.alt, hcell, vcell)
+
+        # Combine cell coordinates to a single integer key. Each dimension
+        # has one empty cell on either side, so neighbour keys never alias.
+        cmin = np.minimum(cellsrow.min(axis=1), cellscol.min(axis=1)) - 1
+        cellsrow -= cmin[:, np.newaxis]
+        cellscol -= cmin[:, np.newaxis]
+        dims = np.maximum(cellsrow.max(axis=1), cellscol.max(axis=1)) + 2
+        strides = np.cumprod(np.concatenate(([1], dims[:0:-1])))[::-1]
+        keyrow = strides @ cellsrow
+        keycol = strides @ cellscol
+
+        # Sort intruders on their cell key
+        colorder = np.argsort(keycol, kind='stable')
+        keycol = keycol[colorder]
+
+        # Only check neighbours in dimensions that have more than one cell
+        offsets = [(-1, 0, 1) if d > 3 else (0,) for d in dims]
+        for offset in product(*offsets):
+            nbkey = keyrow + strides @ offset
+            lo = np.searchsorted(keycol, nbkey, side='left')
+            hi = np.searchsorted(keycol, nbkey, side='right')
+            count = hi - lo
+            npairs = count.sum()
+            if npairs == 0:
+                continue
+            irow = np.repeat(np.arange(ntraf), count)
+            start = np.repeat(lo - np.cumsum(count) + count, count)
+            icol = colorder[start + np.arange(npairs)]
+            yield irow, icol
+
+
+def gridcells(lat, lon, alt, hcell, vcell):
+    ''' Integer grid cell coordinates of a set of positions.
+
+        Horizontal coordinates are those of the position on the unit sphere,
+        with cell size hcell [-], the vertical coordinate has cell size vcell [m].
+    '''
+    latrad = np.radians(lat)
+    lonrad = np.radians(lon)
+    coslat = np.cos(latrad)
+    return np.floor(np.vstack((coslat * np.cos(lonrad) / hcell,
+                               coslat * np.sin(lonrad) / hcell,
+                               np.sin(latrad) / hcell,
+                               alt / vcell))).astype(np.int64)
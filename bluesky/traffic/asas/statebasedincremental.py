@@ -0,0 +1,174 @@
+''' Incremental state-based conflict detection. '''
+from types import SimpleNamespace
+import numpy as np
+
+import bluesky as bs
+from bluesky.tools import geo
+from bluesky.tools.aero import nm, kts, fpm
+from bluesky.traffic.asas.statebasedgrid import StateBasedGrid, cellmargin
+
+
+bs.settings.set_variable_defaults(asas_incr_horizon=60.0, asas_incr_maxgs=700.0,
+                                  asas_incr_maxvs=6000.0)
+
+
+class StateBasedIncremental(StateBasedGrid):
+    ''' State-based conflict detection that skips aircraft pairs that are
+        too far apart to be in conflict.
+
+        For each pair, the earliest simulation time is computed at which a
+        conflict within the lookahead time becomes geometrically possible,
+        assuming both aircraft fly towards each other at maximum speed.
+        Pairs are kept in a re-check queue ordered by this time, and the
+        exact CPA test is only performed for pairs that are due.
+
+        The queue is rebuilt with a grid broadphase every asas_incr_horizon
+        seconds, and only holds pairs that can become due within that horizon.
+        Pairs of aircraft that are created, moved, or get a new protected
+        zone or lookahead time are recomputed at the next update.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.clearqueue()
+        self.horizon = bs.settings.asas_incr_horizon
+        self.maxgs = bs.settings.asas_incr_maxgs * kts
+        self.maxvs = bs.settings.asas_incr_maxvs * fpm
+
+    def clearqueue(self):
+        ''' Empty the re-check queue, and schedule a rebuild at the next update. '''
+        # Time-ordered re-check queue of aircraft pairs (i < j)
+        self.due = np.array([])
+        self.pairs = np.empty((2, 0), dtype=int)
+        # Simulation time of the next full rebuild of the queue
+        self.tnextsweep = -1.0
+        # Aircraft whose pairs need to be recomputed
+        self.dirty = np.array([], dtype=int)
+
+    def invalidate(self, idx=None):
+        ''' Recompute the pairs of aircraft idx (or all pairs) at the next update. '''
+        if idx is None:
+            self.tnextsweep = -1.0
+        else:
+            self.dirty = np.union1d(self.dirty, idx)
+
+    def clearconfdb(self):
+        super().clearconfdb()
+        self.invalidate()
+
+    def create(self, n=1):
+        super().create(n)
+        ntraf = len(self.rpz)
+        self.invalidate(np.arange(ntraf - n, ntraf))
+
+    def delete(self, idx):
+        super().delete(idx)
+        # Remove the pairs of deleted aircraft from the queue, and shift
+        # the remaining indices to the new aircraft order
+        idx = np.atleast_1d(idx)
+        keep = ~(np.isin(self.pairs[0], idx) | np.isin(self.pairs[1], idx))
+        self.due = self.due[keep]
+        self.pairs = self.pairs[:, keep]
+        self.pairs -= np.searchsorted(np.sort(idx), self.pairs)
+        self.dirty = np.setdiff1d(self.dirty, idx)
+        self.dirty -= np.searchsorted(np.sort(idx), self.dirty)
+
+    def reset(self):
+        super().reset()
+        self.clearqueue()
+
+    def candidates(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Generator of the aircraft pairs that are due for a conflict check. '''
+        if ownship.ntraf < 2:
+            return
+        simt = bs.sim.simt
+
+        # The re-check times are only valid as long as no aircraft
+        # exceeds the assumed maximum speeds
+        maxgs = max(np.max(ownship.gs), np.max(intruder.gs))
+        maxvs = max(np.max(np.abs(ownship.vs)), np.max(np.abs(intruder.vs)))
+        if maxgs > self.maxgs or maxvs > self.maxvs:
+            self.maxgs = max(self.maxgs, cellmargin * maxgs)
+            self.maxvs = max(self.maxvs, cellmargin * maxvs)
+            self.tnextsweep = -1.0
+
+        # Rebuilding the queue is cheaper than recomputing the pairs of
+        # many dirty aircraft against all other aircraft
+        if simt >= self.tnextsweep or len(self.dirty) ** 2 > ownship.ntraf:
+            self.sweep(ownship, intruder, rpz, hpz, dtlookahead, simt)
+        elif len(self.dirty):
+            self.recompute(ownship, intruder, rpz, hpz, dtlookahead, simt)
+        self.dirty = np.array([], dtype=int)
+
+        # Take the due pairs from the front of the queue, and put them
+        # back with their updated re-check time
+        ndue = np.searchsorted(self.due, simt, side='right')
+        i, j = self.pairs[:, :ndue]
+        due = self.recheck_time(ownship, intruder, i, j, rpz, hpz, dtlookahead, simt)
+        keep = due < self.tnextsweep
+        self.enqueue(due[keep], i[keep], j[keep], self.due[ndue:], self.pairs[:, ndue:])
+
+        # Check each due pair from the perspective of both aircraft
+        yield i, j
+        yield j, i
+
+    def sweep(self, ownship, intruder, rpz, hpz, dtlookahead, simt):
+        ''' Rebuild the re-check queue with all pairs that can become due
+            before the next sweep. '''
+        self.tnextsweep = simt + self.horizon
+
+        # Use the grid broadphase with maximum speeds, extended with the horizon
+        maxspd = SimpleNamespace(ntraf=ownship.ntraf, lat=ownship.lat, lon=ownship.lon,
+                                 alt=ownship.alt, gs=np.full(ownship.ntraf, self.maxgs),
+                                 vs=np.full(ownship.ntraf, self.maxvs))
+        due, pairs = [], []
+        for i, j in super().candidates(maxspd, maxspd, rpz, hpz,
+                                         dtlookahead + self.horizon):
+            sel = i < j
+            i, j = i[sel], j[sel]
+            duepair = self.recheck_time(ownship, intruder, i, j, rpz, hpz, dtlookahead, simt)
+            keep = duepair < self.tnextsweep
+            due.append(duepair[keep])
+            pairs.append(np.vstack((i[keep], j[keep])))
+        if due:
+            due = np.concatenate(due)
+            order = np.argsort(due, kind='stable')
+            self.due = due[order]
+            self.pairs = np.hstack(pairs)[:, order]
+        else:
+            self.due = np.array([])
+            self.pairs = np.empty((2, 0), dtype=int)
+
+    def recompute(self, ownship, intruder, rpz, hpz, dtlookahead, simt):
+        ''' Replace all queued pairs of dirty aircraft with pairs against
+            all other aircraft. '''
+        dirty = self.dirty
+        keep = ~(np.isin(self.pairs[0], dirty) | np.isin(self.pairs[1], dirty))
+
+        # All pairs (i, j) with i dirty, without duplicates when j is also dirty
+        i = np.repeat(dirty, ownship.ntraf)
+        j = np.tile(np.arange(ownship.ntraf), len(dirty))
+        sel = (i != j) & ~(np.isin(j, dirty) & (j < i))
+        i, j = np.minimum(i[sel], j[sel]), np.maximum(i[sel], j[sel])
+
+        due = self.recheck_time(ownship, intruder, i, j, rpz, hpz, dtlookahead, simt)
+        new = due < self.tnextsweep
+        self.enqueue(due[new], i[new], j[new], self.due[keep], self.pairs[:, keep])
+
+    def enqueue(self, due, i, j, queuedue, queuepairs):
+        ''' Merge pairs (i, j) with re-check time due into the sorted queue
+            (queuedue, queuepairs). '''
+        order = np.argsort(due, kind='stable')
+        pos = np.searchsorted(queuedue, due[order], side='right')
+        self.due = np.insert(queuedue, pos, due[order])
+        self.pairs = np.insert(queuepairs, pos, np.vstack((i[order], j[order])), axis=1)
+
+    def recheck_time(self, ownship, intruder, i, j, rpz, hpz, dtlookahead, simt):
+        ''' Earliest simulation time at which a conflict within the lookahead
+            time is possible for pairs (i, j), at maximum closing speed. '''
+        dist = geo.kwikdist(ownship.lat[i], ownship.lon[i],
+                            intruder.lat[j], intruder.lon[j]) * nm
+        dalt = np.abs(ownship.alt[i] - intruder.alt[j])
+        # Time until the protected zone can be reached horizontally and vertically
+        thor = (dist / cellmargin - np.maximum(rpz[i], rpz[j])) / (2.0 * self.maxgs)
+        tver = (dalt - np.maximum(hpz[i], hpz[j])) / (2.0 * self.maxvs)
+        return simt + np.maximum(thor, tver) - np.maximum(dtlookahead[i], dtlookahead[j])
@@ -0,0 +1,84 @@
+''' Multi-threaded state-based conflict detection. '''
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import bluesky as bs
+from bluesky import stack
+from bluesky.traffic.asas.statebasedtiled import StateBasedTiled, TileWorkspace
+
+
+bs.settings.set_variable_defaults(asas_nthreads=0)
+
+
+class StateBasedParallel(StateBasedTiled):
+    ''' Tiled state-based conflict detection, where the ownship rows are
+        partitioned over a persistent pool of worker threads.
+
+        The numpy kernels of the tiled detection release the GIL, so the
+        workers run concurrently. Each worker has its own scratch buffers
+        and pair lists, which are merged in row order, so results are
+        identical to those of StateBased regardless of the number of threads.
+
+        The pool is started on the first detection, and shut down when
+        another CD method is selected and on simulation reset.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.pool = None
+        self.workspaces = []
+        self.nthreads = 0
+        self.setnthreads(bs.settings.asas_nthreads)
+
+    @stack.command(name='CDTHREADS')
+    def setnthreads(self, nthreads: int = None):
+        ''' Set the number of threads of the parallel conflict detection.
+            A value of zero uses all available cores. '''
+        if nthreads is None:
+            return True, f'CDTHREADS [n]\nParallel CD currently uses {self.nthreads} threads'
+        if nthreads < 0:
+            return False, 'CDTHREADS: number of threads should be positive'
+        self.stoppool()
+        self.nthreads = nthreads or os.cpu_count() or 1
+        self.workspaces = [TileWorkspace() for _ in range(self.nthreads)]
+        return True
+
+    def stoppool(self):
+        ''' Shut down the worker pool. '''
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def deactivate(self):
+        super().deactivate()
+        self.stoppool()
+
+    def reset(self):
+        super().reset()
+        self.stoppool()
+
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(self.nthreads, thread_name_prefix='cd')
+        ntraf = ownship.ntraf
+        inconf = np.zeros(ntraf, dtype=bool)
+        tcpamax = np.zeros(ntraf)
+        acdata = self.aircraftdata(ownship, intruder, rpz, hpz, dtlookahead)
+
+        # Divide the rows in contiguous blocks of whole tiles, one per thread
+        ntiles = -(-ntraf // self.tilesize)
+        bounds = [min(ntraf, self.tilesize * (ntiles * i // self.nthreads))
+                  for i in range(self.nthreads + 1)]
+        futures = []
+        for ws, start, end in zip(self.workspaces, bounds[:-1], bounds[1:]):
+            ws.clear()
+            if end > start:
+                futures.append(self.pool.submit(self.detectrows, ws, start, end,
+                                                acdata, inconf, tcpamax))
+        for future in futures:
+            future.result()
+
+        # Workspaces are ordered by row, so merging them in order gives
+        # the same pair ordering as a single-threaded detection
+        return self.collect(self.workspaces, ownship, inconf, tcpamax)
@@ -0,0 +1,262 @@
+''' State-based conflict detection, evaluated in tiles of ownship rows. '''
+import numpy as np
+
+import bluesky as bs
+from bluesky import stack
+from bluesky.tools.aero import nm
+from bluesky.traffic.asas.statebased import StateBased, velocity_components
+
+
+bs.settings.set_variable_defaults(asas_tilesize=128)
+
+
+class StateBasedTiled(StateBased):
+    ''' State-based conflict detection that processes the ownship x intruder
+        matrix in tiles of a fixed number of ownship rows.
+
+        All intermediate results are stored in scratch buffers that are
+        reused between tiles and timesteps, and only the conflicting pairs
+        of each tile are stored. Peak memory is therefore O(ntraf x tilesize)
+        instead of O(ntraf^2). Results are identical to those of StateBased.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.tilesize = bs.settings.asas_tilesize
+        self.workspace = TileWorkspace()
+
+    @stack.command(name='CDTILESIZE')
+    def settilesize(self, tilesize: int = None):
+        ''' Set the number of ownship rows per tile of the tiled
+            conflict detection. '''
+        if tilesize is None:
+            return True, f'CDTILESIZE [rows]\nCurrent tile size is {self.tilesize} rows'
+        if tilesize < 1:
+            return False, 'CDTILESIZE: tile size should be at least one row'
+        self.tilesize = tilesize
+        self.workspace.scratch.clear()
+        return True
+
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        inconf = np.zeros(ownship.ntraf, dtype=bool)
+        tcpamax = np.zeros(ownship.ntraf)
+        acdata = self.aircraftdata(ownship, intruder, rpz, hpz, dtlookahead)
+        self.workspace.clear()
+        self.detectrows(self.workspace, 0, ownship.ntraf, acdata, inconf, tcpamax)
+        return self.collect([self.workspace], ownship, inconf, tcpamax)
+
+    @staticmethod
+    def aircraftdata(ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Per-aircraft values used in the CD matrix, as row vectors
+            (intruder index j) and column vectors (ownship index i). '''
+        ntraf = ownship.ntraf
+        ownu, ownv, intu, intv = velocity_components(ownship, intruder)
+        ownu, ownv = ownu.reshape((1, ntraf)), ownv.reshape((1, ntraf))
+        intu, intv = intu.reshape((ntraf, 1)), intv.reshape((ntraf, 1))
+        ownlat, ownlon = ownship.lat.reshape((ntraf, 1)), ownship.lon.reshape((ntraf, 1))
+        intlat, intlon = intruder.lat.reshape((1, ntraf)), intruder.lon.reshape((1, ntraf))
+        ownalt, ownvs = ownship.alt.reshape((1, ntraf)), ownship.vs.reshape((1, ntraf))
+        intalt, intvs = intruder.alt.reshape((ntraf, 1)), intruder.vs.reshape((ntraf, 1))
+        rpzrow, rpzcol = rpz.reshape((1, ntraf)), rpz.reshape((ntraf, 1))
+        hpzrow, hpzcol = hpz.reshape((1, ntraf)), hpz.reshape((ntraf, 1))
+        dtlookcol = dtlookahead.reshape((ntraf, 1))
+        return ownu, ownv, intu, intv, ownlat, ownlon, intlat, intlon, \
+            ownalt, ownvs, intalt, intvs, rpzrow, rpzcol, hpzrow, hpzcol, dtlookcol
+
+    def detectrows(self, ws, start, end, acdata, inconf, tcpamax):
+        ''' Perform conflict detection for ownship rows start to end, using
+            the scratch buffers and pair lists of workspace ws. '''
+        ownu, ownv, intu, intv, ownlat, ownlon, intlat, intlon, \
+            ownalt, ownvs, intalt, intvs, rpzrow, rpzcol, hpzrow, hpzcol, dtlookcol = acdata
+        ntraf = ownlat.shape[0]
+        buffer = ws.buffer
+
+        for i0 in range(start, end, self.tilesize):
+            i1 = min(end, i0 + self.tilesize)
+            rows = slice(i0, i1)
+            shape = (i1 - i0, ntraf)
+            # Row and column indices of the diagonal elements within this tile
+            diag = (np.arange(i1 - i0), np.arange(i0, i1))
+
+            # Horizontal conflict, with the operations of kwikqdrdist_matrix
+            dlat = np.subtract(intlat, ownlat[rows], out=buffer('dlat', shape))
+            np.radians(dlat, out=dlat)
+            dlon = np.subtract(intlon, ownlon[rows], out=buffer('dlon', shape))
+            np.add(dlon, 180, out=dlon)
+            np.remainder(dlon, 360, out=dlon)
+            np.subtract(dlon, 180, out=dlon)
+            np.radians(dlon, out=dlon)
+            cavelat = np.add(intlat, ownlat[rows], out=buffer('cavelat', shape))
+            np.radians(cavelat, out=cavelat)
+            np.multiply(cavelat, 0.5, out=cavelat)
+            np.cos(cavelat, out=cavelat)
+
+            tmp = buffer('tmp', shape)
+            dist = np.multiply(dlon, dlon, out=buffer('dist', shape))
+            np.multiply(cavelat, cavelat, out=tmp)
+            np.multiply(dist, tmp, out=dist)
+            np.multiply(dlat, dlat, out=tmp)
+            np.add(tmp, dist, out=dist)
+            np.sqrt(dist, out=dist)
+            np.multiply(6371000., dist, out=dist)
+            np.divide(dist, nm, out=dist)
+            np.multiply(dist, nm, out=dist)
+            dist[diag] += 1e9
+
+            qdr = np.multiply(dlon, cavelat, out=buffer('qdr', shape))
+            np.arctan2(qdr, dlat, out=qdr)
+            np.degrees(qdr, out=qdr)
+            np.remainder(qdr, 360., out=qdr)
+
+            # Relative position and velocity, reusing the kwikqdrdist buffers
+            qdrrad = np.radians(qdr, out=tmp)
+            dx = np.sin(qdrrad, out=dlat)
+            np.multiply(dist, dx, out=dx)
+            dy = np.cos(qdrrad, out=dlon)
+            np.multiply(dist, dy, out=dy)
+            du = np.subtract(ownu, intu[rows], out=cavelat)
+            dv = np.subtract(ownv, intv[rows], out=buffer('dv', shape))
+
+            dv2 = np.multiply(du, du, out=buffer('dv2', shape))
+            np.multiply(dv, dv, out=tmp)
+            np.add(dv2, tmp, out=dv2)
+            np.copyto(dv2, 1e-6, where=np.abs(dv2) < 1e-6)
+            vrel = np.sqrt(dv2, out=buffer('vrel', shape))
+
+            tcpa = np.multiply(du, dx, out=buffer('tcpa', shape))
+            np.multiply(dv, dy, out=tmp)
+            np.add(tcpa, tmp, out=tcpa)
+            np.negative(tcpa, out=tcpa)
+            np.divide(tcpa, dv2, out=tcpa)
+            # Equivalent of + 1e9 * I, including its conversion of -0.0 to 0.0
+            np.add(tcpa, 0.0, out=tcpa)
+            tcpa[diag] += 1e9
+
+            # Calculate distance^2 at CPA (minimum distance^2)
+            dcpa2 = np.multiply(dist, dist, out=buffer('dcpa2', shape))
+            np.multiply(tcpa, tcpa, out=tmp)
+            np.multiply(tmp, dv2, out=tmp)
+            np.subtract(dcpa2, tmp, out=dcpa2)
+            np.abs(dcpa2, out=dcpa2)
+
+            # Check for horizontal conflict
+            rpzpair = np.maximum(rpzrow, rpzcol[rows], out=du)
+            R2 = np.multiply(rpzpair, rpzpair, out=dv)
+            swhorconf = np.less(dcpa2, R2, out=buffer('swhorconf', shape, bool))
+
+            dtinhor = np.subtract(R2, dcpa2, out=dv2)
+            np.maximum(0., dtinhor, out=dtinhor)
+            np.sqrt(dtinhor, out=dtinhor)
+            np.divide(dtinhor, vrel, out=dtinhor)
+            tinhor = np.subtract(tcpa, dtinhor, out=dx)
+            tinhor[~swhorconf] = 1e8
+            touthor = np.add(tcpa, dtinhor, out=dy)
+            touthor[~swhorconf] = -1e8
+
+            # Vertical conflict
+            dalt = np.subtract(ownalt, intalt[rows], out=vrel)
+            np.add(dalt, 0.0, out=dalt)
+            dalt[diag] += 1e9
+            dvs = np.subtract(ownvs, intvs[rows], out=dv2)
+            np.copyto(dvs, 1e-6, where=np.abs(dvs) < 1e-6)
+            negdvs = np.negative(dvs, out=buffer('negdvs', shape))
+
+            hpzpair = np.maximum(hpzrow, hpzcol[rows], out=buffer('hpz', shape))
+            tcrosshi = np.add(dalt, hpzpair, out=tmp)
+            np.divide(tcrosshi, negdvs, out=tcrosshi)
+            tcrosslo = np.subtract(dalt, hpzpair, out=dvs)
+            np.divide(tcrosslo, negdvs, out=tcrosslo)
+
+            tinconf = np.minimum(tcrosshi, tcrosslo, out=buffer('tinconf', shape))
+            np.maximum(tinconf, tinhor, out=tinconf)
+            toutconf = np.maximum(tcrosshi, tcrosslo, out=tmp)
+            np.minimum(toutconf, touthor, out=toutconf)
+
+            swconfl = swhorconf
+            swconfl &= tinconf <= toutconf
+            swconfl &= toutconf > 0.0
+            swconfl &= tinconf < dtlookcol[rows]
+            swconfl[diag] = False
+
+            # Ownship conflict flag and max tCPA
+            inconf[rows] = np.any(swconfl, 1)
+            tcpamax[rows] = np.max(np.multiply(tcpa, swconfl, out=tmp), 1)
+
+            # Store conflicting pairs
+            iconf, jconf = np.nonzero(swconfl)
+            ws.conf.append(iconf + i0, jconf, qdr[swconfl], dist[swconfl],
+                             np.sqrt(dcpa2[swconfl]), tcpa[swconfl], tinconf[swconfl])
+
+            swlos = np.less(dist, rpzpair, out=swhorconf)
+            swlos &= np.abs(dalt, out=tmp) < hpzpair
+            ilos, jlos = np.nonzero(swlos)
+            ws.los.append(ilos + i0, jlos)
+
+    @staticmethod
+    def collect(workspaces, ownship, inconf, tcpamax):
+        ''' Combine the pairs stored in workspaces (in order) into the
+            output of detect(). '''
+        iconf, jconf, qdr, dist, dcpa, tcpa, tinconf = \
+            (np.concatenate(v) for v in zip(*(ws.conf.get() for ws in workspaces)))
+        ilos, jlos = (np.concatenate(v) for v in zip(*(ws.los.get() for ws in workspaces)))
+        confpairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(iconf, jconf)]
+        lospairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(ilos, jlos)]
+
+        return confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tinconf, \
+            np.array((iconf, jconf)), np.array((ilos, jlos))
+
+
+class TileWorkspace:
+    ''' Scratch buffers and conflict/LoS pair lists of one CD worker. '''
+    def __init__(self):
+        self.scratch = dict()
+        self.conf = PairList(5)
+        self.los = PairList(0)
+
+    def clear(self):
+        ''' Remove all stored pairs. '''
+        self.conf.clear()
+        self.los.clear()
+
+    def buffer(self, name, shape, dtype=float):
+        ''' Return scratch array name with the given shape. The underlying
+            memory is reused as long as it is large enough. '''
+        size = shape[0] * shape[1]
+        buf = self.scratch.get(name)
+        if buf is None or buf.size < size:
+            buf = self.scratch[name] = np.empty(size, dtype=dtype)
+        return buf[:size].reshape(shape)
+
+
+class PairList:
+    ''' Growable arrays of aircraft index pairs (i, j), with nfields
+        floating point values per pair. '''
+    def __init__(self, nfields, capacity=256):
+        self.n = 0
+        self.idx = np.empty((2, capacity), dtype=int)
+        self.data = np.empty((nfields, capacity))
+
+    def clear(self):
+        ''' Remove all pairs. The allocated memory is kept. '''
+        self.n = 0
+
+    def append(self, i, j, *data):
+        ''' Append pairs with index arrays i and j, and their data. '''
+        nnew = self.n + len(i)
+        if nnew > self.idx.shape[1]:
+            capacity = max(nnew, 2 * self.idx.shape[1])
+            idx = np.empty((2, capacity), dtype=int)
+            idx[:, :self.n] = self.idx[:, :self.n]
+            self.idx = idx
+            newdata = np.empty((len(self.data), capacity))
+            newdata[:, :self.n] = self.data[:, :self.n]
+            self.data = newdata
+        self.idx[0, self.n:nnew] = i
+        self.idx[1, self.n:nnew] = j
+        for row, values in zip(self.data, data):
+            row[self.n:nnew] = values
+        self.n = nnew
+
+    def get(self):
+        ''' Return views of the index arrays and data of all stored pairs. '''
+        return (*self.idx[:, :self.n], *self.data[:, :self.n])
@@ -4,10 +4,10 @@ import numpy as np
 from collections.abc import Collection
 import bluesky as bs
 from bluesky import stack
-from bluesky.tools import geo
+from bluesky.tools import aerotable, geo
 from bluesky.tools.misc import degto180
 from bluesky.tools.position import txt2pos
-from bluesky.tools.aero import ft, nm, fpm, vcasormach2tas, vcas2tas, tas2cas, cas2tas, g0
+from bluesky.tools.aero import ft, nm, fpm, vcas2tas, vtas2cas, g0
 from bluesky.core import Entity
 from .route import Route
 
@@ -68,8 +68,9 @@ class Autopilot(Entity, replaceable=True):
             # Currently used roll/bank angle [rad]
             self.turnphi = np.array([])  # [rad] bank angle setting of autopilot
 
-            # Route objects
+            # Route objects, and their slots in the route store
             self.route = []
+            self.routeslot = np.array([], dtype=int)
 
 
         self.idxreached = []    # List indices of aircraft who have reached their active waypoint
@@ -105,6 +106,7 @@ class Autopilot(Entity, replaceable=True):
         # Route objects
         for ridx, acid in enumerate(bs.traf.id[-n:]):
             self.route[ridx - n] = Route(acid)
+            self.routeslot[ridx - n] = self.route[ridx - n].slot
 
     def wppassingcheck(self, qdr, dist): # qdr [deg], dist [m[
         """
@@ -113,8 +115,9 @@ class Autopilot(Entity, replaceable=True):
 
         actwp data contains traffic arrays, to allow vectorizing the guidance logic.
 
-        Waypoint switching (just like the adding, deletion in route) are event driven commands and
-        therefore not vectorized as they occur rarely compared to the guidance.
+        Waypoint switching is done for all aircraft that reached their active waypoint at once, using the
+        route store. Only the stack commands of waypoints, and the runway hold after landing, are
+        processed per aircraft.
 
         wppassingcheck contains the waypoint switching function:
         - Check which aircraft i have reached their active waypoint
@@ -129,157 +132,9 @@ class Autopilot(Entity, replaceable=True):
         # This vectorized function checks the passing of the waypoint using a.o. the current turn radius
         self.idxreached = bs.traf.actwp.reached(qdr, dist)
 
-        # For the one who have reached their active waypoint, update vectorized leg data for guidance
-        for i in self.idxreached:
-
-            #debug commands to check VNAV state while passing waypoint
-            #print("Passing waypoint",bs.traf.ap.route[i].wpname[bs.traf.ap.route[i].iactwp])
-            #print("dist2wp,dist2vs",self.dist2wp[i]/nm,self.dist2vs[i]/nm) # distance to wp & distance to ToD/ToC
-
-            # Save current wp speed for use on next leg when we pass this waypoint
-            # VNAV speeds are always FROM-speeds, so we accelerate/decellerate at the waypoint
-            # where this speed is specified, so we need to save it for use now
-            # before getting the new data for the next waypoint
-
-            # Get speed for next leg from the waypoint we pass now and set as active spd
-            bs.traf.actwp.spd[i]    = bs.traf.actwp.nextspd[i]
-            bs.traf.actwp.spdcon[i] = bs.traf.actwp.nextspd[i]
-
-            # Execute stack commands for the still active waypoint, which we pass now
-            self.route[i].runactwpstack()
-            
-            # Get next wp, if there still is one
-            if not bs.traf.actwp.swlastwp[i]:
-                lat, lon, alt, bs.traf.actwp.nextspd[i], \
-                bs.traf.actwp.xtoalt[i], toalt, \
-                    bs.traf.actwp.xtorta[i], bs.traf.actwp.torta[i], \
-                    lnavon, flyby, flyturn, turnrad, turnspd, turnhdgr, turnbank,\
-                    bs.traf.actwp.next_qdr[i], bs.traf.actwp.swlastwp[i] =      \
-                    self.route[i].getnextwp()  # [m] note: xtoalt,nextaltco are in meters
-
-
-                bs.traf.actwp.nextturnlat[i], bs.traf.actwp.nextturnlon[i], \
-                bs.traf.actwp.nextturnspd[i], bs.traf.actwp.nextturnrad[i], \
-                bs.traf.actwp.nextturnhdgr[i],bs.traf.actwp.nextturnidx[i] = \
-                    self.route[i].getnextturnwp()
-
-            else:
-                # Prevent trying to activate the next waypoint when it was already the last waypoint
-                # In case of end of route/no more waypoints: switch off LNAV using the lnavon
-                bs.traf.swlnav[i] = False
-                bs.traf.swvnav[i] = False
-                bs.traf.swvnavspd[i] = False
-                continue # Go to next a/c which reached its active waypoint
-
-            # Special turns: specified by one or two of the following variables:
-            # Turn speed, turn radius, turn bank angle, turn rate
-            # if flyturn:
-            #     # First situation, if turn rate is specified
-            #     if turnspd<=0.:
-            #         turnspd = bs.traf.tas[i]
-
-            #     # Heading rate overrides turnrad
-            #     if turnhdgr>0:
-            #         turnrad = bs.traf.tas[i]*360./(2*np.pi*turnhdgr)
-
-            #     # Use last turn radius for bank angle in current turn
-            #     if bs.traf.actwp.turnrad[i] > 0.:
-            #         self.turnphi[i] = atan(bs.traf.actwp.turnspd[i]*bs.traf.actwp.turnspd[i]/ \
-            #                                (bs.traf.actwp.turnrad[i]*g0)) # [rad]
-            #     else:
-            #         self.turnphi[i] = 0.0  # [rad] or leave untouched???
-
-            # else:
-            #     self.turnphi[i] = 0.0  #[rad] or leave untouched???
-
-
-
-            # Check LNAV switch returned by getnextwp
-            # Switch off LNAV if it failed to get next wpdata
-            if not lnavon and bs.traf.swlnav[i]:
-                bs.traf.swlnav[i] = False
-                # Last wp: copy last wp values for alt and speed in autopilot
-                if bs.traf.swvnavspd[i] and bs.traf.actwp.nextspd[i]>= 0.0:
-                    bs.traf.selspd[i] = bs.traf.actwp.nextspd[i]
-
-            # In case of no LNAV, do not allow VNAV mode to be active
-            bs.traf.swvnav[i] = bs.traf.swvnav[i] and bs.traf.swlnav[i]
-
-            bs.traf.actwp.lat[i] = lat  # [deg]
-            bs.traf.actwp.lon[i] = lon  # [deg]
-            # 1.0 in case of fly by, else fly over
-            bs.traf.actwp.flyby[i] = int(flyby)
-
-            # Update qdr and turndist for this new waypoint for ComputeVNAV
-            qdr[i], distnmi = geo.qdrdist(bs.traf.lat[i], bs.traf.lon[i],
-                                          bs.traf.actwp.lat[i], bs.traf.actwp.lon[i])
-
-            #dist[i] = distnmi * nm
-            self.dist2wp[i] = distnmi*nm
-
-            bs.traf.actwp.curlegdir[i] = qdr[i]
-            bs.traf.actwp.curleglen[i] = self.dist2wp[i]
-
-            # User has entered an altitude for the new waypoint
-            if alt >= -0.01: # positive alt on this waypoint means altitude constraint
-                bs.traf.actwp.nextaltco[i] = alt  # [m]
-                bs.traf.actwp.xtoalt[i] = 0.0
-            else:
-                bs.traf.actwp.nextaltco[i] = toalt  # [m]
-
-            #if not bs.traf.swlnav[i]:
-            #    bs.traf.actwp.spd[i] = -997.
-
-            # VNAV spd mode: use speed of this waypoint as commanded speed
-            # while passing waypoint and save next speed for passing next wp
-            # Speed is now from speed! Next speed is ready in wpdata
-            if bs.traf.swvnavspd[i] and bs.traf.actwp.spd[i]>= 0.0:
-                    bs.traf.selspd[i] = bs.traf.actwp.spd[i]
-
-            # Update turndist so ComputeVNAV works, is there a next leg direction or not?
-            if bs.traf.actwp.next_qdr[i] < -900.:
-                local_next_qdr = qdr[i]
-            else:
-                local_next_qdr = bs.traf.actwp.next_qdr[i]
-
-            # Calculate turn dist (and radius which we do not use now, but later) now for scalar variable [i]
-            bs.traf.actwp.turndist[i], turnrad, turnspd, turnbank, turnhdgr = \
-                bs.traf.actwp.calcturn(i, bs.traf.tas[i], qdr[i], 
-                                       local_next_qdr, turnbank, 
-                                       turnrad,turnspd,turnhdgr, flyturn, flyby)  # update turn distance for VNAV
-
-            # Get flyturn switches and data
-            bs.traf.actwp.oldturnspd[i]  = bs.traf.actwp.turnspd[i] # old turnspd, turning by this waypoint
-            bs.traf.actwp.flyturn[i]      = flyturn
-            bs.traf.actwp.turnrad[i]      = turnrad
-            bs.traf.actwp.turnspd[i]      = turnspd
-            bs.traf.actwp.turnhdgr[i]     = turnhdgr
-            self.turnphi[i] = np.deg2rad(turnbank)
-
-            # Pass on whether currently flyturn mode:
-            # at beginning of leg,c copy tonextwp to lastwp
-            # set next turn False
-            bs.traf.actwp.turnfromlastwp[i] = bs.traf.actwp.turntonextwp[i]
-            bs.traf.actwp.turntonextwp[i]   = False
-
-            # Keep both turning speeds: turn to leg and turn from leg
-            if bs.traf.actwp.flyturn[i]:
-                bs.traf.actwp.turnspd[i] = turnspd                  # new turnspd, turning by next waypoint
-            else:
-                bs.traf.actwp.turnspd[i] = -990.
-
-            # Reduce turn dist for reduced turnspd
-            if bs.traf.actwp.flyturn[i] and bs.traf.actwp.turnrad[i]<0.0 and bs.traf.actwp.turnspd[i]>=0.:
-                turntas = cas2tas(bs.traf.actwp.turnspd[i], bs.traf.alt[i])
-                bs.traf.actwp.turndist[i] = bs.traf.actwp.turndist[i]*turntas*turntas/(bs.traf.tas[i]*bs.traf.tas[i])
-
-            # VNAV = FMS ALT/SPD mode incl. RTA
-            self.ComputeVNAV(i, toalt, bs.traf.actwp.xtoalt[i], bs.traf.actwp.torta[i],
-                             bs.traf.actwp.xtorta[i])
-
-        
-
-        # End of reached-loop: the per waypoint i switching loop
+        # For the ones who have reached their active waypoint, update vectorized leg data for guidance
+        if len(self.idxreached) > 0:
+            self.switchwp(self.idxreached, qdr)
 
         # Update qdr2wp with up-to-date qdr, now that we have checked passing wp
         self.qdr2wp = qdr%360.
@@ -287,23 +142,228 @@ class Autopilot(Entity, replaceable=True):
         # Continuous guidance when speed constraint on active leg is in update-method
 
         # If still an RTA in the route and currently no speed constraint
-        for iac in np.where((bs.traf.actwp.torta > -99.)*(bs.traf.actwp.spdcon<0.0))[0]:
-            iwp = bs.traf.ap.route[iac].iactwp
-            if bs.traf.ap.route[iac].wprta[iwp]>-99.:
-
-                 # For all a/c flying to an RTA waypoint, recalculate speed more often
-                dist2go4rta = geo.kwikdist(bs.traf.lat[iac],bs.traf.lon[iac],
-                                           bs.traf.actwp.lat[iac],bs.traf.actwp.lon[iac])*nm \
-                               + bs.traf.ap.route[iac].wpxtorta[iwp] # last term zero for active wp rta
-
-                # Set bs.traf.actwp.spd to rta speed, if necessary
-                self.setspeedforRTA(iac,bs.traf.actwp.torta[iac],dist2go4rta)
-
-                # If VNAV speed is on (by default coupled to VNAV), use it for speed guidance
-                if bs.traf.swvnavspd[iac] and bs.traf.actwp.spd[iac]>=0.0:
-                     bs.traf.selspd[iac] = bs.traf.actwp.spd[iac]
+        rtaac = np.where((bs.traf.actwp.torta > -99.)*(bs.traf.actwp.spdcon<0.0))[0]
+        # whose active waypoint has an RTA, from the route store
+        actrow = Route.store.active(self.routeslot[rtaac])
+        onrta = (actrow >= 0) * (Route.store.data['wprta'][actrow] > -99.)
+        rtaac, actrow = rtaac[onrta], actrow[onrta]
+
+        # For all a/c flying to an RTA waypoint, recalculate speed more often
+        dist2go4rta = geo.kwikdist(bs.traf.lat[rtaac], bs.traf.lon[rtaac],
+                                   bs.traf.actwp.lat[rtaac], bs.traf.actwp.lon[rtaac])*nm \
+                      + Route.store.data['wpxtorta'][actrow] # last term zero for active wp rta
+
+        for iac, dist2go in zip(rtaac, dist2go4rta):
+            # Set bs.traf.actwp.spd to rta speed, if necessary
+            self.setspeedforRTA(iac,bs.traf.actwp.torta[iac],dist2go)
+
+            # If VNAV speed is on (by default coupled to VNAV), use it for speed guidance
+            if bs.traf.swvnavspd[iac] and bs.traf.actwp.spd[iac]>=0.0:
+                 bs.traf.selspd[iac] = bs.traf.actwp.spd[iac]
+
+    def switchwp(self, i, qdr):
+        """Switch aircraft i, which have reached their active waypoint, to
+           their next waypoint. The waypoint data of all these aircraft is
+           gathered from the route store at once. qdr [deg] is updated to the
+           new active waypoints."""
+        store = Route.store
+        actwp = bs.traf.actwp
+
+        # Save current wp speed for use on next leg when we pass this waypoint
+        # VNAV speeds are always FROM-speeds, so we accelerate/decellerate at the waypoint
+        # where this speed is specified, so we need to save it for use now
+        # before getting the new data for the next waypoint
+
+        # Get speed for next leg from the waypoint we pass now and set as active spd
+        actwp.spd[i]    = actwp.nextspd[i]
+        actwp.spdcon[i] = actwp.nextspd[i]
+
+        # Execute stack commands for the still active waypoint, which we pass now
+        # Only waypoints with stack commands need to be processed one by one
+        rows = store.active(self.routeslot[i])
+        for iac, row in zip(i, rows):
+            if row >= 0 and store.data['wpstack'][row]:
+                self.route[iac].runactwpstack()
+
+        # Prevent trying to activate the next waypoint when it was already the last waypoint
+        # In case of end of route/no more waypoints: switch off LNAV using the lnavon
+        last = actwp.swlastwp[i] | (store.count[self.routeslot[i]] == 0)
+        bs.traf.swlnav[i[last]] = False
+        bs.traf.swvnav[i[last]] = False
+        bs.traf.swvnavspd[i[last]] = False
+        i = i[~last]
+        if len(i) == 0:
+            return
+        slots = self.routeslot[i]
+
+        # Get next wp, if there still is one (see Route.getnextwp)
+        # Aircraft that have landed on a runway keep their active waypoint, and their runway heading
+        landed = store.landed[slots]
+        for iac in i[landed]:
+            self.route[iac].holdrunway()
+
+        # Switch LNAV off when last waypoint has been passed, else increase counter
+        iactwp, nwp = store.iactwp[slots], store.count[slots]
+        lnavon = ~landed & (iactwp < nwp - 1)
+        iactwp = store.iactwp[slots] = iactwp + lnavon
+        rows = store.start[slots] + iactwp
+
+        # Activate switch to indicate that this is the last waypoint (for lenient passing logic in actwp.Reached function)
+        actwp.swlastwp[i] = (iactwp == nwp - 1)
+
+        # Get qdr for next leg
+        hasnext = ~landed & (-1 < iactwp) & (iactwp < nwp - 1)
+        nextrows = np.where(hasnext, rows + 1, rows)
+        nextqdr, _ = geo.qdrdist(store.data['wplat'][rows], store.data['wplon'][rows],
+                                 store.data['wplat'][nextrows], store.data['wplon'][nextrows])
+        actwp.next_qdr[i] = np.where(hasnext, nextqdr, -999.)
+
+        # in case that there is a runway, the aircraft should remain on it
+        # instead of deviating to the airport centre
+        # When there is a destination: current = runway, next  = Dest
+        # Else: current = runway and this is also the last waypoint
+        wptype = store.data['wptype']
+        store.landed[slots] |= ~landed & (wptype[rows] == Route.runway) & \
+            ((store.data['wpname'][rows] == store.data['wpname'][store.start[slots] + nwp - 1]) |
+             (hasnext & (wptype[nextrows] == Route.dest)))
+
+        # Data of the new active waypoint
+        alt = store.data['wpalt'][rows]
+        toalt = store.data['wptoalt'][rows]
+        flyby = store.data['wpflyby'][rows]
+        flyturn = store.data['wpflyturn'][rows]
+        actwp.nextspd[i] = store.data['wpspd'][rows]
+        actwp.xtoalt[i] = store.data['wpxtoalt'][rows]  # [m] note: xtoalt,nextaltco are in meters
+        actwp.xtorta[i] = store.data['wpxtorta'][rows]
+        actwp.torta[i] = store.data['wptorta'][rows]
+
+        # Next turn waypoint data (see Route.getnextturnwp)
+        self.setnextturnwp(i, slots)
+
+        # Check LNAV switch returned by getnextwp
+        # Switch off LNAV if it failed to get next wpdata
+        lnavoff = ~lnavon & bs.traf.swlnav[i]
+        bs.traf.swlnav[i[lnavoff]] = False
+        # Last wp: copy last wp values for alt and speed in autopilot
+        lastspd = i[lnavoff & bs.traf.swvnavspd[i] & (actwp.nextspd[i] >= 0.0)]
+        bs.traf.selspd[lastspd] = actwp.nextspd[lastspd]
+
+        # In case of no LNAV, do not allow VNAV mode to be active
+        bs.traf.swvnav[i] = bs.traf.swvnav[i] & bs.traf.swlnav[i]
+
+        actwp.lat[i] = store.data['wplat'][rows]  # [deg]
+        actwp.lon[i] = store.data['wplon'][rows]  # [deg]
+        # 1.0 in case of fly by, else fly over
+        actwp.flyby[i] = flyby
+
+        # Update qdr and turndist for this new waypoint for ComputeVNAV
+        qdr[i], distnmi = geo.qdrdist(bs.traf.lat[i], bs.traf.lon[i],
+                                      actwp.lat[i], actwp.lon[i])
+
+        self.dist2wp[i] = distnmi*nm
+
+        actwp.curlegdir[i] = qdr[i]
+        actwp.curleglen[i] = self.dist2wp[i]
+
+        # User has entered an altitude for the new waypoint
+        # positive alt on this waypoint means altitude constraint
+        altco = alt >= -0.01
+        actwp.nextaltco[i] = np.where(altco, alt, toalt)  # [m]
+        actwp.xtoalt[i[altco]] = 0.0
+
+        # VNAV spd mode: use speed of this waypoint as commanded speed
+        # while passing waypoint and save next speed for passing next wp
+        # Speed is now from speed! Next speed is ready in wpdata
+        usespd = i[bs.traf.swvnavspd[i] & (actwp.spd[i] >= 0.0)]
+        bs.traf.selspd[usespd] = actwp.spd[usespd]
+
+        # Update turndist so ComputeVNAV works, is there a next leg direction or not?
+        local_next_qdr = np.where(actwp.next_qdr[i] < -900., qdr[i], actwp.next_qdr[i])
+
+        # Calculate turn dist (and radius which we do not use now, but later)
+        actwp.turndist[i], turnrad, turnspd, turnbank, turnhdgr = \
+            actwp.calcturn(i, bs.traf.tas[i], qdr[i], local_next_qdr,
+                           store.data['wpturnbank'][rows], store.data['wpturnrad'][rows],
+                           store.data['wpturnspd'][rows], store.data['wpturnhdgr'][rows],
+                           flyturn, flyby)  # update turn distance for VNAV
+
+        # Get flyturn switches and data
+        actwp.oldturnspd[i]  = actwp.turnspd[i] # old turnspd, turning by this waypoint
+        actwp.flyturn[i]     = flyturn
+        actwp.turnrad[i]     = turnrad
+        actwp.turnhdgr[i]    = turnhdgr
+        self.turnphi[i] = np.deg2rad(turnbank)
+
+        # Pass on whether currently flyturn mode:
+        # at beginning of leg,c copy tonextwp to lastwp
+        # set next turn False
+        actwp.turnfromlastwp[i] = actwp.turntonextwp[i]
+        actwp.turntonextwp[i]   = False
+
+        # Keep both turning speeds: turn to leg and turn from leg
+        # new turnspd, turning by next waypoint
+        actwp.turnspd[i] = np.where(flyturn, turnspd, -990.)
+
+        # Reduce turn dist for reduced turnspd
+        reduce = i[flyturn & (actwp.turnrad[i] < 0.0) & (actwp.turnspd[i] >= 0.)]
+        turntas = vcas2tas(actwp.turnspd[reduce], bs.traf.alt[reduce])
+        actwp.turndist[reduce] = actwp.turndist[reduce]*turntas*turntas/(bs.traf.tas[reduce]*bs.traf.tas[reduce])
+
+        # VNAV = FMS ALT/SPD mode incl. RTA
+        self.ComputeVNAV(i, toalt, actwp.xtoalt[i], actwp.torta[i], actwp.xtorta[i])
+
+    def setnextturnwp(self, idx, slots):
+        """Set the next turn waypoint data of aircraft idx with routes in slots
+           (see Route.getnextturnwp)."""
+        store = Route.store
+        actwp = bs.traf.actwp
+        trnrow = store.nextturn(slots)
+        turn = trnrow >= 0
+
+        # No turn waypoints: default values
+        noturn = idx[~turn]
+        actwp.nextturnlat[noturn] = 0.
+        actwp.nextturnlon[noturn] = 0.
+        actwp.nextturnspd[noturn] = -999.
+        actwp.nextturnrad[noturn] = -999.
+        actwp.nextturnhdgr[noturn] = -999.
+        actwp.nextturnidx[noturn] = -999.
+
+        idx, slots, trnrow = idx[turn], slots[turn], trnrow[turn]
+        if len(idx) == 0:
+            return
+        start, nwp = store.start[slots], store.count[slots]
+        trnidx = trnrow - start
+
+        # Calculate the turn first. We need to assume  that the aircraft is
+        # coming from perfectly on the previous leg.
+        wplat, wplon = store.data['wplat'], store.data['wplon']
+        prevrow = np.where(trnidx > 0, trnrow - 1, start + nwp - 1)
+        qdr, _ = geo.qdrdist(wplat[prevrow], wplon[prevrow], wplat[trnrow], wplon[trnrow])
+        hasnext = trnidx < nwp - 1
+        nextrow = np.where(hasnext, trnrow + 1, trnrow)
+        local_next_qdr, _ = geo.qdrdist(wplat[trnrow], wplon[trnrow], wplat[nextrow], wplon[nextrow])
+        local_next_qdr = np.where(hasnext, local_next_qdr, qdr)
+
+        turndist, turnrad, turnspd, turnbank, turnhdgr = \
+            actwp.calcturn(idx, bs.traf.tas[idx], qdr, local_next_qdr,
+                           store.data['wpturnbank'][trnrow], store.data['wpturnrad'][trnrow],
+                           store.data['wpturnspd'][trnrow], store.data['wpturnhdgr'][trnrow],
+                           True, False)
+
+        actwp.nextturnlat[idx] = wplat[trnrow]
+        actwp.nextturnlon[idx] = wplon[trnrow]
+        actwp.nextturnspd[idx] = turnspd
+        actwp.nextturnrad[idx] = turnrad
+        actwp.nextturnhdgr[idx] = turnhdgr
+        actwp.nextturnidx[idx] = trnidx
 
     def update(self):
+        # Update the flight plans of the routes that were edited since the last update
+        store = Route.store
+        for i in np.flatnonzero((store.stale[self.routeslot] >= 0) | store.redirect[self.routeslot]):
+            self.route[i].updatefp(i)
+
         # FMS LNAV mode:
         # qdr[deg],distinnm[nm]
         qdr, distinnm = geo.qdrdist(bs.traf.lat, bs.traf.lon,
@@ -376,7 +436,7 @@ class Autopilot(Entity, replaceable=True):
         # use the turn speed
 
         # Is turn speed specified and are we not already slow enough? We only decelerate for turns, not accel.
-        turntas       = np.where(bs.traf.actwp.nextturnspd>0.0, vcas2tas(bs.traf.actwp.nextturnspd, bs.traf.alt),
+        turntas       = np.where(bs.traf.actwp.nextturnspd>0.0, aerotable.vcas2tas(bs.traf.actwp.nextturnspd, bs.traf.derived.altitudes),
                                  -1.0+0.*bs.traf.tas)
         
         # Switch is now whether the aircraft has any turn waypoints
@@ -390,7 +450,7 @@ class Autopilot(Entity, replaceable=True):
         # Note that because nextspd comes from the stack, and can be either a mach number or
         # a calibrated airspeed, it can only be converted from Mach / CAS [kts] to TAS [m/s]
         # once the altitude is known.
-        nexttas = vcasormach2tas(bs.traf.actwp.nextspd, bs.traf.alt)
+        nexttas = aerotable.vcasormach2tas(bs.traf.actwp.nextspd, bs.traf.derived.altitudes)
 #
         dxspdconchg = distaccel(bs.traf.tas, nexttas, bs.traf.perf.axmax)
 
@@ -457,11 +517,12 @@ class Autopilot(Entity, replaceable=True):
         bs.traf.selspd = np.where(usecruisespd, self.cruisespd, bs.traf.selspd)
 
         # Below crossover altitude: CAS=const, above crossover altitude: Mach = const
-        self.tas = vcasormach2tas(bs.traf.selspd, bs.traf.alt)
+        self.tas = aerotable.vcasormach2tas(bs.traf.selspd, bs.traf.derived.altitudes)
 
     def ComputeVNAV(self, idx, toalt, xtoalt, torta, xtorta):
         """
-        This function to do VNAV (and RTA) calculations is only called only once per leg for one aircraft idx.
+        This function to do VNAV (and RTA) calculations is only called only once per leg for aircraft idx
+        (a single index, or an array of indices with arrays of the other arguments).
         If:
          - switching to next waypoint
          - when VNAV is activated
@@ -488,18 +549,17 @@ class Autopilot(Entity, replaceable=True):
         bs.traf.actwp.vs =  V/S to be used during climb/descent part, so when dist2wp<dist2vs [m] (to next waypoint)
         """
 
-        #print ("ComputeVNAV for",bs.traf.id[idx],":",toalt/ft,"ft  ",xtoalt/nm,"nm")
-        #print("Called by",callstack()[1].function)
+        idx, toalt, xtoalt, torta, xtorta = np.broadcast_arrays(
+            np.atleast_1d(idx), toalt, xtoalt, torta, xtorta)
 
         # Check  whether active waypoint speed needs to be adjusted for RTA
         # sets bs.traf.actwp.spd, if necessary
-        # debug print("xtorta+legdist =",(xtorta+legdist)/nm)
-        self.setspeedforRTA(idx, torta, xtorta + self.dist2wp[idx])  # all scalar
+        self.setspeedforRTA(idx, torta, xtorta + self.dist2wp[idx])
 
-        # Check if there is a target altitude and VNAV is on, else return doing nothing
-        if toalt < 0 or not bs.traf.swvnav[idx]:
-            self.dist2vs[idx] = -999999. #dist to next wp will never be less than this, so VNAV will do nothing
-            return
+        # Check if there is a target altitude and VNAV is on, else do nothing
+        novnav = (toalt < 0) | np.logical_not(bs.traf.swvnav[idx])
+        self.dist2vs[idx[novnav]] = -999999. #dist to next wp will never be less than this, so VNAV will do nothing
+        idx, toalt, xtoalt = idx[~novnav], toalt[~novnav], xtoalt[~novnav]
 
         # So: somewhere there is an altitude constraint ahead
         # Compute proper values for bs.traf.actwp.nextaltco, self.dist2vs, self.alt, bs.traf.actwp.vs
@@ -537,126 +597,100 @@ class Autopilot(Entity, replaceable=True):
         # - Descend at the latest when necessary for next altitude constraint
         #   which can be many waypoints beyond current actual waypoint
         epsalt = 2.*ft # deadzone
-        #
-        if bs.traf.alt[idx] > toalt + epsalt:
-            # Stop potential current climb (e.g. due to not making it to previous altco)
-            # then stop immediately, as in: do not make it worse.
-            if bs.traf.vs[idx]>0.0001:
-                self.vnavvs[idx] = 0.0
-                self.alt[idx] = bs.traf.alt[idx]
-                if bs.traf.swvnav[idx]:
-                    bs.traf.selalt[idx] = bs.traf.alt[idx]
-
-            # Descent modes: VNAV (= swtod/Top of Descent logic) or aiming at next alt constraint
-
-            # Calculate max allowed altitude at next wp (above toalt)
-            bs.traf.actwp.nextaltco[idx] = toalt  # [m] next alt constraint
-            bs.traf.actwp.xtoalt[idx]    = xtoalt # [m] distance to next alt constraint measured from next waypoint
-
-
-            # VNAV ToD logic
-            if self.swtod[idx]:
-                # Get distance to waypoint
-                self.dist2wp[idx] = nm*geo.kwikdist(bs.traf.lat[idx], bs.traf.lon[idx],
-                                                 bs.traf.actwp.lat[idx],
-                                                 bs.traf.actwp.lon[idx])  # was not always up to date, so update first
-
-                # Distance to next waypoint where we need to start descent (top of descent) [m]
-                descdist = abs(bs.traf.alt[idx] - toalt) / self.steepness  # [m] required length for descent, uses default steepness!
-                self.dist2vs[idx] = descdist - xtoalt   # [m] part of that length on this leg
-
-                #print(bs.traf.id[idx],"traf.alt =",bs.traf.alt[idx]/ft,"ft toalt = ",toalt/ft,"ft descdist =",descdist/nm,"nm")
-                #print ("d2wp = ",self.dist2wp[idx]/nm,"nm d2vs = ",self.dist2vs[idx]/nm,"nm")
-                #print("xtoalt =",xtoalt/nm,"nm descdist =",descdist/nm,"nm")
-
-                # Exceptions: Descend now?
-                #print("Active WP:",bs.traf.ap.route[idx].wpname[bs.traf.ap.route[idx].iactwp])
-                #print("dist2wp,turndist, dist2vs= ",self.dist2wp[idx],bs.traf.actwp.turndist[idx],self.dist2vs[idx])
-                if self.dist2wp[idx] - 1.02*bs.traf.actwp.turndist[idx] < self.dist2vs[idx]:  # Urgent descent, we're late![m]
-                    # Descend now using whole remaining distance on leg to reach altitude
-                    self.alt[idx] = bs.traf.actwp.nextaltco[idx]  # dial in altitude of next waypoint as calculated
-                    t2go = self.dist2wp[idx]/max(0.01,bs.traf.gs[idx])
-                    bs.traf.actwp.vs[idx] = (bs.traf.alt[idx]-toalt)/max(0.01,t2go)
-
-                elif xtoalt<descdist: # Not on this leg, no descending is needed at next waypoint
-                    # Top of decent needs to be on this leg, as next wp is in descent
-                    bs.traf.actwp.vs[idx] = -abs(self.steepness) * (bs.traf.gs[idx] +
-                                                                    (bs.traf.gs[idx] < 0.2 * bs.traf.tas[idx]) *
-                                                                    bs.traf.tas[idx])
-
-                else:
-                    # else still level
-                    bs.traf.actwp.vs[idx] = 0.0
-
-            else:
-
-                # We are higher but swtod = False, so there is no ToD descent logic, simply aim at next altco
-                steepness_ = (bs.traf.alt[idx]-bs.traf.actwp.nextaltco[idx])/(max(0.01,self.dist2wp[idx]+xtoalt))
-                bs.traf.actwp.vs[idx] = -abs(steepness_) * (bs.traf.gs[idx] +
-                                                           (bs.traf.gs[idx] < 0.2 * bs.traf.tas[idx]) * bs.traf.tas[
-                                                               idx])
-                self.dist2vs[idx]      = 99999. #[m] Forces immediate descent as current distance to next wp will be less
+        descend = bs.traf.alt[idx] > toalt + epsalt
+        climb = np.logical_not(descend) & (bs.traf.alt[idx] < toalt - 9.9 * ft)
 
-                # print("in else swtod for ", bs.traf.id[idx])
+        # Level leg: never start V/S
+        self.dist2vs[idx[~(descend | climb)]] = -999.  # [m]
+
+        # Stop potential current climb when we need to descend, or descent when we need to climb
+        # (e.g. due to not making it to previous altco), then stop immediately, as in: do not make it worse.
+        stop = idx[(descend & (bs.traf.vs[idx] > 0.0001)) | (climb & (bs.traf.vs[idx] < -0.0001))]
+        self.vnavvs[stop] = 0.0
+        self.alt[stop] = bs.traf.alt[stop]
+        bs.traf.selalt[stop] = bs.traf.alt[stop]
+
+        # Calculate max allowed altitude at next wp (above toalt) when descending,
+        # or the altitude we want to climb to: next alt constraint in our route (could be further down the route)
+        vert = descend | climb
+        bs.traf.actwp.nextaltco[idx[vert]] = toalt[vert]  # [m] next alt constraint
+        bs.traf.actwp.xtoalt[idx[vert]]    = xtoalt[vert] # [m] distance to next alt constraint measured from next waypoint
+
+        # Descent modes: VNAV (= swtod/Top of Descent logic) or aiming at next alt constraint
+        # VNAV ToD logic
+        tod = np.logical_and(descend, self.swtod[idx])
+        i, itoalt, ixtoalt = idx[tod], toalt[tod], xtoalt[tod]
+
+        # Get distance to waypoint
+        self.dist2wp[i] = nm*geo.kwikdist(bs.traf.lat[i], bs.traf.lon[i],
+                                          bs.traf.actwp.lat[i],
+                                          bs.traf.actwp.lon[i])  # was not always up to date, so update first
+
+        # Distance to next waypoint where we need to start descent (top of descent) [m]
+        descdist = np.abs(bs.traf.alt[i] - itoalt) / self.steepness  # [m] required length for descent, uses default steepness!
+        self.dist2vs[i] = descdist - ixtoalt   # [m] part of that length on this leg
+
+        # Exceptions: Descend now?
+        # Urgent descent, we're late![m]
+        late = self.dist2wp[i] - 1.02*bs.traf.actwp.turndist[i] < self.dist2vs[i]
+        # Top of decent needs to be on this leg, as next wp is in descent
+        ontod = np.logical_not(late) & (ixtoalt < descdist)
+
+        # Descend now using whole remaining distance on leg to reach altitude
+        self.alt[i[late]] = bs.traf.actwp.nextaltco[i[late]]  # dial in altitude of next waypoint as calculated
+        t2go = self.dist2wp[i]/np.maximum(0.01,bs.traf.gs[i])
+        bs.traf.actwp.vs[i] = np.where(late, (bs.traf.alt[i]-itoalt)/np.maximum(0.01,t2go),
+                                       # Not on this leg, no descending is needed at next waypoint
+                                       np.where(ontod, -abs(self.steepness) * (bs.traf.gs[i] +
+                                                    (bs.traf.gs[i] < 0.2 * bs.traf.tas[i]) * bs.traf.tas[i]),
+                                                # else still level
+                                                0.0))
+
+        # We are higher but swtod = False, so there is no ToD descent logic, simply aim at next altco
+        i, ixtoalt = idx[descend & ~tod], xtoalt[descend & ~tod]
+        steepness_ = (bs.traf.alt[i]-bs.traf.actwp.nextaltco[i])/(np.maximum(0.01,self.dist2wp[i]+ixtoalt))
+        bs.traf.actwp.vs[i] = -np.abs(steepness_) * (bs.traf.gs[i] +
+                                                    (bs.traf.gs[i] < 0.2 * bs.traf.tas[i]) * bs.traf.tas[i])
+        self.dist2vs[i]      = 99999. #[m] Forces immediate descent as current distance to next wp will be less
 
         # VNAV climb mode: climb as soon as possible (T/C logic)
-        elif bs.traf.alt[idx] < toalt - 9.9 * ft:
-            # Stop potential current descent (e.g. due to not making it to previous altco)
-            # then stop immediately, as in: do not make it worse.
-            if bs.traf.vs[idx] < -0.0001:
-                self.vnavvs[idx] = 0.0
-                self.alt[idx] = bs.traf.alt[idx]
-                if bs.traf.swvnav[idx]:
-                    bs.traf.selalt[idx] = bs.traf.alt[idx]
-
-            # Altitude we want to climb to: next alt constraint in our route (could be further down the route)
-            bs.traf.actwp.nextaltco[idx] = toalt   # [m]
-            bs.traf.actwp.xtoalt[idx]    = xtoalt  # [m] distance to next alt constraint measured from next waypoint
-            self.alt[idx]          = bs.traf.actwp.nextaltco[idx]  # dial in altitude of next waypoint as calculated
-            self.dist2vs[idx]      = 99999. #[m] Forces immediate climb as current distance to next wp will be less
-
-            t2go = max(0.1, self.dist2wp[idx]+xtoalt) / max(0.01, bs.traf.gs[idx])
-            if self.swtoc[idx]:
-                steepness_ = self.steepness # default steepness
-            else:
-                steepness_ = (bs.traf.alt[idx] - bs.traf.actwp.nextaltco[idx]) / (max(0.01, self.dist2wp[idx] + xtoalt))
+        i, ixtoalt = idx[climb], xtoalt[climb]
+        self.alt[i]          = bs.traf.actwp.nextaltco[i]  # dial in altitude of next waypoint as calculated
+        self.dist2vs[i]      = 99999. #[m] Forces immediate climb as current distance to next wp will be less
 
-            bs.traf.actwp.vs[idx]  = np.maximum(steepness_*bs.traf.gs[idx],
-                                       (bs.traf.actwp.nextaltco[idx] - bs.traf.alt[idx]) / t2go) # [m/s]
-        # Level leg: never start V/S
-        else:
-            self.dist2vs[idx] = -999.  # [m]
+        t2go = np.maximum(0.1, self.dist2wp[i]+ixtoalt) / np.maximum(0.01, bs.traf.gs[i])
+        # default steepness, or steepness to arrive at the constraint
+        steepness_ = np.where(self.swtoc[i], self.steepness,
+                              (bs.traf.alt[i] - bs.traf.actwp.nextaltco[i]) / (np.maximum(0.01, self.dist2wp[i] + ixtoalt)))
 
-        return
+        bs.traf.actwp.vs[i]  = np.maximum(steepness_*bs.traf.gs[i],
+                                   (bs.traf.actwp.nextaltco[i] - bs.traf.alt[i]) / t2go) # [m/s]
 
     def setspeedforRTA(self, idx, torta, xtorta):
-        #debug print("setspeedforRTA called, torta,xtorta =",torta,xtorta/nm)
-
-        # Calculate required CAS to meet RTA
-        # for aircraft nr. idx (scalar)
-        if torta < -90. : # -999 signals there is no RTA defined in remainder of route
-            return False
+        """Calculate required CAS to meet RTA for aircraft idx (a single index,
+           or an array of indices with arrays of RTAs and distances to go)."""
+        idx, torta, xtorta = np.broadcast_arrays(np.atleast_1d(idx), torta, xtorta)
 
+        # -999 signals there is no RTA defined in remainder of route
         deltime = torta-bs.sim.simt # Remaining time to next RTA [s] in simtime
-        if deltime>0: # Still possible?
-            gsrta = calcvrta(bs.traf.gs[idx], xtorta,
-                             deltime, bs.traf.perf.axmax[idx])
+        rta = (torta >= -90.) & (deltime > 0) # Still possible?
+        idx, xtorta, deltime = idx[rta], xtorta[rta], deltime[rta]
+        if len(idx) == 0:
+            return
 
-            # Subtract tail wind speed vector
-            tailwind = (bs.traf.windnorth[idx]*bs.traf.gsnorth[idx] + bs.traf.windeast[idx]*bs.traf.gseast[idx]) / \
-                        bs.traf.gs[idx]
+        gsrta = np.array([calcvrta(bs.traf.gs[i], x, dt, bs.traf.perf.axmax[i])
+                          for i, x, dt in zip(idx, xtorta, deltime)])
 
-            # Convert to CAS
-            rtacas = tas2cas(gsrta-tailwind,bs.traf.alt[idx])
+        # Subtract tail wind speed vector
+        tailwind = (bs.traf.windnorth[idx]*bs.traf.gsnorth[idx] + bs.traf.windeast[idx]*bs.traf.gseast[idx]) / \
+                    bs.traf.gs[idx]
 
-            # Performance limits on speed will be applied in traf.update
-            if bs.traf.actwp.spdcon[idx]<0. and bs.traf.swvnavspd[idx]:
-                bs.traf.actwp.spd[idx] = rtacas
-                #print("setspeedforRTA: xtorta =",xtorta)
+        # Convert to CAS
+        rtacas = vtas2cas(gsrta-tailwind,bs.traf.alt[idx])
 
-            return rtacas
-        else:
-            return False
+        # Performance limits on speed will be applied in traf.update
+        setspd = (bs.traf.actwp.spdcon[idx]<0.) & bs.traf.swvnavspd[idx]
+        bs.traf.actwp.spd[idx[setspd]] = rtacas[setspd]
 
     @stack.command(name='ALT')
     def selaltcmd(self, idx: 'acid', alt: 'alt', vspd: 'vspd'=None):
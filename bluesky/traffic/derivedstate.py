@@ -0,0 +1,127 @@
+''' Per-step cache of quantities derived from the traffic state. '''
+import numpy as np
+
+from bluesky.tools import aerotable
+
+
+def sincos(angle):
+    ''' Sine and cosine of angle [deg]. '''
+    rad = np.radians(angle)
+    return np.sin(rad), np.cos(rad)
+
+
+def velocity(spd, sincos):
+    ''' East and north components of a speed along an angle with sincos. '''
+    return spd * sincos[0], spd * sincos[1]
+
+
+class DerivedState:
+    ''' Quantities derived from the traffic state: sines and cosines of
+        latitude, track and heading, east/north velocity components, and the
+        atmosphere table indices of and atmosphere at the aircraft altitude.
+
+        Each quantity is computed on first use, and reused until the next
+        simulation step. Within a step, a quantity is recomputed when a
+        traffic array it depends on has been replaced, which is how the
+        kinematics update lat, lon, alt, hdg, trk, tas and gs. Code that
+        changes these arrays in place during a step should call clear(). '''
+    def __init__(self, traf):
+        self.traf = traf
+        self.step = 0
+        # {(name, id(source), ...): (sources, value)}
+        self.cache = dict()
+
+    def newstep(self):
+        ''' Start a new simulation step: forget all cached quantities. '''
+        self.step += 1
+        self.cache.clear()
+
+    def clear(self):
+        ''' Forget all cached quantities of the current step. '''
+        self.cache.clear()
+
+    def get(self, name, func, *sources):
+        ''' Quantity name, computed with func(*sources) when it is not cached
+            for these source arrays. The cache keeps references to the
+            sources, so their ids are not reused while they are cached. '''
+        key = (name, *map(id, sources))
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = self.cache[key] = (sources, func(*sources))
+        return entry[1]
+
+    @property
+    def sinlat(self):
+        return self.get('sincos', sincos, self.traf.lat)[0]
+
+    @property
+    def coslat(self):
+        return self.get('sincos', sincos, self.traf.lat)[1]
+
+    @property
+    def sintrk(self):
+        return self.get('sincos', sincos, self.traf.trk)[0]
+
+    @property
+    def costrk(self):
+        return self.get('sincos', sincos, self.traf.trk)[1]
+
+    @property
+    def sinhdg(self):
+        return self.get('sincos', sincos, self.traf.hdg)[0]
+
+    @property
+    def coshdg(self):
+        return self.get('sincos', sincos, self.traf.hdg)[1]
+
+    @property
+    def gsvel(self):
+        ''' East and north components of the ground speed [m/s]. '''
+        return self.get('velocity', velocity, self.traf.gs,
+                        self.get('sincos', sincos, self.traf.trk))
+
+    @property
+    def tasvel(self):
+        ''' East and north components of the true airspeed [m/s]. '''
+        return self.get('velocity', velocity, self.traf.tas,
+                        self.get('sincos', sincos, self.traf.hdg))
+
+    @property
+    def enu(self):
+        ''' East, north and up components of the aircraft velocity [m/s]. '''
+        return (*self.gsvel, self.traf.vs)
+
+    @property
+    def altitudes(self):
+        ''' Atmosphere table indices and weights of the aircraft altitude,
+            for atmosphere lookups and speed conversions with aerotable. '''
+        return self.get('altitudes', aerotable.altitudes, self.traf.alt)
+
+    @property
+    def atmos(self):
+        ''' Pressure [Pa], density [kg/m3], temperature [K] and speed of
+            sound [m/s] at the aircraft altitude. '''
+        return self.get('atmos', aerotable.vatmos_vsound, self.altitudes)
+
+    @property
+    def p(self):
+        return self.atmos[0]
+
+    @property
+    def rho(self):
+        return self.atmos[1]
+
+    @property
+    def temp(self):
+        return self.atmos[2]
+
+    @property
+    def vsound(self):
+        return self.atmos[3]
+
+
+def derivedstate(acdata):
+    ''' The derived state of traffic data: the cache of bs.traf, or an
+        uncached one for other aircraft data, such as the ADS-B model. '''
+    derived = getattr(acdata, 'derived', None)
+    return derived if isinstance(derived, DerivedState) else DerivedState(acdata)
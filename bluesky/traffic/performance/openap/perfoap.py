@@ -1,6 +1,6 @@
 import numpy as np
 import bluesky as bs
-from bluesky.tools import aero
+from bluesky.tools import aero, aerotable
 from bluesky.tools.aero import kts, ft, fpm
 from bluesky.traffic.performance.perfbase import PerfBase
 from bluesky.traffic.performance.openap import coeff, thrust
@@ -198,7 +198,7 @@ class OpenAP(PerfBase):
         self.k[self.phase == ph.DE] = self.k_clean[self.phase == ph.DE]
         self.k[self.phase == ph.NA] = self.k_clean[self.phase == ph.NA]
 
-        rho = aero.vdensity(bs.traf.alt[idx_fixwing])
+        rho = bs.traf.derived.rho[idx_fixwing]
         vtas = bs.traf.tas[idx_fixwing]
         rhovs = 0.5 * rho * vtas ** 2 * self.Sref[idx_fixwing]
         cl = self.mass[idx_fixwing] * aero.g0 / rhovs
@@ -321,10 +321,11 @@ class OpenAP(PerfBase):
             floats or 1D-arrays: Min TAS, Max TAS, Min VS, Max VS
 
         """
-        vtasmin = aero.vcas2tas(self.vmin, bs.traf.alt)
+        alt = bs.traf.derived.altitudes
+        vtasmin = aerotable.vcas2tas(self.vmin, alt)
 
         vtasmax = np.minimum(
-            aero.vcas2tas(self.vmax, bs.traf.alt), aero.vmach2tas(self.mmo, bs.traf.alt)
+            aerotable.vcas2tas(self.vmax, alt), aerotable.vmach2tas(self.mmo, alt)
         )
 
         if id is not None:
@@ -1,15 +1,16 @@
 """ Route implementation for the BlueSky FMS."""
 import math
-from weakref import WeakValueDictionary
+from weakref import WeakValueDictionary, finalize
 import numpy as np
 import bluesky as bs
 from bluesky.tools import geo
 from bluesky.core import Base
-from bluesky.tools.aero import ft, kts, g0, nm, mach2cas, casormach2tas
+from bluesky.tools.aero import ft, kts, g0, nm, mach2cas, vcasormach2tas
 from bluesky.tools.misc import degto180, txt2tim, txt2alt, txt2spd
-from bluesky.tools.position import txt2pos
+from bluesky.tools.position import txt2pos, txt2pos_many
 from bluesky import stack
 from bluesky.stack.cmdparser import Command, command, commandgroup
+from bluesky.traffic.routestore import RouteStore, WaypointField
 
 
 
@@ -37,10 +38,43 @@ class Route(Base):
     # Aircraft route objects
     _routes: WeakValueDictionary[str, 'Route'] = WeakValueDictionary()
 
+    # Waypoint data of all routes
+    store = RouteStore()
+
+    # Waypoint data of this route: views on the columns of the route store
+    wpname = WaypointField()
+    wptype = WaypointField()
+    wplat = WaypointField()
+    wplon = WaypointField()
+    wpalt = WaypointField()
+    wpspd = WaypointField()
+    wprta = WaypointField()
+    wpflyby = WaypointField()
+    wpstack = WaypointField()
+    wpflyturn = WaypointField()
+    wpturnbank = WaypointField()
+    wpturnrad = WaypointField()
+    wpturnspd = WaypointField()
+    wpturnhdgr = WaypointField()
+    wpdirfrom = WaypointField()
+    wpdirto = WaypointField()
+    wpdistto = WaypointField()
+    wpialt = WaypointField()
+    wptoalt = WaypointField()
+    wpxtoalt = WaypointField()
+    wpirta = WaypointField()
+    wptorta = WaypointField()
+    wpxtorta = WaypointField()
+
     def __init__(self, acid):
         super().__init__()
         # Add self to dictionary of all aircraft routes
         Route._routes[acid] = self
+        # Slot of this route in the route store. A re-initialized route
+        # keeps its slot, and its waypoints are cleared below.
+        if 'slot' not in self.__dict__:
+            self.slot = Route.store.alloc()
+            finalize(self, Route.store.free, self.slot)
         # Aircraft id (callsign) of the aircraft to which this route belongs
         self.acid = acid
         self.nwp = 0
@@ -100,6 +134,24 @@ class Route(Base):
         self.wptorta   = []  # [s] next time constraint
         self.wpxtorta  = []  # [m] distance to next time constaint
 
+    @property
+    def iactwp(self):
+        ''' Index of the active waypoint (-1 when there is none). '''
+        return int(self.store.iactwp[self.slot])
+
+    @iactwp.setter
+    def iactwp(self, idx):
+        self.store.iactwp[self.slot] = idx
+
+    @property
+    def flag_landed_runway(self):
+        ''' True when the aircraft has landed on a runway in the route. '''
+        return bool(self.store.landed[self.slot])
+
+    @flag_landed_runway.setter
+    def flag_landed_runway(self, flag):
+        self.store.landed[self.slot] = flag
+
     @staticmethod
     def get_available_name(data, name_, len_=2):
         """
@@ -110,7 +162,7 @@ class Route(Base):
         fmt_ = "{:0" + str(len_) + "d}"
 
         # Avoid using call sign without number
-        if bs.traf.id.count(name_) > 0:
+        if name_ in bs.traf.idindex:
             appi = 1
             name_ = name_+fmt_.format(appi)
 
@@ -482,12 +534,9 @@ class Route(Base):
                 afterwp = ""
 
             name = "T/O-" + acid # Use lat/lon naming convention
-        # Add waypoint
+        # Add waypoint, the flight plan is recalculated before the next autopilot update
         wpidx = acrte.addwpt(acidx, name, wptype, lat, lon, alt, spd, afterwp, beforewp)
 
-        # Recalculate flight plan
-        acrte.calcfp()
-
         # Check for success by checking inserted location in flight plan >= 0
         if wpidx < 0:
             return False, "Waypoint " + name + " not added."
@@ -585,6 +634,176 @@ class Route(Base):
         # acrte.direct(acidx, acrte.wpname[0])
         
 
+    @stack.command(name='FLIGHTPLAN')
+    @staticmethod
+    def flightplan(acidx: 'acid', *wpnames: 'wpt'):
+        """FLIGHTPLAN acid, wpt, [wpt, ...]
+
+            Add a list of waypoints (navaids/fixes, airports, runways or lat/lon
+            positions) to the end of the route of an aircraft at once."""
+        acidx = np.atleast_1d(acidx)
+        return Route.load_many(acidx, len(acidx) * [wpnames])
+
+    @stack.command(name='ADDAIRWAY')
+    @staticmethod
+    def addairway(acidx: 'acid', airway: 'txt', towpt: 'txt'):
+        """ADDAIRWAY acid, airway, towpt
+
+            Add the fixes along an airway to the end of the route of an
+            aircraft, from the last waypoint in the route (before the
+            destination) up to and including towpt."""
+        acidx = np.atleast_1d(acidx)
+        wpnames = []
+        for iac in acidx:
+            acrte = bs.traf.ap.route[iac]
+            nwp = acrte.nwp - int(acrte.nwp > 1 and acrte.wptype[-1] == Route.dest)
+            if nwp == 0:
+                return False, f"ADDAIRWAY {bs.traf.id[iac]}: no waypoint in route to start airway from"
+            fromnodes = bs.navdb.airways.nodes(acrte.wpname[nwp - 1], acrte.wplat[nwp - 1],
+                                               acrte.wplon[nwp - 1])
+            fixes = bs.navdb.airways.expand(airway.upper(), fromnodes, towpt.upper())
+            if not fixes:
+                return False, f"ADDAIRWAY {bs.traf.id[iac]}: {acrte.wpname[nwp - 1]} and " + \
+                    f"{towpt.upper()} are not connected by airway {airway.upper()}"
+            wpnames.append([bs.navdb.airways.wpid[node] for node in fixes])
+        return Route.load_many(acidx, wpnames)
+
+    @stack.command(name='ROUTEGEN')
+    @staticmethod
+    def routegen(orig: 'wpt', dest: 'wpt', acidx: 'acid' = None):
+        """ROUTEGEN orig, dest, [acid]
+
+            Generate the shortest airway route from orig to dest (airports,
+            navaids/fixes or positions). Without acid the route is shown,
+            with acid its fixes are added to the route of the aircraft."""
+        success, origpos = txt2pos(orig, bs.ref.lat, bs.ref.lon)
+        if not success:
+            return False, origpos
+        success, destpos = txt2pos(dest, origpos.lat, origpos.lon)
+        if not success:
+            return False, destpos
+
+        wpnames = bs.navdb.routegen(origpos.lat, origpos.lon, destpos.lat, destpos.lon)
+        if not wpnames:
+            return False, f"ROUTEGEN: no airway route found from {orig} to {dest}"
+        if acidx is None:
+            return True, f"{orig} " + " ".join(wpnames) + f" {dest}"
+        acidx = np.atleast_1d(acidx)
+        return Route.load_many(acidx, len(acidx) * [wpnames])
+
+    @staticmethod
+    def load_many(acidx, wpnames, wpalts=None, wpspds=None):
+        """Add lists of waypoints to the routes of many aircraft at once.
+
+           Arguments:
+           - acidx: Indices of the aircraft
+           - wpnames: Per aircraft a list of waypoint position texts
+             (navaid/fix, airport, runway "EHAM/RW06", lat,lon or aircraft id)
+           - wpalts: Per aircraft a list of altitude constraints [m] (<0: none)
+           - wpspds: Per aircraft a list of speed constraints [m/s or Mach] (<0: none)
+
+           Like ADDWPT, waypoints are added to the end of the route (before the
+           destination) and are looked up closest to the previous waypoint.
+           The waypoints of all aircraft are looked up together, and each
+           route is extended in the route store in one go."""
+        acidx = np.asarray(acidx, dtype=int)
+        routes = [bs.traf.ap.route[i] for i in acidx]
+        nwpmax = max((len(names) for names in wpnames), default=0)
+        nwp = np.array([len(names) for names in wpnames], dtype=int)
+
+        # Reference position to look up the first waypoint: last waypoint
+        # before the destination, or the aircraft position for an empty route
+        reflat = bs.traf.lat[acidx].astype(float)
+        reflon = bs.traf.lon[acidx].astype(float)
+        for j, acrte in enumerate(routes):
+            # For safety, as in addwpt: calculated waypoints are inserted
+            # without updating nwp
+            acrte.nwp = int(acrte.store.count[acrte.slot])
+            if acrte.nwp > 0:
+                iref = -1 if acrte.wptype[-1] != Route.dest or acrte.nwp == 1 else -2
+                reflat[j], reflon[j] = acrte.wplat[iref], acrte.wplon[iref]
+
+        # Look up the i-th waypoints of all routes together, as waypoints are
+        # looked up closest to the previous waypoint in their route
+        wplat = np.zeros((len(routes), nwpmax))
+        wplon = np.zeros((len(routes), nwpmax))
+        wptype = np.full((len(routes), nwpmax), -1, dtype=int)
+        typecodes = {"latlon": Route.wplatlon, "nav": Route.wpnav, "apt": Route.wpnav,
+                     "rwy": Route.runway, "": -1}
+        for i in range(nwpmax):
+            jrte = np.flatnonzero(nwp > i)
+            lat, lon, types = txt2pos_many([wpnames[j][i] for j in jrte],
+                                           reflat[jrte], reflon[jrte])
+            wplat[jrte, i] = lat
+            wplon[jrte, i] = lon
+            wptype[jrte, i] = [typecodes[t] for t in types]
+
+            # Airports are replaced by a navaid with the same name, when there is one
+            iapt = [k for k, t in enumerate(types) if t == "apt"]
+            if iapt:
+                aptnames = [wpnames[jrte[k]][i].upper().strip() for k in iapt]
+                wpidx = bs.navdb.getwpidx_many(aptnames, lat[iapt], lon[iapt])
+                for k, idx in zip(iapt, wpidx):
+                    if idx >= 0:
+                        wplat[jrte[k], i] = bs.navdb.wplat[idx]
+                        wplon[jrte[k], i] = bs.navdb.wplon[idx]
+
+            # Found waypoints are the reference for the next waypoint
+            found = jrte[wptype[jrte, i] >= 0]
+            reflat[found] = wplat[found, i]
+            reflon[found] = wplon[found, i]
+
+        notfound = []
+        for j, (iac, acrte) in enumerate(zip(acidx, routes)):
+            ok = wptype[j, :nwp[j]] >= 0
+            notfound += [name for name, isok in zip(wpnames[j], ok) if not isok]
+            n = np.count_nonzero(ok)
+            if n == 0:
+                continue
+
+            # Waypoint names: call sign for lat/lon waypoints, with a number
+            # added when the name already exists in the route
+            acid = bs.traf.id[iac]
+            names = acrte.wpname.tolist()
+            for name, wptype_ in zip(np.asarray(wpnames[j], dtype=object)[ok], wptype[j, :nwp[j]][ok]):
+                if wptype_ == Route.wplatlon:
+                    names.append(Route.get_available_name(names, acid, 3))
+                else:
+                    names.append(Route.get_available_name(names, name.upper().strip()))
+
+            # Append, just before dest if there is a dest
+            norig = int(bs.traf.ap.orig[iac] != "")
+            ndest = int(bs.traf.ap.dest[iac] != "")
+            firstwp = acrte.nwp - norig - ndest == 0
+            wpidx = acrte.nwp - 1 if acrte.nwp > 0 and acrte.wptype[-1] == Route.dest else acrte.nwp
+            acrte.store.insertmany(
+                acrte.slot, wpidx, n, wpname=names[acrte.nwp:],
+                wplat=(wplat[j, :nwp[j]][ok] + 90.) % 180. - 90.,
+                wplon=(wplon[j, :nwp[j]][ok] + 180.) % 360. - 180.,
+                wpalt=-999. if wpalts is None else np.asarray(wpalts[j], dtype=float)[ok],
+                wpspd=-999. if wpspds is None else np.asarray(wpspds[j], dtype=float)[ok],
+                wptype=wptype[j, :nwp[j]][ok], wpflyby=acrte.swflyby,
+                wpflyturn=acrte.swflyturn, wpturnbank=acrte.turnbank,
+                wpturnrad=acrte.turnrad, wpturnspd=acrte.turnspd,
+                wpturnhdgr=acrte.turnhdgr)
+            acrte.nwp = int(acrte.store.count[acrte.slot])
+
+            # First 'real' waypoint (not orig & dest): make active. As with
+            # ADDWPT, the aircraft goes direct to its active waypoint again
+            # at the next autopilot update
+            if acrte.iactwp < 0:
+                acrte.iactwp = 0
+            if firstwp:
+                acrte.direct(iac, acrte.wpname[norig])
+                bs.traf.swlnav[iac] = True
+            acrte.store.redirect[acrte.slot] = not firstwp or n > 1
+            bs.traf.actwp.next_qdr[iac] = acrte.getnextqdr()
+            bs.traf.actwp.swlastwp[iac] = (acrte.iactwp == acrte.nwp - 1)
+
+        if notfound:
+            return False, "Waypoint(s) " + ", ".join(notfound) + " not found."
+        return True
+
     def addwpt_simple(self, iac, name, wptype, lat, lon, alt=-999., spd=-999.):
         """Adds waypoint in the most simple way possible"""
         # For safety
@@ -850,37 +1069,18 @@ class Route(Base):
         wplat = (wplat + 90.) % 180. - 90.
         wplon = (wplon + 180.) % 360. - 180.
 
-        if overwrt:
-            self.wpname[wpidx]  = wpname
-            self.wplat[wpidx]   = wplat
-            self.wplon[wpidx]   = wplon
-            self.wpalt[wpidx]   = wpalt
-            self.wpspd[wpidx]   = wpspd
-            self.wptype[wpidx]  = wptype
-            self.wpflyby[wpidx] = self.swflyby
-            self.wpflyturn[wpidx] = self.swflyturn
-            self.wpturnbank[wpidx] = self.turnbank
-            self.wpturnrad[wpidx] = self.turnrad
-            self.wpturnspd[wpidx] = self.turnspd
-            self.wpturnhdgr[wpidx] = self.turnhdgr
-            self.wprta[wpidx]   = -999.0 # initially no RTA
-            self.wpstack[wpidx] = []
+        values = dict(wpname=wpname, wplat=wplat, wplon=wplon, wpalt=wpalt,
+                      wpspd=wpspd, wptype=wptype, wpflyby=self.swflyby,
+                      wpflyturn=self.swflyturn, wpturnbank=self.turnbank,
+                      wpturnrad=self.turnrad, wpturnspd=self.turnspd,
+                      wpturnhdgr=self.turnhdgr,
+                      wprta=-999.0,  # initially no RTA
+                      wpstack=[])
 
+        if overwrt:
+            self.store.setrow(self.slot, wpidx, **values)
         else:
-            self.wpname.insert(wpidx, wpname)
-            self.wplat.insert(wpidx, wplat)
-            self.wplon.insert(wpidx, wplon)
-            self.wpalt.insert(wpidx, wpalt)
-            self.wpspd.insert(wpidx, wpspd)
-            self.wptype.insert(wpidx, wptype)
-            self.wpflyby.insert(wpidx, self.swflyby)
-            self.wpflyturn.insert(wpidx, self.swflyturn)
-            self.wpturnbank.insert(wpidx,self.turnbank)
-            self.wpturnrad.insert(wpidx, self.turnrad)
-            self.wpturnspd.insert(wpidx, self.turnspd)
-            self.wpturnhdgr.insert(wpidx, self.turnhdgr)
-            self.wprta.insert(wpidx,-999.0)       # initially no RTA
-            self.wpstack.insert(wpidx,[])
+            self.store.insert(self.slot, wpidx, **values)
 
 
     def addwpt(self, iac, name, wptype, lat, lon, alt=-999., spd=-999., afterwp="", beforewp=""):
@@ -1011,17 +1211,15 @@ class Route(Base):
             bs.traf.actwp.next_qdr[iac] = self.getnextqdr()
             bs.traf.actwp.swlastwp[iac] = (self.iactwp==self.nwp-1)
 
-        # Update waypoints
-        if not (wptype == Route.calcwp):
-            self.calcfp()
-
         # Update autopilot settings
         # If we added a waypoint but iactwp is still -1, make it 0
         if wpok and self.iactwp < 0:
             self.iactwp = 0
-            
+
+        # Update waypoints: the flight plan is recalculated, and the aircraft goes direct
+        # to its active waypoint, once for all waypoints added before the next autopilot update
         if wpok and 0 <= self.iactwp < self.nwp:
-            self.direct(iac, self.wpname[self.iactwp])
+            self.store.redirect[self.slot] = True
 
         return idx
 
@@ -1036,6 +1234,7 @@ class Route(Base):
         wpidx = acrte.wpname.index(wpname)
 
         acrte.iactwp = wpidx
+        acrte.store.redirect[acrte.slot] = False
         bs.traf.actwp.lat[acidx]    = acrte.wplat[wpidx]
         bs.traf.actwp.lon[acidx]    = acrte.wplon[wpidx]
         bs.traf.actwp.flyby[acidx]  = acrte.wpflyby[wpidx]
@@ -1245,33 +1444,7 @@ class Route(Base):
 
             # and the aircraft just needs a fixed heading to
             # remain on the runway
-            # syntax: HDG acid,hdg (deg,True)
-            name = self.wpname[self.iactwp]
-
-            # Change RW06,RWY18C,RWY24001 to resp. 06,18C,24
-            if "RWY" in name:
-                rwykey = name[8:10]
-                if len(name)>10:
-                    if not name[10].isdigit():
-                        rwykey = name[8:11]
-            # also if it is only RW
-            else:
-                rwykey = name[7:9]
-                if len(name) > 9:
-                    if not name[9].isdigit():
-                        rwykey = name[7:10]
-
-            # Use this code to look up runway heading
-            wphdg = bs.navdb.rwythresholds[name[:4]][rwykey][2]
-
-            # keep constant runway heading
-            stack.stack("HDG " + str(self.acid) + " " + str(wphdg))
-
-            # start decelerating
-            stack.stack("DELAY " + "10 " + "SPD " + str(self.acid) + " " + "10")
-
-            # delete aircraft
-            stack.stack("DELAY " + "42 " + "DEL " + str(self.acid))
+            self.holdrunway()
 
             swlastwp = (self.iactwp == self.nwp - 1)
 
@@ -1319,6 +1492,37 @@ class Route(Base):
                 self.wpturnspd[self.iactwp], self.wpturnhdgr[self.iactwp], \
                 self.wpturnbank[self.iactwp], nextqdr, swlastwp
 
+    def holdrunway(self):
+        """After landing, keep the runway heading, decelerate and
+           delete the aircraft."""
+        # syntax: HDG acid,hdg (deg,True)
+        name = self.wpname[self.iactwp]
+
+        # Change RW06,RWY18C,RWY24001 to resp. 06,18C,24
+        if "RWY" in name:
+            rwykey = name[8:10]
+            if len(name)>10:
+                if not name[10].isdigit():
+                    rwykey = name[8:11]
+        # also if it is only RW
+        else:
+            rwykey = name[7:9]
+            if len(name) > 9:
+                if not name[9].isdigit():
+                    rwykey = name[7:10]
+
+        # Use this code to look up runway heading
+        wphdg = bs.navdb.rwythresholds[name[:4]][rwykey][2]
+
+        # keep constant runway heading
+        stack.stack("HDG " + str(self.acid) + " " + str(wphdg))
+
+        # start decelerating
+        stack.stack("DELAY " + "10 " + "SPD " + str(self.acid) + " " + "10")
+
+        # delete aircraft
+        stack.stack("DELAY " + "42 " + "DEL " + str(self.acid))
+
     def runactwpstack(self):
         for cmdline in self.wpstack[self.iactwp]:
             stack.stack(cmdline)
@@ -1372,20 +1576,7 @@ class Route(Base):
             acrte.direct(acidx, acrte.wpname[wpidx + 1])
 
         acrte.nwp =acrte.nwp - 1
-        del acrte.wpname[wpidx]
-        del acrte.wplat[wpidx]
-        del acrte.wplon[wpidx]
-        del acrte.wpalt[wpidx]
-        del acrte.wpspd[wpidx]
-        del acrte.wprta[wpidx]
-        del acrte.wptype[wpidx]
-        del acrte.wpflyby[wpidx]
-        del acrte.wpflyturn[wpidx]
-        del acrte.wpturnbank[wpidx]
-        del acrte.wpturnrad[wpidx]
-        del acrte.wpturnspd[wpidx]
-        del acrte.wpturnhdgr[wpidx]
-        del acrte.wpstack[wpidx]
+        acrte.store.delete(acrte.slot, wpidx)
         if acrte.iactwp > wpidx:
             acrte.iactwp = max(0, acrte.iactwp - 1)
 
@@ -1403,15 +1594,21 @@ class Route(Base):
     def insertcalcwp(self, i, name):
         """Insert empty wp with no attributes at location i"""
 
-        self.wpname.insert(i,name)
-        self.wplat.insert(i,0.)
-        self.wplon.insert(i,0.)
-        self.wpalt.insert(i,-999.)
-        self.wpspd.insert(i,-999.)
-        self.wptype.insert(i,Route.calcwp)
+        self.store.insert(self.slot, i, wpname=name, wptype=Route.calcwp)
+
+    def updatefp(self, acidx):
+        """Update the flight plan after the route was edited: recalculate it,
+           and go direct to the active waypoint when waypoints were added."""
+        if self.store.redirect[self.slot] and 0 <= self.iactwp < self.store.count[self.slot]:
+            # Direct also recalculates the flight plan
+            self.direct(acidx, self.wpname[self.iactwp])
+        else:
+            self.store.redirect[self.slot] = False
+            self.calcfp()
 
     def calcfp(self): # Current Flight Plan calculations, which actualize based on flight condition
-        """Do flight plan calculations"""
+        """Do flight plan calculations. Leg data is only recalculated from the first
+           waypoint that was changed since the last calculation."""
 
         # Note: No Top of Descent or Top of Climb can inserted here
         # as this depends on the speed, which might be undefined (often is)
@@ -1420,121 +1617,89 @@ class Route(Base):
         # distance at wp to next altitude constraint (xtoalt), its index ial and the value (toalt)
         # same logic is used for time consarint (requieed time of arrival) RTAs at waypoints
 
-        # Direction to waypoint
-        self.nwp = len(self.wpname)
-
-        # Create cleared flight plan calculation table
-        self.wpdirfrom   = self.nwp*[0.]  # [deg] Direction of leg laving this waypoint
-        self.wpdirto     = self.nwp*[0.]  # [deg] Direction of leg ot this waypoint (if it exists)
-        self.wpdistto    = self.nwp*[0.]  # [nm] Distance of leg to this waypoint in nm
-        self.wpialt      = self.nwp*[-1]  # wp index of next alttud constraint
-        self.wptoalt     = self.nwp*[-999.] # [m] next alt contraint
-        self.wpxtoalt    = self.nwp*[1.]  # [m] dist to next alt constraint, default 1.0 to avoid division by zero
-        self.wpirta      = self.nwp*[-1]  # wp index of next time constraint
-        self.wptorta     = self.nwp*[-999.] # [s] next time constraint
-        self.wpxtorta    = self.nwp*[1.]  # [m] dist to next time constraint, default 1.0 to avoid division by zero
-
-        # No waypoints: make empty variables to be safe and return: nothing to do
+        # First changed waypoint, -1 if none
+        first = self.store.stale[self.slot]
+        self.store.stale[self.slot] = -1
+
+        # Views on the waypoint data of this route in the route store
+        start, end = self.store.segment(self.slot)
+        wp = {name: col[start:end] for name, col in self.store.data.items()}
+        self.nwp = end - start
+
+        # No waypoints: nothing to do
         if self.nwp==0:
             return
 
         # Calculate lateral leg data
-        # LNAV: Calculate leg distances and directions
+        # LNAV: Calculate leg distances and directions of the legs to and from changed waypoints
+        if first >= 0:
+            i0 = max(0, first - 1)
+            qdr, dist = geo.qdrdist(wp['wplat'][i0:-1], wp['wplon'][i0:-1],
+                                    wp['wplat'][i0 + 1:], wp['wplon'][i0 + 1:])
+            wp['wpdirfrom'][i0:-1] = qdr    # [deg]
+            wp['wpdistto'][i0 + 1:] = dist  # [nm]  distto is in nautical miles
+
+            # Also add "from direction" as to directions so no need to shift for actwpdata
+            # direction to will be overwritten in actwpdata in case of a direct to
+            wp['wpdirto'][i0 + 1:] = qdr    # [deg] Direction to waypoints
+        wp['wpdistto'][0] = 0.
 
-        for i in range(0, self.nwp - 1):
-            qdr,dist = geo.qdrdist(self.wplat[i]  ,self.wplon[i],
-                                self.wplat[i+1],self.wplon[i+1])
-            self.wpdirfrom[i] = qdr    # [deg]
-            self.wpdistto[i+1]  = dist #[nm]  distto is in nautical miles
-
-        # Also add "from direction" as to directions so no need to shift for actwpdata
-        # direction to will be overwritten in actwpdata in case of a direct to
         # Add current pos to first waypoint as default value for direction to 1st waypoint
         iac = bs.traf.id2idx(self.acid)
-        qdr,dist = geo.qdrdist(bs.traf.lat[iac],bs.traf.lon[iac],
-                               self.wplat[0],self.wplon[0])
-        self.wpdirto = [qdr]+self.wpdirfrom[0:-1] #[deg] Direction to waypoints
+        wp['wpdirto'][0], _ = geo.qdrdist(bs.traf.lat[iac], bs.traf.lon[iac],
+                                          wp['wplat'][0], wp['wplon'][0])
+
+        # Continue flying in the same direction
+        wp['wpdirfrom'][-1] = wp['wpdirfrom'][-2] if self.nwp > 1 else 0.
 
-        # Continue flying in the saem direction
-        if self.nwp>1:
-            self.wpdirfrom[-1] = self.wpdirfrom[-2]
+        # Calculate longitudinal leg data with the distance along the route to each waypoint [m]
+        idx = np.arange(self.nwp)
+        xroute = np.cumsum(wp['wpdistto']) * nm
 
-        # Calculate longitudinal leg data
         # VNAV: calc next altitude constraint: index, altitude and distance to it
-        ialt = -1     # index to waypoint with next altitude constraint
-        toalt = -999. # value of next altitude constraint
-        xtoalt = 0.   # distance to next altitude constraint from this wp
-        for i in range(self.nwp-1,-1,-1):
-
-            # waypoint with altitude constraint (dest of al specified)
-            if self.wptype[i]==Route.dest:
-                ialt   = i
-                toalt  = 0.
-                xtoalt = 0.                # [m]
-
-            elif self.wpalt[i] >= 0:
-                ialt   = i
-                toalt  = self.wpalt[i]
-                xtoalt = 0.                # [m]
-
-            # waypoint with no altitude constraint:keep counting
-            else:
-                if i!=self.nwp-1:
-                    xtoalt = xtoalt + self.wpdistto[i+1]*nm  # [m] xtoalt is in meters!
-                else:
-                    xtoalt = 0.0
+        # waypoint with altitude constraint (dest of al specified)
+        isdest = wp['wptype'] == Route.dest
+        ialt = np.minimum.accumulate(np.where(isdest | (wp['wpalt'] >= 0), idx, self.nwp)[::-1])[::-1]
+        ialt[ialt == self.nwp] = -1
+        wp['wpialt'][:] = ialt
+        wp['wptoalt'][:] = np.where(ialt < 0, -999., np.where(isdest, 0., wp['wpalt'])[ialt])  # [m]
 
-            self.wpialt[i]   = ialt
-            self.wptoalt[i]  = toalt   #[m]
-            self.wpxtoalt[i] = xtoalt  #[m]
+        # waypoint with no altitude constraint: distance to next constraint, or to the last waypoint
+        wp['wpxtoalt'][:] = xroute[np.where(ialt < 0, self.nwp - 1, ialt)] - xroute  # [m]
 
-        # RTA: calc next rta constraint: index, altitude and distance to it
+        # RTA: calc next rta constraint: index, time and distance to it
         # If any RTA.
-        if any(np.array(self.wprta)>=0.0):
-            #print("Yes, I found RTAs")
-            irta = -1       # index of wp
-            torta = -999.   # next rta value
-            xtorta = 0.     # distance to next rta
-            for i in range(self.nwp - 1, -1, -1):
-
-                # waypoint with rta: reset counter, update rts
-                if self.wprta[i] >= 0:
-                    irta = i
-                    torta = self.wprta[i]
-                    xtorta = 0.  # [m]
-
-                # waypoint with no altitude constraint:keep counting
-                else:
-                    if i != self.nwp - 1:
-                        # No speed or rta constraint: add to xtorta
-                        if self.wpspd[i] <= 0.0:
-                            xtorta = xtorta + self.wpdistto[i + 1] * nm  # [m] xtoalt is in meters!
-                        else:
-                            # speed constraint on this leg: shift torta to account for this
-                            # altitude unknown
-                            if self.wptoalt[i] >0.:
-                                alt = toalt
-                            else:
-                                # TODO: current a/c altitude would be better guess, but not accessible here
-                                # as we do not know aircraft index for this route
-                                alt = 10000.*ft # default to minimize errors, when no alt constraints are present
-                            legtas = casormach2tas(self.wpspd[i],alt)
-                            #TODO: account for wind at this position vy adding wind vectors to waypoints?
-
-                            # xtorta stays the same! This leg will not be available for RTA scheduling, so distance
-                            # is not in xtorta. Therefore we need to subtract legtime to ignore this leg for the RTA
-                            # scheduling
-                            legtime = self.wpdistto[i+1]/legtas
-                            torta = torta - legtime
-                    else:
-                        xtorta = 0.0
-                        torta = -999.0
-
-                self.wpirta[i]   = irta
-                self.wptorta[i]  = torta  # [s]
-                self.wpxtorta[i] = xtorta  # [m]
-            #print("wpxtorta=",self.wpxtorta)
-            #print("wptorta=", self.wptorta)
+        if not np.any(wp['wprta'] >= 0.0):
+            wp['wpirta'][:] = -1
+            wp['wptorta'][:] = -999.
+            wp['wpxtorta'][:] = 1.
+            return
+
+        irta = np.minimum.accumulate(np.where(wp['wprta'] >= 0.0, idx, self.nwp)[::-1])[::-1]
+        irta[irta == self.nwp] = -1
+
+        # No speed or rta constraint on a leg: add its length to xtorta
+        # Speed constraint on a leg: xtorta stays the same! This leg will not be available for RTA
+        # scheduling, so distance is not in xtorta. Therefore we need to subtract legtime to ignore
+        # this leg for the RTA scheduling
+        spdleg = wp['wpspd'][:-1] > 0.0
+        legdist = np.where(spdleg, 0., wp['wpdistto'][1:] * nm)  # [m] xtorta is in meters!
+        legtime = np.zeros(self.nwp - 1)
+        if np.any(spdleg):
+            # altitude unknown: use the altitude constraint ahead of the route
+            # TODO: current a/c altitude would be better guess
+            alt = np.where(wp['wptoalt'][:-1][spdleg] > 0., wp['wptoalt'][0], 10000.*ft)
+            legtas = vcasormach2tas(wp['wpspd'][:-1][spdleg], alt)
+            #TODO: account for wind at this position vy adding wind vectors to waypoints?
+            legtime[spdleg] = wp['wpdistto'][1:][spdleg] / legtas
+
+        # Sums over the legs from each waypoint to the next RTA, or to the last waypoint
+        iend = np.where(irta < 0, self.nwp - 1, irta)
+        xlegs = np.concatenate(([0.], np.cumsum(legdist)))
+        tlegs = np.concatenate(([0.], np.cumsum(legtime)))
+        wp['wpirta'][:] = irta
+        wp['wptorta'][:] = np.where(irta < 0, -999., wp['wprta'][irta]) - (tlegs[iend] - tlegs)  # [s]
+        wp['wpxtorta'][:] = xlegs[iend] - xlegs  # [m]
 
     def findact(self,i):
         """ Find best default active waypoint.
@@ -0,0 +1,391 @@
+''' Columnar storage of the waypoint data of all aircraft routes. '''
+import numpy as np
+
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+
+
+class RouteStore:
+    ''' Waypoint data of all routes in CSR-style columns.
+
+        Each waypoint field is a single numpy array (column) for all routes.
+        The waypoints of a route occupy a contiguous segment of rows, which
+        is described per route slot by its start row, number of waypoints
+        and capacity, together with the index of the active waypoint,
+        whether the aircraft has landed on a runway of the route, the first
+        waypoint that was changed since the last flight plan calculation,
+        and whether the aircraft still needs to go direct to its active
+        waypoint after waypoints were added (see Route.updatefp).
+
+        Segments grow geometrically. A segment that cannot grow in place is
+        moved to the end of the columns, and the columns are compacted when
+        more than half of their rows are unused. Rows that do not hold a
+        waypoint always contain the default value of their column.
+    '''
+    # Waypoint columns: (dtype, default value of new waypoints). A callable
+    # default is called to get a new value for each waypoint.
+    columns = dict(
+        wpname=(object, ''),        # Waypoint name
+        wptype=(int, 0),            # Waypoint type
+        wplat=(float, 0.0),         # [deg] Latitude
+        wplon=(float, 0.0),         # [deg] Longitude
+        wpalt=(float, -999.),       # [m] negative value means not specified
+        wpspd=(float, -999.),       # [m/s] negative value means not specified
+        wprta=(float, -999.),       # [s] negative value means not specified
+        wpflyby=(bool, True),       # Flyby (True)/flyover(False) switch
+        wpstack=(object, list),     # Commands executed when passing the waypoint
+        wpflyturn=(bool, False),    # Flyturn (True) or flyover/flyby (False) switch
+        wpturnbank=(float, -999.),  # [deg] Bank angle
+        wpturnrad=(float, -999.),   # [nm] Turn radius (<0 = not specified)
+        wpturnspd=(float, -999.),   # [kts] Turn speed (<0 = not specified)
+        wpturnhdgr=(float, -999.),  # [deg/s] Heading rate (<0 = not specified)
+        wpdirfrom=(float, 0.),      # [deg] Direction of leg leaving the waypoint
+        wpdirto=(float, 0.),        # [deg] Direction of leg to the waypoint
+        wpdistto=(float, 0.),       # [nm] Length of leg to the waypoint
+        wpialt=(int, -1),           # Index of next altitude constraint
+        wptoalt=(float, -999.),     # [m] Next altitude constraint
+        wpxtoalt=(float, 1.),       # [m] Distance to next altitude constraint
+        wpirta=(int, -1),           # Index of next time constraint
+        wptorta=(float, -999.),     # [s] Next time constraint
+        wpxtorta=(float, 1.),       # [m] Distance to next time constraint
+    )
+
+    # Minimum capacity of a route segment
+    mincapacity = 8
+
+    def __init__(self):
+        # Number of rows taken by segments, and the rows of abandoned segments
+        self.nrows = 0
+        self.nunused = 0
+        self.data = dict()
+        self.growrows(256)
+
+        # Segment data per route slot
+        self.nslots = 0
+        self.freeslots = []
+        self.start = np.zeros(64, dtype=np.int64)
+        self.count = np.zeros(64, dtype=np.int64)
+        self.capacity = np.zeros(64, dtype=np.int64)
+        self.iactwp = np.full(64, -1, dtype=np.int64)
+        self.landed = np.zeros(64, dtype=bool)
+        self.stale = np.full(64, -1, dtype=np.int64)
+        self.redirect = np.zeros(64, dtype=bool)
+
+    def growrows(self, size):
+        ''' Make sure that the columns can hold at least size rows. '''
+        oldsize = len(self.data.get('wplat', ()))
+        if size <= oldsize:
+            return
+        size = max(size, 2 * oldsize)
+        for name, (dtype, default) in self.columns.items():
+            col = np.empty(size, dtype=dtype)
+            col[:oldsize] = self.data[name] if oldsize else []
+            col[oldsize:] = None if callable(default) else default
+            self.data[name] = col
+
+    def reset(self, first, last):
+        ''' Reset rows first:last to the default values of the columns. '''
+        for name, (_, default) in self.columns.items():
+            self.data[name][first:last] = None if callable(default) else default
+
+    def fill(self, first, last):
+        ''' Fill rows first:last with the values of new waypoints. '''
+        for name, (_, default) in self.columns.items():
+            col = self.data[name]
+            if callable(default):
+                for row in range(first, last):
+                    col[row] = default()
+            else:
+                col[first:last] = default
+
+    def alloc(self):
+        ''' Allocate an empty route, and return its slot. '''
+        if self.freeslots:
+            slot = self.freeslots.pop()
+        else:
+            slot = self.nslots
+            self.nslots += 1
+            if slot >= len(self.start):
+                size = 2 * len(self.start)
+                for name in ('start', 'count', 'capacity', 'iactwp', 'landed', 'stale', 'redirect'):
+                    arr = getattr(self, name)
+                    setattr(self, name, np.resize(arr, size))
+        self.start[slot] = self.nrows
+        self.count[slot] = 0
+        self.capacity[slot] = 0
+        self.iactwp[slot] = -1
+        self.landed[slot] = False
+        self.stale[slot] = -1
+        self.redirect[slot] = False
+        return slot
+
+    def free(self, slot):
+        ''' Free the route in slot, and its waypoints. '''
+        start, cap = self.start[slot], self.capacity[slot]
+        self.reset(start, start + self.count[slot])
+        self.nunused += cap
+        self.count[slot] = self.capacity[slot] = 0
+        self.iactwp[slot] = -1
+        self.stale[slot] = -1
+        self.redirect[slot] = False
+        self.freeslots.append(slot)
+        if len(self.freeslots) == self.nslots:
+            # No routes left: start again with empty columns
+            self.nslots = self.nrows = self.nunused = 0
+            self.freeslots.clear()
+
+    def markstale(self, slot, idx):
+        ''' Mark the waypoints of the route in slot from index idx onwards as
+            changed since the last flight plan calculation. '''
+        stale = self.stale[slot]
+        self.stale[slot] = idx if stale < 0 else min(stale, idx)
+
+    def segment(self, slot):
+        ''' Return the first and last (exclusive) row of the route in slot. '''
+        start = int(self.start[slot])
+        return start, start + int(self.count[slot])
+
+    def reserve(self, slot, n):
+        ''' Make sure that the segment of the route in slot can hold n waypoints. '''
+        cap = self.capacity[slot]
+        if n <= cap:
+            return
+        newcap = max(n, 2 * cap, self.mincapacity)
+        start = self.start[slot]
+        if start + cap != self.nrows:
+            # Move the segment to the end of the columns
+            count = self.count[slot]
+            newstart = self.nrows
+            self.growrows(newstart + newcap)
+            for col in self.data.values():
+                col[newstart:newstart + count] = col[start:start + count]
+            self.reset(start, start + count)
+            self.nunused += cap
+            self.start[slot] = start = newstart
+        self.growrows(start + newcap)
+        self.capacity[slot] = newcap
+        self.nrows = start + newcap
+        if self.nunused > max(self.nrows // 2, 1024):
+            self.compact()
+
+    def compact(self):
+        ''' Remove the unused rows between route segments. '''
+        slots = np.flatnonzero(self.capacity[:self.nslots])
+        slots = slots[np.argsort(self.start[slots])]
+        cap = self.capacity[slots]
+        newstart = np.cumsum(cap) - cap
+        nrows = int(cap.sum())
+        src = np.repeat(self.start[slots] - newstart, cap) + np.arange(nrows)
+        for col in self.data.values():
+            col[:nrows] = col[src]
+        self.reset(nrows, self.nrows)
+        self.start[:self.nslots] = nrows
+        self.start[slots] = newstart
+        self.nrows = nrows
+        self.nunused = 0
+
+    def resize(self, slot, n):
+        ''' Set the number of waypoints of the route in slot to n, removing
+            waypoints from, or adding new waypoints to the end. '''
+        self.reserve(slot, n)
+        start, end = self.segment(slot)
+        if start + n > end:
+            self.fill(end, start + n)
+        else:
+            self.reset(start + n, end)
+        self.count[slot] = n
+        self.markstale(slot, min(n, end - start))
+
+    def insert(self, slot, idx, **values):
+        ''' Insert a waypoint before index idx in the route in slot. Columns
+            that are not given in values get their default value. '''
+        idx = self.insertmany(slot, idx, 1)
+        self.setrow(slot, idx, **values)
+
+    def insertmany(self, slot, idx, n, **values):
+        ''' Insert n waypoints before index idx in the route in slot, and
+            return the index of the first new waypoint. Values are given per
+            column, as one value for all new waypoints or as a sequence of n
+            values. Columns that are not given in values get their default
+            value. '''
+        count = int(self.count[slot])
+        self.reserve(slot, count + n)
+        start, end = self.segment(slot)
+        idx = min(max(idx + count, 0) if idx < 0 else idx, count)
+        row = start + idx
+        for col in self.data.values():
+            col[row + n:end + n] = col[row:end]
+        self.fill(row, row + n)
+        for name, value in values.items():
+            self.data[name][row:row + n] = value
+        self.count[slot] = count + n
+        self.markstale(slot, idx)
+        return idx
+
+    def delete(self, slot, idx):
+        ''' Delete the waypoint with index idx from the route in slot. '''
+        start, end = self.segment(slot)
+        row = start + (idx + end - start if idx < 0 else idx)
+        for col in self.data.values():
+            col[row:end - 1] = col[row + 1:end]
+        self.reset(end - 1, end)
+        self.count[slot] -= 1
+        self.markstale(slot, row - start)
+
+    def setrow(self, slot, idx, **values):
+        ''' Set the given column values of waypoint idx of the route in slot. '''
+        start, end = self.segment(slot)
+        row = start + (idx + end - start if idx < 0 else idx)
+        for name, value in values.items():
+            self.data[name][row] = value
+        self.markstale(slot, row - start)
+
+    def setcolumn(self, slot, name, values):
+        ''' Set all values of column name of the route in slot. When the number
+            of values differs from the number of waypoints, the route is resized. '''
+        if len(values) != self.count[slot]:
+            self.resize(slot, len(values))
+        start, end = self.segment(slot)
+        col = self.data[name]
+        if col.dtype == object:
+            # Assign elementwise, to keep sequences (e.g. stack commands) intact
+            for row, value in zip(range(start, end), values):
+                col[row] = value
+        else:
+            col[start:end] = values
+        self.markstale(slot, 0)
+
+    def active(self, slots):
+        ''' Row of the active waypoint of the routes in slots, or -1 when
+            a route has no active waypoint. '''
+        iactwp = self.iactwp[slots]
+        valid = (iactwp >= 0) & (iactwp < self.count[slots])
+        return np.where(valid, self.start[slots] + iactwp, -1)
+
+    def distance_to_go(self, slots, lat, lon):
+        ''' Distance [m] along the routes in slots from positions lat/lon, via
+            the active waypoint to the last waypoint of each route. Routes
+            without active waypoint have a distance to go of zero. '''
+        rows = self.active(slots)
+        valid = rows >= 0
+        if not np.any(valid):
+            return np.zeros(len(rows))
+        rows = np.where(valid, rows, 0)
+        _, dist = geo.qdrdist(lat, lon, self.data['wplat'][rows], self.data['wplon'][rows])
+        # Leg lengths of the waypoints after the active waypoint. Rows without
+        # a waypoint have a leg length of zero, so the cumulative sum can span
+        # all segments.
+        cumdist = np.cumsum(self.data['wpdistto'][:self.nrows])
+        last = np.maximum(self.start[slots] + self.count[slots] - 1, 0)
+        return np.where(valid, (dist + cumdist[last] - cumdist[rows]) * nm, 0.0)
+
+    def nextturn(self, slots):
+        ''' Row of the first flyturn waypoint at or after the active waypoint
+            of the routes in slots, or -1 when there is none. '''
+        rows = self.active(slots)
+        turnrows = np.flatnonzero(self.data['wpflyturn'][:self.nrows])
+        nextrow = np.append(turnrows, self.nrows)[np.searchsorted(turnrows, rows)]
+        end = self.start[slots] + self.count[slots]
+        return np.where((rows >= 0) & (nextrow < end), nextrow, -1)
+
+
+class WaypointField:
+    ''' Route attribute for a column of the route store.
+
+        Reading the attribute gives a WaypointColumn view on the waypoints
+        of the route, assigning a sequence to it sets all waypoint values.
+    '''
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, route, owner=None):
+        if route is None:
+            return self
+        return WaypointColumn(route.store, route.slot, self.name)
+
+    def __set__(self, route, values):
+        route.store.setcolumn(route.slot, self.name, values)
+
+
+class WaypointColumn:
+    ''' List-like view on the values of one waypoint field of a route.
+
+        Elements and slices can be read and set, but waypoints can only be
+        inserted or deleted for all fields at once, through the route.
+    '''
+    __slots__ = ('store', 'slot', 'name')
+
+    def __init__(self, store, slot, name):
+        self.store = store
+        self.slot = slot
+        self.name = name
+
+    @property
+    def values(self):
+        ''' Numpy view on the values of this field. '''
+        start, end = self.store.segment(self.slot)
+        return self.store.data[self.name][start:end]
+
+    def tolist(self):
+        ''' Return the values as a list of Python objects. '''
+        return self.values.tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.values, dtype=dtype)
+
+    def __len__(self):
+        return int(self.store.count[self.slot])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.values[idx].tolist()
+        start, end = self.store.segment(self.slot)
+        if idx < 0:
+            idx += end - start
+        if not 0 <= idx < end - start:
+            raise IndexError('waypoint index out of range')
+        return self.store.data[self.name].item(start + idx)
+
+    def __setitem__(self, idx, value):
+        values = self.values
+        if isinstance(idx, slice):
+            rows = range(*idx.indices(len(values)))
+            if not rows:
+                return
+            if values.dtype == object:
+                for i, v in zip(rows, value):
+                    values[i] = v
+            else:
+                values[idx] = value
+            self.store.markstale(self.slot, min(rows[0], rows[-1]))
+        else:
+            values[idx] = value
+            self.store.markstale(self.slot, idx + len(values) if idx < 0 else idx)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __contains__(self, value):
+        return value in self.tolist()
+
+    def __eq__(self, other):
+        if isinstance(other, WaypointColumn):
+            other = other.tolist()
+        return isinstance(other, (list, tuple)) and self.tolist() == list(other)
+
+    def __add__(self, other):
+        return self.tolist() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.tolist()
+
+    def index(self, value):
+        ''' Return the index of the first waypoint with this value. '''
+        return self.tolist().index(value)
+
+    def count(self, value):
+        ''' Return the number of waypoints with this value. '''
+        return self.tolist().count(value)
+
+    def __repr__(self):
+        return repr(self.tolist())
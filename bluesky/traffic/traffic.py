@@ -5,28 +5,34 @@ from random import randint
 import numpy as np
 
 import bluesky as bs
-from bluesky.core import Entity, Timer
+from bluesky.core import Entity, Timer, Signal
+from bluesky.stack import command
 from bluesky.stack.recorder import savecmd
-from bluesky.tools import geo
+from bluesky.tools import aerotable, geo
 from bluesky.tools.misc import latlon2txt
 from bluesky.tools.aero import casormach2tas, fpm, kts, ft, g0, Rearth, nm, tas2cas,\
-                         vatmos,  vtas2cas, vtas2mach, vcasormach
+                         vatmos, vcasormach
 
 
 from bluesky.traffic.asas import ConflictDetection, ConflictResolution
 from .windsim import WindSim
+from .windsampler import WindSampler
 from .conditional import Condition
 from .trails import Trails
 from .adsbmodel import ADSB
 from .aporasas import APorASAS
 from .autopilot import Autopilot
+from .route import Route
 from .activewpdata import ActiveWaypoint
 from .turbulence import Turbulence
 from .trafficgroups import TrafficGroups
 from .performance.perfbase import PerfBase
+from .derivedstate import DerivedState
+from .workarrays import WorkArrays
 
 # Register settings defaults
-bs.settings.set_variable_defaults(performance_model='openap', asas_dt=1.0)
+bs.settings.set_variable_defaults(performance_model='openap', asas_dt=1.0,
+                                  deferred_delete=False)
 
 # if bs.settings.performance_model == 'bada':
 #     try:
@@ -81,10 +87,33 @@ class Traffic(Entity):
         # Manual timer for CD and CR
         self.asastimer = Timer(name='asas', dt=bs.settings.asas_dt)
 
+        # Callsign -> index lookup table, kept up to date by cre, delete,
+        # reset and rename
+        self.idindex = dict()
+
+        # Next unique aircraft number (see uid)
+        self.nextuid = 0
+
+        # Deferred deletion: when enabled, deleted aircraft are only marked,
+        # and removed from all traffic arrays at once at the end of the timestep
+        self.deferdelete = bs.settings.deferred_delete
+        self.delqueue = set()
+
+        # Emitted after aircraft are removed from the traffic arrays, with a
+        # remap array (old index -> new index, -1 for deleted aircraft)
+        self.remap_event = Signal('traffic-remap')
+
+        # Per-step cache of quantities derived from the traffic state
+        # (sines/cosines, velocity components, atmosphere)
+        self.derived = DerivedState(self)
+        # Work arrays for intermediate results of the kinematics
+        self.work_arrays = WorkArrays()
+
         with self.settrafarrays():
             # Aircraft Info
             self.id      = []  # identifier (string)
             self.type    = []  # aircaft type (string)
+            self.uid     = np.array([], dtype=np.int64)  # unique number, stable over deletes
 
             # Positions
             self.lat     = np.array([])  # latitude [deg]
@@ -105,6 +134,7 @@ class Traffic(Entity):
 
             # Acceleration
             self.ax = np.array([])  # [m/s2] current longitudinal acceleration
+            self.az = np.array([])  # [m/s2] current vertical acceleration
 
             # Atmosphere
             self.p       = np.array([])  # air pressure [N/m2]
@@ -115,6 +145,7 @@ class Traffic(Entity):
             # Wind speeds
             self.windnorth = np.array([])  # wind speed north component a/c pos [m/s]
             self.windeast  = np.array([])  # wind speed east component a/c pos [m/s]
+            self.windsampler = WindSampler()  # Cache of the wind at the a/c positions
 
             # Traffic autopilot settings
             self.selspd = np.array([])  # selected spd(CAS or Mach) [m/s or -]
@@ -142,6 +173,7 @@ class Traffic(Entity):
 
             # Traffic autopilot data
             self.swhdgsel = np.array([], dtype=bool)  # determines whether aircraft is turning
+            self.swaltsel = np.array([], dtype=bool)  # determines whether aircraft climbs/descends to selected altitude
 
             # Traffic autothrottle settings
             self.swats    = np.array([], dtype=bool)  # Switch indicating whether autothrottle system is on/off
@@ -162,6 +194,9 @@ class Traffic(Entity):
         ''' Clear all traffic data upon simulation reset. '''
         # Some child reset functions depend on a correct value of self.ntraf
         self.ntraf = 0
+        self.nextuid = 0
+        self.delqueue.clear()
+        self.idindex.clear()
         # This ensures that the traffic arrays (which size is dynamic)
         # are all reset as well, so all lat,lon,sdp etc but also objects adsb
         super().reset()
@@ -204,9 +239,13 @@ class Traffic(Entity):
         # Determine number of aircraft to create from array length of acid
         n = 1 if isinstance(acid, str) else len(acid)
 
+        # Remove aircraft marked for deletion first, so that their callsigns
+        # can be reused
+        self.compact()
+
         if isinstance(acid, str):
             # Check if not already exist
-            if self.id.count(acid.upper()) > 0:
+            if acid.upper() in self.idindex:
                 return False, acid + " already exists."  # already exists do nothing
             acid = n * [acid]
 
@@ -232,6 +271,10 @@ class Traffic(Entity):
         # Aircraft Info
         self.id[-n:]   = acid
         self.type[-n:] = actype
+        self.uid[-n:]  = np.arange(self.nextuid, self.nextuid + n)
+        self.nextuid  += n
+        for i, acidi in enumerate(acid, self.ntraf - n):
+            self.idindex.setdefault(acidi, i)
 
         # Positions
         self.lat[-n:]  = aclat
@@ -376,25 +419,60 @@ class Traffic(Entity):
 
     def delete(self, idx):
         """Delete an aircraft"""
+        if self.deferdelete:
+            # Only mark aircraft as deleted. They are removed from the traffic
+            # arrays at the end of the timestep (see compact())
+            for i in np.atleast_1d(idx):
+                i = int(i) % self.ntraf
+                self.delqueue.add(i)
+                # Marked aircraft can no longer be found by callsign
+                if self.idindex.get(self.id[i]) == i:
+                    del self.idindex[self.id[i]]
+            return True
+        return self._delete(idx)
+
+    def _delete(self, idx):
+        """ Remove aircraft idx from all traffic arrays. """
         # If this is a multiple delete, sort first for list delete
         # (which will use list in reverse order to avoid index confusion)
         if isinstance(idx, Collection):
             idx = np.sort(idx)
 
         # Call the actual delete function
+        nold = self.ntraf
         super().delete(idx)
 
         # Update number of aircraft
         self.ntraf = len(self.lat)
+
+        # Indices have shifted: rebuild the callsign lookup table. Iterate
+        # in reverse, so that the first occurrence of a callsign is stored
+        self.idindex = dict(zip(reversed(self.id), range(self.ntraf - 1, -1, -1)))
+
+        # Publish old -> new index remap table to interested subscribers
+        if self.remap_event.subscribers:
+            remap = np.full(nold, -1)
+            keep = np.ones(nold, dtype=bool)
+            keep[idx] = False
+            remap[keep] = np.arange(self.ntraf)
+            self.remap_event.emit(remap)
         return True
 
+    def compact(self):
+        """ Remove all aircraft marked for deletion from the traffic arrays
+            in a single pass. The order of the remaining aircraft is kept. """
+        if self.delqueue:
+            idx = np.array(sorted(self.delqueue))
+            self.delqueue.clear()
+            self._delete(idx)
+
     def update(self):
         # Update only if there is traffic ---------------------
         if self.ntraf == 0:
             return
 
         #---------- Atmosphere --------------------------------
-        self.p, self.rho, self.Temp = vatmos(self.alt)
+        self.p, self.rho, self.Temp = self.derived.atmos[:3]
 
         #---------- ADSB Update -------------------------------
         self.adsb.update()
@@ -415,9 +493,7 @@ class Traffic(Entity):
                              self.aporasas.alt, self.ax)
 
         #---------- Kinematics --------------------------------
-        self.update_airspeed()
-        self.update_groundspeed()
-        self.update_pos()
+        self.update_kinematics()
 
         #---------- Simulate Turbulence -----------------------
         self.turbulence.update()
@@ -428,97 +504,171 @@ class Traffic(Entity):
         #---------- Aftermath ---------------------------------
         self.trails.update()
 
+    def update_kinematics(self):
+        ''' Advance the speeds, heading, track, altitude and position of all
+            aircraft by one time step.
+
+            Intermediate results are computed in place, in work arrays that
+            are reused every step. Arrays that are derived from the traffic
+            state (cas, M, ax, az, swhdgsel, swaltsel) are updated in place.
+            State arrays are replaced by new arrays, because the derived
+            state cache and other modules (e.g., trails) rely on that. '''
+        self.update_airspeed()
+        self.update_groundspeed()
+        self.update_pos()
+
     def update_airspeed(self):
+        dt = bs.sim.simdt
+        tmp1, tmp2, tmp3, tmp4 = self.work_arrays(self.ntraf, 'tmp1', 'tmp2', 'tmp3', 'tmp4')
+        need = self.work_arrays(self.ntraf, 'need', dtype=bool)
+
         # Compute horizontal acceleration
-        delta_spd = self.aporasas.tas - self.tas
-        need_ax = np.abs(delta_spd) > np.abs(bs.sim.simdt * self.perf.axmax)
-        self.ax = need_ax * np.sign(delta_spd) * self.perf.axmax
+        delta_spd = np.subtract(self.aporasas.tas, self.tas, out=tmp1)
+        maxdspd = np.abs(np.multiply(dt, self.perf.axmax, out=tmp2), out=tmp2)
+        np.greater(np.abs(delta_spd, out=tmp3), maxdspd, out=need)
+        np.multiply(need, np.sign(delta_spd, out=tmp3), out=self.ax)
+        self.ax *= self.perf.axmax
         # Update velocities
-        self.tas = np.where(need_ax, self.tas + self.ax * bs.sim.simdt, self.aporasas.tas)
-        self.cas = vtas2cas(self.tas, self.alt)
-        self.M = vtas2mach(self.tas, self.alt)
+        tas = np.multiply(self.ax, dt, out=tmp1)
+        tas += self.tas
+        self.tas = np.where(need, tas, self.aporasas.tas)
+        aerotable.vtas2cas(self.tas, self.derived.altitudes, out=self.cas)
+        np.divide(self.tas, self.derived.vsound, out=self.M)
 
         # Turning bank triangle
         # tan phi = a centrigugal/a grav = omega^2 * R / g = omega * V /g
         # => omega = (g tan phi)/V
-        turnrate = np.degrees(g0 * np.tan(np.where(self.ap.turnphi>self.eps*self.eps,
-                                                   self.ap.turnphi,self.ap.bankdef)) \
-                                          / np.maximum(self.tas, self.eps))
-        delhdg = (self.aporasas.hdg - self.hdg + 180) % 360 - 180  # [deg]
-        self.swhdgsel = np.abs(delhdg) > np.abs(bs.sim.simdt * turnrate)
+        turnrate = tmp1
+        np.copyto(turnrate, self.ap.bankdef)
+        np.greater(self.ap.turnphi, np.multiply(self.eps, self.eps, out=tmp2), out=need)
+        np.copyto(turnrate, self.ap.turnphi, where=need)
+        np.tan(turnrate, out=turnrate)
+        turnrate *= g0
+        turnrate /= np.maximum(self.tas, self.eps, out=tmp2)
+        np.degrees(turnrate, out=turnrate)
+        delhdg = np.subtract(self.aporasas.hdg, self.hdg, out=tmp2)  # [deg]
+        delhdg += 180.0
+        np.remainder(delhdg, 360.0, out=delhdg)
+        delhdg -= 180.0
+        turn = np.multiply(dt, turnrate, out=tmp1)
+        np.greater(np.abs(delhdg, out=tmp3), np.abs(turn, out=tmp4), out=self.swhdgsel)
 
         # Update heading
-        self.hdg = np.where(self.swhdgsel, 
-                            self.hdg + bs.sim.simdt * turnrate * np.sign(delhdg), self.aporasas.hdg) % 360.0
+        turn *= np.sign(delhdg, out=tmp3)
+        turn += self.hdg
+        hdg = np.where(self.swhdgsel, turn, self.aporasas.hdg)
+        self.hdg = np.remainder(hdg, 360.0, out=hdg)
 
         # Update vertical speed (alt select, capture and hold autopilot mode)
-        delta_alt = self.aporasas.alt - self.alt
+        delta_alt = np.subtract(self.aporasas.alt, self.alt, out=tmp1)
         # Old dead band version:
         #        self.swaltsel = np.abs(delta_alt) > np.maximum(
         #            10 * ft, np.abs(2 * bs.sim.simdt * self.vs))
 
         # Update version: time based engage of altitude capture (to adapt for UAV vs airliner scale)
-        self.swaltsel = np.abs(delta_alt) >  1.05*np.maximum(np.abs(bs.sim.simdt * self.aporasas.vs), \
-                                                         np.abs(bs.sim.simdt * self.vs))
-        target_vs = self.swaltsel * np.sign(delta_alt) * np.abs(self.aporasas.vs)
-        delta_vs = target_vs - self.vs
-        # print(delta_vs / fpm)
-        need_az = np.abs(delta_vs) > 300 * fpm   # small threshold
-        self.az = need_az * np.sign(delta_vs) * (300 * fpm)   # fixed vertical acc approx 1.6 m/s^2
-        self.vs = np.where(need_az, self.vs+self.az*bs.sim.simdt, target_vs)
-        self.vs = np.where(np.isfinite(self.vs), self.vs, 0)    # fix vs nan issue
+        maxdalt = np.abs(np.multiply(dt, self.aporasas.vs, out=tmp2), out=tmp2)
+        np.maximum(maxdalt, np.abs(np.multiply(dt, self.vs, out=tmp3), out=tmp3), out=maxdalt)
+        maxdalt *= 1.05
+        np.greater(np.abs(delta_alt, out=tmp3), maxdalt, out=self.swaltsel)
+        target_vs = np.multiply(self.swaltsel, np.sign(delta_alt, out=tmp2), out=tmp2)
+        target_vs *= np.abs(self.aporasas.vs, out=tmp3)
+        delta_vs = np.subtract(target_vs, self.vs, out=tmp1)
+        need_az = np.greater(np.abs(delta_vs, out=tmp3), 300 * fpm, out=need)  # small threshold
+        np.multiply(need_az, np.sign(delta_vs, out=tmp3), out=self.az)
+        self.az *= 300 * fpm  # fixed vertical acc approx 1.6 m/s^2
+        vs = np.multiply(self.az, dt, out=tmp1)
+        vs += self.vs
+        vs = np.where(need_az, vs, target_vs)
+        # fix vs nan issue
+        np.copyto(vs, 0.0, where=np.logical_not(np.isfinite(vs, out=need), out=need))
+        self.vs = vs
 
     def update_groundspeed(self):
+        tmp1, tmp2 = self.work_arrays(self.ntraf, 'tmp1', 'tmp2')
+
         # Compute ground speed and track from heading, airspeed and wind
         if self.wind.winddim == 0:  # no wind
-            self.gsnorth  = self.tas * np.cos(np.radians(self.hdg))
-            self.gseast   = self.tas * np.sin(np.radians(self.hdg))
+            self.gseast, self.gsnorth = self.derived.tasvel
 
             self.gs  = self.tas
             self.trk = self.hdg
             self.windnorth[:], self.windeast[:] = 0.0,0.0
 
         else:
-            applywind = self.alt>50.*ft # Only apply wind when airborne
+            # Only apply wind when airborne
+            applywind = np.greater(self.alt, 50. * ft,
+                                   out=self.work_arrays(self.ntraf, 'applywind', dtype=bool))
 
-            vnwnd,vewnd = self.wind.getdata(self.lat, self.lon, self.alt)
+            vnwnd,vewnd = self.windsampler.getdata(self.wind, self.lat, self.lon, self.alt,
+                                                   self.derived.coslat)
             self.windnorth[:], self.windeast[:] = vnwnd,vewnd
-            self.gsnorth  = self.tas * np.cos(np.radians(self.hdg)) + self.windnorth*applywind
-            self.gseast   = self.tas * np.sin(np.radians(self.hdg)) + self.windeast*applywind
-
-            self.gs  = np.logical_not(applywind)*self.tas + \
-                       applywind*np.sqrt(self.gsnorth**2 + self.gseast**2)
+            taseast, tasnorth = self.derived.tasvel
+            self.gsnorth  = np.multiply(self.windnorth, applywind)
+            self.gsnorth += tasnorth
+            self.gseast   = np.multiply(self.windeast, applywind)
+            self.gseast  += taseast
 
-            self.trk = np.logical_not(applywind)*self.hdg + \
-                       applywind*np.degrees(np.arctan2(self.gseast, self.gsnorth)) % 360.
+            gs = np.multiply(self.gsnorth, self.gsnorth, out=tmp1)
+            gs += np.multiply(self.gseast, self.gseast, out=tmp2)
+            self.gs = np.where(applywind, np.sqrt(gs, out=gs), self.tas)
 
-        self.work += (self.perf.thrust * bs.sim.simdt * np.sqrt(self.gs * self.gs + self.vs * self.vs))
+            trk = np.degrees(np.arctan2(self.gseast, self.gsnorth, out=tmp1), out=tmp1)
+            self.trk = np.where(applywind, np.remainder(trk, 360., out=trk), self.hdg)
 
+        spd = np.multiply(self.gs, self.gs, out=tmp1)
+        spd += np.multiply(self.vs, self.vs, out=tmp2)
+        work = np.multiply(self.perf.thrust, bs.sim.simdt, out=tmp2)
+        work *= np.sqrt(spd, out=spd)
+        self.work += work
 
     def update_pos(self):
+        dt = bs.sim.simdt
+        tmp1 = self.work_arrays(self.ntraf, 'tmp1')
+
         # Update position
-        self.alt = np.where(self.swaltsel, np.round(self.alt + self.vs * bs.sim.simdt, 6), self.aporasas.alt)
-        self.lat = self.lat + np.degrees(bs.sim.simdt * self.gsnorth / Rearth)
-        self.coslat = np.cos(np.deg2rad(self.lat))
-        self.lon = self.lon + np.degrees(bs.sim.simdt * self.gseast / self.coslat / Rearth)
-        self.distflown += self.gs * bs.sim.simdt
+        alt = np.multiply(self.vs, dt, out=tmp1)
+        alt += self.alt
+        self.alt = np.where(self.swaltsel, np.round(alt, 6, out=alt), self.aporasas.alt)
+        dlat = np.multiply(dt, self.gsnorth, out=tmp1)
+        dlat /= Rearth
+        self.lat = self.lat + np.degrees(dlat, out=dlat)
+        self.coslat = self.derived.coslat
+        dlon = np.multiply(dt, self.gseast, out=tmp1)
+        dlon /= self.coslat
+        dlon /= Rearth
+        self.lon = self.lon + np.degrees(dlon, out=dlon)
+        self.distflown += np.multiply(self.gs, dt, out=tmp1)
 
     def id2idx(self, acid):
         """Find index of aircraft id"""
         if not isinstance(acid, str):
-            # id2idx is called for multiple id's
-            # Fast way of finding indices of all ACID's in a given list
-            tmp = dict((v, i) for i, v in enumerate(self.id))
-            return [tmp.get(acidi, -1) for acidi in acid]
-        else:
-             # Catch last created id (* or # symbol)
-            if acid in ('#', '*'):
-                return self.ntraf - 1
-
-            try:
-                return self.id.index(acid.upper())
-            except:
-                return -1
+            # id2idx is called for multiple id's: return array of indices
+            return np.array([self.idindex.get(acidi, -1) for acidi in acid], dtype=int)
+
+        # Catch last created id (* or # symbol)
+        if acid in ('#', '*'):
+            return self.ntraf - 1
+
+        return self.idindex.get(acid.upper(), -1)
+
+    @command(name='RENAME')
+    def rename(self, idx: 'acid', newid: 'txt'):
+        """ Change the callsign of an aircraft. """
+        if newid in self.idindex:
+            return False, f'{newid} already exists.'
+        oldid = self.id[idx]
+        self.id[idx] = newid
+        if self.idindex.get(oldid) == idx:
+            del self.idindex[oldid]
+        self.idindex[newid] = idx
+
+        # Routes and conditional commands are stored per callsign
+        route = self.ap.route[idx]
+        route.acid = newid
+        Route._routes.pop(oldid, None)
+        Route._routes[newid] = route
+        self.cond.renameac(oldid, newid)
+        return True, f'{oldid} renamed to {newid}'
 
     def setnoise(self, noise=None):
         """Noise (turbulence, ADBS-transmission noise, ADSB-truncated effect)"""
@@ -553,6 +703,9 @@ class Traffic(Entity):
             self.vs[idx]     = vspd
             self.swvnav[idx] = False
 
+        # Conflict detection can't assume continuous motion for this aircraft
+        self.cd.invalidate(idx)
+
     def poscommand(self, idxorwp: int|str):
         """POS command: Show info or an aircraft, airport, waypoint or navaid"""
         if isinstance(idxorwp, str):
@@ -636,7 +789,7 @@ class Traffic(Entity):
 
 
                     # How many others?
-                    nother = bs.navdb.wpid.count(wp)-len(iwps)
+                    nother = len(bs.navdb.wpindex.get(wp, []))-len(iwps)
                     if nother>0:
                         verb = ["is ","are "][min(1,max(0,nother-1))]
                         lines = lines +"\nThere "+verb + str(nother) +\
@@ -720,7 +873,7 @@ class Traffic(Entity):
 
     def airwaycmd(self, key):
         ''' Show conections of a waypoint or airway. '''
-        if bs.navdb.awid.count(key) > 0:
+        if key in bs.navdb.airways.awyindex:
             return self.poscommand(key)
 
         # Find connecting airway legs
@@ -38,10 +38,10 @@ class Turbulence(Entity, replaceable=True):
         # Vertical direction
         turbalt=np.random.normal(0,self.sd[2]*timescale,bs.traf.ntraf) #[m]
 
-        trkrad=np.radians(bs.traf.trk)
+        sintrk, costrk = bs.traf.derived.sintrk, bs.traf.derived.costrk
         # Lateral, longitudinal direction
-        turblat=np.cos(trkrad)*turbhf-np.sin(trkrad)*turbhw #[m]
-        turblon=np.sin(trkrad)*turbhf+np.cos(trkrad)*turbhw #[m]
+        turblat=costrk*turbhf-sintrk*turbhw #[m]
+        turblon=sintrk*turbhf+costrk*turbhw #[m]
 
         # Update the aircraft locations
         bs.traf.alt = bs.traf.alt + turbalt
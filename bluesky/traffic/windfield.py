@@ -4,6 +4,7 @@ from numpy import array, sin, cos, arange, radians, ones, append, ndarray, \
                   pi, concatenate, unique, flatnonzero
 from scipy.interpolate import interp1d, RegularGridInterpolator
 from bluesky.tools.aero import ft
+from .windgrid import WindGrid
 class Windfield():
     """ Windfield class:
         Methods:
@@ -22,6 +23,12 @@ class Windfield():
 
             remove(idx) = remove a defined profile using the index
 
+            resample(lat0,lat1,lon0,lon1,res,altres)
+                       = resample the wind field onto a regular grid, which
+                         is used for all wind lookups after that
+
+            loadgrid(grid) = replace the wind field by a wind grid
+
         Members:
             lat(nvec)          = latitudes of wind definitions
             lon(nvec)          = longitudes of wind definitions
@@ -36,6 +43,13 @@ class Windfield():
                           2 = 2D field (no alt profiles),
                           3 = 3D field (alt dependent wind at some points)
 
+            grid      = WindGrid with the wind on a regular lat/lon/alt grid, used
+                        instead of the interpolation between the wind points when
+                        the field is loaded as a grid or resampled onto a grid
+
+            version   = number of changes of the wind field, to tell when wind
+                        sampled from the field is outdated
+
     """
     def __init__(self):
         # For altitude use fixed axis to allow vectorisation later
@@ -51,6 +65,7 @@ class Windfield():
         self.iprof   = []
 
         # Clear actual field
+        self.version = 0
         self.clear()
         return
 
@@ -66,6 +81,9 @@ class Windfield():
         self.nvec    = 0
         self.fe      = None
         self.fn      = None
+        self.grid    = None
+        self.gridresampled = False
+        self.version += 1
         return
 
     def addpointvne(self, lat, lon, vnorth, veast, windalt=None):
@@ -92,13 +110,18 @@ class Windfield():
                     lats = unique(lat)
                     lons = unique(lon)
                     
-                    # Set RGI interpolation functions
                     vevalues = veaxis.reshape((len(altaxis), len(lats), len(lons)))
                     vnvalues = vnaxis.reshape((len(altaxis), len(lats), len(lons)))
-                    self.fe = RegularGridInterpolator((altaxis, lats, lons), 
-                                                      vevalues, bounds_error=False, fill_value=0.)
-                    self.fn = RegularGridInterpolator((altaxis, lats, lons), 
-                                                      vnvalues, bounds_error=False, fill_value=0.) 
+                    try:
+                        # Regular lat/lon grid: constant-time grid interpolation
+                        self.grid = WindGrid(lats, lons, altaxis, vnvalues, vevalues)
+                        self.gridresampled = False
+                    except ValueError:
+                        # Set RGI interpolation functions
+                        self.fe = RegularGridInterpolator((altaxis, lats, lons),
+                                                          vevalues, bounds_error=False, fill_value=0.)
+                        self.fn = RegularGridInterpolator((altaxis, lats, lons),
+                                                          vnvalues, bounds_error=False, fill_value=0.)
                 except:
                     # Create vn, ve if RGI is not possible
                     vnaxis = fnorth(self.altaxis).T
@@ -129,6 +152,8 @@ class Windfield():
         if self.winddim<3: # No 3D => set dim to 0,1 or 2 dep on nr of points
             self.winddim = min(2,len(self.lat))
 
+        self.version += 1
+
     def addpoint(self,lat,lon,winddir,windspd,windalt=None):
         """ addpoint: adds a lat,lon position with a wind direction [deg]
                                                      and wind speedd [m/s]
@@ -179,6 +204,11 @@ class Windfield():
 
         self.nvec = self.nvec+1
 
+        # A grid resampled from the wind points is outdated now
+        if self.gridresampled:
+            self.grid = None
+
+        self.version += 1
         return idx # return index of added point
     
     def getdata(self,userlat,userlon,useralt=0.0): # in case no altitude specified and field is 3D, use sea level wind
@@ -203,8 +233,12 @@ class Windfield():
         else:
             alt = zeros(npos)
 
+        # Use the wind grid when there is one
+        if self.grid is not None:
+            vnorth, veast = self.grid.getdata(lat.reshape(npos), lon.reshape(npos), alt)
+
         # Check if RGI functions are present, if so use them for interpolation
-        if self.fe is not None and self.fn is not None:
+        elif self.fe is not None and self.fn is not None:
             vnorth = self.fn(concatenate((alt.reshape(1,-1), lat, lon), axis=0).T)
             veast  = self.fe(concatenate((alt.reshape(1,-1), lat, lon), axis=0).T)
         else:
@@ -251,7 +285,7 @@ class Windfield():
                     idxalt = maximum(0., minimum(self.altaxis[-1]-eps, alt) / self.altstep) # find right index
     
                     # Convert to index and factor
-                    ialt   = floor(idxalt).astype(int) # index array for lower altitude
+                    ialt   = minimum(floor(idxalt).astype(int), len(self.altaxis) - 2) # index array for lower altitude
                     falt   = idxalt-ialt  # factor for upper value
 
 
@@ -277,7 +311,7 @@ class Windfield():
             return list(vnorth),list(veast)
 
         else:
-            return float(vnorth),float(veast)
+            return vnorth.item(),veast.item()
 
     def remove(self,idx): # remove a point using the returned index when it was added
         if idx<len(self.lat):
@@ -293,4 +327,28 @@ class Windfield():
             if self.winddim<3 or len(self.iprof)==0 or len(self.lat)==0:
                 self.winddim = min(2,len(self.lat)) # Check for 0, 1D, 2D or 3D
 
+            if self.gridresampled:
+                self.grid = None
+
+            self.version += 1
+
         return
+
+    def resample(self, lat0, lat1, lon0, lon1, res=0.5, altres=1000. * ft):
+        """ Resample the wind field between lat0,lat1 and from lon0 eastward
+            to lon1 [deg] onto a regular grid with res [deg] resolution, and
+            altres [m] altitude resolution for 3D fields. Outside the grid the
+            wind at the nearest grid edge is used. Returns the grid. """
+        self.grid = None
+        alt = arange(0., self.altmax + altres, altres) if self.winddim == 3 else None
+        self.grid = WindGrid.resample(self, lat0, lat1, lon0, lon1, res, alt, fill_value=None)
+        self.gridresampled = True
+        self.version += 1
+        return self.grid
+
+    def loadgrid(self, grid):
+        """ Replace the wind field by a wind grid, such as a WindSeries
+            that varies in time. """
+        self.clear()
+        self.grid = grid
+        self.winddim = 3 if grid.nalt > 1 else 2
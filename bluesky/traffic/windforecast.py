@@ -0,0 +1,158 @@
+''' Time-varying wind from forecast or reanalysis data. '''
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import numpy as np
+
+from bluesky.tools.cachefile import ColumnCache, CacheError
+from .windgrid import WindSeries
+
+
+def crop(columns, lat0, lon0, lat1, lon1):
+    ''' Axes and wind components of a decoded slice inside an area. Returns
+        None when there are no grid points in the area. '''
+    lat = columns['lat']
+    lon = (columns['lon'] + 180.0) % 360.0 - 180.0
+    ilat = np.flatnonzero((lat >= lat0) & (lat <= lat1))
+    jlon = np.argsort(lon, kind='stable')
+    jlon = jlon[(lon[jlon] >= lon0) & (lon[jlon] <= lon1)]
+    if len(ilat) == 0 or len(jlon) == 0:
+        return None
+    idx = np.ix_(np.arange(len(columns['alt'])), ilat, jlon)
+    return lat[ilat], lon[jlon], columns['alt'], \
+        columns['vnorth'][idx], columns['veast'][idx]
+
+
+class WindForecast:
+    ''' Wind from forecast or reanalysis data that is available at fixed
+        valid times, interpolated in time between the valid times.
+
+        The data is decoded in slices of one valid time. Decoded slices are
+        cached as .npy files in the cache path, so that the GRIB or NetCDF
+        data of a slice is decoded only once. The slices before and after
+        the simulation time are kept in a WindSeries, and the slice after
+        that is decoded on a background thread when its data is available
+        locally.
+
+        Arguments:
+        - name: name of the data source, and of its cache directory
+        - decode: function that decodes the data of a valid time into a dict
+          with ascending lat, lon [deg] and alt [m] axes, and vnorth, veast
+          [m/s] arrays of shape (nalt, nlat, nlon). Returns None when there
+          is no data.
+        - islocal: function that tells whether the data of a valid time can
+          be decoded without downloading it
+        - step: time between valid times
+    '''
+    # Increment when the decoded slices change
+    version = '1'
+
+    def __init__(self, name, decode, islocal, step=datetime.timedelta(hours=3)):
+        self.name = name
+        self.decode = decode
+        self.islocal = islocal
+        self.step = step
+        self.area = None
+        self.series = None
+        # Valid times without data, which are not tried again
+        self.missing = set()
+        # Slices that are being loaded: {validtime: future}
+        self.pending = dict()
+        # All decoding happens on one thread, as GRIB and NetCDF libraries
+        # are not thread-safe
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        ''' Stop loading slices in the background. Slices that wait to be
+            loaded are cancelled, and a slice that is being decoded is not
+            waited for. '''
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending.clear()
+
+    def reset(self):
+        ''' Stop loading slices in the background, and clear the area and
+            the wind series. '''
+        self.close()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.area = None
+        self.series = None
+        self.missing.clear()
+
+    def validtime(self, time):
+        ''' Last valid time at or before time. '''
+        day = datetime.datetime(time.year, time.month, time.day)
+        return day + self.step * ((time - day) // self.step)
+
+    def cache(self, validtime):
+        return ColumnCache(f'{self.name}/{validtime:%Y%m%d_%H%M}', self.version)
+
+    def load(self, validtime):
+        ''' Slice of a valid time from the cache, or decoded and cached. '''
+        cache = self.cache(validtime)
+        try:
+            return cache.load('wind')
+        except CacheError:
+            pass
+        columns = self.decode(validtime)
+        if columns is not None:
+            with cache:
+                cache.dump('wind', dict(
+                    lat=np.asarray(columns['lat'], dtype=float),
+                    lon=np.asarray(columns['lon'], dtype=float),
+                    alt=np.asarray(columns['alt'], dtype=float),
+                    vnorth=np.asarray(columns['vnorth'], dtype=np.float32),
+                    veast=np.asarray(columns['veast'], dtype=np.float32)))
+        return columns
+
+    def prefetch(self, validtime):
+        ''' Start loading the slice of a valid time in the background, when
+            it is cached or its data is available locally. '''
+        if validtime in self.pending or validtime in self.missing:
+            return
+        try:
+            self.cache(validtime).check_cache()
+        except CacheError:
+            if not self.islocal(validtime):
+                return
+        self.pending[validtime] = self.executor.submit(self.load, validtime)
+
+    def get(self, validtime):
+        ''' Slice of a valid time. Waits for the slice when it is loading. '''
+        future = self.pending.pop(validtime, None) or self.executor.submit(self.load, validtime)
+        columns = future.result()
+        if columns is None:
+            self.missing.add(validtime)
+        return columns
+
+    def setarea(self, lat0, lon0, lat1, lon1):
+        ''' Set the area [deg] of the wind grid. '''
+        area = (min(lat0, lat1), min(lon0, lon1), max(lat0, lat1), max(lon0, lon1))
+        if area != self.area:
+            self.area = area
+            self.series = None
+
+    def settime(self, time, field=None):
+        ''' The wind series at a time (datetime), or None when there is no
+            data in the area for the last valid time before time. The version
+            of the Windfield that uses the series (field) is incremented when
+            the wind changes. '''
+        validtime = self.validtime(time)
+        for vtime in (validtime, validtime + self.step):
+            if self.series is not None and vtime in self.series.times:
+                continue
+            grid = None if vtime in self.missing else self.get(vtime)
+            grid = None if grid is None else crop(grid, *self.area)
+            if grid is None:
+                if vtime == validtime:
+                    return None
+                continue
+            lat, lon, alt, vnorth, veast = grid
+            if self.series is None:
+                self.series = WindSeries(lat, lon, alt)
+            self.series.add(vtime, vnorth, veast)
+
+        self.prefetch(validtime + 2 * self.step)
+        self.series.settime(time, field)
+        return self.series
@@ -0,0 +1,223 @@
+""" Wind field on a regular lat/lon/altitude grid, with trilinear interpolation. """
+from bisect import bisect_left
+import numpy as np
+
+from bluesky.tools.aero import ft
+
+
+def memory_estimate(nlat, nlon, nalt, dtype=np.float32):
+    """ Memory [bytes] of the north and east wind components of a grid. """
+    return 2 * nlat * nlon * nalt * np.dtype(dtype).itemsize
+
+
+def regular_axis(values):
+    """ Start and step of an axis with (nearly) equal steps, or a ValueError. """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return (float(values[0]) if len(values) else 0.0), 1.0
+    step = (values[-1] - values[0]) / (len(values) - 1)
+    if step <= 0.0 or not np.allclose(np.diff(values), step, rtol=1e-6, atol=1e-9):
+        raise ValueError('Wind grid axis is not regular')
+    return float(values[0]), float(step)
+
+
+def lerp(a, b, w):
+    """ Linear interpolation between a and b with weight w of b. """
+    return a + w * (b - a)
+
+
+class WindGrid:
+    """ Wind field on a regular lat/lon grid, at a set of altitude levels.
+
+        Wind at a position is interpolated trilinearly between the eight
+        surrounding grid points. The grid cell of a position follows from
+        the constant lat/lon steps, and the altitude level from a lookup
+        table with a fixed altitude step, so each query costs the same
+        amount of work regardless of the size of the grid.
+
+        Arguments:
+        - lat, lon: ascending, equally spaced grid axes [deg]
+        - alt: ascending altitude levels [m]
+        - vnorth, veast: wind components [m/s], shape (nalt, nlat, nlon)
+        - fill_value: wind outside the lat/lon grid. None: use the wind at
+          the nearest edge of the grid. Above the highest and below the
+          lowest level the wind of that level is used.
+        - dtype: storage type of the wind components
+    """
+    altstep = 100. * ft  # [m] altitude step of the level lookup table
+
+    def __init__(self, lat, lon, alt, vnorth, veast, fill_value=0.0, dtype=np.float32):
+        self.lat0, self.dlat = regular_axis(lat)
+        self.lon0, self.dlon = regular_axis(lon)
+        self.alt = np.array(alt, dtype=float).reshape(-1)
+        self.nlat, self.nlon, self.nalt = len(lat), len(lon), len(self.alt)
+        if np.any(np.diff(self.alt) <= 0.0):
+            raise ValueError('Wind grid altitudes are not ascending')
+
+        # North and east wind side by side, so that each corner is one lookup
+        shape = (self.nalt, self.nlat, self.nlon)
+        self.data = np.empty(shape + (2,), dtype=dtype)
+        self.data[..., 0] = np.reshape(vnorth, shape)
+        self.data[..., 1] = np.reshape(veast, shape)
+        self.fill_value = fill_value
+
+        # A grid around the world wraps around in longitude
+        self.wraplon = self.nlon > 1 and abs(self.nlon * self.dlon - 360.0) < 1e-6
+
+        # Index of the level below each step of the altitude lookup table. The
+        # step is not larger than the smallest level spacing, so that each
+        # step contains at most one level.
+        if self.nalt > 1:
+            self.lutstep = min(self.altstep, np.min(np.diff(self.alt)))
+            self.altlut = np.searchsorted(
+                self.alt, np.arange(self.alt[0], self.alt[-1], self.lutstep), side='right') - 1
+        else:
+            self.lutstep = self.altstep
+            self.altlut = np.zeros(1, dtype=int)
+
+    @property
+    def nbytes(self):
+        """ Memory [bytes] of the grid data. """
+        return self.data.nbytes
+
+    @staticmethod
+    def axisweights(f, n):
+        """ Lower index and weight of the upper index for fractional indices f
+            on an axis with n points, clamped to the axis. """
+        f = np.clip(f, 0.0, n - 1.0)
+        i0 = np.minimum(f.astype(int), max(n - 2, 0))
+        return i0, np.minimum(i0 + 1, n - 1), f - i0
+
+    def getdata(self, lat, lon, alt):
+        """ North and east wind [m/s] at arrays of positions lat, lon [deg]
+            and altitudes alt [m]. """
+        lat, lon, alt = np.broadcast_arrays(np.asarray(lat, dtype=float),
+                                            np.asarray(lon, dtype=float),
+                                            np.asarray(alt, dtype=float))
+
+        # Fractional grid indices. Longitudes are taken eastward from the
+        # first grid longitude.
+        fi = (lat - self.lat0) / self.dlat
+        fj = ((lon - self.lon0) % 360.0) / self.dlon
+        inside = (fi >= 0.0) & (fi <= self.nlat - 1.0)
+        if self.wraplon:
+            j0 = fj.astype(int) % self.nlon
+            j1 = (j0 + 1) % self.nlon
+            wj = fj - np.floor(fj)
+        else:
+            inside &= fj <= self.nlon - 1.0
+            # West of the grid: closer to the first than to the last longitude
+            fj = np.where(fj > 0.5 * (self.nlon - 1.0 + 360.0 / self.dlon), fj - 360.0 / self.dlon, fj)
+            j0, j1, wj = self.axisweights(fj, self.nlon)
+        i0, i1, wi = self.axisweights(fi, self.nlat)
+
+        # Altitude levels below and above from the lookup table
+        alt = np.clip(alt, self.alt[0], self.alt[-1])
+        k0 = self.altlut[np.minimum(((alt - self.alt[0]) / self.lutstep).astype(int),
+                                    len(self.altlut) - 1)]
+        k0 = np.where(alt >= self.alt[np.minimum(k0 + 1, self.nalt - 1)],
+                      np.minimum(k0 + 1, self.nalt - 1), k0)
+        k1 = np.minimum(k0 + 1, self.nalt - 1)
+        dalt = self.alt[k1] - self.alt[k0]
+        wk = (alt - self.alt[k0]) / np.where(dalt > 0.0, dalt, 1.0)
+
+        # Trilinear interpolation: first along longitude for the four
+        # corner rows, then along latitude, then along altitude
+        data = self.data.reshape(-1, 2)
+        wj, wi, wk = wj[..., None], wi[..., None], wk[..., None]
+        rows = [(k * self.nlat + i) * self.nlon for k in (k0, k1) for i in (i0, i1)]
+        v00, v01, v10, v11 = (lerp(data[row + j0], data[row + j1], wj) for row in rows)
+        wind = lerp(lerp(v00, v01, wi), lerp(v10, v11, wi), wk)
+
+        if self.fill_value is not None:
+            wind[~inside] = self.fill_value
+        return wind[..., 0], wind[..., 1]
+
+    @classmethod
+    def frompoints(cls, lat, lon, vnorth, veast, windalt, **kwargs):
+        """ Wind grid from wind profiles at the points of a regular grid,
+            ordered by latitude and then longitude, as loaded from GRIB or
+            NetCDF data. vnorth and veast have shape (nalt, npoints). """
+        lats, lons = np.unique(lat), np.unique(lon)
+        return cls(lats, lons, windalt, np.reshape(vnorth, (len(windalt), len(lats), len(lons))),
+                   np.reshape(veast, (len(windalt), len(lats), len(lons))), **kwargs)
+
+    @classmethod
+    def resample(cls, field, lat0, lat1, lon0, lon1, res, alt=None, **kwargs):
+        """ Wind grid from a wind field, which is evaluated at the grid points
+            between lat0, lat1 and lon0, lon1 with res [deg] resolution, at
+            altitude levels alt [m]. """
+        nlat = max(2, int(round(abs(lat1 - lat0) / res)) + 1)
+        nlon = max(2, int(round(((lon1 - lon0) % 360.0 or 360.0) / res)) + 1)
+        lats = np.linspace(min(lat0, lat1), max(lat0, lat1), nlat)
+        lons = lon0 + np.linspace(0.0, (lon1 - lon0) % 360.0 or 360.0, nlon)
+        alt = np.zeros(1) if alt is None else np.asarray(alt, dtype=float)
+
+        glat, glon = np.meshgrid(lats, lons, indexing='ij')
+        vnorth = np.empty((len(alt), nlat, nlon))
+        veast = np.empty((len(alt), nlat, nlon))
+        for k, altk in enumerate(alt):
+            vn, ve = field.getdata(glat.ravel(), glon.ravel(), np.full(glat.size, altk))
+            vnorth[k], veast[k] = np.reshape(vn, glat.shape), np.reshape(ve, glat.shape)
+        return cls(lats, lons, alt, vnorth, veast, **kwargs)
+
+
+class WindSeries(WindGrid):
+    """ Wind grid that varies in time, from wind grids at a few times
+        (epochs) on the same axes, with linear interpolation in time.
+
+        The wind of the time set with settime() is stored as the grid data,
+        so wind lookups cost the same as for a single wind grid. Before the
+        first and after the last epoch the wind of that epoch is used.
+
+        Arguments: as WindGrid, without wind components
+    """
+    maxepochs = 3  # Number of epochs kept in memory
+
+    def __init__(self, lat, lon, alt, fill_value=0.0, dtype=np.float32):
+        shape = (len(alt), len(lat), len(lon))
+        super().__init__(lat, lon, alt, np.zeros(shape), np.zeros(shape), fill_value, dtype)
+        self.times = []
+        self.epochs = []
+        self.time = None
+
+    def add(self, time, vnorth, veast):
+        """ Add the wind at a time (datetime or seconds). """
+        if time in self.times:
+            self.remove(time)
+        epoch = np.empty_like(self.data)
+        epoch[..., 0] = np.reshape(vnorth, self.data.shape[:-1])
+        epoch[..., 1] = np.reshape(veast, self.data.shape[:-1])
+        idx = bisect_left(self.times, time)
+        self.times.insert(idx, time)
+        self.epochs.insert(idx, epoch)
+        if len(self.times) > self.maxepochs:
+            # Drop the epoch farthest from the new one
+            self.remove(self.times[0] if time - self.times[0] > self.times[-1] - time
+                        else self.times[-1])
+        self.time = None
+
+    def remove(self, time):
+        """ Remove the epoch at a time. """
+        idx = self.times.index(time)
+        del self.times[idx], self.epochs[idx]
+        self.time = None
+
+    def settime(self, time, field=None):
+        """ Set the grid data to the wind at a time. When the data changes,
+            the version of the Windfield that uses this series (field) is
+            incremented, so that wind sampled from it is outdated. """
+        if time == self.time or not self.times:
+            return
+        self.time = time
+        if field is not None:
+            field.version += 1
+        idx = bisect_left(self.times, time)
+        if idx == 0 or idx == len(self.times):
+            self.data[:] = self.epochs[min(idx, len(self.times) - 1)]
+            return
+        t0, t1 = self.times[idx - 1], self.times[idx]
+        w = (time - t0) / (t1 - t0)
+        np.subtract(self.epochs[idx], self.epochs[idx - 1], out=self.data)
+        self.data *= w
+        self.data += self.epochs[idx - 1]
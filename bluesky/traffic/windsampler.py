@@ -0,0 +1,109 @@
+""" Wind at the aircraft positions, sampled only for aircraft that moved. """
+import numpy as np
+import bluesky as bs
+from bluesky.core import Entity
+from bluesky.stack import command
+from bluesky.tools.aero import ft, nm, Rearth
+
+
+# Register settings defaults: horizontal distance [m], altitude difference [m]
+# and time [s] after which the wind at an aircraft position is sampled again.
+# By default the wind is sampled for every aircraft every step.
+bs.settings.set_variable_defaults(wind_sample_dist=0.0, wind_sample_dalt=0.0,
+                                  wind_sample_dt=0.0)
+
+
+class WindSampler(Entity):
+    """ Per-aircraft cache of the wind at the aircraft position.
+
+        The wind is sampled again from the wind field only for aircraft that
+        moved more than a horizontal distance or an altitude difference since
+        their last sample, or whose sample is older than a maximum age, and
+        for all aircraft when the wind field changes. Wind fields are smooth,
+        so the cost of a step scales with the number of resampled aircraft.
+        With all thresholds zero (the default), every aircraft is sampled
+        every step.
+    """
+    def __init__(self):
+        super().__init__()
+        self.setlimits(bs.settings.wind_sample_dist, bs.settings.wind_sample_dalt,
+                       bs.settings.wind_sample_dt)
+        # Version of the wind field of the samples
+        self.windversion = None
+        # Number of aircraft sampled in the last update
+        self.nsampled = 0
+
+        with self.settrafarrays():
+            # Position [deg, deg, m] and simulation time [s] of the last sample
+            self.lat    = np.array([])
+            self.lon    = np.array([])
+            self.alt    = np.array([])
+            self.simt   = np.array([])
+            # Sampled wind [m/s]
+            self.vnorth = np.array([])
+            self.veast  = np.array([])
+
+    def create(self, n=1):
+        super().create(n)
+        # Not sampled yet
+        self.simt[-n:] = -np.inf
+
+    def reset(self):
+        super().reset()
+        self.setlimits(bs.settings.wind_sample_dist, bs.settings.wind_sample_dalt,
+                       bs.settings.wind_sample_dt)
+        self.windversion = None
+
+    def setlimits(self, dist, dalt, dt):
+        """ Set the horizontal distance [m], altitude difference [m] and
+            time [s] after which the wind is sampled again. """
+        self.dist = dist
+        self.dalt = dalt
+        self.dt = dt
+
+    def getdata(self, wind, lat, lon, alt, coslat):
+        """ North and east wind [m/s] from wind field wind at the aircraft
+            positions lat, lon [deg] and altitudes alt [m]. """
+        if wind.version != self.windversion:
+            self.windversion = wind.version
+            self.simt[:] = -np.inf
+
+        # Aircraft that moved too far, or with a sample that is too old
+        dy = np.radians(lat - self.lat)
+        dx = np.radians((lon - self.lon + 180.0) % 360.0 - 180.0) * coslat
+        resample = (dx * dx + dy * dy) * (Rearth * Rearth) > self.dist * self.dist
+        resample |= np.abs(alt - self.alt) > self.dalt
+        resample |= bs.sim.simt - self.simt >= self.dt
+
+        idx = np.flatnonzero(resample)
+        self.nsampled = len(idx)
+        if self.nsampled == len(lat):
+            self.vnorth[:], self.veast[:] = wind.getdata(lat, lon, alt)
+            self.lat[:], self.lon[:], self.alt[:] = lat, lon, alt
+            self.simt[:] = bs.sim.simt
+        elif self.nsampled:
+            self.vnorth[idx], self.veast[idx] = wind.getdata(lat[idx], lon[idx], alt[idx])
+            self.lat[idx], self.lon[idx], self.alt[idx] = lat[idx], lon[idx], alt[idx]
+            self.simt[idx] = bs.sim.simt
+        return self.vnorth, self.veast
+
+    @command(name='WINDSAMPLE')
+    def setsample(self, dist: float = None, dalt: 'alt' = None, dt: float = None):
+        """ Set when the wind at an aircraft position is sampled again from
+            the wind field. Without arguments, show the current settings.
+
+            Arguments:
+            - dist: Horizontal distance flown since the last sample [nm]
+            - dalt: Altitude change since the last sample [ft]
+            - dt: Maximum age of a sample [s]
+        """
+        if dist is None and dalt is None and dt is None:
+            return True, f'WINDSAMPLE: resample after {self.dist / nm:.2f} nm, ' + \
+                f'{self.dalt / ft:.0f} ft or {self.dt:.0f} s'
+        if any(value is not None and value < 0.0 for value in (dist, dalt, dt)):
+            return False, 'WINDSAMPLE: distances and time should not be negative'
+        self.setlimits(self.dist if dist is None else dist * nm,
+                       self.dalt if dalt is None else dalt,
+                       self.dt if dt is None else dt)
+        self.windversion = None
+        return True
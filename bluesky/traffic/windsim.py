@@ -67,4 +67,27 @@ class WindSim(Entity, Windfield, replaceable=True):
 
         txt  = "WIND AT %.5f, %.5f: %03d/%d" % (lat,lon,round(wdir),round(wspd/kts))
 
-        return True, txt
\ No newline at end of file
+        return True, txt
+
+    @command(name='WINDGRID')
+    def setgrid(self, lat0: 'lat', lon0: 'lon', lat1: 'lat', lon1: 'lon',
+                res: float = 0.5, altres: 'alt' = 1000. * ft):
+        """ Resample the wind defined with WIND onto a regular grid, to speed
+            up the wind lookups for many aircraft. Adding or removing wind
+            definitions switches back to the interpolation between the wind
+            definitions.
+
+            Arguments:
+            - lat0, lon0, lat1, lon1: Area of the grid [deg], from lon0
+              eastward to lon1
+            - res: Grid resolution [deg]
+            - altres: Altitude resolution of the grid for 3D wind fields [ft]
+        """
+        if self.winddim == 0:
+            return False, "WINDGRID: no wind defined"
+        if res <= 0.0 or altres <= 0.0:
+            return False, "WINDGRID: resolution should be positive"
+
+        grid = self.resample(lat0, lat1, lon0, lon1, res, altres)
+        return True, f"WINDGRID: {grid.nlat} x {grid.nlon} x {grid.nalt} grid points, " + \
+            f"{grid.nbytes / 1e6:.1f} MB"
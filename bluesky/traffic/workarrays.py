@@ -0,0 +1,29 @@
+''' Work arrays for per-aircraft intermediate results. '''
+import numpy as np
+
+
+class WorkArrays:
+    ''' Named work arrays with one element per aircraft, for intermediate
+        results of the traffic update that are computed in place with out=
+        arguments instead of in new arrays every simulation step.
+
+        The arrays are allocated on first use, and again when the number of
+        aircraft changes. Their contents are undefined at the start of each
+        use, and they should not be kept beyond the current step. '''
+    def __init__(self):
+        self.n = 0
+        # {(name, dtype): array}
+        self.arrays = dict()
+
+    def __call__(self, n, *names, dtype=float):
+        ''' Work arrays names of n elements of dtype. '''
+        if n != self.n:
+            self.n = n
+            self.arrays.clear()
+        arrays = []
+        for name in names:
+            array = self.arrays.get((name, dtype))
+            if array is None:
+                array = self.arrays[name, dtype] = np.empty(n, dtype=dtype)
+            arrays.append(array)
+        return tuple(arrays) if len(arrays) > 1 else arrays[0]
@@ -757,7 +757,7 @@ class Screen(Entity):
 
 
             # Draw conflicts: line from a/c to closest point of approach
-            nconf = len(bs.traf.cd.confpairs_unique)
+            nconf = bs.traf.cd.nconf_cur
             n2conf = len(bs.traf.cd.confpairs)
 
             if nconf>0:
@@ -876,13 +876,13 @@ class Screen(Entity):
                                  "Freq=" + str(int(len(self.dts) / max(0.001, sum(self.dts)))))
 
             self.fontsys.printat(self.win, 10+240, 2, \
-                                 "#LOS      = " + str(len(bs.traf.cd.lospairs_unique)))
+                                 "#LOS      = " + str(bs.traf.cd.nlos_cur))
             self.fontsys.printat(self.win, 10+240, 18, \
-                                 "Total LOS = " + str(len(bs.traf.cd.lospairs_all)))
+                                 "Total LOS = " + str(bs.traf.cd.nlos_tot))
             self.fontsys.printat(self.win, 10+240, 34, \
-                                 "#Con      = " + str(len(bs.traf.cd.confpairs_unique)))
+                                 "#Con      = " + str(bs.traf.cd.nconf_cur))
             self.fontsys.printat(self.win, 10+240, 50, \
-                                 "Total Con = " + str(len(bs.traf.cd.confpairs_all)))
+                                 "Total Con = " + str(bs.traf.cd.nconf_tot))
 
             # Frame ready, flip to screen
             pg.display.flip()
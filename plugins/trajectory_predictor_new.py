@@ -60,7 +60,10 @@ def pack_attrs(obj, exclude: set[str] | None = None, include: set[str] | None =
     exclude = exclude or set()
     dct = getattr(obj, "__dict__", {})
     if include is not None:
-        return {k: v for k, v in dct.items() if k in include and k not in exclude}
+        # Use getattr, as not all attributes are stored in __dict__
+        # (e.g., the waypoint data of routes are views on the route store)
+        values = {k: getattr(obj, k) for k in include if k not in exclude and hasattr(obj, k)}
+        return {k: v.tolist() if hasattr(v, 'tolist') else v for k, v in values.items()}
     return {k: v for k, v in dct.items() if k not in exclude}
 
 def unpack_attribs(obj, data: dict):
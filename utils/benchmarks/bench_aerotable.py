@@ -0,0 +1,131 @@
+''' Benchmark and accuracy report of the tabulated atmosphere.
+
+    Compares the analytic atmosphere and speed conversion functions of
+    bluesky.tools.aero with the tabulated ones of bluesky.tools.aerotable,
+    for random altitudes and speeds of a number of aircraft:
+    - the largest relative error of the tables, at ISA and with random
+      temperature offsets (dtemp)
+    - the time per call of the analytic functions, of the tables, and of the
+      tables with precomputed altitudes and out buffers, as in a simulation
+      step where the atmosphere and several speed conversions share the
+      altitudes of all aircraft
+
+    Usage: python bench_aerotable.py [-n NAC] [-r REPEAT]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bluesky.tools import aero, aerotable
+from bluesky.tools.aero import R, gamma, p0, rho0
+
+
+def timeit(func, repeat):
+    ''' Best time of repeated calls of func. '''
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def relerror(values, refs):
+    ''' Largest relative error of values, or tuples of values. '''
+    if isinstance(refs, tuple):
+        return max(relerror(v, r) for v, r in zip(values, refs))
+    return np.max(np.abs(values - refs) / np.maximum(np.abs(refs), 1.0))
+
+
+def nonisa(h, dtemp, cas):
+    ''' Analytic pressure, density, temperature, speed of sound and TAS at
+        pressure altitude h with temperature offset dtemp. '''
+    p, _, T = aero.vatmos(h)
+    T = T + dtemp
+    rho = p / (R * T)
+    qdyn = p0 * ((1.0 + rho0 * cas * cas / (7.0 * p0)) ** 3.5 - 1.0)
+    tas = np.sqrt(7.0 * p / rho * ((1.0 + qdyn / p) ** (2.0 / 7.0) - 1.0))
+    return (p, rho, T, np.sqrt(gamma * R * T)), tas
+
+
+def step_analytic(h, tas, cas, casmach):
+    ''' The atmosphere and speed conversions of a simulation step. '''
+    aero.vatmos(h)
+    aero.vvsound(h)
+    aero.vtas2cas(tas, h)
+    aero.vcas2tas(cas, h)
+    aero.vcasormach2tas(casmach, h)
+    aero.vcasormach2tas(casmach, h)
+
+
+def step_table(h, tas, cas, casmach, out):
+    ''' The same lookups with shared altitudes and out buffers. '''
+    alts = aerotable.altitudes(h)
+    aerotable.vatmos_vsound(alts, out=out[:4])
+    aerotable.vtas2cas(tas, alts, out=out[4])
+    aerotable.vcas2tas(cas, alts, out=out[4])
+    aerotable.vcasormach2tas(casmach, alts, out=out[4])
+    aerotable.vcasormach2tas(casmach, alts, out=out[4])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, default=5000,
+                        help='Number of aircraft')
+    parser.add_argument('-r', '--repeat', type=int, default=200,
+                        help='Number of timed calls')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    h = rng.uniform(0.0, 13000.0, args.nac)
+    cas = rng.uniform(60.0, 180.0, args.nac)
+    tas = aero.vcas2tas(cas, h)
+    casmach = np.where(h > 9000.0, rng.uniform(0.7, 0.85, args.nac), cas)
+    dtemp = rng.uniform(-20.0, 20.0, args.nac)
+    t0 = time.perf_counter()
+    aerotable.table()
+    tinit = time.perf_counter() - t0
+
+    # Accuracy
+    refs_dtemp, tas_dtemp = nonisa(h, dtemp, cas)
+    accuracy = (
+        ('vatmos+vsound', relerror(aerotable.vatmos_vsound(h), (*aero.vatmos(h), aero.vvsound(h))),
+         relerror(aerotable.vatmos_vsound(h, dtemp), refs_dtemp)),
+        ('vcas2tas', relerror(aerotable.vcas2tas(cas, h), tas),
+         relerror(aerotable.vcas2tas(cas, h, dtemp), tas_dtemp)),
+        ('vtas2cas', relerror(aerotable.vtas2cas(tas, h), aero.vtas2cas(tas, h)),
+         relerror(aerotable.vtas2cas(tas_dtemp, h, dtemp), cas)),
+        ('vcasormach', relerror(aerotable.vcasormach(casmach, h), aero.vcasormach(casmach, h)),
+         np.nan))
+
+    # Speed
+    alts = aerotable.altitudes(h)
+    out = tuple(np.empty(args.nac) for _ in range(5))
+    timings = (
+        ('altitudes', np.nan, timeit(lambda: aerotable.altitudes(h), args.repeat), np.nan),
+        ('vatmos+vsound', timeit(lambda: (aero.vatmos(h), aero.vvsound(h)), args.repeat),
+         timeit(lambda: aerotable.vatmos_vsound(h), args.repeat),
+         timeit(lambda: aerotable.vatmos_vsound(alts, out=out[:4]), args.repeat)),
+        ('vcas2tas', timeit(lambda: aero.vcas2tas(cas, h), args.repeat),
+         timeit(lambda: aerotable.vcas2tas(cas, h), args.repeat),
+         timeit(lambda: aerotable.vcas2tas(cas, alts, out=out[4]), args.repeat)),
+        ('vtas2cas', timeit(lambda: aero.vtas2cas(tas, h), args.repeat),
+         timeit(lambda: aerotable.vtas2cas(tas, h), args.repeat),
+         timeit(lambda: aerotable.vtas2cas(tas, alts, out=out[4]), args.repeat)),
+        ('vcasormach2tas', timeit(lambda: aero.vcasormach2tas(casmach, h), args.repeat),
+         timeit(lambda: aerotable.vcasormach2tas(casmach, h), args.repeat),
+         timeit(lambda: aerotable.vcasormach2tas(casmach, alts, out=out[4]), args.repeat)),
+        ('simulation step', timeit(lambda: step_analytic(h, tas, cas, casmach), args.repeat),
+         np.nan, timeit(lambda: step_table(h, tas, cas, casmach, out), args.repeat)))
+
+    print(f'{args.nac} aircraft, tables computed in {1e3 * tinit:.0f} ms')
+    print(f'{"":16} {"rel. error ISA":>15} {"with dtemp":>11}')
+    for name, err, errdtemp in accuracy:
+        print(f'{name:16} {err:15.1e} {errdtemp:11.1e}')
+    print(f'{"":16} {"analytic [us]":>15} {"table [us]":>11} {"shared [us]":>12} {"speedup":>8}')
+    for name, tanalytic, ttable, tshared in timings:
+        print(f'{name:16} {1e6 * tanalytic:15.1f} {1e6 * ttable:11.1f} {1e6 * tshared:12.1f} '
+              f'{tanalytic / tshared:8.1f}')
@@ -0,0 +1,72 @@
+''' Benchmark for state-based conflict detection: full matrix vs grid broadphase.
+
+    Traffic is spread uniformly at constant density, so the number of nearby
+    aircraft pairs grows linearly with the number of aircraft. The full-matrix
+    StateBased detection scales quadratically, StateBasedGrid should scale
+    close to linearly.
+
+    Usage: python bench_cd_grid.py [-n NAC [NAC ...]] [--max-dense NAC]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bluesky.tools.aero import nm, ft
+from bluesky.traffic.asas.statebased import StateBased
+from bluesky.traffic.asas.statebasedgrid import StateBasedGrid
+
+
+def make_traffic(nac, density=2.0, seed=1):
+    ''' Random traffic with on average density aircraft per 1000 nm^2. '''
+    rng = np.random.default_rng(seed)
+    # Side of the (square) traffic area in degrees latitude
+    side = np.sqrt(nac / density * 1000.0) / 60.0
+    lat = 45.0 + rng.uniform(-0.5, 0.5, nac) * side
+    lon = rng.uniform(-0.5, 0.5, nac) * side / np.cos(np.radians(lat))
+    return SimpleNamespace(
+        ntraf=nac, id=[f'AC{i:05d}' for i in range(nac)], lat=lat, lon=lon,
+        alt=rng.uniform(2000.0, 12000.0, nac), trk=rng.uniform(0.0, 360.0, nac),
+        gs=rng.uniform(100.0, 250.0, nac), vs=rng.choice([-10.0, 0.0, 0.0, 10.0], nac))
+
+
+def bench(detector, traf, nrep):
+    ''' Return the average time of a detection call, and its result. '''
+    rpz = np.full(traf.ntraf, 5.0 * nm)
+    hpz = np.full(traf.ntraf, 1000.0 * ft)
+    dtlook = np.full(traf.ntraf, 300.0)
+    t0 = time.perf_counter()
+    for _ in range(nrep):
+        result = detector.detect(traf, traf, rpz, hpz, dtlook)
+    return (time.perf_counter() - t0) / nrep, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, nargs='+',
+                        default=[1000, 2000, 5000, 10000, 20000],
+                        help='Numbers of aircraft to benchmark')
+    parser.add_argument('--max-dense', type=int, default=5000,
+                        help='Largest number of aircraft for the full-matrix detection')
+    parser.add_argument('--nrep', type=int, default=3,
+                        help='Number of repetitions per measurement')
+    args = parser.parse_args()
+
+    grid, dense = StateBasedGrid.__new__(StateBasedGrid), StateBased.__new__(StateBased)
+    prev = None
+    print(f'{"ntraf":>7} {"nconf":>7} {"StateBased [s]":>15} {"StateBasedGrid [s]":>19} {"exponent":>9}')
+    for nac in args.nac:
+        traf = make_traffic(nac)
+        tgrid, resgrid = bench(grid, traf, args.nrep)
+        tdense = float('nan')
+        if nac <= args.max_dense:
+            tdense, resdense = bench(dense, traf, args.nrep)
+            assert resdense[0] == resgrid[0] and resdense[1] == resgrid[1], \
+                'Grid-based detection differs from StateBased'
+        # Scaling exponent of the grid-based detection w.r.t. the previous size
+        exponent = np.log(tgrid / prev[1]) / np.log(nac / prev[0]) if prev else float('nan')
+        prev = (nac, tgrid)
+        print(f'{nac:7d} {len(resgrid[0]):7d} {tdense:15.3f} {tgrid:19.3f} {exponent:9.2f}')
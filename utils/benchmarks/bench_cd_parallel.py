@@ -0,0 +1,47 @@
+''' Benchmark for multi-threaded state-based conflict detection.
+
+    Measures CD steps per second of StateBasedParallel as a function of the
+    number of threads, for several traffic sizes.
+
+    Usage: python bench_cd_parallel.py [-n NAC [NAC ...]] [-t NTHREADS [NTHREADS ...]]
+'''
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bluesky.traffic.asas.statebasedparallel import StateBasedParallel
+from bench_cd_grid import make_traffic, bench
+
+
+if __name__ == '__main__':
+    ncores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, nargs='+', default=[2000, 10000, 20000],
+                        help='Numbers of aircraft to benchmark')
+    parser.add_argument('-t', '--nthreads', type=int, nargs='+',
+                        default=sorted({1, 2, 4, 8, 16, 32, ncores}),
+                        help='Numbers of threads to benchmark')
+    parser.add_argument('--tilesize', type=int, default=128,
+                        help='Number of ownship rows per tile')
+    parser.add_argument('--nrep', type=int, default=1,
+                        help='Number of repetitions per measurement')
+    args = parser.parse_args()
+
+    detector = StateBasedParallel.__new__(StateBasedParallel)
+    detector.tilesize = args.tilesize
+    detector.pool = None
+    print(f'{ncores} cores available')
+    print(f'{"ntraf":>7} {"threads":>8} {"steps/s":>9} {"speedup":>8}')
+    for nac in args.nac:
+        traf = make_traffic(nac)
+        reference = None
+        for nthreads in args.nthreads:
+            detector.setnthreads(nthreads)
+            tstep, result = bench(detector, traf, args.nrep)
+            if reference is None:
+                reference = (tstep, result[0])
+            assert result[0] == reference[1], 'Result depends on the number of threads'
+            print(f'{nac:7d} {nthreads:8d} {1.0 / tstep:9.3f} {reference[0] / tstep:8.2f}')
+    detector.pool.shutdown()
@@ -0,0 +1,159 @@
+''' Benchmark for the traffic kinematics update.
+
+    Flies a number of aircraft with wind, and times the kinematics update
+    (airspeed, heading, vertical speed, ground speed, track and position)
+    from the same state with:
+    - the integration before the kinematics used work arrays, which
+      allocated new arrays for every intermediate result
+    - Traffic.update_kinematics, which computes intermediate results in
+      place in reused work arrays
+    Also reports the largest difference between the two in each updated
+    traffic array.
+
+    Usage: python bench_kinematics.py [-n NAC] [-s NSTEPS] [-r REPEAT] [--workdir DIR]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import bluesky as bs
+from bluesky import stack
+from bluesky.tools import aerotable
+from bluesky.tools.aero import fpm, ft, g0, Rearth
+
+
+# Traffic arrays that are updated by the kinematics
+STATE = ('tas', 'cas', 'M', 'ax', 'az', 'hdg', 'swhdgsel', 'swaltsel', 'vs', 'gs', 'trk',
+         'gsnorth', 'gseast', 'windnorth', 'windeast', 'work', 'alt', 'lat', 'lon',
+         'coslat', 'distflown')
+# Wind sampler arrays that are updated by the kinematics
+SAMPLER = ('lat', 'lon', 'alt', 'simt', 'vnorth', 'veast')
+
+
+def reference(traf):
+    ''' The kinematics update with new arrays for intermediate results. '''
+    # Airspeed
+    delta_spd = traf.aporasas.tas - traf.tas
+    need_ax = np.abs(delta_spd) > np.abs(bs.sim.simdt * traf.perf.axmax)
+    traf.ax = need_ax * np.sign(delta_spd) * traf.perf.axmax
+    traf.tas = np.where(need_ax, traf.tas + traf.ax * bs.sim.simdt, traf.aporasas.tas)
+    traf.cas = aerotable.vtas2cas(traf.tas, traf.derived.altitudes)
+    traf.M = traf.tas / traf.derived.vsound
+
+    # Heading
+    turnrate = np.degrees(g0 * np.tan(np.where(traf.ap.turnphi > traf.eps * traf.eps,
+                                               traf.ap.turnphi, traf.ap.bankdef))
+                          / np.maximum(traf.tas, traf.eps))
+    delhdg = (traf.aporasas.hdg - traf.hdg + 180) % 360 - 180
+    traf.swhdgsel = np.abs(delhdg) > np.abs(bs.sim.simdt * turnrate)
+    traf.hdg = np.where(traf.swhdgsel, traf.hdg + bs.sim.simdt * turnrate * np.sign(delhdg),
+                        traf.aporasas.hdg) % 360.0
+
+    # Vertical speed
+    delta_alt = traf.aporasas.alt - traf.alt
+    traf.swaltsel = np.abs(delta_alt) > 1.05 * np.maximum(np.abs(bs.sim.simdt * traf.aporasas.vs),
+                                                          np.abs(bs.sim.simdt * traf.vs))
+    target_vs = traf.swaltsel * np.sign(delta_alt) * np.abs(traf.aporasas.vs)
+    delta_vs = target_vs - traf.vs
+    need_az = np.abs(delta_vs) > 300 * fpm
+    traf.az = need_az * np.sign(delta_vs) * (300 * fpm)
+    traf.vs = np.where(need_az, traf.vs + traf.az * bs.sim.simdt, target_vs)
+    traf.vs = np.where(np.isfinite(traf.vs), traf.vs, 0)
+
+    # Ground speed
+    applywind = traf.alt > 50. * ft
+    vnwnd, vewnd = traf.windsampler.getdata(traf.wind, traf.lat, traf.lon, traf.alt,
+                                            traf.derived.coslat)
+    traf.windnorth[:], traf.windeast[:] = vnwnd, vewnd
+    taseast, tasnorth = traf.derived.tasvel
+    traf.gsnorth = tasnorth + traf.windnorth * applywind
+    traf.gseast = taseast + traf.windeast * applywind
+    traf.gs = np.logical_not(applywind) * traf.tas + \
+        applywind * np.sqrt(traf.gsnorth**2 + traf.gseast**2)
+    traf.trk = np.logical_not(applywind) * traf.hdg + \
+        applywind * np.degrees(np.arctan2(traf.gseast, traf.gsnorth)) % 360.
+    traf.work += (traf.perf.thrust * bs.sim.simdt * np.sqrt(traf.gs * traf.gs + traf.vs * traf.vs))
+
+    # Position
+    traf.alt = np.where(traf.swaltsel, np.round(traf.alt + traf.vs * bs.sim.simdt, 6),
+                        traf.aporasas.alt)
+    traf.lat = traf.lat + np.degrees(bs.sim.simdt * traf.gsnorth / Rearth)
+    traf.coslat = traf.derived.coslat
+    traf.lon = traf.lon + np.degrees(bs.sim.simdt * traf.gseast / traf.coslat / Rearth)
+    traf.distflown += traf.gs * bs.sim.simdt
+
+
+def getstate(traf):
+    ''' Copies of the traffic and wind sampler arrays of the kinematics. '''
+    return {name: getattr(traf, name).copy() for name in STATE}, \
+        {name: getattr(traf.windsampler, name).copy() for name in SAMPLER}
+
+
+def setstate(traf, state):
+    ''' Restore the traffic and wind sampler arrays from getstate(). '''
+    for obj, arrays in zip((traf, traf.windsampler), state):
+        for name, value in arrays.items():
+            setattr(obj, name, value.copy())
+
+
+def run(nac, nsteps, repeat):
+    ''' Best kinematics times [s] of both updates from the state after
+        nsteps, and the largest differences per traffic array. '''
+    bs.sim.reset()
+    rng = np.random.default_rng(1)
+    bs.traf.cre([f'AC{i:05d}' for i in range(nac)], 'B738', rng.uniform(50.0, 54.0, nac),
+                rng.uniform(3.0, 7.0, nac), rng.uniform(0.0, 360.0, nac),
+                rng.uniform(5000.0, 35000.0, nac) * ft, rng.uniform(200.0, 300.0, nac) * 0.5144)
+    # Give the aircraft new headings, speeds and altitudes to fly to
+    bs.traf.ap.selhdgcmd(np.arange(nac), rng.uniform(0.0, 360.0, nac))
+    bs.traf.ap.selspdcmd(np.arange(nac), rng.uniform(200.0, 300.0, nac) * 0.5144)
+    bs.traf.ap.selaltcmd(np.arange(nac), rng.uniform(5000.0, 35000.0, nac) * ft)
+    stack.stack('WIND 52 5 FL50 270 20 FL350 250 60')
+    stack.process()
+    bs.sim.op()
+    for _ in range(nsteps):
+        bs.sim.step()
+
+    # Time both updates from the same state, alternating between them
+    traf = bs.traf
+    state = getstate(traf)
+    times = dict(reference=np.inf, inplace=np.inf)
+    for _ in range(repeat):
+        for name, update in (('reference', lambda: reference(traf)),
+                             ('inplace', traf.update_kinematics)):
+            setstate(traf, state)
+            t0 = time.perf_counter()
+            update()
+            times[name] = min(times[name], time.perf_counter() - t0)
+            result = getstate(traf)[0]
+            if name == 'reference':
+                ref = result
+    diff = {name: np.max(np.abs(result[name].astype(float) - ref[name].astype(float)))
+            for name in STATE}
+    return times['reference'], times['inplace'], diff
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, default=10000,
+                        help='Number of aircraft')
+    parser.add_argument('-s', '--nsteps', type=int, default=50,
+                        help='Number of simulation steps before timing')
+    parser.add_argument('-r', '--repeat', type=int, default=20,
+                        help='Number of timed updates')
+    parser.add_argument('--workdir', default=None,
+                        help='BlueSky working directory')
+    args = parser.parse_args()
+
+    bs.init(mode='sim', detached=True, workdir=args.workdir)
+    t_ref, t_inplace, diff = run(args.nac, args.nsteps, args.repeat)
+
+    print(f'{args.nac} aircraft, after {args.nsteps} steps')
+    print(f'{"":12} {"time [ms]":>10}')
+    for name, t in (('reference', t_ref), ('in place', t_inplace)):
+        print(f'{name:12} {1e3 * t:10.2f}')
+    print(f'speedup {t_ref / t_inplace:.2f}')
+    print('max. difference: ' + ', '.join(f'{name} {value:.1e}' for name, value in diff.items()))
@@ -0,0 +1,78 @@
+''' Benchmark for the spatial index of the navigation database.
+
+    Compares nearest-point and inside-box queries with the spatial index
+    with the linear scans over all points that the navdb used before.
+    Both should find the same points.
+
+    Usage: python bench_navdb_spatial.py [-n NPOINTS] [-q NQUERIES]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bluesky.navdatabase.spatialindex import SpatialIndex, inbox, lat2xyz
+
+
+def scan_nearest(lat, lon, queries):
+    ''' Nearest point to each query position with a scan over all points. '''
+    xyz = lat2xyz(lat, lon)
+    return [int(np.argmin(np.linalg.norm(xyz - lat2xyz(qlat, qlon), axis=1)))
+            for qlat, qlon in queries]
+
+
+def scan_inside(lat, lon, boxes):
+    ''' Points inside each box with a scan over all points. '''
+    return [np.flatnonzero(inbox(lat, lon, *box)).tolist() for box in boxes]
+
+
+def index_nearest(index, queries):
+    return [int(index.nearest(qlat, qlon)[0]) for qlat, qlon in queries]
+
+
+def index_inside(index, boxes):
+    return [index.inside(*box) for box in boxes]
+
+
+def timeit(func, *args):
+    ''' Time of a call of func, and its result. '''
+    t0 = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - t0, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--npoints', type=int, default=200000,
+                        help='Number of navdata points')
+    parser.add_argument('-q', '--nqueries', type=int, default=1000,
+                        help='Number of queries of each type')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    lat = np.degrees(np.arcsin(rng.uniform(-1.0, 1.0, args.npoints)))
+    lon = rng.uniform(-180.0, 180.0, args.npoints)
+    queries = np.column_stack((rng.uniform(-80.0, 80.0, args.nqueries),
+                               rng.uniform(-180.0, 180.0, args.nqueries)))
+    # Screen-sized boxes of 2 to 10 degrees, some across the antimeridian
+    size = rng.uniform(2.0, 10.0, args.nqueries)
+    boxes = [(qlat - 0.5 * s, qlat + 0.5 * s, qlon - s, (qlon + s + 180.0) % 360.0 - 180.0)
+             for (qlat, qlon), s in zip(queries, size)]
+
+    t_build, index = timeit(SpatialIndex, lat, lon)
+    t_tree, _ = timeit(index.gettree)
+    t_scan_near, res_scan_near = timeit(scan_nearest, lat, lon, queries)
+    t_index_near, res_index_near = timeit(index_nearest, index, queries)
+    t_scan_box, res_scan_box = timeit(scan_inside, lat, lon, boxes)
+    t_index_box, res_index_box = timeit(index_inside, index, boxes)
+    assert res_scan_near == res_index_near, 'Nearest points differ'
+    assert res_scan_box == res_index_box, 'Points inside boxes differ'
+
+    print(f'{args.npoints} points, {args.nqueries} queries, '
+          f'index build {1e3 * (t_build + t_tree):.1f} ms')
+    print(f'{"":8} {"scan [ms]":>10} {"index [ms]":>11} {"speedup":>8}')
+    for name, tscan, tindex in (('nearest', t_scan_near, t_index_near),
+                                ('inside', t_scan_box, t_index_box)):
+        print(f'{name:8} {1e3 * tscan:10.1f} {1e3 * tindex:11.1f} {tscan / tindex:8.1f}')
@@ -0,0 +1,130 @@
+''' Benchmark for the columnar route store.
+
+    Compares the memory use and the time of the per-step route lookups
+    (active waypoint, distance to go and next turn waypoint) of the route
+    store with per-aircraft routes stored as Python lists.
+
+    Usage: python bench_routes.py [-n NAC] [-w NWP]
+'''
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+from bluesky.traffic.routestore import RouteStore
+
+
+def make_routes(nac, nwp):
+    ''' Random routes, with random active waypoints and aircraft positions. '''
+    rng = np.random.default_rng(1)
+    lat = rng.uniform(40.0, 60.0, (nac, 1)) + np.cumsum(rng.uniform(-0.3, 0.3, (nac, nwp)), axis=1)
+    lon = rng.uniform(-10.0, 20.0, (nac, 1)) + np.cumsum(rng.uniform(0.0, 0.5, (nac, nwp)), axis=1)
+    _, distto = geo.qdrdist(lat[:, :-1], lon[:, :-1], lat[:, 1:], lon[:, 1:])
+    distto = np.hstack((np.zeros((nac, 1)), distto))
+    flyturn = rng.random((nac, nwp)) < 0.05
+    iactwp = rng.integers(0, nwp, nac)
+    aclat = lat[np.arange(nac), iactwp] - 0.1
+    aclon = lon[np.arange(nac), iactwp] - 0.1
+    return lat, lon, distto, flyturn, iactwp, aclat, aclon
+
+
+def fill_lists(names, lat, lon, distto, flyturn):
+    ''' Per-aircraft routes with a Python list per waypoint field. '''
+    routes = []
+    for i in range(len(lat)):
+        route = {name: [default() if callable(default) else default] * len(names)
+                 for name, (_, default) in RouteStore.columns.items()}
+        route['wpname'] = list(names)
+        route['wpstack'] = [[] for _ in names]
+        route['wplat'] = lat[i].tolist()
+        route['wplon'] = lon[i].tolist()
+        route['wpdistto'] = distto[i].tolist()
+        route['wpflyturn'] = flyturn[i].tolist()
+        routes.append(route)
+    return routes
+
+
+def fill_store(names, lat, lon, distto, flyturn):
+    ''' All routes in a route store. '''
+    store = RouteStore()
+    slots = np.array([store.alloc() for _ in range(len(lat))])
+    for i, slot in enumerate(slots):
+        store.resize(slot, len(names))
+        store.setcolumn(slot, 'wpname', names)
+        store.setcolumn(slot, 'wplat', lat[i])
+        store.setcolumn(slot, 'wplon', lon[i])
+        store.setcolumn(slot, 'wpdistto', distto[i])
+        store.setcolumn(slot, 'wpflyturn', flyturn[i])
+    return store, slots
+
+
+def step_lists(routes, iactwp, aclat, aclon):
+    ''' Route lookups with a loop over the aircraft. '''
+    actlat, dist2go, turnidx = [], [], []
+    for route, iwp, lat, lon in zip(routes, iactwp, aclat, aclon):
+        actlat.append(route['wplat'][iwp])
+        _, dist = geo.qdrdist(lat, lon, route['wplat'][iwp], route['wplon'][iwp])
+        dist2go.append((dist + sum(route['wpdistto'][iwp + 1:])) * nm)
+        turnidx_all = np.where(route['wpflyturn'])[0]
+        turnidx_next = turnidx_all[turnidx_all >= iwp]
+        turnidx.append(turnidx_next[0] if len(turnidx_next) else -1)
+    return np.array(actlat), np.array(dist2go), np.array(turnidx)
+
+
+def step_store(store, slots, aclat, aclon):
+    ''' Vectorized route lookups in the route store. '''
+    actlat = store.data['wplat'][store.active(slots)]
+    dist2go = store.distance_to_go(slots, aclat, aclon)
+    turnrow = store.nextturn(slots)
+    turnidx = np.where(turnrow >= 0, turnrow - store.start[slots], -1)
+    return actlat, dist2go, turnidx
+
+
+def timeit(func, *args, repeat=5):
+    ''' Best time of repeat calls of func, and its result. '''
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def measure(func, *args):
+    ''' Memory allocated by func [MB] and its result. '''
+    tracemalloc.start()
+    result = func(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / 1e6, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, default=10000,
+                        help='Number of aircraft')
+    parser.add_argument('-w', '--nwp', type=int, default=40,
+                        help='Number of waypoints per route')
+    args = parser.parse_args()
+
+    lat, lon, distto, flyturn, iactwp, aclat, aclon = make_routes(args.nac, args.nwp)
+    names = [f'WPT{i:02d}' for i in range(args.nwp)]
+
+    mem_lists, routes = measure(fill_lists, names, lat, lon, distto, flyturn)
+    mem_store, (store, slots) = measure(fill_store, names, lat, lon, distto, flyturn)
+    store.iactwp[slots] = iactwp
+
+    t_lists, res_lists = timeit(step_lists, routes, iactwp, aclat, aclon, repeat=1)
+    t_store, res_store = timeit(step_store, store, slots, aclat, aclon)
+    assert all(np.allclose(a, b) for a, b in zip(res_lists, res_store)), \
+        'Route store lookups differ from the per-aircraft lookups'
+
+    print(f'{args.nac} aircraft x {args.nwp} waypoints')
+    print(f'{"":8} {"memory [MB]":>12} {"step [ms]":>10}')
+    print(f'{"lists":8} {mem_lists:12.1f} {1e3 * t_lists:10.2f}')
+    print(f'{"store":8} {mem_store:12.1f} {1e3 * t_store:10.2f}')
@@ -0,0 +1,96 @@
+''' Benchmark for loading the flight plans of a scenario.
+
+    Compares adding the waypoints of many flights one ADDWPT command at a
+    time with adding them with one FLIGHTPLAN command per flight, and with
+    Route.load_many for all flights at once. All methods should give the
+    same routes.
+
+    Usage: python bench_scenario_load.py [-n NAC] [-w NWP] [--workdir DIR]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import bluesky as bs
+from bluesky import stack
+from bluesky.traffic.route import Route
+
+
+def make_flights(nac, nwp):
+    ''' Random flights in the Netherlands, with routes of nwp navdb fixes. '''
+    rng = np.random.default_rng(1)
+    inbox = np.flatnonzero((np.abs(bs.navdb.wplat - 52.0) < 2.0) &
+                           (np.abs(bs.navdb.wplon - 5.0) < 3.0))
+    names = np.array(bs.navdb.wpid, dtype=object)[inbox]
+    lat = rng.uniform(50.5, 53.5, nac)
+    lon = rng.uniform(2.5, 7.5, nac)
+    hdg = rng.uniform(0.0, 360.0, nac)
+    routes = [list(rng.choice(names, nwp)) for _ in range(nac)]
+    return lat, lon, hdg, routes
+
+
+def create(lat, lon, hdg):
+    ''' Reset the simulation and create the aircraft. '''
+    bs.sim.reset()
+    bs.traf.cre([f'AC{i:05d}' for i in range(len(lat))], 'B738', lat, lon, hdg,
+                10000.0, 150.0)
+
+
+def load_addwpt(routes):
+    ''' One ADDWPT command per waypoint. '''
+    for acid, route in zip(bs.traf.id, routes):
+        stack.stack(*(f'ADDWPT {acid} {name}' for name in route))
+    stack.process()
+    bs.traf.ap.update()
+
+
+def load_flightplan(routes):
+    ''' One FLIGHTPLAN command per flight. '''
+    stack.stack(*(f'FLIGHTPLAN {acid} {" ".join(route)}'
+                  for acid, route in zip(bs.traf.id, routes)))
+    stack.process()
+    bs.traf.ap.update()
+
+
+def load_many(routes):
+    ''' All flights at once with Route.load_many. '''
+    Route.load_many(np.arange(bs.traf.ntraf), routes)
+    bs.traf.ap.update()
+
+
+def get_routes():
+    ''' Waypoint names and positions of the routes of all aircraft. '''
+    return [(route.wpname.tolist(), route.wplat.tolist(), route.wplon.tolist())
+            for route in bs.traf.ap.route]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, default=2000,
+                        help='Number of aircraft')
+    parser.add_argument('-w', '--nwp', type=int, default=20,
+                        help='Number of waypoints per route')
+    parser.add_argument('--workdir', default=None,
+                        help='BlueSky working directory')
+    args = parser.parse_args()
+
+    bs.init(mode='sim', detached=True, workdir=args.workdir)
+    lat, lon, hdg, routes = make_flights(args.nac, args.nwp)
+
+    print(f'{args.nac} aircraft x {args.nwp} waypoints')
+    print(f'{"":12} {"time [s]":>9} {"speedup":>8}')
+    reference = None
+    for name, load in (('ADDWPT', load_addwpt), ('FLIGHTPLAN', load_flightplan),
+                       ('load_many', load_many)):
+        create(lat, lon, hdg)
+        t0 = time.perf_counter()
+        load(routes)
+        tload = time.perf_counter() - t0
+        result = get_routes()
+        if reference is None:
+            reference = (tload, result)
+        assert result == reference[1], f'{name} gives different routes than ADDWPT'
+        print(f'{name:12} {tload:9.3f} {reference[0] / tload:8.2f}')
@@ -0,0 +1,76 @@
+''' Benchmark for SSD conflict resolution with multiple worker processes.
+
+    Measures the time of an SSD resolution step for all aircraft in
+    conflict, as a function of the number of worker processes, for several
+    traffic sizes. Resolutions are checked to be independent of the number
+    of workers.
+
+    Usage: python bench_ssd.py [-n NAC [NAC ...]] [-w NWORKERS [NWORKERS ...]]
+'''
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bluesky.plugins.asas.ssd import SSD
+from bluesky.traffic.asas.statebasedgrid import StateBasedGrid
+from bench_cd_grid import make_traffic, bench
+
+
+def make_conflicts(nac, density):
+    ''' Random traffic with the data used by SSD, and its conflicts. '''
+    traf = make_traffic(nac, density)
+    rng = np.random.default_rng(2)
+    traf.hdg = traf.trk
+    traf.gseast = traf.gs * np.sin(np.radians(traf.trk))
+    traf.gsnorth = traf.gs * np.cos(np.radians(traf.trk))
+    traf.ap = SimpleNamespace(tas=traf.gs, trk=(traf.trk + rng.uniform(-20.0, 20.0, nac)) % 360.0)
+    traf.perf = SimpleNamespace(vmin=np.full(nac, 70.0), vmax=np.full(nac, 260.0))
+    traf.selalt = traf.alt
+    _, result = bench(StateBasedGrid.__new__(StateBasedGrid), traf, 1)
+    conf = SimpleNamespace(inconf=result[2], rpz=np.full(nac, 5.0 * 1852.0))
+    return traf, conf
+
+
+if __name__ == '__main__':
+    ncores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, nargs='+', default=[500, 1000, 2000],
+                        help='Numbers of aircraft to benchmark')
+    parser.add_argument('-w', '--nworkers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, 8, ncores}),
+                        help='Numbers of worker processes to benchmark')
+    parser.add_argument('--density', type=float, default=4.0,
+                        help='Number of aircraft per 1000 nm^2')
+    parser.add_argument('--priocode', default='RS1',
+                        help='SSD priority code')
+    args = parser.parse_args()
+
+    resolver = SSD.__new__(SSD)
+    resolver.pool = None
+    resolver.swprio = True
+    resolver.priocode = args.priocode
+    resolver.resofach = 1.05
+    print(f'{ncores} cores available')
+    print(f'{"ntraf":>7} {"inconf":>7} {"workers":>8} {"time [s]":>9} {"speedup":>8}')
+    for nac in args.nac:
+        traf, conf = make_conflicts(nac, args.density)
+        reference = None
+        for nworkers in args.nworkers:
+            resolver.setnworkers(nworkers)
+            # The first step includes the start-up of the worker processes
+            resolver.resolve(conf, traf, traf)
+            t0 = time.perf_counter()
+            result = resolver.resolve(conf, traf, traf)
+            tstep = time.perf_counter() - t0
+            if reference is None:
+                reference = (tstep, result)
+            assert all(np.array_equal(res, ref) for res, ref in zip(result, reference[1])), \
+                'Resolution depends on the number of workers'
+            print(f'{nac:7d} {np.count_nonzero(conf.inconf):7d} {nworkers:8d} '
+                  f'{tstep:9.3f} {reference[0] / tstep:8.2f}')
+    resolver.setnworkers(1)
@@ -0,0 +1,81 @@
+''' Benchmark for the start-up of a simulation node.
+
+    Starts fresh Python processes that import and initialise BlueSky, and
+    reports the time of the imports, of the complete initialisation, of the
+    first use of each optional navigation data layer, and of loading all
+    navigation data from the pickle cache of earlier versions. Also reports
+    the resident memory after initialisation and after loading all layers.
+
+    Usage: python bench_startup.py [--workdir DIR] [-r REPEAT]
+'''
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = str(Path(__file__).resolve().parents[2])
+
+NODE = '''
+import json, resource, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import bluesky as bs
+from bluesky.navdatabase import loadnavdata
+from bluesky.navdatabase.navdatabase import lazylayers
+from bluesky.tools import cachefile
+t1 = time.perf_counter()
+bs.init(mode='sim', detached=True, workdir={workdir!r})
+t2 = time.perf_counter()
+times = dict(imports=t1 - t0, init=t2 - t1,
+             rss_init=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+# Optional layers, loaded on first use
+for layer, names in lazylayers.items():
+    t = time.perf_counter()
+    getattr(bs.navdb, names[0])
+    times[layer] = time.perf_counter() - t
+times['rss_all'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# Write a pickle cache to compare with, when there is none
+with cachefile.openfile('navdata.p', loadnavdata.navdb_version) as cache:
+    try:
+        cache.check_cache()
+    except cachefile.CacheError:
+        for layer in ('wpt', 'awy', 'apt', 'fir', 'co'):
+            cache.dump(dict(loadnavdata.load_navdata(layer)))
+        cache.dump({{apt: dict(rwys) for apt, rwys in bs.navdb.rwythresholds.items()}})
+t = time.perf_counter()
+loadnavdata.load_navdata_pickle()
+times['pickle'] = time.perf_counter() - t
+print(json.dumps(times))
+'''
+
+
+def start_node(workdir):
+    ''' Timings of the start-up of one simulation node. '''
+    result = subprocess.run([sys.executable, '-c', NODE.format(root=ROOT, workdir=workdir)],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workdir', default=None,
+                        help='BlueSky working directory')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Number of nodes to start')
+    args = parser.parse_args()
+
+    # The first node may have to write the caches
+    start_node(args.workdir)
+    times = [start_node(args.workdir) for _ in range(args.repeat)]
+    best = {name: min(t[name] for t in times) for name in times[0]}
+    print(f'{"":34} {"time [s]":>9}')
+    print(f'{"imports":34} {best["imports"]:9.3f}')
+    print(f'{"bs.init (waypoints, airports)":34} {best["init"]:9.3f}')
+    for layer in ('awy', 'awygraph', 'fir', 'co', 'rwy'):
+        print(f'{"first use of layer " + layer:34} {best[layer]:9.3f}')
+    print(f'{"all navdata from pickle cache":34} {best["pickle"]:9.3f}')
+    print(f'max. resident memory after bs.init {best["rss_init"] / 1024:7.1f} MB, '
+          f'after all layers {best["rss_all"] / 1024:7.1f} MB')
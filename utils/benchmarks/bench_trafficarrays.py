@@ -0,0 +1,96 @@
+''' Benchmark for TrafficArrays: create aircraft one by one.
+
+    Compares the buffered (amortized O(1)) TrafficArrays.create with the
+    previous implementation, which used np.append on every creation.
+
+    Usage: python bench_trafficarrays.py [-n NAC] [--narrays NARR]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bluesky.core.trafficarrays import TrafficArrays, defaults
+
+
+class LegacyArrays(TrafficArrays):
+    ''' TrafficArrays with the original np.append-based create. '''
+    def create(self, n=1):
+        for v in self._LstVars:
+            lst = self.__dict__[v]
+            vartype = type(lst[0]).__name__ if lst else 'str'
+            lst.extend([defaults.get(vartype)] * n)
+
+        for v in self._ArrVars:
+            vartype = ''.join(c for c in str(self.__dict__[v].dtype) if c.isalpha())
+            self.__dict__[v] = np.append(self.__dict__[v], [defaults.get(vartype, 0)] * n)
+
+
+def make_tree(base, narrays, nchildren=4):
+    ''' Build a Traffic-like tree of traffic arrays, with narrays arrays
+        spread over a root object and nchildren child objects. '''
+    class Child(base):
+        def __init__(self, narr):
+            super().__init__()
+            with self.settrafarrays():
+                for i in range(narr):
+                    setattr(self, f'arr{i}', np.array([]))
+
+    class Root(base):
+        def __init__(self):
+            super().__init__()
+            TrafficArrays.setroot(self)
+            narr = narrays // (nchildren + 1)
+            with self.settrafarrays():
+                self.id = []
+                self.type = []
+                for i in range(narr):
+                    setattr(self, f'arr{i}', np.array([]))
+                self.swflag = np.array([], dtype=bool)
+                for i in range(nchildren):
+                    setattr(self, f'child{i}', Child(narr))
+
+        def cre(self):
+            self.create(1)
+            self.create_children(1)
+            self.ntraf += 1
+            self.arr0[-1] = self.ntraf
+
+    return Root()
+
+
+def bench(base, nac, narrays):
+    root = make_tree(base, narrays)
+    t0 = time.perf_counter()
+    tlap = t0
+    for i in range(1, nac + 1):
+        root.cre()
+        if i % (nac // 5) == 0:
+            tnow = time.perf_counter()
+            print(f'  {i:7d} aircraft: {(tnow - tlap) / (nac // 5) * 1e6:8.1f} us/create')
+            tlap = tnow
+    ttot = time.perf_counter() - t0
+    assert len(root.arr0) == nac and root.arr0[-1] == nac
+    return ttot
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, default=50000,
+                        help='Number of aircraft to create')
+    parser.add_argument('--narrays', type=int, default=100,
+                        help='Total number of registered arrays')
+    parser.add_argument('--skip-legacy', action='store_true',
+                        help='Only benchmark the buffered implementation')
+    args = parser.parse_args()
+
+    print(f'Buffered TrafficArrays, {args.nac} creates, {args.narrays} arrays:')
+    tnew = bench(TrafficArrays, args.nac, args.narrays)
+    print(f'  total: {tnew:.2f} s')
+    if not args.skip_legacy:
+        print(f'Legacy (np.append) TrafficArrays, {args.nac} creates, {args.narrays} arrays:')
+        told = bench(LegacyArrays, args.nac, args.narrays)
+        print(f'  total: {told:.2f} s')
+        print(f'Speedup: {told / tnew:.1f}x')
@@ -0,0 +1,94 @@
+''' Benchmark for wind lookups on a regular grid.
+
+    Compares the wind lookup for many aircraft positions between:
+    - the interpolation between wind definitions (WIND command) and the
+      same wind field resampled onto a grid (WINDGRID command)
+    - scipy's grid interpolation, used before for GRIB data, and the grid
+      wind field
+    Also reports the memory of the grids and the differences in wind speed.
+    The wind between wind definitions varies on a smaller scale near the
+    definitions than the grid resolution, so the grid differs most there.
+
+    Usage: python bench_windgrid.py [-n NPOS] [-w NWIND] [--res RES]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bluesky.tools.aero import ft
+from bluesky.traffic.windfield import Windfield
+from bluesky.traffic.windgrid import WindGrid, memory_estimate
+
+
+def timeit(func, *args, repeat=3):
+    ''' Best time of repeated calls of func, and its result. '''
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def rgi_getdata(fn, fe, lat, lon, alt):
+    points = np.column_stack((alt, lat, lon))
+    return fn(points), fe(points)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--npos', type=int, default=5000,
+                        help='Number of aircraft positions')
+    parser.add_argument('-w', '--nwind', type=int, default=500,
+                        help='Number of wind definitions')
+    parser.add_argument('--res', type=float, default=0.25,
+                        help='Resolution of the grids [deg]')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    lat = rng.uniform(45.0, 60.0, args.npos)
+    lon = rng.uniform(-5.0, 15.0, args.npos)
+    alt = rng.uniform(0.0, 40000.0 * ft, args.npos)
+
+    # Wind definitions with profiles, resampled onto a grid
+    field = Windfield()
+    windalt = np.array([0.0, 10000.0, 20000.0, 30000.0, 40000.0]) * ft
+    for wlat, wlon in zip(rng.uniform(45.0, 60.0, args.nwind), rng.uniform(-5.0, 15.0, args.nwind)):
+        field.addpoint(wlat, wlon, rng.uniform(0.0, 360.0, len(windalt)),
+                       rng.uniform(5.0, 60.0, len(windalt)), windalt)
+    t_idw, (vn_idw, ve_idw) = timeit(field.getdata, lat, lon, alt, repeat=1)
+    t_resample, grid = timeit(field.resample, 45.0, 60.0, -5.0, 15.0, args.res,
+                              1000.0 * ft, repeat=1)
+    t_grid, (vn_grid, ve_grid) = timeit(field.getdata, lat, lon, alt)
+    diff_idw = np.hypot(vn_grid - vn_idw, ve_grid - ve_idw)
+    mem_idw = grid.nbytes
+
+    # GRIB-like data on 37 pressure levels
+    lats = np.arange(45.0, 60.0 + 0.5 * args.res, args.res)
+    lons = np.arange(-5.0, 15.0 + 0.5 * args.res, args.res)
+    levels = np.linspace(0.0, 16000.0, 37)
+    shape = (len(levels), len(lats), len(lons))
+    vnorth, veast = rng.normal(0.0, 20.0, shape), rng.normal(0.0, 20.0, shape)
+    fn = RegularGridInterpolator((levels, lats, lons), vnorth, bounds_error=False, fill_value=0.)
+    fe = RegularGridInterpolator((levels, lats, lons), veast, bounds_error=False, fill_value=0.)
+    gribgrid = WindGrid(lats, lons, levels, vnorth, veast)
+    alt16 = np.minimum(alt, 16000.0)
+    t_rgi, (vn_rgi, ve_rgi) = timeit(rgi_getdata, fn, fe, lat, lon, alt16)
+    t_gribgrid, (vn_gg, ve_gg) = timeit(gribgrid.getdata, lat, lon, alt16)
+    diff_rgi = np.hypot(vn_gg - vn_rgi, ve_gg - ve_rgi)
+
+    print(f'{args.npos} positions, {args.nwind} wind definitions, '
+          f'resampling {1e3 * t_resample:.0f} ms')
+    print(f'{"":22} {"before [ms]":>11} {"grid [ms]":>10} {"speedup":>8} '
+          f'{"diff rms/max [m/s]":>19} {"grid [MB]":>10}')
+    for name, tbefore, tgrid, diff, mem in (
+            ('WIND definitions', t_idw, t_grid, diff_idw, mem_idw),
+            ('GRIB data (RGI)', t_rgi, t_gribgrid, diff_rgi, gribgrid.nbytes)):
+        print(f'{name:22} {1e3 * tbefore:11.1f} {1e3 * tgrid:10.2f} {tbefore / tgrid:8.1f} '
+              f'{np.sqrt(np.mean(diff**2)):9.3f} {diff.max():9.3f} {mem / 1e6:10.1f}')
+    print(f'Global 0.25 deg grid on 37 levels: '
+          f'{memory_estimate(721, 1440, 37) / 1e6:.0f} MB (float32)')
@@ -0,0 +1,79 @@
+''' Benchmark for the per-aircraft wind sampling cache.
+
+    Flies a number of aircraft through a wind field defined with WIND
+    commands, and reports the time spent in the ground speed update, which
+    looks up the wind, with every aircraft sampled every step (WINDSAMPLE
+    0 0 0, the default) and with sampling thresholds of 0.54 nm, 100 ft and
+    60 s (WINDSAMPLE 0.54 100 60). Also reports the mean
+    number of aircraft sampled per step, and the largest difference in
+    ground speed at the end of the run.
+
+    Usage: python bench_windsampler.py [-n NAC] [-s NSTEPS] [-w NWIND] [--workdir DIR]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import bluesky as bs
+from bluesky import stack
+
+
+def run(nac, nsteps, nwind, sample):
+    ''' Time [s] of the ground speed updates, mean number of sampled
+        aircraft and final ground speeds of a run. '''
+    bs.sim.reset()
+    rng = np.random.default_rng(1)
+    cmds = [f'WINDSAMPLE {sample}']
+    for lat, lon in zip(rng.uniform(48.0, 56.0, nwind), rng.uniform(0.0, 10.0, nwind)):
+        cmds.append(f'WIND {lat:.3f} {lon:.3f} FL50 {rng.uniform(0, 360):.0f} '
+                    f'{rng.uniform(5, 30):.0f} FL350 {rng.uniform(0, 360):.0f} '
+                    f'{rng.uniform(20, 90):.0f}')
+    for cmd in cmds:
+        stack.stack(cmd)
+    stack.process()
+    bs.traf.cre([f'AC{i:05d}' for i in range(nac)], 'B738', rng.uniform(50.0, 54.0, nac),
+                rng.uniform(3.0, 7.0, nac), rng.uniform(0.0, 360.0, nac),
+                rng.uniform(5000.0, 35000.0, nac) * 0.3048, rng.uniform(200.0, 300.0, nac) * 0.5144)
+
+    update_groundspeed = bs.traf.update_groundspeed
+    timing = dict(t=0.0, nsampled=0)
+
+    def timed():
+        t0 = time.perf_counter()
+        update_groundspeed()
+        timing['t'] += time.perf_counter() - t0
+        timing['nsampled'] += bs.traf.windsampler.nsampled
+
+    bs.traf.update_groundspeed = timed
+    bs.sim.op()
+    for _ in range(nsteps):
+        bs.sim.step()
+    del bs.traf.update_groundspeed
+    return timing['t'], timing['nsampled'] / nsteps, bs.traf.gs.copy()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--nac', type=int, default=2000,
+                        help='Number of aircraft')
+    parser.add_argument('-s', '--nsteps', type=int, default=200,
+                        help='Number of simulation steps')
+    parser.add_argument('-w', '--nwind', type=int, default=50,
+                        help='Number of wind definitions')
+    parser.add_argument('--workdir', default=None,
+                        help='BlueSky working directory')
+    args = parser.parse_args()
+
+    bs.init(mode='sim', detached=True, workdir=args.workdir)
+    t_all, n_all, gs_all = run(args.nac, args.nsteps, args.nwind, '0 0 0')
+    t_gated, n_gated, gs_gated = run(args.nac, args.nsteps, args.nwind, '0.54 100 60')
+
+    print(f'{args.nac} aircraft, {args.nsteps} steps, {args.nwind} wind definitions')
+    print(f'{"":14} {"time/step [ms]":>15} {"sampled/step":>13}')
+    for name, t, n in (('every step', t_all, n_all), ('gated', t_gated, n_gated)):
+        print(f'{name:14} {1e3 * t / args.nsteps:15.2f} {n:13.0f}')
+    print(f'speedup {t_all / t_gated:.1f}, '
+          f'max. ground speed difference {np.max(np.abs(gs_all - gs_gated)):.3f} m/s')